@@ -0,0 +1,199 @@
+# Replay benchmark for the triangle fans the marcher dumps to updates/updateN.json
+# Each fan goes through triangleFan.outputJSON (same as stepWithPython.py and fanWorker.py)
+# and we report the latency percentiles, the iterations of the optimizer, how many fans
+# end up with each type of path and, if we have a baseline, how far THat and gradHat are
+# from it. Use it to measure (and check) every change to the optimizer on real fans.
+#
+# python benchFanUpdates.py updates/ [--limit N] [--solver newton] [--pathTypeSearch dp]
+#                           [--noPrune] [--threads N | --processes N] [--metrics] [--saveIterates iterates.bin]
+#                           [--tolKKT 1e-6]
+#                           [--saveBaseline baseline.json] [--baseline baseline.json] [--rtol 1e-8]
+# The corpus can be a directory (all its updateN.json, in order of N) or a list of files.
+# --saveBaseline writes THat and gradHat of each fan, --baseline compares against that file.
+# --metrics also prints the iterations, backtracking and projections by type of path (oP.marchMetrics),
+# counting them makes the optimizer a bit slower so the latencies are not comparable.
+# --saveIterates writes the iterates of every option of every fan (read them with oP.loadIterates).
+# The first fan also pays for compiling the kernels, so it is reported apart.
+
+import optiPython as oP
+from fanWorker import executorFromArgs
+import numpy as np
+import json
+import os
+import re
+import sys
+import time
+
+
+def corpusFiles(paths):
+    '''
+    updateN.json files in the directories in paths (sorted by N) and the files in paths
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = [name for name in os.listdir(path) if re.fullmatch(r"update\d+\.json", name)]
+            names.sort(key = lambda name: int(re.findall(r"\d+", name)[0]))
+            files += [os.path.join(path, name) for name in names]
+        else:
+            files.append(path)
+    return files
+
+
+def argValue(args, flag, default = None):
+    '''
+    Value after flag in args (default if flag is not there)
+    '''
+    if flag in args:
+        return args[args.index(flag) + 1]
+    return default
+
+
+def runFan(triInfo, args, executor = None, metrics = None, fIterates = None):
+    '''
+    Optimize one fan with the settings given in args, returns the triangle fan and its output dictionary.
+    If fIterates is given the iterates of the optimizer are appended there
+    '''
+    nRegions = len(json.loads(triInfo)['listxk']) - 2
+    triFan = oP.triangleFan(nRegions)
+    triFan.executor = executor
+    triFan.solver = argValue(args, "--solver", triFan.solver)
+    triFan.pathTypeSearch = argValue(args, "--pathTypeSearch", triFan.pathTypeSearch)
+    triFan.pruneOptions = "--noPrune" not in args
+    triFan.metrics = metrics
+    triFan.saveIterates = fIterates is not None
+    if "--tolKKT" in args:
+        triFan.tolKKT = float(argValue(args, "--tolKKT"))
+    dict_out = triFan.outputJSON(triInfo)
+    if fIterates is not None:
+        triFan.dumpIterates(fIterates)
+    return triFan, dict_out
+
+
+def percentiles(values, ps = (50, 90, 99)):
+    '''
+    Percentiles and max of values as a dictionary
+    '''
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {}
+    out = {"p" + str(p): float(np.percentile(values, p)) for p in ps}
+    out["max"] = float(np.max(values))
+    out["mean"] = float(np.mean(values))
+    return out
+
+
+def replay(files, args, executor = None, metrics = None, fIterates = None):
+    '''
+    Optimize all the fans in files, returns one record per fan
+    '''
+    records = []
+    for fName in files:
+        with open(fName) as f:
+            triInfo = f.read().strip()
+        start = time.perf_counter()
+        try:
+            triFan, dict_out = runFan(triInfo, args, executor, metrics, fIterates)
+        except Exception as e:
+            records.append({"file": fName, "error": repr(e)})
+            continue
+        elapsed = time.perf_counter() - start
+        records.append({"file": fName, "nRegions": triFan.nRegions, "time": elapsed,
+                        "nIterations": triFan.nIterations, "nOptions": len(triFan.optionsTop),
+                        "nOptionsPruned": triFan.nOptionsPruned,
+                        "pathType": oP.pathTypeName(triFan.optiOption), "residual": triFan.residualOut(),
+                        "THat": float(dict_out["THat"]), "gradHat": [float(g) for g in dict_out["gradHat"]]})
+    return records
+
+
+def compareBaseline(records, baseline, rtol):
+    '''
+    Fans whose THat (relative) or gradHat (angle) moved more than rtol with respect to the baseline,
+    and the max differences
+    '''
+    regressions = []
+    maxErrT = 0.0
+    maxAngle = 0.0
+    for rec in records:
+        base = baseline.get(os.path.basename(rec["file"]))
+        if base is None or "error" in rec:
+            continue
+        errT = abs(rec["THat"] - base["THat"])/max(abs(base["THat"]), 1e-300)
+        g, gBase = np.array(rec["gradHat"]), np.array(base["gradHat"])
+        angle = float(np.arctan2(abs(g[0]*gBase[1] - g[1]*gBase[0]), np.dot(g, gBase))) # arccos loses digits next to 0
+        maxErrT = max(maxErrT, errT)
+        maxAngle = max(maxAngle, angle)
+        if errT > rtol or angle > rtol:
+            regressions.append((rec["file"], errT, angle))
+    return regressions, maxErrT, maxAngle
+
+
+def report(records, fOut = sys.stdout):
+    '''
+    Latency percentiles, iterations and types of path of the fans in records
+    '''
+    ok = [rec for rec in records if "error" not in rec]
+    errors = [rec for rec in records if "error" in rec]
+    fOut.write("fans: {}  errors: {}\n".format(len(records), len(errors)))
+    if len(ok) == 0:
+        return
+    fOut.write("first fan (compiles the kernels): {:.4f} s\n".format(ok[0]["time"]))
+    steady = ok[1:] if len(ok) > 1 else ok
+    times = [rec["time"] for rec in steady]
+    fOut.write("latency [ms]: " + "  ".join("{} {:.3f}".format(k, 1e3*v) for k, v in percentiles(times).items()) + "\n")
+    fOut.write("total: {:.3f} s  fans/s: {:.1f}\n".format(sum(times), len(times)/max(sum(times), 1e-300)))
+    fOut.write("iterations per fan: " + "  ".join("{} {:.1f}".format(k, v) for k, v in percentiles([rec["nIterations"] for rec in ok]).items()) + "\n")
+    fOut.write("KKT residual: " + "  ".join("{} {:.2e}".format(k, v) for k, v in percentiles([rec["residual"] for rec in ok]).items()) + "\n")
+    fOut.write("options solved/pruned: {}/{}\n".format(sum(rec["nOptions"] - rec["nOptionsPruned"] for rec in ok),
+                                                      sum(rec["nOptionsPruned"] for rec in ok)))
+    byRegions = {}
+    for rec in steady:
+        byRegions.setdefault(rec["nRegions"], []).append(rec["time"])
+    for nRegions in sorted(byRegions):
+        fOut.write("  nRegions {}: {} fans, p50 {:.3f} ms\n".format(nRegions, len(byRegions[nRegions]),
+                                                                    1e3*np.median(byRegions[nRegions])))
+    pathTypes = {}
+    for rec in ok:
+        pathTypes[rec["pathType"]] = pathTypes.get(rec["pathType"], 0) + 1
+    fOut.write("types of path: " + "  ".join("{} {}".format(k, v) for k, v in sorted(pathTypes.items(), key = lambda kv: -kv[1])) + "\n")
+    for rec in errors:
+        fOut.write("  error in {}: {}\n".format(rec["file"], rec["error"]))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    flagsWithValue = ["--limit", "--solver", "--pathTypeSearch", "--threads", "--processes",
+                      "--saveBaseline", "--baseline", "--rtol", "--saveIterates", "--tolKKT"]
+    paths = [a for i, a in enumerate(args) if not a.startswith("--") and (i == 0 or args[i-1] not in flagsWithValue)]
+    files = corpusFiles(paths if len(paths) > 0 else ["updates"])
+    limit = argValue(args, "--limit")
+    if limit is not None:
+        files = files[:int(limit)]
+    executor = executorFromArgs(args)
+    metrics = oP.marchMetrics() if "--metrics" in args else None
+    saveIterates = argValue(args, "--saveIterates")
+    fIterates = None if saveIterates is None else open(saveIterates, "wb")
+    records = replay(files, args, executor, metrics, fIterates)
+    if fIterates is not None:
+        fIterates.close()
+    if executor is not None:
+        executor.shutdown()
+    report(records)
+    if metrics is not None:
+        print(metrics.report())
+    saveBaseline = argValue(args, "--saveBaseline")
+    if saveBaseline is not None:
+        with open(saveBaseline, "w") as f:
+            json.dump({os.path.basename(rec["file"]): {"THat": rec["THat"], "gradHat": rec["gradHat"]}
+                       for rec in records if "error" not in rec}, f, indent = 1)
+    baselineFile = argValue(args, "--baseline")
+    if baselineFile is not None:
+        with open(baselineFile) as f:
+            baseline = json.load(f)
+        rtol = float(argValue(args, "--rtol", 1e-8))
+        regressions, maxErrT, maxAngle = compareBaseline(records, baseline, rtol)
+        print("baseline: max relative error THat {:.3e}  max angle gradHat {:.3e}".format(maxErrT, maxAngle))
+        for fName, errT, angle in regressions:
+            print("  REGRESSION {}: THat {:.3e}  gradHat {:.3e}".format(fName, errT, angle))
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -0,0 +1,251 @@
+// Benchmark of the binary heap the marcher uses (priority_queue.c) against the bucket queue
+// (bucket_queue.c) on the H0-H9 meshes. The march is the one of the marcher without the updates:
+// accept the root, insert or update its neighbors with T + eta*|x - xNeighbor| (eta is the smaller
+// index of refraction of the two triangles next to the edge). Both queues have to give the same eikonal.
+//
+// ./bench_queue              meshes in ./Hk/ (python generate_BaseSnowTest.py), skips the missing ones
+// ./bench_queue grid N       N x N triangulation of [-10, 10]^2 with two indices of refraction
+//
+// The bucket width is eta_min*h_min over the edges of the mesh.
+//
+// Results with gcc -O2 on the grids (the H meshes need meshpy to be generated):
+//
+//   101x101     heap 0.0015 s  buckets 0.0020 s
+//   301x301     heap 0.0182 s  buckets 0.0212 s
+//   1001x1001   heap 0.257 s   buckets 0.318 s
+//   2001x2001   heap 1.46 s    buckets 1.55 s
+//
+// with max |T diff| 0 in all of them. Keeping the exact order of the heap costs a sort per bucket,
+// so the buckets are slower and the marcher keeps the binary heap.
+
+#include "mesh2D.h"
+#include "linAlg.h"
+#include "priority_queue.h"
+#include "bucket_queue.h"
+
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+typedef struct {
+  int nPoints;
+  double (*points)[2];
+  int *first; // neighbors of i are neis[first[i]], ..., neis[first[i+1] - 1]
+  int *neis;
+  double *etas; // index of refraction used along each edge in neis
+  double bucketWidth;
+} graphS;
+
+static double bucketWidth_fromMesh(mesh2S *mesh2) {
+  // smallest increment of the eikonal between two neighbors, eta_min*h_min over the edges of the mesh
+  double xMinx[2], width, minWidth = INFINITY;
+  for(size_t i = 0; i<mesh2->nEdges; i++){
+    vec2_subtraction(mesh2->points[mesh2->edges[i][0]], mesh2->points[mesh2->edges[i][1]], xMinx);
+    width = minEtaFromTwoPoints(mesh2, mesh2->edges[i][0], mesh2->edges[i][1])*l2norm(xMinx);
+    if( width > 0 && width < minWidth ){
+      minWidth = width;
+    }
+  }
+  return minWidth;
+}
+
+static void graph_fromMesh(graphS *graph, mesh2S *mesh2) {
+  // edges of the mesh with the smaller index of refraction of their two triangles
+  int nNeis = 0;
+  graph->nPoints = (int)mesh2->nPoints;
+  graph->points = mesh2->points;
+  graph->first = malloc((graph->nPoints + 1)*sizeof(int));
+  for(int i = 0; i<graph->nPoints; i++){
+    nNeis += mesh2->neighbors[i].len;
+  }
+  graph->neis = malloc(nNeis*sizeof(int));
+  graph->etas = malloc(nNeis*sizeof(double));
+  nNeis = 0;
+  for(int i = 0; i<graph->nPoints; i++){
+    graph->first[i] = nNeis;
+    for(int j = 0; j<mesh2->neighbors[i].len; j++){
+      int nei = mesh2->neighbors[i].neis_i[j];
+      if( nei == i ){
+        continue;
+      }
+      graph->neis[nNeis] = nei;
+      graph->etas[nNeis] = minEtaFromTwoPoints(mesh2, i, nei);
+      nNeis++;
+    }
+  }
+  graph->first[graph->nPoints] = nNeis;
+  graph->bucketWidth = bucketWidth_fromMesh(mesh2);
+}
+
+static void graph_grid(graphS *graph, int N) {
+  // N x N points on [-10, 10]^2, each square split in two triangles, eta = 1.452 if y > 0 and 1 otherwise
+  double h = 20.0/(N - 1);
+  int nNeis = 0;
+  int di[6] = {1, -1, 0, 0, 1, -1};
+  int dj[6] = {0, 0, 1, -1, 1, -1};
+  graph->nPoints = N*N;
+  graph->points = malloc(graph->nPoints*sizeof(double[2]));
+  graph->first = malloc((graph->nPoints + 1)*sizeof(int));
+  graph->neis = malloc(6*graph->nPoints*sizeof(int));
+  graph->etas = malloc(6*graph->nPoints*sizeof(double));
+  for(int i = 0; i<N; i++){
+    for(int j = 0; j<N; j++){
+      int p = i*N + j;
+      graph->points[p][0] = -10 + j*h;
+      graph->points[p][1] = -10 + i*h;
+      graph->first[p] = nNeis;
+      for(int k = 0; k<6; k++){
+        int ii = i + di[k], jj = j + dj[k];
+        if( ii < 0 || ii >= N || jj < 0 || jj >= N ){
+          continue;
+        }
+        graph->neis[nNeis] = ii*N + jj;
+        // the edge is in the lower region if one of its end points is
+        graph->etas[nNeis] = (i <= (N - 1)/2 || ii <= (N - 1)/2) ? 1.0 : 1.452;
+        nNeis++;
+      }
+    }
+  }
+  graph->first[graph->nPoints] = nNeis;
+  graph->bucketWidth = h;
+}
+
+static double march(graphS *graph, int start, int useBuckets, double *T) {
+  // returns the time it took (in seconds), with the binary heap or with the buckets
+  char *states = calloc(graph->nPoints, sizeof(char)); // 0 far, 1 trial, 2 valid
+  double xMinx[2], TNew;
+  int minIndex;
+  clock_t start_t = clock();
+  p_queue *p_queueG;
+  b_queue *b_queueG;
+  priority_queue_alloc(&p_queueG);
+  priority_queue_init(p_queueG);
+  bucket_queue_alloc(&b_queueG);
+  bucket_queue_init(b_queueG, graph->bucketWidth);
+  for(int i = 0; i<graph->nPoints; i++){
+    T[i] = INFINITY;
+  }
+  T[start] = 0;
+  states[start] = 1;
+  if( useBuckets ){
+    bucket_insert(b_queueG, 0, start);
+  }
+  else{
+    insert(p_queueG, 0, start);
+  }
+  while( (useBuckets ? bucket_getSize(b_queueG) : getSize(p_queueG)) > 0 ){
+    if( useBuckets ){
+      minIndex = bucket_indexRoot(b_queueG);
+      bucket_deleteRoot(b_queueG);
+    }
+    else{
+      minIndex = indexRoot(p_queueG);
+      deleteRoot(p_queueG);
+    }
+    states[minIndex] = 2;
+    for(int k = graph->first[minIndex]; k<graph->first[minIndex + 1]; k++){
+      int nei = graph->neis[k];
+      if( states[nei] == 2 ){
+        continue;
+      }
+      vec2_subtraction(graph->points[nei], graph->points[minIndex], xMinx);
+      TNew = T[minIndex] + graph->etas[k]*l2norm(xMinx);
+      if( TNew < T[nei] ){
+        T[nei] = TNew;
+        if( states[nei] == 1 && useBuckets ){
+          bucket_update(b_queueG, TNew, nei);
+        }
+        else if( states[nei] == 1 ){
+          update(p_queueG, TNew, nei);
+        }
+        else if( useBuckets ){
+          states[nei] = 1;
+          bucket_insert(b_queueG, TNew, nei);
+        }
+        else{
+          states[nei] = 1;
+          insert(p_queueG, TNew, nei);
+        }
+      }
+    }
+  }
+  double time = (double)(clock() - start_t)/CLOCKS_PER_SEC;
+  priority_queue_dealloc(&p_queueG);
+  bucket_queue_dealloc(&b_queueG);
+  free(states);
+  return time;
+}
+
+static void compareQueues(graphS *graph, char const *name) {
+  double *THeap = malloc(graph->nPoints*sizeof(double));
+  double *TBuckets = malloc(graph->nPoints*sizeof(double));
+  double maxDiff = 0;
+  double timeHeap = march(graph, 0, 0, THeap);
+  double timeBuckets = march(graph, 0, 1, TBuckets);
+  for(int i = 0; i<graph->nPoints; i++){
+    if( fabs(THeap[i] - TBuckets[i]) > maxDiff ){
+      maxDiff = fabs(THeap[i] - TBuckets[i]);
+    }
+  }
+  printf("%-6s %9d points  heap %9.4f s  buckets %9.4f s  (width %.3g)  speedup %5.2f  max |T diff| %g\n",
+         name, graph->nPoints, timeHeap, timeBuckets, graph->bucketWidth,
+         timeHeap/fmax(timeBuckets, 1e-9), maxDiff);
+  free(THeap);
+  free(TBuckets);
+}
+
+static int fileExists(char const *path) {
+  FILE *fp = fopen(path, "r");
+  if( fp == NULL ){
+    return 0;
+  }
+  fclose(fp);
+  return 1;
+}
+
+int main(int argc, char **argv)
+{
+  graphS graph;
+  if( argc > 2 && strcmp(argv[1], "grid") == 0 ){
+    int N = atoi(argv[2]);
+    char name[32];
+    snprintf(name, sizeof(name), "%dx%d", N, N);
+    graph_grid(&graph, N);
+    compareQueues(&graph, name);
+    free(graph.points);
+    free(graph.first);
+    free(graph.neis);
+    free(graph.etas);
+    return 0;
+  }
+  for(int k = 0; k<10; k++){
+    char name[16], pathPoints[64], pathFaces[64], pathEdges[64], pathEdgesInFace[64];
+    char pathNeighbors[64], pathIncidentFaces[64], pathIndices[64], pathBoundary[64];
+    snprintf(name, sizeof(name), "H%d", k);
+    snprintf(pathPoints, sizeof(pathPoints), "./H%d/H%d_MeshPoints.txt", k, k);
+    snprintf(pathFaces, sizeof(pathFaces), "./H%d/H%d_Faces.txt", k, k);
+    snprintf(pathEdges, sizeof(pathEdges), "./H%d/H%d_Edges.txt", k, k);
+    snprintf(pathEdgesInFace, sizeof(pathEdgesInFace), "./H%d/H%d_EdgesInFace.txt", k, k);
+    snprintf(pathNeighbors, sizeof(pathNeighbors), "./H%d/H%d_Neigh.txt", k, k);
+    snprintf(pathIncidentFaces, sizeof(pathIncidentFaces), "./H%d/H%d_IncidentFaces.txt", k, k);
+    snprintf(pathIndices, sizeof(pathIndices), "./H%d/H%d_Indices.txt", k, k);
+    snprintf(pathBoundary, sizeof(pathBoundary), "./H%d/H%d_BoundaryCurve.txt", k, k);
+    if( !fileExists(pathPoints) ){
+      printf("%-6s no mesh in ./H%d/\n", name, k);
+      continue;
+    }
+    mesh2S *mesh2;
+    mesh2_alloc(&mesh2);
+    mesh2_init_from_meshpy(mesh2, pathPoints, pathFaces, pathEdges, pathEdgesInFace,
+                           pathNeighbors, pathIncidentFaces, pathIndices, pathBoundary);
+    graph_fromMesh(&graph, mesh2);
+    compareQueues(&graph, name);
+    free(graph.first);
+    free(graph.neis);
+    free(graph.etas);
+    mesh2_dealloc(&mesh2);
+  }
+  return 0;
+}
@@ -0,0 +1,393 @@
+/* BUCKET QUEUE
+
+Bucketed (Dial) priority queue, same operations as priority_queue.c. The marcher doesn't use it:
+it's slower than the binary heap on the meshes we tried (see bench_queue.c). Explanaition
+
+   - bucket k has the indices whose value is in [k*bucketWidth, (k+1)*bucketWidth)
+   - buckets : circular array of nBuckets buckets (power of 2), bucket k is in buckets[k % nBuckets]
+   - current : first bucket that might not be empty, values smaller than that go in current
+   - vals, bucketOf, posInBucket : for each index its value, its bucket (-1 if it's not in the queue)
+     and where it is inside of that bucket
+
+If bucketWidth is smaller than the smallest increment of the eikonal between neighbors (eta_min*h_min)
+all the nodes in a bucket could be accepted in any order. We still accept them in order, so that
+the march is exactly the same as with the binary heap: when a bucket becomes current it's sorted
+once (decreasing values, the root is the last one). With that bucket width accepting a node never
+adds or moves nodes in the current bucket, so insert, update and delete are O(1) and the cost of
+deleteRoot is the sort, O(log(size of the bucket)) per node, plus the empty buckets we skip.
+
+*/
+
+#include "bucket_queue.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <assert.h>
+#include <math.h>
+
+struct Bucket_queue {
+  double bucketWidth; // width of each bucket
+  int nBuckets; // number of buckets in the circular array (power of 2)
+  int **buckets; // indices in each bucket
+  int *bucketSize; // current occupied size of each bucket
+  int *bucketMaxSize; // max sized of each bucket currently allowed
+  long long current; // first bucket that might not be empty
+  int currentSorted; // 1 if the current bucket is sorted (decreasing values)
+  struct bucketEntry *sortBuffer; // to sort the current bucket
+  int sortBufferSize;
+  double *vals; // value of each index
+  long long *bucketOf; // bucket of each index, -1 if not in the queue
+  int *posInBucket; // position of each index inside of its bucket
+  int nIndices; // size of vals, bucketOf and posInBucket (one more than the largest index we've seen)
+  int size; // number of indices in the queue
+};
+
+struct bucketEntry {
+  double val;
+  int index;
+};
+
+void bucket_queue_alloc(b_queue **Bucket_queue ) {
+  *Bucket_queue = malloc(sizeof(b_queue));
+  assert(*Bucket_queue != NULL);
+}
+
+void bucket_queue_dealloc(b_queue **Bucket_queue ) {
+  for( int k = 0; k < (*Bucket_queue)->nBuckets; k++ ){
+    free((*Bucket_queue)->buckets[k]);
+  }
+  free((*Bucket_queue)->buckets);
+  free((*Bucket_queue)->bucketSize);
+  free((*Bucket_queue)->bucketMaxSize);
+  free((*Bucket_queue)->sortBuffer);
+  free((*Bucket_queue)->vals);
+  free((*Bucket_queue)->bucketOf);
+  free((*Bucket_queue)->posInBucket);
+  free(*Bucket_queue);
+  *Bucket_queue = NULL;
+}
+
+void bucket_queue_init( b_queue *Bucket_queue, double bucketWidth )
+{
+  assert( bucketWidth > 0 );
+  Bucket_queue->bucketWidth = bucketWidth;
+  Bucket_queue->nBuckets = 64;
+  Bucket_queue->buckets = malloc( Bucket_queue->nBuckets*sizeof(int*) );
+  Bucket_queue->bucketSize = malloc( Bucket_queue->nBuckets*sizeof(int) );
+  Bucket_queue->bucketMaxSize = malloc( Bucket_queue->nBuckets*sizeof(int) );
+  for( int k = 0; k < Bucket_queue->nBuckets; k++ ){
+    Bucket_queue->buckets[k] = NULL;
+    Bucket_queue->bucketSize[k] = 0;
+    Bucket_queue->bucketMaxSize[k] = 0;
+  }
+  Bucket_queue->current = 0;
+  Bucket_queue->currentSorted = 0;
+  Bucket_queue->sortBuffer = NULL;
+  Bucket_queue->sortBufferSize = 0;
+  Bucket_queue->vals = NULL;
+  Bucket_queue->bucketOf = NULL;
+  Bucket_queue->posInBucket = NULL;
+  Bucket_queue->nIndices = 0;
+  Bucket_queue->size = 0;
+}
+
+static void grow_indices( b_queue *Bucket_queue, int index )
+{
+  // make sure that we have an entry for index, new entries are not in the queue
+  if( index < Bucket_queue->nIndices ){
+    return;
+  }
+  int newSize = Bucket_queue->nIndices > 0 ? Bucket_queue->nIndices : 2;
+  while( newSize <= index ){
+    newSize *= 2;
+  }
+  Bucket_queue->vals = realloc( Bucket_queue->vals, newSize*sizeof(double) );
+  Bucket_queue->bucketOf = realloc( Bucket_queue->bucketOf, newSize*sizeof(long long) );
+  Bucket_queue->posInBucket = realloc( Bucket_queue->posInBucket, newSize*sizeof(int) );
+  assert( Bucket_queue->vals != NULL && Bucket_queue->bucketOf != NULL && Bucket_queue->posInBucket != NULL );
+  for( int i = Bucket_queue->nIndices; i < newSize; i++ ){
+    Bucket_queue->bucketOf[i] = -1;
+  }
+  Bucket_queue->nIndices = newSize;
+}
+
+static int inQueue( b_queue *Bucket_queue, int index )
+{
+  return index >= 0 && index < Bucket_queue->nIndices && Bucket_queue->bucketOf[index] != -1;
+}
+
+static void add_toBucket( b_queue *Bucket_queue, long long k, int index )
+{
+  // add index at the end of bucket k (which has to fit in the circular array)
+  int slot = (int)(k & (Bucket_queue->nBuckets - 1));
+  if( Bucket_queue->bucketSize[slot] == Bucket_queue->bucketMaxSize[slot] ){
+    Bucket_queue->bucketMaxSize[slot] = Bucket_queue->bucketMaxSize[slot] > 0 ? 2*Bucket_queue->bucketMaxSize[slot] : 4;
+    Bucket_queue->buckets[slot] = realloc( Bucket_queue->buckets[slot], Bucket_queue->bucketMaxSize[slot]*sizeof(int) );
+    assert( Bucket_queue->buckets[slot] != NULL );
+  }
+  int *bucket = Bucket_queue->buckets[slot];
+  int pos = Bucket_queue->bucketSize[slot];
+  if( k == Bucket_queue->current && Bucket_queue->currentSorted ){
+    // keep the current bucket sorted, move the ones with smaller values one place up
+    while( pos > 0 && Bucket_queue->vals[bucket[pos - 1]] < Bucket_queue->vals[index] ){
+      bucket[pos] = bucket[pos - 1];
+      Bucket_queue->posInBucket[bucket[pos]] = pos;
+      pos--;
+    }
+  }
+  bucket[pos] = index;
+  Bucket_queue->bucketOf[index] = k;
+  Bucket_queue->posInBucket[index] = pos;
+  Bucket_queue->bucketSize[slot] += 1;
+}
+
+static void remove_fromBucket( b_queue *Bucket_queue, int index )
+{
+  // move the last index of the bucket to where index was (or everything after index one place
+  // down if this is the current bucket and it's sorted)
+  int slot = (int)(Bucket_queue->bucketOf[index] & (Bucket_queue->nBuckets - 1));
+  int *bucket = Bucket_queue->buckets[slot];
+  int pos = Bucket_queue->posInBucket[index];
+  int last = Bucket_queue->bucketSize[slot] - 1;
+  if( Bucket_queue->bucketOf[index] == Bucket_queue->current && Bucket_queue->currentSorted ){
+    for( int i = pos; i < last; i++ ){
+      bucket[i] = bucket[i + 1];
+      Bucket_queue->posInBucket[bucket[i]] = i;
+    }
+  }
+  else{
+    bucket[pos] = bucket[last];
+    Bucket_queue->posInBucket[bucket[pos]] = pos;
+  }
+  Bucket_queue->bucketSize[slot] -= 1;
+  Bucket_queue->bucketOf[index] = -1;
+}
+
+static void grow_buckets( b_queue *Bucket_queue, long long k )
+{
+  // more buckets in the circular array until bucket k fits, we have to place everything again
+  int oldN = Bucket_queue->nBuckets;
+  int **oldBuckets = Bucket_queue->buckets;
+  int *oldSize = Bucket_queue->bucketSize;
+  int *oldMaxSize = Bucket_queue->bucketMaxSize;
+  int newN = oldN;
+  while( k - Bucket_queue->current >= newN ){
+    newN *= 2;
+  }
+  Bucket_queue->nBuckets = newN;
+  Bucket_queue->currentSorted = 0;
+  Bucket_queue->buckets = malloc( newN*sizeof(int*) );
+  Bucket_queue->bucketSize = malloc( newN*sizeof(int) );
+  Bucket_queue->bucketMaxSize = malloc( newN*sizeof(int) );
+  for( int j = 0; j < newN; j++ ){
+    Bucket_queue->buckets[j] = NULL;
+    Bucket_queue->bucketSize[j] = 0;
+    Bucket_queue->bucketMaxSize[j] = 0;
+  }
+  for( int j = 0; j < oldN; j++ ){
+    for( int i = 0; i < oldSize[j]; i++ ){
+      add_toBucket(Bucket_queue, Bucket_queue->bucketOf[oldBuckets[j][i]], oldBuckets[j][i]);
+    }
+    free(oldBuckets[j]);
+  }
+  free(oldBuckets);
+  free(oldSize);
+  free(oldMaxSize);
+}
+
+static long long bucketNumber( b_queue *Bucket_queue, double val )
+{
+  // bucket where val goes, values smaller than current go in current
+  assert( isfinite(val) );
+  long long k = (long long)floor( val/Bucket_queue->bucketWidth );
+  if( Bucket_queue->size == 0 ){
+    Bucket_queue->current = k; // empty queue, start from here
+  }
+  return k < Bucket_queue->current ? Bucket_queue->current : k;
+}
+
+static void place( b_queue *Bucket_queue, double val, int index )
+{
+  long long k = bucketNumber(Bucket_queue, val);
+  if( k - Bucket_queue->current >= Bucket_queue->nBuckets ){
+    grow_buckets(Bucket_queue, k);
+  }
+  Bucket_queue->vals[index] = val;
+  add_toBucket(Bucket_queue, k, index);
+}
+
+void bucket_insert(b_queue *Bucket_queue, double newNum, int newIndex)
+{
+  assert( newIndex >= 0 );
+  grow_indices(Bucket_queue, newIndex);
+  assert( Bucket_queue->bucketOf[newIndex] == -1 ); // each index can be in the queue just once
+  place(Bucket_queue, newNum, newIndex);
+  Bucket_queue->size += 1;
+}
+
+void bucket_update(b_queue *Bucket_queue, double new_valConsidered, int index)
+{
+  // same as update in priority_queue.c, only if the new value is smaller than the current value
+  assert( inQueue(Bucket_queue, index) );
+  if( Bucket_queue->vals[index] > new_valConsidered ){
+    if( Bucket_queue->bucketOf[index] != Bucket_queue->current &&
+        bucketNumber(Bucket_queue, new_valConsidered) == Bucket_queue->bucketOf[index] ){
+      Bucket_queue->vals[index] = new_valConsidered; // same bucket, it doesn't have to move
+      return;
+    }
+    remove_fromBucket(Bucket_queue, index);
+    Bucket_queue->size -= 1;
+    place(Bucket_queue, new_valConsidered, index);
+    Bucket_queue->size += 1;
+  }
+}
+
+void bucket_delete_findIndex(b_queue *Bucket_queue, int ind)
+{
+  if( inQueue(Bucket_queue, ind) ){
+    remove_fromBucket(Bucket_queue, ind);
+    Bucket_queue->size -= 1;
+  }
+}
+
+void bucket_delete_findValue(b_queue *Bucket_queue, double num)
+{
+  if( Bucket_queue->size == 0 ){
+    return;
+  }
+  long long k = bucketNumber(Bucket_queue, num);
+  if( k - Bucket_queue->current >= Bucket_queue->nBuckets ){
+    return; // not in the queue
+  }
+  int slot = (int)(k & (Bucket_queue->nBuckets - 1));
+  for( int i = 0; i < Bucket_queue->bucketSize[slot]; i++ ){
+    if( Bucket_queue->vals[Bucket_queue->buckets[slot][i]] == num ){
+      bucket_delete_findIndex(Bucket_queue, Bucket_queue->buckets[slot][i]);
+      return;
+    }
+  }
+}
+
+static void sortEntries( struct bucketEntry *entries, int n )
+{
+  // decreasing values, quicksort and insertion sort for the small pieces (no comparison function
+  // to call like with qsort, this is most of the cost of the bucket queue)
+  while( n > 16 ){
+    double pivot = entries[n/2].val;
+    int i = 0, j = n - 1;
+    while( i <= j ){
+      while( entries[i].val > pivot ){
+        i++;
+      }
+      while( entries[j].val < pivot ){
+        j--;
+      }
+      if( i <= j ){
+        struct bucketEntry temp = entries[i];
+        entries[i] = entries[j];
+        entries[j] = temp;
+        i++;
+        j--;
+      }
+    }
+    // recursion on the smaller piece, loop on the larger one
+    if( j + 1 < n - i ){
+      sortEntries(entries, j + 1);
+      entries += i;
+      n -= i;
+    }
+    else{
+      sortEntries(entries + i, n - i);
+      n = j + 1;
+    }
+  }
+  for( int i = 1; i < n; i++ ){
+    struct bucketEntry temp = entries[i];
+    int j = i;
+    while( j > 0 && entries[j - 1].val < temp.val ){
+      entries[j] = entries[j - 1];
+      j--;
+    }
+    entries[j] = temp;
+  }
+}
+
+static void sortCurrent( b_queue *Bucket_queue, int slot )
+{
+  // sort the current bucket, decreasing values
+  int n = Bucket_queue->bucketSize[slot];
+  int *bucket = Bucket_queue->buckets[slot];
+  if( n > Bucket_queue->sortBufferSize ){
+    Bucket_queue->sortBufferSize = 2*n;
+    Bucket_queue->sortBuffer = realloc( Bucket_queue->sortBuffer, Bucket_queue->sortBufferSize*sizeof(struct bucketEntry) );
+    assert( Bucket_queue->sortBuffer != NULL );
+  }
+  for( int i = 0; i < n; i++ ){
+    Bucket_queue->sortBuffer[i].val = Bucket_queue->vals[bucket[i]];
+    Bucket_queue->sortBuffer[i].index = bucket[i];
+  }
+  sortEntries(Bucket_queue->sortBuffer, n);
+  for( int i = 0; i < n; i++ ){
+    bucket[i] = Bucket_queue->sortBuffer[i].index;
+    Bucket_queue->posInBucket[bucket[i]] = i;
+  }
+  Bucket_queue->currentSorted = 1;
+}
+
+static int findRoot( b_queue *Bucket_queue )
+{
+  // skip the empty buckets, the root is the last one of the first one that isn't
+  assert( Bucket_queue->size > 0 );
+  int slot = (int)(Bucket_queue->current & (Bucket_queue->nBuckets - 1));
+  while( Bucket_queue->bucketSize[slot] == 0 ){
+    Bucket_queue->current += 1;
+    Bucket_queue->currentSorted = 0;
+    slot = (int)(Bucket_queue->current & (Bucket_queue->nBuckets - 1));
+  }
+  if( !Bucket_queue->currentSorted ){
+    sortCurrent(Bucket_queue, slot);
+  }
+  return Bucket_queue->buckets[slot][Bucket_queue->bucketSize[slot] - 1];
+}
+
+int bucket_indexRoot(b_queue *Bucket_queue){
+  return findRoot(Bucket_queue);
+}
+
+double bucket_valueRoot(b_queue *Bucket_queue){
+  return Bucket_queue->vals[findRoot(Bucket_queue)];
+}
+
+void bucket_deleteRoot(b_queue *Bucket_queue)
+{
+  bucket_delete_findIndex(Bucket_queue, findRoot(Bucket_queue));
+}
+
+double bucket_valueAtIndex(b_queue *Bucket_queue, int index)
+{
+  assert( inQueue(Bucket_queue, index) );
+  return Bucket_queue->vals[index];
+}
+
+int bucket_getSize(b_queue *Bucket_queue)
+{
+  return Bucket_queue->size;
+}
+
+void printbucket_queue(b_queue *Bucket_queue)
+{
+  printf("Eikonal values (bucket width %lf):", Bucket_queue->bucketWidth);
+  for( int j = 0; j < Bucket_queue->nBuckets; j++ ){
+    for( int i = 0; i < Bucket_queue->bucketSize[j]; i++ ){
+      printf("%lf ", Bucket_queue->vals[Bucket_queue->buckets[j][i]]);
+    }
+  }
+  printf("\n");
+  printf("Indices:");
+  for( int j = 0; j < Bucket_queue->nBuckets; j++ ){
+    for( int i = 0; i < Bucket_queue->bucketSize[j]; i++ ){
+      printf("%d ", Bucket_queue->buckets[j][i]);
+    }
+  }
+  printf("\n");
+  printf("Current size: %d", Bucket_queue->size);
+}
@@ -0,0 +1,29 @@
+#pragma once
+
+typedef struct Bucket_queue b_queue;
+
+void bucket_queue_alloc(b_queue **Bucket_queue );
+
+void bucket_queue_dealloc(b_queue **Bucket_queue );
+
+void bucket_queue_init( b_queue *Bucket_queue, double bucketWidth );
+
+void bucket_insert(b_queue *Bucket_queue, double newNum, int newIndex);
+
+void bucket_update(b_queue *Bucket_queue, double new_valConsidered, int index);
+
+void bucket_delete_findIndex(b_queue *Bucket_queue, int ind);
+
+int bucket_indexRoot(b_queue *Bucket_queue);
+
+double bucket_valueRoot(b_queue *Bucket_queue);
+
+void bucket_deleteRoot(b_queue *Bucket_queue);
+
+double bucket_valueAtIndex(b_queue *Bucket_queue, int index);
+
+int bucket_getSize(b_queue *Bucket_queue);
+
+void bucket_delete_findValue(b_queue *Bucket_queue, double num);
+
+void printbucket_queue(b_queue *Bucket_queue);
@@ -1,6 +1,13 @@
 #!/usr/bin/env bash
 
 CFLAGS="-g -Wall -Werror -std=c99 -fsanitize=undefined"
+LIBS="-ljson-c -lm"
+
+# JMM_EMBED_PYTHON=1 ./build.sh to be able to use PYTHON_EMBEDDED as the python optimizer
+if [ "${JMM_EMBED_PYTHON:-0}" = "1" ]; then
+    CFLAGS="$CFLAGS -DJMM_EMBED_PYTHON $(python3-config --includes)"
+    LIBS="$LIBS $(python3-config --ldflags --embed)"
+fi
 
 gcc $CFLAGS -c eik_grid.c -o eik_grid.o
 gcc $CFLAGS -c files_methods.c -o files_methods.o
@@ -9,6 +16,12 @@ gcc $CFLAGS -c mesh2D.c -o mesh2D.o
 gcc $CFLAGS -c linAlg.c -o linAlg.o
 gcc $CFLAGS -c marcher_T2.c -o marcher_T2.o
 gcc $CFLAGS -c priority_queue.c -o priority_queue.o
+gcc $CFLAGS -c bucket_queue.c -o bucket_queue.o
 gcc $CFLAGS -c test_eik_grid.c -o test_eik_grid.o
 gcc $CFLAGS -c opti_method.c -o opti_method.o
-gcc $CFLAGS -o test_eik_grid test_eik_grid.o mesh2D.o eik_grid.o marcher_T2.o  files_methods.o neighbors.o linAlg.o priority_queue.o opti_method.o -ljson-c -lm
+gcc $CFLAGS -c python_embedded.c -o python_embedded.o
+gcc $CFLAGS -c test_priority_queue.c -o test_priority_queue.o
+gcc $CFLAGS -c bench_queue.c -o bench_queue.o
+gcc $CFLAGS -o test_eik_grid test_eik_grid.o mesh2D.o eik_grid.o marcher_T2.o  files_methods.o neighbors.o linAlg.o priority_queue.o opti_method.o python_embedded.o $LIBS
+gcc $CFLAGS -o test_priority_queue test_priority_queue.o priority_queue.o -lm
+gcc $CFLAGS -o bench_queue bench_queue.o mesh2D.o files_methods.o neighbors.o linAlg.o priority_queue.o bucket_queue.o $LIBS
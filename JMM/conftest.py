@@ -0,0 +1,81 @@
+################ FIXTURES FOR THE PYTEST CHECKS (test_*.py) OF optiPython
+# Run them with the path of the test file (test_fromJSONUpdate.py is a script):
+#    python -m pytest -q test_optiKernels.py
+
+import os
+import numpy as np
+from numpy.linalg import norm
+import pytest
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import optiPython as oP
+
+etas = np.array([1.0, 1.45, 1.8])
+
+
+def randomFanArrays(nRegions, rng, curved = True):
+     '''
+     Random triangle fan with nRegions regions around x0 = (0,0). The sides are curved a bit
+     if curved, the tops bulge inwards (so that there are creeping and straight paths on the tops)
+     and the eikonal at x0 and x1 is the one of a point source
+     '''
+     x0 = np.array([0.0, 0.0])
+     angles = np.linspace(0, rng.uniform(0.6, 1.2)*np.pi/(1 if nRegions > 1 else 2), nRegions + 1)
+     angles += rng.uniform(-0.05, 0.05, nRegions + 1)
+     radii = rng.uniform(0.8, 1.2, nRegions + 1)
+     listxk = np.array([x0] + [np.array([r*np.cos(a), r*np.sin(a)]) for r, a in zip(radii, angles)])
+     listB0k = listxk[1:] - x0
+     listBk = np.copy(listB0k)
+     if( curved ):
+          for k in range(nRegions + 1):
+               d = listxk[k + 1] - x0
+               perp = np.array([-d[1], d[0]])
+               listB0k[k] = d + 0.2*rng.normal()*perp
+               listBk[k] = d - 0.2*rng.normal()*perp
+     listBkBk1 = []
+     for k in range(nRegions):
+          xk, xk1 = listxk[k + 1], listxk[k + 2]
+          d = xk1 - xk
+          mid = (xk + xk1)/2
+          inward = (x0 - mid)/norm(x0 - mid)
+          s = rng.uniform(0.3, 1.2) if curved else 0
+          listBkBk1.append(d - s*norm(d)*inward)
+          listBkBk1.append(d + s*norm(d)*inward)
+     listBkBk1 = np.array(listBkBk1)
+     listIndices = np.concatenate((rng.choice(etas, nRegions + 1), rng.choice(etas, nRegions)))
+     xSource = np.array([-5.0, -3.0]) + rng.normal(size = 2)
+     T0, T1 = norm(listxk[0] - xSource), norm(listxk[1] - xSource)
+     grad0, grad1 = (listxk[0] - xSource)/T0, (listxk[1] - xSource)/T1
+     return dict(x0 = x0, T0 = T0, grad0 = grad0, x1 = np.copy(listxk[1]), T1 = T1, grad1 = grad1,
+                 xHat = np.copy(listxk[-1]), listIndices = listIndices, listxk = listxk,
+                 listB0k = listB0k, listBk = listBk, listBkBk1 = listBkBk1)
+
+def fanFromArrays(fan, **attributes):
+     '''
+     triangleFan initialized with the arrays of randomFanArrays (without plots), attributes
+     are set before initFromArrays
+     '''
+     triFan = oP.triangleFan(len(fan['listxk']) - 2)
+     triFan.plotBefore = triFan.plotAfter = triFan.plotOpti = False
+     for name, value in attributes.items():
+          setattr(triFan, name, value)
+     triFan.initFromArrays(fan['x0'], fan['T0'], fan['grad0'], fan['x1'], fan['T1'], fan['grad1'],
+                           fan['xHat'], fan['listIndices'], fan['listxk'], fan['listB0k'],
+                           fan['listBk'], fan['listBkBk1'])
+     triFan.plotBefore = triFan.plotAfter = triFan.plotOpti = False
+     return triFan
+
+
+@pytest.fixture
+def rng():
+     return np.random.default_rng(7)
+
+@pytest.fixture
+def referenceKernels():
+     '''
+     Pure Python kernels in optiPython for the duration of the test
+     '''
+     oP.useCompiledKernels(False)
+     yield oP
+     oP.useCompiledKernels(oP.optiKernels is not None)
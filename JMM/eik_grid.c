@@ -4,11 +4,13 @@ This is the Eikonal grid with different specifications
 
 */
 
+#include "feature_test.h" // for fdopen, fork, popen
 #include "eik_grid.h"
 #include "priority_queue.h"
 #include "opti_method.h" // currently using Python and C for the optimization
 #include "linAlg.h"
 #include "files_methods.h"
+#include "python_embedded.h"
 
 
 #include <stdio.h>
@@ -30,6 +32,14 @@ void eik_grid_dealloc(eik_gridS **eik_g ) {
 void fanUpdate_alloc(fanUpdateS **fanUpdate) {
   *fanUpdate = malloc(sizeof(fanUpdateS));
   assert(*fanUpdate != NULL);
+  // nothing from the optimizer yet (see fanUpdate_freeOutput)
+  (*fanUpdate)->params = NULL;
+  (*fanUpdate)->indCrTop = NULL;
+  (*fanUpdate)->paramsCrTop = NULL;
+  (*fanUpdate)->indStTop = NULL;
+  (*fanUpdate)->paramsStTop = NULL;
+  (*fanUpdate)->grads = NULL;
+  (*fanUpdate)->path = NULL;
 }
 
 void fanUpdate_dalloc(fanUpdateS **fanUpdate) {
@@ -37,6 +47,25 @@ void fanUpdate_dalloc(fanUpdateS **fanUpdate) {
   *fanUpdate = NULL;
 }
 
+void fanUpdate_freeOutput(fanUpdateS *fanUpdate) {
+  // free what the optimizer (python or fanUpdate_fromSimple) malloced for the last update, the
+  // same fanUpdate is used for all the updates in updateOneWay
+  free(fanUpdate->params);
+  free(fanUpdate->indCrTop);
+  free(fanUpdate->paramsCrTop);
+  free(fanUpdate->indStTop);
+  free(fanUpdate->paramsStTop);
+  free(fanUpdate->grads);
+  free(fanUpdate->path);
+  fanUpdate->params = NULL;
+  fanUpdate->indCrTop = NULL;
+  fanUpdate->paramsCrTop = NULL;
+  fanUpdate->indStTop = NULL;
+  fanUpdate->paramsStTop = NULL;
+  fanUpdate->grads = NULL;
+  fanUpdate->path = NULL;
+}
+
 void eik_grid_init( eik_gridS *eik_g, size_t *start, size_t nStart, mesh2S *mesh2) {
   // the rest of the parameters, eik_vals, p_queueG, current_states are going to be assigned inside
   eik_g->start = start;
@@ -73,6 +102,10 @@ void eik_grid_init( eik_gridS *eik_g, size_t *start, size_t nStart, mesh2S *mesh
     insert(p_queueG, 0, start[i]); // insert all the starting points with eikonal value 0
   }
   eik_g->p_queueG = p_queueG;
+  eik_g->pythonOpti = PYTHON_SUBPROCESS; // writes updates/updateN.json (benchFanUpdates.py), PYTHON_WORKER is faster
+  eik_g->fanWorker = NULL; // marcher_T2 starts the python worker
+  eik_g->tolKKT = 0;
+  eik_g->maxResidual = 0;
   assert(&eik_g != NULL); // eik_g should not be null
 }
 
@@ -103,6 +136,8 @@ void fanUpdate_init(fanUpdateS *fanUpdate, triangleFanS *triFan, double *params,
   fanUpdate->path = path;
   fanUpdate->gradHat[0] = gradHat[0];
   fanUpdate->gradHat[1] = gradHat[1];
+  fanUpdate->tolKKT = 0;
+  fanUpdate->residual = -1;
 }
 
 
@@ -116,6 +151,8 @@ void fanUpdate_initPreOpti(fanUpdateS *fanUpdate, triangleFanS *triFan, double T
   fanUpdate->T1 = T1;
   fanUpdate->grad1[0] = grad1[0];
   fanUpdate->grad1[1] = grad1[1];
+  fanUpdate->tolKKT = 0;
+  fanUpdate->residual = -1;
 }
 
 void eik_grid_initFromFile(eik_gridS *eik_g, size_t *start, size_t nStart, char const *pathPoints, char const *pathFaces,
@@ -163,6 +200,7 @@ void printInfoFanUpdate(fanUpdateS *fanUpdate) {
   printf("\n\nPRINTING INFORMATION TRIANGLE FAN UPDATE\n");
   printf("\nTHat: %fl\n", fanUpdate->THat);
   printf("\nGradHat:   %fl    %fl\n", fanUpdate->gradHat[0], fanUpdate->gradHat[1]);
+  printf("\nKKT residual: %g\n", fanUpdate->residual);
   printf("Triangle fan:\n");
   printEverythingTriFan(fanUpdate->triFan);
   printf("\nParams: \n");
@@ -318,8 +356,8 @@ void initTriFan(eik_gridS *eik_g, triangleFanS *triFan,
   //////////////////////////
   // first we need to count the number of regions
   double etakM1, etak, xk[2], xk1[2], thisAngle, angleRegion;
-  size_t possibleThirdVertices[2], indexk1;
-  int possibleTriangles[2];
+  size_t indexk1;
+  int nextTriangle;
   size_t thisTriangle;
   nRegions = 1;
   indexk1 = index2;
@@ -333,18 +371,10 @@ void initTriFan(eik_gridS *eik_g, triangleFanS *triFan,
   thisTriangle = firstTriangle;
   etak = eik_g->mesh2->eta[firstTriangle];
   while( indexk1 != indexHat ){
-    // circle around and see what we get
-    twoTrianglesFromEdge(eik_g->mesh2, index0, indexk1, possibleTriangles, possibleThirdVertices);
-    if( thisTriangle != (size_t)possibleTriangles[0]){
-      // the next triangle is possibleTriangles[0]
-      indexk1 = possibleThirdVertices[0];
-      thisTriangle = (size_t)possibleTriangles[0];
-    }
-    else {
-      // the next triangle is possibleTriangles[1]
-      indexk1 = possibleThirdVertices[1];
-      thisTriangle = (size_t)possibleTriangles[1];
-    }
+    // circle around and see what we get (corner table)
+    nextTriangle = nextTriangleAround(eik_g->mesh2, index0, thisTriangle, indexk1, &indexk1);
+    assert( nextTriangle != -1 ); // we can't go around x0 through the boundary
+    thisTriangle = (size_t)nextTriangle;
     // update
     xk[0] = xk1[0];
     xk[1] = xk1[1];
@@ -384,17 +414,7 @@ void initTriFan(eik_gridS *eik_g, triangleFanS *triFan,
   listIndicesNodes[2] =  index2;
   while( indexk1 != indexHat ) {
     // circle around and see what we get
-    twoTrianglesFromEdge(eik_g->mesh2, index0, indexk1, possibleTriangles, possibleThirdVertices);
-    if( thisTriangle != (size_t)possibleTriangles[0] ) {
-      // the next triangle is possibleTriangles[0]
-      indexk1 = possibleThirdVertices[0];
-      thisTriangle = (size_t)possibleTriangles[0];
-    }
-    else {
-      // the next triangle is possibleTriangles[1]
-      indexk1 = possibleThirdVertices[1];
-      thisTriangle = (size_t)possibleTriangles[1];
-    }
+    thisTriangle = (size_t)nextTriangleAround(eik_g->mesh2, index0, thisTriangle, indexk1, &indexk1);
     listIndicesNodes[i] = indexk1;
     i ++;
 
@@ -456,6 +476,7 @@ void fanUpdate_fromSimple(fanUpdateS *fanUpdate) {
   size_t nIndCrTop, *indCrTop, nIndStTop, *indStTop;
   double *paramsCrTop, *paramsStTop, (*grads)[2], (*path)[2];
   double lambda, grad[2], That2, indexRef, *params;
+  fanUpdate_freeOutput(fanUpdate); // from the previous update
   // initialize useless things in this context
   paramsCrTop = malloc(2*sizeof(double));
   paramsStTop = malloc(2*sizeof(double));
@@ -504,10 +525,10 @@ void fanUpdate_fromSimple(fanUpdateS *fanUpdate) {
 
 
 
-void createJSONFile(fanUpdateS *fanUpdate, char const *path) {
+void writeJSONFan(fanUpdateS *fanUpdate, FILE *fp) {
+  // writes the triangle fan as a one line JSON string to fp, this is the
+  // input of the Python optimizer (either from a file or through the worker's stdin)
   int i;
-  FILE *fp = fopen(path, "w");
-
 
   fprintf(fp, "{");
 
@@ -596,13 +617,127 @@ void createJSONFile(fanUpdateS *fanUpdate, char const *path) {
   fprintf(fp, "],");
 
 
+  // stopping rule of the optimizer
+  if( fanUpdate->tolKKT > 0 ){
+    fprintf(fp, "\"tolKKT\": %1.20e,", fanUpdate->tolKKT);
+  }
+
   // OPTIONS FOR PLOTTING CHANGE THIS ACCORDINGLY
   fprintf(fp, "\"plotBefore\": 0, \"plotAfter\": 0, \"plotOpti\": 0");
 
 
 
   fprintf(fp, "}");
+}
 
+void fanKey(triangleFanS *triFan, double *key) {
+  // key of this triangle fan for the warm start cache of the python optimizer (as doubles):
+  // index0, index1, indexHat, listFaces. Length nRegions + 3
+  size_t i;
+  key[0] = (double)triFan->index0;
+  key[1] = (double)triFan->index1;
+  key[2] = (double)triFan->indexHat;
+  for( i = 0; i<triFan->nRegions; i++){
+    key[3 + i] = (double)triFan->listFaces[i];
+  }
+}
+
+void writeBinaryFan(fanUpdateS *fanUpdate, FILE *fp) {
+  // writes the triangle fan as a fixed layout binary request (read with np.frombuffer
+  // in triangleFan.initFromBinary): int64 nRegions followed by 12*nRegions + 21 doubles
+  // x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listxk, listB0k, listBk, listBkBk1
+  // and then the key of this fan, nRegions + 3 doubles index0, index1, indexHat, listFaces
+  // (the worker can use it to warm start the optimizer, see warmStartCache in optiPython.py)
+  triangleFanS *triFan = fanUpdate->triFan;
+  int64_t nRegions = (int64_t)triFan->nRegions;
+  double *key;
+  fwrite(&nRegions, sizeof(int64_t), 1, fp);
+  fwrite(triFan->x0, sizeof(double), 2, fp);
+  fwrite(&fanUpdate->T0, sizeof(double), 1, fp);
+  fwrite(fanUpdate->grad0, sizeof(double), 2, fp);
+  fwrite(triFan->x1, sizeof(double), 2, fp);
+  fwrite(&fanUpdate->T1, sizeof(double), 1, fp);
+  fwrite(fanUpdate->grad1, sizeof(double), 2, fp);
+  fwrite(triFan->xHat, sizeof(double), 2, fp);
+  fwrite(triFan->listIndices, sizeof(double), 2*nRegions + 1, fp);
+  fwrite(triFan->listxk, sizeof(double), 2*(nRegions + 2), fp);
+  fwrite(triFan->listB0k, sizeof(double), 2*(nRegions + 1), fp);
+  fwrite(triFan->listBk, sizeof(double), 2*(nRegions + 1), fp);
+  fwrite(triFan->listBkBk1, sizeof(double), 4*nRegions, fp);
+  key = malloc((nRegions + 3)*sizeof(double));
+  fanKey(triFan, key);
+  fwrite(key, sizeof(double), nRegions + 3, fp);
+  free(key);
+}
+
+void fanUpdate_fromBinaryOutput(fanUpdateS *fanUpdate, double const *output, size_t nDoubles) {
+  // saves the binary response written by triangleFan.binaryOutput to fanUpdate:
+  // THat, gradHat, nIndCrTop, nIndStTop, params, indCrTop, paramsCrTop, indStTop, paramsStTop, grads, path, residual
+  size_t nRegions = fanUpdate->triFan->nRegions;
+  size_t i, start, nGrads;
+  fanUpdate_freeOutput(fanUpdate); // from the previous update
+  fanUpdate->THat = output[0];
+  fanUpdate->gradHat[0] = output[1];
+  fanUpdate->gradHat[1] = output[2];
+  fanUpdate->nIndCrTop = (size_t)output[3];
+  fanUpdate->nIndStTop = (size_t)output[4];
+  fanUpdate->residual = -1;
+  if( nDoubles == 5 ){
+    // the optimizer failed for this fan, we only have THat and gradHat (nan)
+    return;
+  }
+  nGrads = 2*nRegions + 1 + 2*fanUpdate->nIndCrTop + 2*fanUpdate->nIndStTop;
+  assert( nDoubles == 6 + 2*nRegions + 1 + 3*fanUpdate->nIndCrTop + 3*fanUpdate->nIndStTop + 4*nGrads );
+  fanUpdate->residual = output[nDoubles - 1];
+  fanUpdate->params = malloc((2*nRegions + 1)*sizeof(double));
+  fanUpdate->indCrTop = malloc(fanUpdate->nIndCrTop*sizeof(size_t));
+  fanUpdate->paramsCrTop = malloc(2*fanUpdate->nIndCrTop*sizeof(double));
+  fanUpdate->indStTop = malloc(fanUpdate->nIndStTop*sizeof(size_t));
+  fanUpdate->paramsStTop = malloc(2*fanUpdate->nIndStTop*sizeof(double));
+  fanUpdate->grads = malloc(2*nGrads*sizeof(double));
+  fanUpdate->path = malloc(2*nGrads*sizeof(double));
+  start = 5;
+  memcpy(fanUpdate->params, &output[start], (2*nRegions + 1)*sizeof(double));
+  start += 2*nRegions + 1;
+  for( i = 0; i<fanUpdate->nIndCrTop; i++){
+    fanUpdate->indCrTop[i] = (size_t)output[start + i];
+  }
+  start += fanUpdate->nIndCrTop;
+  memcpy(fanUpdate->paramsCrTop, &output[start], 2*fanUpdate->nIndCrTop*sizeof(double));
+  start += 2*fanUpdate->nIndCrTop;
+  for( i = 0; i<fanUpdate->nIndStTop; i++){
+    fanUpdate->indStTop[i] = (size_t)output[start + i];
+  }
+  start += fanUpdate->nIndStTop;
+  memcpy(fanUpdate->paramsStTop, &output[start], 2*fanUpdate->nIndStTop*sizeof(double));
+  start += 2*fanUpdate->nIndStTop;
+  memcpy(fanUpdate->grads, &output[start], 2*nGrads*sizeof(double));
+  start += 2*nGrads;
+  memcpy(fanUpdate->path, &output[start], 2*nGrads*sizeof(double));
+}
+
+void readBinaryFanOutput(fanUpdateS *fanUpdate, FILE *fp) {
+  // reads the binary response written by triangleFan.outputBinary: int64 nDoubles followed by
+  // the doubles described in fanUpdate_fromBinaryOutput
+  int64_t nDoubles;
+  double *output;
+  if( fread(&nDoubles, sizeof(int64_t), 1, fp) != 1 ){
+    fprintf(stderr, "Python worker closed its output\n");
+    exit(EXIT_FAILURE);
+  }
+  output = malloc(nDoubles*sizeof(double));
+  if( fread(output, sizeof(double), nDoubles, fp) != (size_t)nDoubles ){
+    fprintf(stderr, "Incomplete response from the python worker\n");
+    exit(EXIT_FAILURE);
+  }
+  fanUpdate_fromBinaryOutput(fanUpdate, output, (size_t)nDoubles);
+  free(output);
+}
+
+void createJSONFile(fanUpdateS *fanUpdate, char const *path) {
+  FILE *fp = fopen(path, "w");
+  assert(fp != NULL);
+  writeJSONFan(fanUpdate, fp);
   fclose(fp);
 }
 
@@ -612,6 +747,7 @@ void deserializeJSONoutput(fanUpdateS *fanUpdate, json_object *output_obj) {
   //given a json_object output from the Python optimizer we deserialize it
   // and save it to fanUpdate
   size_t nRegions = fanUpdate->triFan->nRegions; // useful to have
+  fanUpdate_freeOutput(fanUpdate); // from the previous update
   // malloc what we can malloc
   fanUpdate->params = malloc((2*nRegions + 1)*sizeof(double));
   // START READING
@@ -771,6 +907,10 @@ void deserializeJSONoutput(fanUpdateS *fanUpdate, json_object *output_obj) {
   }
 
 
+  // get the KKT residual (older versions of optiPython.py don't send it)
+  output_list = json_object_object_get(output_obj, "residual");
+  fanUpdate->residual = output_list == NULL ? -1 : json_object_get_double(output_list);
+
   // get gradHat
   double gradHat[2];
   output_list = json_object_object_get(output_obj, "gradHat");
@@ -840,19 +980,86 @@ void optimizeTriangleFan_wPython(fanUpdateS *fanUpdate) {
   fanUpdate->THat = output[0];
   fanUpdate->gradHat[0] = output[1];
   fanUpdate->gradHat[1] = output[2];
+  fanUpdate->residual = -1; // stepWithPython.py only prints THat and gradHat
 
   updateNumber ++;
 
 }
 
+void fanWorker_start(fanWorkerS *fanWorker, char const *pathScript, double tolKKT) {
+  // start a single python process that optimizes all the triangle fans for this march
+  // we write the fans to its stdin and read the optimized fans from its stdout
+  // if tolKKT > 0 the optimizer also stops once its KKT residual is below tolKKT
+  int toChild[2], fromChild[2];
+  char tolKKT_str[64];
+  if( pipe(toChild) != 0 || pipe(fromChild) != 0 ){
+    perror("pipe");
+    exit(EXIT_FAILURE);
+  }
+  fflush(stdout); // don't duplicate what we've printed so far
+  pid_t pid = fork();
+  if( pid < 0 ){
+    perror("fork");
+    exit(EXIT_FAILURE);
+  }
+  if( pid == 0 ){
+    // child: the pipes become its stdin and stdout
+    dup2(toChild[0], STDIN_FILENO);
+    dup2(fromChild[1], STDOUT_FILENO);
+    close(toChild[0]);
+    close(toChild[1]);
+    close(fromChild[0]);
+    close(fromChild[1]);
+    if( tolKKT > 0 ){
+      snprintf(tolKKT_str, sizeof(tolKKT_str), "%1.17e", tolKKT);
+      execlp("python3", "python3", pathScript, "--binary", "--tolKKT", tolKKT_str, (char *)NULL);
+    }
+    else{
+      execlp("python3", "python3", pathScript, "--binary", (char *)NULL);
+    }
+    perror("execlp python3");
+    _exit(127);
+  }
+  // parent
+  close(toChild[0]);
+  close(fromChild[1]);
+  fanWorker->pid = pid;
+  fanWorker->toWorker = fdopen(toChild[1], "w");
+  fanWorker->fromWorker = fdopen(fromChild[0], "r");
+  assert(fanWorker->toWorker != NULL && fanWorker->fromWorker != NULL);
+  fanWorker->nUpdates = 0;
+}
+
+void fanWorker_stop(fanWorkerS *fanWorker) {
+  // tell the worker we are done (nRegions = 0) and wait for it
+  int64_t nRegions = 0;
+  fwrite(&nRegions, sizeof(int64_t), 1, fanWorker->toWorker);
+  fclose(fanWorker->toWorker);
+  fclose(fanWorker->fromWorker);
+  waitpid(fanWorker->pid, NULL, 0);
+  printf("\nPython worker optimized %d triangle fans\n", fanWorker->nUpdates);
+}
+
+void optimizeTriangleFan_wWorker(fanUpdateS *fanUpdate, fanWorkerS *fanWorker) {
+  // same as optimizeTriangleFan_wPython but using the python process started
+  // with fanWorker_start, no temporary files, no new interpreter and no text per update
+  printf("\nDoing update %d with the worker\n\n", fanWorker->nUpdates);
+  writeBinaryFan(fanUpdate, fanWorker->toWorker);
+  fflush(fanWorker->toWorker); // the worker is waiting for the whole request
+  readBinaryFanOutput(fanUpdate, fanWorker->fromWorker);
+  printf("THat and gradHat: %1.20f   %1.20f   %1.20f\n", fanUpdate->THat, fanUpdate->gradHat[0], fanUpdate->gradHat[1]);
+
+  fanWorker->nUpdates ++;
+}
+
 
 void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
 		  int indexStop_int, size_t firstTriangle) {
   printf("\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n");
   // given a starting edge on the valid front update a far/trial
   // set of triangles until indexStop is reached (going on the direction of firstTriangle)
-  size_t possibleNextIndices[2], allSameIndices;
-  int possibleNextTriangles[2];
+  size_t possibleNextIndices[2], allSameIndices, nextIndex;
+  int possibleNextTriangles[2], nextTriang;
   int i;
   double T0, grad0[2], T1, grad1[2], *angleMax;
   angleMax = malloc(sizeof(double));
@@ -877,8 +1084,7 @@ void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
   triangleFan_alloc(&currentTriangleFan);
   fanUpdateS *currentTriangleFanUpdate;
   fanUpdate_alloc(&currentTriangleFanUpdate);
-  size_t prevTriang, thisTriang;
-  prevTriang = firstTriangle;
+  size_t thisTriang;
   thisTriang = firstTriangle;
   size_t *allPossibleIndicesNodes, nRegions; // in here we are going to store all possible
   // nodes for the triangle fans, the key is to use nRegions to initialize correctly
@@ -905,12 +1111,13 @@ void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
     //printf("Angle in this triangleFan %f\n", angleMax[0]);
     if( fabs(angleMax[0]) > 1){
       //printf("\n\nangleMax is greater than pi\n");
-      return;
+      break;
     }
     // initialize the triangle update
     fanUpdate_initPreOpti(currentTriangleFanUpdate, currentTriangleFan,
 			  T0, grad0, T1, grad1);
     currentTriangleFanUpdate->THat = eik_g->eik_vals[indexHat];
+    currentTriangleFanUpdate->tolKKT = eik_g->tolKKT;
     /////////////////// OPTIMIZE!
     allSameIndices = allSameTriangles(currentTriangleFan); // see if all the indices in this fan are the same
     // MAYBE WE NEED SNELLS LAW
@@ -922,7 +1129,7 @@ void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
       // compute the tangent and eta inside the first triangle
       etaInside = currentTriangleFanUpdate->triFan->listIndices[0];
       etaOutside = l2norm(currentTriangleFanUpdate->grad0);
-      getTangentChangeReg(eik_g->mesh2, index0, firstTriangle, tanChange, etaOutside);
+      getTangentChangeReg(eik_g->mesh2, index0, firstTriangle, tanChange);
       printf("Tangent at x0: %fl %fl\n", tanChange[0], tanChange[1]);
       printf("Eta inside: %fl,  eta outside:  %fl\n", etaInside, etaOutside);
       // compute the new gradient on this side 
@@ -941,7 +1148,7 @@ void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
       // compute the tangent and eta inside the first triangle
       etaInside = currentTriangleFanUpdate->triFan->listIndices[0];
       etaOutside = l2norm(currentTriangleFanUpdate->grad1);
-      getTangentChangeReg(eik_g->mesh2, index1, firstTriangle, tanChange, etaOutside);
+      getTangentChangeReg(eik_g->mesh2, index1, firstTriangle, tanChange);
       // compute the new gradient on this side
       printf("Tangent at x0: %fl %fl\n", tanChange[0], tanChange[1]);
       printf("Eta inside: %fl,  eta outside:  %fl\n", etaInside, etaOutside);
@@ -976,7 +1183,20 @@ void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
 	currentTriangleFanUpdate->grad1[0] = grad1Snell[0];
 	currentTriangleFanUpdate->grad1[1] = grad1Snell[1];
       }
-      optimizeTriangleFan_wPython(currentTriangleFanUpdate);
+      if( eik_g->pythonOpti == PYTHON_WORKER && eik_g->fanWorker != NULL ){
+	optimizeTriangleFan_wWorker(currentTriangleFanUpdate, eik_g->fanWorker);
+      }
+#ifdef JMM_EMBED_PYTHON
+      else if( eik_g->pythonOpti == PYTHON_EMBEDDED ){
+	optimizeTriangleFan_wEmbedded(currentTriangleFanUpdate);
+      }
+#endif
+      else{
+	optimizeTriangleFan_wPython(currentTriangleFanUpdate);
+      }
+      if( currentTriangleFanUpdate->residual > eik_g->maxResidual ){
+	eik_g->maxResidual = currentTriangleFanUpdate->residual;
+      }
     }
     else{
       // all the indices of refraction in this triangle fan are the same
@@ -1004,21 +1224,24 @@ void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
       }
     }
     //////// MARCH TO THE OTHER TRIANGLE
-    prevTriang = thisTriang;
-    twoTrianglesFromEdge(eik_g->mesh2, index0, indexHat, possibleNextTriangles, possibleNextIndices);
-    if( (size_t)possibleNextTriangles[0] == prevTriang && possibleNextTriangles[1] != -1 ){
-      // we should march in the possibleNextTriangles[1] direction
-      thisTriang = (size_t)possibleNextTriangles[1];
-      indexHat = possibleNextIndices[1];
+    nextTriang = nextTriangleAround(eik_g->mesh2, index0, thisTriang, indexHat, &nextIndex);
+    if( nextTriang != -1 ){
+      // the triangle after thisTriang around x0 (corner table)
+      thisTriang = (size_t)nextTriang;
+      indexHat = nextIndex;
     }
-    else if (possibleNextTriangles[0] != -1) {
-      thisTriang = (size_t)possibleNextTriangles[0];
+    else{
+      // x0 xHat is on the boundary, thisTriang is its only triangle, go back to its third vertex
+      twoTrianglesFromEdge(eik_g->mesh2, index0, indexHat, possibleNextTriangles, possibleNextIndices);
       indexHat = possibleNextIndices[0];
     }
     allPossibleIndicesNodes[i] = indexHat;
     nRegions ++;
     i ++;
   }
+  fanUpdate_freeOutput(currentTriangleFanUpdate);
+  free(allPossibleIndicesNodes);
+  free(angleMax);
   triangleFan_dalloc(&currentTriangleFan);
   fanUpdate_dalloc(&currentTriangleFanUpdate);
 }
@@ -8,6 +8,7 @@
 #include <stdlib.h>
 #include <string.h>
 #include <assert.h>
+#include <stdint.h>
 #include <json-c/json.h> // used for reading the json type string from python
 
 
@@ -36,8 +37,23 @@ typedef struct fanUpdate {
   double (*grads)[2]; // gradients computed using all params, paramsCrTop, paramsStTop, length 2*nRegions + 1 + 2*nIndCrTop + 2*nIndStTop
   double (*path)[2]; // path computed using all params, paramsCrTop, paramsStTop, length 2*nRegions + 1 + 2*nIndCrTop + 2*nIndStTop
   double gradHat[2]; // gradient which is going to be used for xHat
+  double tolKKT; // target for the KKT residual of the python optimizer, 0 for its usual stopping rule
+  double residual; // KKT residual of the python optimizer at the path found, -1 if unknown (e.g. simple update)
 } fanUpdateS;
 
+typedef struct fanWorker {
+  // long lived python process (fanWorker.py) that optimizes all the triangle fans of a march
+  pid_t pid;
+  FILE *toWorker; // its stdin, binary fan requests (writeBinaryFan)
+  FILE *fromWorker; // its stdout, binary optimized fans (readBinaryFanOutput)
+  int nUpdates; // number of fans sent so far
+} fanWorkerS;
+
+// ways of calling the python optimizer (pythonOpti in eik_gridS)
+#define PYTHON_SUBPROCESS 0 // python3 ./stepWithPython.py updates/updateN.json for each update (default)
+#define PYTHON_WORKER 1 // fanWorker.py started once per march, doesn't write updates/updateN.json
+#define PYTHON_EMBEDDED 2 // interpreter inside this process, needs -DJMM_EMBED_PYTHON
+
 typedef struct eik_grid {
   size_t *start; // the index of the point that is the source (could be multiple, that's why its a pointer)
   size_t nStart; // number of points in start
@@ -46,6 +62,10 @@ typedef struct eik_grid {
   double (*grads)[2]; // gradient of the eikonal
   p_queue *p_queueG; // priority queue struct
   size_t *current_states; // 0 far, 1 trial, 2 valid
+  int pythonOpti; // PYTHON_SUBPROCESS, PYTHON_WORKER or PYTHON_EMBEDDED
+  fanWorkerS *fanWorker; // started by marcher_T2 if pythonOpti is PYTHON_WORKER
+  double tolKKT; // target for the KKT residual of the python optimizer (e.g. 1e-2*h*h, see tolKKT_fromMeshSize in optiPython.py), 0 for its usual stopping rule
+  double maxResidual; // largest KKT residual of the fans optimized with python in this march
 } eik_gridS;
 
 void eik_grid_alloc(eik_gridS **eik_g );
@@ -56,6 +76,8 @@ void fanUpdate_alloc(fanUpdateS **fanUpdate);
 
 void fanUpdate_dalloc(fanUpdateS **fanUpdate);
 
+void fanUpdate_freeOutput(fanUpdateS *fanUpdate);
+
 void eik_grid_init( eik_gridS *eik_g, size_t *start, size_t nStart, mesh2S *mesh2);
 
 void fanUpdate_init(fanUpdateS *fanUpdate, triangleFanS *triFan, double *params,
@@ -94,12 +116,28 @@ void simple_Update(double x0[2], double x1[2], double xHat[2],
 
 void fanUpdate_fromSimple(fanUpdateS *fanUpdate);
 
+void writeJSONFan(fanUpdateS *fanUpdate, FILE *fp);
+
+void fanKey(triangleFanS *triFan, double *key);
+
+void writeBinaryFan(fanUpdateS *fanUpdate, FILE *fp);
+
+void fanUpdate_fromBinaryOutput(fanUpdateS *fanUpdate, double const *output, size_t nDoubles);
+
+void readBinaryFanOutput(fanUpdateS *fanUpdate, FILE *fp);
+
 void createJSONFile(fanUpdateS *fanUpdate, char const *path);
 
 void deserializeJSONoutput(fanUpdateS *fanUpdate, json_object *output_obj);
 
 void optimizeTriangleFan_wPython(fanUpdateS *fanUpdate);
 
+void fanWorker_start(fanWorkerS *fanWorker, char const *pathScript, double tolKKT);
+
+void fanWorker_stop(fanWorkerS *fanWorker);
+
+void optimizeTriangleFan_wWorker(fanUpdateS *fanUpdate, fanWorkerS *fanWorker);
+
 void updateOneWay(eik_gridS *eik_g, size_t index0, size_t index1, size_t index2,
 		  int indexStop_int, size_t firstTriangle);
 
@@ -0,0 +1,127 @@
+# Long lived version of stepWithPython.py
+# The marcher starts this script once and then sends one triangle fan per line
+# through stdin (same JSON string as in updates/updateN.json). For each fan we
+# answer with one line "THat ,  gradHat0 ,  gradHat1" on stdout, which is what
+# the C side parses with separateARowDb. This way we only pay for starting python,
+# importing numpy and compiling numba once per march.
+# Send "quit" (or close stdin) to stop the worker.
+# With --binary (what eik_grid.c uses) the messages are fixed layout doubles instead:
+# request = int64 nRegions + 13*nRegions + 24 doubles (the fan and its key, see triangleFan.initFromBinary),
+# response = int64 nDoubles + nDoubles doubles (see triangleFan.outputBinary),
+# nRegions = 0 stops the worker.
+# With --threads N or --processes N the path types of each fan (triangleFan.optionsTop)
+# are solved concurrently on a pool that lives as long as the worker.
+# In binary mode with --warmStart the optimizer is warm started with the previous optimum of
+# the same fan (or of the same fan with one triangle less).
+# With --metrics the iterations, backtracking steps, projections and time of the optimizer
+# are added up by type of path over the whole march and written to stderr when the worker stops.
+# With --tolKKT x the optimizer also stops once its KKT residual is below x (see oP.kktResidual),
+# the residual of each fan goes back to C at the end of the binary response.
+
+import optiPython as oP
+import numpy as np
+import json
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def solveFan(triInfo, executor = None, metrics = None, tolKKT = None):
+    '''
+    Optimize a single triangle fan given its JSON string, returns the output dictionary
+    '''
+    params_dict = json.loads(triInfo)
+    nRegions = len(params_dict['listxk']) -2
+    triFan = oP.triangleFan(nRegions) # initialize a triangle fan
+    triFan.executor = executor
+    triFan.metrics = metrics
+    triFan.tolKKT = tolKKT
+    return triFan.outputJSON(triInfo)
+
+
+def serve(fIn = sys.stdin, fOut = sys.stdout, executor = None, metrics = None, tolKKT = None):
+    '''
+    Read fans from fIn until it is closed or we receive "quit", answer each one in fOut
+    '''
+    for triInfo in fIn:
+        triInfo = triInfo.strip()
+        if triInfo == "":
+            continue
+        if triInfo == "quit":
+            break
+        try:
+            dict_out = solveFan(triInfo, executor, metrics, tolKKT)
+            fOut.write("{} ,  {} ,  {}\n".format(dict_out["THat"], dict_out["gradHat"][0], dict_out["gradHat"][1]))
+        except Exception:
+            # don't kill the march because of one fan, C won't accept a nan update
+            traceback.print_exc(file = sys.stderr)
+            fOut.write("nan ,  nan ,  nan\n")
+        fOut.flush() # C is blocked waiting for this line
+
+
+def readExactly(fIn, nBytes):
+    '''
+    Read exactly nBytes from fIn, returns None if fIn was closed
+    '''
+    buf = fIn.read(nBytes)
+    if buf is None or len(buf) < nBytes:
+        return None
+    return buf
+
+
+def serveBinary(fIn = sys.stdin.buffer, fOut = sys.stdout.buffer, executor = None, cache = None, metrics = None,
+                tolKKT = None):
+    '''
+    Same as serve but with the binary messages, no float formatting or parsing
+    '''
+    while True:
+        header = readExactly(fIn, 8)
+        if header is None:
+            break
+        nRegions = int(np.frombuffer(header, dtype=np.int64)[0])
+        if nRegions == 0:
+            break
+        buf = readExactly(fIn, 8*oP.fanRequestSize(nRegions))
+        if buf is None:
+            break
+        try:
+            triFan = oP.triangleFan(nRegions) # initialize a triangle fan
+            triFan.executor = executor
+            triFan.cache = cache
+            triFan.metrics = metrics
+            triFan.tolKKT = tolKKT
+            out = triFan.outputBinary(buf)
+        except Exception:
+            # don't kill the march because of one fan, C won't accept a nan update
+            traceback.print_exc(file = sys.stderr)
+            out = np.array([np.nan, np.nan, np.nan, 0, 0]).tobytes()
+        fOut.write(np.array([len(out)//8], dtype=np.int64).tobytes())
+        fOut.write(out)
+        fOut.flush() # C is blocked waiting for this
+
+
+def executorFromArgs(args):
+    '''
+    Pool given by --threads N or --processes N in args, None if neither is there
+    '''
+    for flag, poolType in [("--threads", ThreadPoolExecutor), ("--processes", ProcessPoolExecutor)]:
+        if flag in args:
+            i = args.index(flag)
+            nWorkers = int(args[i+1]) if i + 1 < len(args) else None
+            return poolType(max_workers = nWorkers)
+    return None
+
+
+if __name__ == "__main__":
+    executor = executorFromArgs(sys.argv[1:])
+    metrics = oP.marchMetrics() if "--metrics" in sys.argv[1:] else None
+    tolKKT = float(sys.argv[sys.argv.index("--tolKKT") + 1]) if "--tolKKT" in sys.argv[1:] else None
+    if "--binary" in sys.argv[1:]:
+        cache = oP.warmStartCache() if "--warmStart" in sys.argv[1:] else None
+        serveBinary(executor = executor, cache = cache, metrics = metrics, tolKKT = tolKKT)
+    else:
+        serve(executor = executor, metrics = metrics, tolKKT = tolKKT)
+    if executor is not None:
+        executor.shutdown()
+    if metrics is not None:
+        sys.stderr.write(metrics.report() + "\n")
@@ -1,8 +1,24 @@
 #include "eik_grid.h"
+#include "python_embedded.h"
 
 #include <stdio.h>
+#include <stdlib.h>
 
 void marcher_T2( eik_gridS *eik_g, double rBall){
+  // start the python optimizer once for the whole march
+  fanWorkerS fanWorker;
+  if( eik_g->pythonOpti == PYTHON_WORKER ){
+    fanWorker_start(&fanWorker, "./fanWorker.py", eik_g->tolKKT);
+    eik_g->fanWorker = &fanWorker;
+  }
+  else if( eik_g->pythonOpti == PYTHON_EMBEDDED ){
+#ifdef JMM_EMBED_PYTHON
+    embeddedPython_init();
+#else
+    fprintf(stderr, "PYTHON_EMBEDDED needs to be compiled with -DJMM_EMBED_PYTHON\n");
+    exit(EXIT_FAILURE);
+#endif
+  }
   // we first add directly the points that are close
   initializePointsNear(eik_g, rBall);
   // then we can start marching
@@ -17,4 +33,14 @@ void marcher_T2( eik_gridS *eik_g, double rBall){
     // printGeneralInfo(eik_g);
   }
   // printGeneralInfo(eik_g);
+  printf("\nLargest KKT residual of the python optimizer: %g\n", eik_g->maxResidual);
+  if( eik_g->pythonOpti == PYTHON_WORKER ){
+    fanWorker_stop(&fanWorker);
+    eik_g->fanWorker = NULL;
+  }
+#ifdef JMM_EMBED_PYTHON
+  else if( eik_g->pythonOpti == PYTHON_EMBEDDED ){
+    embeddedPython_finalize();
+  }
+#endif
 }
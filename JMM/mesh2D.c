@@ -70,6 +70,9 @@ void mesh2_init(mesh2S *mesh2, double (*points)[2], size_t nPoints,
   mesh2->incidentFaces = incidentFaces;
   mesh2->eta = eta;
   mesh2->h_i = h_i;
+  mesh2_initEdgeFaces(mesh2);
+  mesh2_initCorners(mesh2);
+  mesh2_initInterfaces(mesh2);
 }
 
 void boundaryCurve_init_from_meshpy(boundaryCurve *h_i, size_t nEdges, char const *pathBoundary) {
@@ -213,6 +216,183 @@ void mesh2_init_from_meshpy(mesh2S *mesh2, char const *pathPoints, char const *p
   readDbColumn(pathIndices, eta);
   mesh2->eta = eta;
 
+  // edge -> faces index, for twoTrianglesFromEdge and faceBetween3Points
+  mesh2_initEdgeFaces(mesh2);
+  printf("Indexed the faces of each edge\n");
+
+  // corner table, to go around a point
+  mesh2_initCorners(mesh2);
+  printf("Set the corner table\n");
+
+  // points on interfaces and their tangents, for Snell's law
+  mesh2_initInterfaces(mesh2);
+  printf("Set the interfaces\n");
+}
+
+void mesh2_initEdgeFaces(mesh2S *mesh2) {
+  // from edges and edgesInFace, for each edge the (at most) two faces that share it and
+  // their opposite vertices. Faces go in increasing index, which is the order in which they
+  // are in incidentFaces (this is the order in which the scan in twoTrianglesFromEdge found them).
+  // The edges are also sorted by their smaller point (CSR) so that we can find them from their points
+  size_t i, k, e, f, nFacesEdge;
+  size_t *firstEdge, *edgesFrom;
+  int (*facesInEdge)[2];
+  size_t (*oppositeInEdge)[2];
+
+  firstEdge = malloc((mesh2->nPoints + 1)*sizeof(size_t));
+  edgesFrom = malloc(mesh2->nEdges*sizeof(size_t));
+  facesInEdge = malloc(mesh2->nEdges*2*sizeof(int));
+  oppositeInEdge = malloc(mesh2->nEdges*2*sizeof(size_t));
+
+  // count the edges that start at each point (the smaller one), then place them
+  for( i = 0; i<mesh2->nPoints + 1; i++ ){
+    firstEdge[i] = 0;
+  }
+  for( e = 0; e<mesh2->nEdges; e++ ){
+    assert( mesh2->edges[e][0] < mesh2->edges[e][1] ); // edges are SORTED
+    firstEdge[mesh2->edges[e][0] + 1] ++;
+    facesInEdge[e][0] = -1;
+    facesInEdge[e][1] = -1;
+  }
+  for( i = 0; i<mesh2->nPoints; i++ ){
+    firstEdge[i + 1] += firstEdge[i];
+  }
+  for( e = 0; e<mesh2->nEdges; e++ ){
+    // firstEdge[i] is used as the next free place for point i, shifted back after
+    edgesFrom[firstEdge[mesh2->edges[e][0]]++] = e;
+  }
+  for( i = mesh2->nPoints; i>0; i-- ){
+    firstEdge[i] = firstEdge[i - 1];
+  }
+  firstEdge[0] = 0;
+
+  // faces of each edge
+  for( f = 0; f<mesh2->nFaces; f++ ){
+    for( k = 0; k<3; k++ ){
+      e = mesh2->edgesInFace[f][k];
+      nFacesEdge = facesInEdge[e][0] == -1 ? 0 : 1;
+      assert( facesInEdge[e][1] == -1 ); // at most two faces per edge
+      facesInEdge[e][nFacesEdge] = (int)f;
+      for( i = 0; i<3; i++ ){
+	if( mesh2->faces[f][i] != mesh2->edges[e][0] && mesh2->faces[f][i] != mesh2->edges[e][1] ){
+	  oppositeInEdge[e][nFacesEdge] = mesh2->faces[f][i];
+	}
+      }
+    }
+  }
+
+  mesh2->firstEdge = firstEdge;
+  mesh2->edgesFrom = edgesFrom;
+  mesh2->facesInEdge = facesInEdge;
+  mesh2->oppositeInEdge = oppositeInEdge;
+}
+
+void mesh2_initCorners(mesh2S *mesh2) {
+  // corner table (a half edge structure for triangles): the vertex of corner c = 3*f + k is
+  // faces[f][k], the next corner in the face is 3*f + (k+1)%3 and the opposite corner is the corner of
+  // the other face across the edge that faces c. Going around a point is then just following
+  // cornerOpposite. Needs mesh2_initEdgeFaces
+  size_t f, k, j, e, other, v;
+  int *cornerOpposite, faceOther;
+  cornerOpposite = malloc(3*mesh2->nFaces*sizeof(int));
+  for( f = 0; f<mesh2->nFaces; f++ ){
+    for( k = 0; k<3; k++ ){
+      v = mesh2->faces[f][k];
+      cornerOpposite[3*f + k] = -1;
+      // the edge of this face that doesn't have v
+      for( j = 0; j<3; j++ ){
+	e = mesh2->edgesInFace[f][j];
+	if( mesh2->edges[e][0] != v && mesh2->edges[e][1] != v ){
+	  break;
+	}
+      }
+      assert( j < 3 );
+      other = mesh2->facesInEdge[e][0] == (int)f ? 1 : 0;
+      faceOther = mesh2->facesInEdge[e][other];
+      if( faceOther == -1 ){
+	continue; // on the boundary
+      }
+      for( j = 0; j<3; j++ ){
+	if( mesh2->faces[faceOther][j] == mesh2->oppositeInEdge[e][other] ){
+	  cornerOpposite[3*f + k] = 3*faceOther + (int)j;
+	}
+      }
+    }
+  }
+  mesh2->cornerOpposite = cornerOpposite;
+}
+
+static void tangentChangeAround(mesh2S *mesh2, size_t indexPoint, size_t firstTriangle, double tanChange[2]) {
+  // go around indexPoint starting from firstTriangle (towards its first vertex that isn't indexPoint)
+  // until the index of refraction changes, the tangent we want is the one at indexPoint
+  // on the edge where it changes. 0 if it doesn't change (or if we get to the boundary first)
+  size_t pointsTriangleInit[2], currentVertex, prevVertex, nextVertex;
+  int currentTriangle, edge, k = 0;
+  for( int i = 0; i<3; i++ ){
+    if( mesh2->faces[firstTriangle][i] != indexPoint ){
+      pointsTriangleInit[k] = mesh2->faces[firstTriangle][i];
+      k ++;
+    }
+  }
+  tanChange[0] = 0;
+  tanChange[1] = 0;
+  currentTriangle = (int)firstTriangle;
+  currentVertex = pointsTriangleInit[0];
+  while( currentVertex != pointsTriangleInit[1] ){
+    prevVertex = currentVertex;
+    currentTriangle = nextTriangleAround(mesh2, indexPoint, (size_t)currentTriangle, currentVertex, &nextVertex);
+    if( currentTriangle == -1 ){
+      return;
+    }
+    currentVertex = nextVertex;
+    if( mesh2->eta[currentTriangle] != mesh2->eta[firstTriangle] ){
+      // the edge indexPoint prevVertex is where the region changes
+      edge = edgeBetweenPoints(mesh2, indexPoint, prevVertex);
+      if( mesh2->edges[edge][0] == indexPoint ){
+	// the tangent we want is B0
+	tanChange[0] = mesh2->h_i[edge].B[0][0];
+	tanChange[1] = mesh2->h_i[edge].B[0][1];
+      }
+      else{
+	// the tangent we want is B1
+	tanChange[0] = mesh2->h_i[edge].B[1][0];
+	tanChange[1] = mesh2->h_i[edge].B[1][1];
+      }
+      return;
+    }
+  }
+}
+
+void mesh2_initInterfaces(mesh2S *mesh2) {
+  // points where the index of refraction changes and, for each of their corners, the tangent
+  // where it changes going around them (what pointOnBoundary and getTangentChangeReg look up
+  // for the Snell's law corrections). Needs mesh2_initCorners
+  size_t i, f, k, *pointOnInterface;
+  int neiTri;
+  double (*tanChangeCorner)[2];
+  pointOnInterface = malloc(mesh2->nPoints*sizeof(size_t));
+  tanChangeCorner = malloc(3*mesh2->nFaces*2*sizeof(double));
+  for( i = 0; i<mesh2->nPoints; i++ ){
+    pointOnInterface[i] = 0;
+    for( int j = 1; j < mesh2->incidentFaces[i].len; j++ ){
+      neiTri = mesh2->incidentFaces[i].neis_i[j];
+      if( mesh2->eta[neiTri] != mesh2->eta[mesh2->incidentFaces[i].neis_i[0]] ){
+	pointOnInterface[i] = 1;
+	break;
+      }
+    }
+  }
+  for( f = 0; f<mesh2->nFaces; f++ ){
+    for( k = 0; k<3; k++ ){
+      tanChangeCorner[3*f + k][0] = 0;
+      tanChangeCorner[3*f + k][1] = 0;
+      if( pointOnInterface[mesh2->faces[f][k]] == 1 ){
+	tangentChangeAround(mesh2, mesh2->faces[f][k], f, tanChangeCorner[3*f + k]);
+      }
+    }
+  }
+  mesh2->pointOnInterface = pointOnInterface;
+  mesh2->tanChangeCorner = tanChangeCorner;
 }
 
 
@@ -279,53 +459,70 @@ void printEverythingInMesh(mesh2S *mesh2) {
 // we need a few methods to initialize triangle fans in the correct way
 // notice that given a point we can define two triangle fans
 
+int edgeBetweenPoints(mesh2S *mesh2, size_t index0, size_t index1) {
+  // index of the edge between the two points, -1 if they don't form an edge
+  size_t indexSmall, indexBig, e;
+  indexSmall = index0 < index1 ? index0 : index1;
+  indexBig = index0 < index1 ? index1 : index0;
+  for( size_t i = mesh2->firstEdge[indexSmall]; i<mesh2->firstEdge[indexSmall + 1]; i++ ){
+    e = mesh2->edgesFrom[i];
+    if( mesh2->edges[e][1] == indexBig ){
+      return (int)e;
+    }
+  }
+  return -1;
+}
+
 void twoTrianglesFromEdge(mesh2S *mesh2, size_t index0, size_t index1,
 			  int possibleTriangles[2], size_t possibleThirdVertices[2] ) {
   // given a triangle mesh and two indices indices defining two nodes in the mesh,
   // output the two adjacent triangles to that edge and the two other possible third vertices
-  size_t j, currentTriangle;
+  int edge = edgeBetweenPoints(mesh2, index0, index1);
   possibleTriangles[0] = -1;
   possibleTriangles[1] = -1;
-  j = 0;
-  for( int i = 0; i<mesh2->incidentFaces[index0].len; i++ ){
-    // circle around all the incident faces to the node associated with index0
-    currentTriangle = mesh2->incidentFaces[index0].neis_i[i]; // current incident face to x0
-    if( (mesh2->faces[currentTriangle][0] == index0) && (mesh2->faces[currentTriangle][1] == index1) ) {
-      possibleTriangles[j] = currentTriangle;
-      possibleThirdVertices[j] = mesh2->faces[currentTriangle][2];
-      j ++;
-    }
-    else if( (mesh2->faces[currentTriangle][1] == index0) && (mesh2->faces[currentTriangle][0] == index1) ) {
-      possibleTriangles[j] = currentTriangle;
-      possibleThirdVertices[j] = mesh2->faces[currentTriangle][2];
-      j ++ ;
-    }
-    else if( (mesh2->faces[currentTriangle][0] == index0) && (mesh2->faces[currentTriangle][2] == index1) ) {
-      possibleTriangles[j] = currentTriangle;
-      possibleThirdVertices[j] = mesh2->faces[currentTriangle][1];
-      j ++;
-    }
-    else if( (mesh2->faces[currentTriangle][2] == index0) && (mesh2->faces[currentTriangle][0] == index1) ) {
-      possibleTriangles[j] = currentTriangle;
-      possibleThirdVertices[j] = mesh2->faces[currentTriangle][1];
-      j ++;
+  if( edge == -1 ){
+    printf("\n\nCant find incident faces\n\n");
+    assert(edge != -1);
+  }
+  for( int j = 0; j<2; j++ ){
+    if( mesh2->facesInEdge[edge][j] != -1 ){
+      possibleTriangles[j] = mesh2->facesInEdge[edge][j];
+      possibleThirdVertices[j] = mesh2->oppositeInEdge[edge][j];
     }
-    else if( (mesh2->faces[currentTriangle][1] == index0) && (mesh2->faces[currentTriangle][2] == index1) ) {
-      possibleTriangles[j] = currentTriangle;
-      possibleThirdVertices[j] = mesh2->faces[currentTriangle][0];
-      j ++;
+  }
+}
+
+
+int triangleAcrossPoint(mesh2S *mesh2, size_t face, size_t indexPoint, size_t *indexOpposite) {
+  // the face across the edge of face that doesn't have indexPoint (-1 if that edge is on the boundary)
+  // and its vertex that is not on that edge
+  int c = -1;
+  for( int k = 0; k<3; k++ ){
+    if( mesh2->faces[face][k] == indexPoint ){
+      c = mesh2->cornerOpposite[3*face + k];
     }
-    else if( (mesh2->faces[currentTriangle][2] == index0) && (mesh2->faces[currentTriangle][1] == index1) ) {
-      possibleTriangles[j] = currentTriangle;
-      possibleThirdVertices[j] = mesh2->faces[currentTriangle][0];
-      j ++;
+  }
+  if( c == -1 ){
+    return -1;
+  }
+  *indexOpposite = mesh2->faces[c/3][c%3];
+  return c/3;
+}
+
+int nextTriangleAround(mesh2S *mesh2, size_t index0, size_t thisTriangle, size_t indexk1, size_t *indexNext) {
+  // going around index0: the face after thisTriangle across the edge x0 xk1 and its vertex
+  // that is not x0 or xk1 (-1 if x0 xk1 is on the boundary)
+  int c = -1;
+  for( int k = 0; k<3; k++ ){
+    if( mesh2->faces[thisTriangle][k] != index0 && mesh2->faces[thisTriangle][k] != indexk1 ){
+      c = mesh2->cornerOpposite[3*thisTriangle + k];
     }
   }
-  
-  if( j == 0 ){
-    printf("\n\nCant find incident faces\n\n");
-    assert(j != 0);
+  if( c == -1 ){
+    return -1;
   }
+  *indexNext = mesh2->faces[c/3][c%3];
+  return c/3;
 }
 
 
@@ -363,24 +560,19 @@ double minEtaFromTwoPoints(mesh2S *mesh2, size_t index0, size_t index1) {
 int faceBetween3Points(mesh2S *mesh2, size_t index0, size_t index1, size_t index2) {
   // given 3 points that share a face it outputs the index of such face found
   // if there is no such face it outputs -1
-  int faceIndex;
-  int faceFound; // flag to see if we have found a face or if we shoud continue
-  faceFound = -1; // because we haven't found the desired face yet
-  size_t currentFace;
-  for( int i = 0; i<mesh2->incidentFaces[index0].len; i++) {
-    currentFace = mesh2->incidentFaces[index0].neis_i[i];
-    if( (mesh2->faces[currentFace][0] == index1) || (mesh2->faces[currentFace][1] == index1) || (mesh2->faces[currentFace][2] == index1) ) {
-      // index0 and index1 share a face/triangle
-      if( (mesh2->faces[currentFace][0] == index2) || (mesh2->faces[currentFace][1] == index2) || (mesh2->faces[currentFace][2] == index2) ){
+  int faceIndex = -1;
+  int edge = edgeBetweenPoints(mesh2, index0, index1);
+  if( edge != -1 ){
+    for( int j = 0; j<2; j++ ){
+      if( mesh2->facesInEdge[edge][j] != -1 &&
+	  (mesh2->oppositeInEdge[edge][j] == index2 || index2 == index0 || index2 == index1) ){
 	// index0, index1, index2 share this face/triangle
-	faceIndex = currentFace;
-	faceFound = 0; // because we've found a face
+	faceIndex = mesh2->facesInEdge[edge][j];
 	break;
       }
     }
   }
-  if( faceFound == -1 ){
-    faceIndex = -1;
+  if( faceIndex == -1 ){
     printf("\n\nIndex0: %zu, Index1: %zu, Index2: %zu   DONT SHARE A FACE\n\n", index0, index1, index2);
   }
   return faceIndex;
@@ -409,9 +601,8 @@ void triangleFan_initFromIndices(triangleFanS *triFan, mesh2S *mesh2, size_t nRe
   listBk = malloc(2*(nRegions + 1)*sizeof(double));
   listBkBk1 = malloc(2*(2*nRegions)*sizeof(double));
   // start filling the information in
-  size_t indexk, indexk1, edge0, edge1, edge2;
-  size_t possibleThirdVertices[2];
-  int possibleTriangles[2];
+  size_t indexk, indexk1, edge0, edge1, edge2, indexOutside;
+  int outsideTriangle;
   int j, i;
   for( i = 0; i <(nRegions + 2); i++){
     listxk[i][0] = mesh2->points[listIndicesNodes[i]][0];
@@ -429,14 +620,10 @@ void triangleFan_initFromIndices(triangleFanS *triFan, mesh2S *mesh2, size_t nRe
     listFaces[i] = (int)faceBetweenPoints; // add this information
     listIndices[i] = mesh2->eta[faceBetweenPoints]; // add this index of refraction
     // We need to add the index of refraction of the triangle on the outside
-    twoTrianglesFromEdge(mesh2, indexk, indexk1, possibleTriangles, possibleThirdVertices);
-    // we don't want faceBetweenPoints, we want the other one
-    if( (size_t)possibleTriangles[0] != faceBetweenPoints && possibleTriangles[0] != -1){
-      listIndices[nRegions + i+1] = mesh2->eta[possibleTriangles[0]];
-    }
-    else if (possibleTriangles[1] != -1){
-      //printf("Inside triangleFan_initFromIndices, possibleTriangles[1]: %d\n", possibleTriangles[1]);
-      listIndices[nRegions + i+1] = mesh2->eta[possibleTriangles[1]];
+    // (across xk xk1, the edge that doesn't have x0)
+    outsideTriangle = triangleAcrossPoint(mesh2, faceBetweenPoints, index0, &indexOutside);
+    if( outsideTriangle != -1 ){
+      listIndices[nRegions + i+1] = mesh2->eta[outsideTriangle];
     }
     else{
       // we are on the side of the box we are solving the problem in
@@ -607,13 +794,10 @@ void triangleFan_initFromIndices(triangleFanS *triFan, mesh2S *mesh2, size_t nRe
 
 
   // add information regarding the edge x0 xHat
-  twoTrianglesFromEdge(mesh2, index0, indexHat, possibleTriangles, possibleThirdVertices);
-  if( possibleTriangles[0] != listFaces[nRegions - 1] && possibleTriangles[0] != -1 ){
-    // this is the triangle we want
-    listIndices[nRegions] = mesh2->eta[possibleTriangles[0]];
-  }
-  else if (possibleTriangles[1] != listFaces[nRegions - 1] && possibleTriangles[1] != -1) {
-    listIndices[nRegions] = mesh2->eta[possibleTriangles[1]];
+  // (the triangle after the last one in the fan)
+  outsideTriangle = nextTriangleAround(mesh2, index0, (size_t)listFaces[nRegions - 1], indexHat, &indexOutside);
+  if( outsideTriangle != -1 ){
+    listIndices[nRegions] = mesh2->eta[outsideTriangle];
   }
   else {
     //printf("Inside triangleFan_initFromIndices, the edge x0 xHat is on the border of square, setting it to %fl\n", listIndices[nRegions - 1]);
@@ -671,6 +855,9 @@ void triangleFan_initFromIndices(triangleFanS *triFan, mesh2S *mesh2, size_t nRe
 
 
   // finally assign everything
+  triFan->index0 = index0;
+  triFan->index1 = index1;
+  triFan->indexHat = indexHat;
   triFan->x0[0] = x0[0];
   triFan->x0[1] = x0[1];
   triFan->x1[0] = x1[0];
@@ -803,6 +990,9 @@ void triangleFan_init(triangleFanS *triFan, size_t nRegions, double x0[2],
 		      double (*listB0k)[2], double (*listBk)[2],
 		      double (*listBkBk1)[2]) {
   triFan->nRegions = nRegions;
+  triFan->index0 = 0; // not built from the mesh
+  triFan->index1 = 0;
+  triFan->indexHat = 0;
   triFan->x0[0] = x0[0];
   triFan->x0[1] = x0[1];
   triFan->x1[0] = x1[0];
@@ -1109,70 +1299,13 @@ void oneGradFromSnells(mesh2S *mesh2, double point[2], double xHat[2],
 
 
 void getTangentChangeReg(mesh2S *mesh2, size_t indexPoint, size_t firstTriangle,
-			 double tanChange[2], double etaOutside) {
+			 double tanChange[2]) {
   // get the tangent to the boundary at indexPoint where the region changes
-  double indexInitial = mesh2->eta[firstTriangle];
-  printf("  Index initial when searching for the tangent: %fl\n", indexInitial);
-  size_t pointsTriangleInit[2];
-  int i, k;
-  k = 0;
-  // find the other two vertices of this triangle
-  for( i = 0; i<3; i ++){
-    if( mesh2->faces[firstTriangle][i] != indexPoint ) {
-      pointsTriangleInit[k] = mesh2->faces[firstTriangle][i];
-      k ++;
-    }
-  }
-
-  // start going around the incident faces
-  int possibleTriangles[2];
-  size_t possibleThirdVertices[2];
-  int prevTriangle = (int) firstTriangle;
-  int currentTriangle = firstTriangle;
-  size_t currentVertex = pointsTriangleInit[0];
-  size_t prevVertex = pointsTriangleInit[0];
-  size_t edgeConsidered;
-  etaOutside = indexInitial;
-  
-  while( currentTriangle != -1 && currentVertex != pointsTriangleInit[1] ){
-    // while there is another triangle to march along and we haven't circled fully around
-    twoTrianglesFromEdge(mesh2, indexPoint, currentVertex,
-			 possibleTriangles, possibleThirdVertices);
-    prevTriangle = currentTriangle;
-    prevVertex = currentVertex;
-    // update currentTriangle
-    if( possibleTriangles[0] != prevTriangle){
-      currentTriangle = possibleTriangles[0];
-      currentVertex = possibleThirdVertices[0];
-    }
-    else{
-      currentTriangle = possibleTriangles[1];
-      currentVertex = possibleThirdVertices[1];
-    }
-    // see if they have the same index as the original triangle
-    if( mesh2->eta[currentTriangle] != indexInitial ){
-      // we've found a different index, we need the edge defined by indexPoint and previousVertex
-      etaOutside = mesh2->eta[currentTriangle];
-      for( k = 0; k < 3; k++){
-	// get the edge
-	edgeConsidered = mesh2->edgesInFace[currentTriangle][k];
-	printf("Considering edge: %lu\n", edgeConsidered);
-	// se if the edge is the edge we want
-	if( mesh2->edges[edgeConsidered][0] == indexPoint &&
-	    mesh2->edges[edgeConsidered][1] == prevVertex){
-	  // the tangent we want is B0
-	  tanChange[0] = mesh2->h_i[edgeConsidered].B[0][0];
-	  tanChange[1] = mesh2->h_i[edgeConsidered].B[0][1];
-	  return;
-	}
-	if( mesh2->edges[edgeConsidered][1] == indexPoint &&
-	    mesh2->edges[edgeConsidered][0] == prevVertex){
-	  // the tangent we want is B1
-	  tanChange[0] = mesh2->h_i[edgeConsidered].B[1][0];
-	  tanChange[1] = mesh2->h_i[edgeConsidered].B[1][1];
-	  return;
-	}
-      }
+  // (going around indexPoint from firstTriangle, set in mesh2_initInterfaces)
+  for( int k = 0; k<3; k++ ){
+    if( mesh2->faces[firstTriangle][k] == indexPoint ){
+      tanChange[0] = mesh2->tanChangeCorner[3*firstTriangle + k][0];
+      tanChange[1] = mesh2->tanChangeCorner[3*firstTriangle + k][1];
     }
   }
 }
@@ -1205,22 +1338,8 @@ void getTangentChangeReg(mesh2S *mesh2, size_t indexPoint, size_t firstTriangle,
 
 
 size_t pointOnBoundary(mesh2S *mesh2, size_t indexPoint) {
-  // returns 0 if point is not on the Boundary, 1 if it is
-  int neiTri, nNeisTris;
-  double indexInit, indexCompare;
-  size_t flag = 0;
-  nNeisTris = mesh2->incidentFaces[indexPoint].len;
-  neiTri = mesh2->incidentFaces[indexPoint].neis_i[0];
-  indexInit = mesh2->eta[neiTri]; // initial index, point of comparison
-  for( int i = 1; i < nNeisTris; i ++){
-    neiTri = mesh2->incidentFaces[indexPoint].neis_i[i];
-    indexCompare = mesh2->eta[neiTri];
-    if( indexCompare != indexInit ){
-      flag = 1;
-      return flag;
-    }
-  }
-  return flag;
+  // returns 0 if point is not on the Boundary, 1 if it is (set in mesh2_initInterfaces)
+  return mesh2->pointOnInterface[indexPoint];
 }
 
 
@@ -26,6 +26,15 @@ typedef struct mesh2S{
   neighborsRS *incidentFaces; // for each point i, its incident faces
   double *eta; // indices of refraction on each face
   boundaryCurve *h_i; // boundaryCurve struct for each edge
+  size_t *firstEdge; // edges whose smaller point is i are edgesFrom[firstEdge[i]], ..., edgesFrom[firstEdge[i+1] - 1]
+  size_t *edgesFrom; // edge indices sorted by their smaller point (see edgeBetweenPoints)
+  int (*facesInEdge)[2]; // the faces that share each edge (increasing index), -1 if there is just one
+  size_t (*oppositeInEdge)[2]; // for each of those faces the vertex that is not on the edge
+  int *cornerOpposite; // corner table: corner c = 3*f + k is faces[f][k] in face f (next corner 3*f + (k+1)%3),
+                       // cornerOpposite[c] is the corner across the edge that faces c, -1 on the boundary
+  size_t *pointOnInterface; // 1 if the faces around each point don't all have the same eta (pointOnBoundary)
+  double (*tanChangeCorner)[2]; // for corner c = 3*f + k, tangent where the region changes going around faces[f][k]
+                                // starting from face f (getTangentChangeReg), 0 if it doesn't change
 } mesh2S;
 
 typedef struct triangleFan {
@@ -33,6 +42,9 @@ typedef struct triangleFan {
   double x0[2];
   double x1[2];
   double xHat[2];
+  size_t index0; // nodes of x0, x1, xHat in the mesh (used as a key by the python optimizer)
+  size_t index1;
+  size_t indexHat;
   int  *listFaces; // list of the triangle indices in this triangle fan FILLED WITH -1 IF REDUCED TRIANGLE
   double *listIndices; // in a triangle fan the etas are going to be called indices
   int *listEdges; // edges in this triangle fan FILLED WITH -1 IF REDUCED TRIANGLE length 2*nRegions + 1
@@ -69,13 +81,25 @@ void mesh2_init_from_meshpy(mesh2S *mesh2, char const *pathPoints, char const *p
 			    char const *pathNeighbors, char const *pathIncidentFaces,
 			    char const *pathIndices, char const *pathBoundary) ;
 
+void mesh2_initEdgeFaces(mesh2S *mesh2);
+
+void mesh2_initCorners(mesh2S *mesh2);
+
+void mesh2_initInterfaces(mesh2S *mesh2);
+
 void printGeneralInfoMesh(mesh2S *mesh2);
 
 void printEverythingInMesh(mesh2S *mesh2);
 
+int edgeBetweenPoints(mesh2S *mesh2, size_t index0, size_t index1);
+
 void twoTrianglesFromEdge(mesh2S *mesh2, size_t index0, size_t index1,
 			  int possibleTriangles[2], size_t possibleThirdVertices[2] );
 
+int triangleAcrossPoint(mesh2S *mesh2, size_t face, size_t indexPoint, size_t *indexOpposite);
+
+int nextTriangleAround(mesh2S *mesh2, size_t index0, size_t thisTriangle, size_t indexk1, size_t *indexNext);
+
 double minEtaFromTwoPoints(mesh2S *mesh2, size_t index0, size_t index1);
 
 int faceBetween3Points(mesh2S *mesh2, size_t index0, size_t index1, size_t index2);
@@ -107,7 +131,7 @@ void oneGradFromSnells(mesh2S *mesh2, double point[2], double xHat[2],
 		       double gradSnell[2]) ;
 
 void getTangentChangeReg(mesh2S *mesh2, size_t indexPoint, size_t firstTriangle,
-			 double tanChange[2], double etaOutside);
+			 double tanChange[2]);
 
 size_t pointOnBoundary(mesh2S *mesh2, size_t indexPoint);
 
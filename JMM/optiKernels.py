@@ -0,0 +1,472 @@
+# Nopython compiled versions of the functions in optiPython.py that are evaluated
+# the most (the boundary interpolations, the generalized objective, its partials
+# and the path/gradient reconstruction). They are compiled with cache=True so the
+# machine code is saved in __pycache__ and only the very first run pays for the JIT.
+# The pure Python versions in optiPython.py are the reference for these.
+# All arguments are arrays: optiPython normalizes None/list tops before calling
+# (indCrTop = [-1], paramsCrTop = [0, 0] means there are no points on the tops)
+# nogil so that triangleFan can solve several path types at the same time on threads.
+# error_model='numpy' so that dividing by a zero norm gives inf/nan as in the reference (numba's
+# default raises ZeroDivisionError there).
+
+import numpy as np
+from numba import njit, int32, float64, boolean
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def norm(v):
+     '''
+     Euclidean norm of a vector of size 2
+     '''
+     return np.sqrt(v[0]*v[0] + v[1]*v[1])
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def hermite_interpolationT(param, x0, T0, grad0, x1, T1, grad1):
+     '''
+     Hermite interpolation of the eikonal
+     '''
+     sumGrads = (param**3 - 2*param**2 + param)*grad0 + (param**3 - param**2)*grad1
+     return (2*param**3 - 3*param**2 + 1)*T0 + (-2*param**3 + 3*param**2)*T1 + np.dot(x1 - x0, sumGrads)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def der_hermite_interpolationT(param, x0, T0, grad0, x1, T1, grad1):
+     '''
+     derivative with respecto to param of the Hermite interpolation of the eikonal
+     '''
+     sumGrads = (3*param**2 - 4*param + 1)*grad0 + (3*param**2 - 2*param)*grad1
+     return (6*param**2 - 6*param)*T0 + (-6*param**2 + 6*param)*T1 + np.dot(x1 - x0, sumGrads)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def secondDer_Boundary(param, xFrom, Bfrom, xTo, Bto):
+     '''
+     d2B/dparam2
+     '''
+     return 6*(2*xFrom + Bfrom - 2*xTo + Bto)*param + 2*(-3*xFrom - 2*Bfrom + 3*xTo - Bto)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def gradientBoundary(param, xFrom, Bfrom, xTo, Bto):
+     '''
+     Tangent to the boundary (interpolated using Hermite)
+     '''
+     return 3*(2*xFrom + Bfrom - 2*xTo + Bto)*param**2 + 2*(-3*xFrom - 2*Bfrom + 3*xTo - Bto)*param + Bfrom
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def hermite_boundary(param, xFrom, Bfrom, xTo, Bto):
+     '''
+     Hermite interpolation of the boundary
+     '''
+     return (2*xFrom + Bfrom - 2*xTo + Bto)*param**3 + (-3*xFrom - 2*Bfrom + 3*xTo - Bto)*param**2 + Bfrom*param + xFrom
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def arclengthSimpson(mu, lam, xFrom, Bfrom, xTo, Bto):
+     '''
+     arclength along a boundary from xLam to xMu
+     '''
+     Bmu = gradientBoundary(mu, xFrom, Bfrom, xTo, Bto)
+     Blam = gradientBoundary(lam, xFrom, Bfrom, xTo, Bto)
+     B_mid = gradientBoundary((mu + lam)/2, xFrom, Bfrom, xTo, Bto)
+     return (norm(Bmu) + 4*norm(B_mid) + norm(Blam))*(abs(mu - lam)/6)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def get_sk(muk, lamk):
+     '''
+     Sign of muk - lamk
+     '''
+     if(muk > lamk):
+          sk = 1
+     else:
+          sk = -1
+     return sk
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_L_muk(muk, lamk, B0k_muk, secondDer_B0k_muk, B0k_halves, secondDer_B0khalves_muk, B0k_lamk):
+     '''
+     partial of the approximation of the arc length with respect to muk
+     '''
+     if( abs(muk - lamk) <= 1e-14):
+          return 0.0
+     else:
+          normB0k_muk = norm(B0k_muk)
+          normB0k_halves = norm(B0k_halves)
+          sk = get_sk(muk, lamk)
+          firstPart = sk/6*(normB0k_muk + 4*normB0k_halves + norm(B0k_lamk) )
+          secondPart = (abs(muk - lamk)/6)*(np.dot(secondDer_B0k_muk, B0k_muk)/normB0k_muk + 2*np.dot(secondDer_B0khalves_muk, B0k_halves)/normB0k_halves)
+          return firstPart + secondPart
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_L_lamk(muk, lamk, B0k_muk, B0k_halves, secondDer_B0khalves_lamk, B0k_lamk, secondDer_B0k_lamk):
+     '''
+     partial of the approximation of the arc length with respect to lamk
+     '''
+     if( abs(muk - lamk) <= 1e-14):
+          return 0.0
+     else:
+          normB0k_halves = norm(B0k_halves)
+          normB0k_lamk = norm(B0k_lamk)
+          sk = get_sk(muk, lamk)
+          firstPart = -sk/6*(norm(B0k_muk) + 4*normB0k_halves + normB0k_lamk )
+          secondPart = (abs(muk - lamk)/6)*(2*np.dot(secondDer_B0khalves_lamk, B0k_halves)/normB0k_halves + np.dot(secondDer_B0k_lamk, B0k_lamk)/normB0k_lamk )
+     return firstPart + secondPart
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_mu1(mu1, x0, T0, grad0, x1, T1, grad1, B01_mu, y2, z1):
+     der_hermite_inter = der_hermite_interpolationT(mu1, x0, T0, grad0, x1, T1, grad1)
+     if( norm(y2 - z1) < 1e-8 ):
+          return der_hermite_inter
+     else:
+          return der_hermite_inter - np.dot(B01_mu, y2 - z1)/norm(y2 - z1)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_recCr(shFrom, shTo, rec, x0From, B0From, x1From, B1From, x0To, B0To, x1To, B1To, etaInside, etaOutside):
+     '''
+     Partial of the objective function with respect to a receiver that creeps to a shooter
+     '''
+     shooterFrom = hermite_boundary(shFrom, x0From, B0From, x1From, B1From)
+     receiver = hermite_boundary(rec, x0To, B0To, x1To, B1To)
+     B_atShooterTo = gradientBoundary(shTo, x0To, B0To, x1To, B1To)
+     B_atReceiver = gradientBoundary(rec, x0To, B0To, x1To, B1To)
+     secondDer_B_atReceiver = secondDer_Boundary(rec, x0To, B0To, x1To, B1To)
+     B_halves = gradientBoundary( (shTo + rec)/2, x0To, B0To, x1To, B1To)
+     secondDer_Bhalves_atReceiver = secondDer_Boundary( (shTo + rec)/2, x0To, B0To, x1To, B1To)
+     perL_receiver = partial_L_lamk(shTo, rec, B_atShooterTo, B_halves, secondDer_Bhalves_atReceiver, B_atReceiver, secondDer_B_atReceiver)
+     etaMin = min(etaInside, etaOutside)
+     if( np.all(receiver == shooterFrom) ):
+          return etaMin*perL_receiver
+     else:
+          return etaInside*np.dot(B_atReceiver, receiver - shooterFrom)/norm(receiver - shooterFrom) + etaMin*perL_receiver
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_shCr(sh, recFrom, recTo, x0From, B0From, x1From, B1From, x0To, B0To, x1To, B1To, etaInside, etaOutside):
+     '''
+     Partial of the objective function with respect to a shooter that comes from a creeping ray from a receiver
+     '''
+     shooter = hermite_boundary(sh, x0From, B0From, x1From, B1From)
+     receiverTo = hermite_boundary(recTo, x0To, B0To, x1To, B1To)
+     B_atShooter = gradientBoundary(sh, x0From, B0From, x1From, B1From)
+     secondDer_B_atShooter = secondDer_Boundary(sh, x0From, B0From, x1From, B1From)
+     B_halves = gradientBoundary( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
+     secondDer_Bhalves_atShooter = secondDer_Boundary( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
+     B_atReceiver = gradientBoundary(recFrom, x0From, B0From, x1From, B1From)
+     parL_shooter = partial_L_muk(sh, recFrom, B_atShooter, secondDer_B_atShooter, B_halves, secondDer_Bhalves_atShooter, B_atReceiver)
+     etaMin = min(etaInside, etaOutside)
+     if( np.all( receiverTo == shooter) ):
+          return etaMin*parL_shooter
+     else:
+          return etaInside*np.dot(-B_atShooter, receiverTo - shooter)/norm(receiverTo - shooter) + etaMin*parL_shooter
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_recCr1(muk, muk1, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1, etak, etak1):
+     '''
+     Partial of the objective function of the "next" receiver that creeps to a shooter
+     '''
+     zk = hermite_boundary(muk, x0, B0k, xk, Bk)
+     yk1 = hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
+     B0k1_muk1 = gradientBoundary(muk1, x0, B0k1, xk1, Bk1)
+     secondDer_B0k1_lamk1 = secondDer_Boundary(lamk1, x0, B0k1, xk1, Bk1)
+     B0k1_halves = gradientBoundary( (muk1 + lamk1)/2, x0, B0k1, xk1, Bk1)
+     secondDer_B0k1halves_lamk1 = secondDer_Boundary((muk1 + lamk1)/2, x0, B0k1, xk1, Bk1)
+     B0k1_lamk1 = gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
+     perL_lamk1 = partial_L_lamk(muk1, lamk1, B0k1_muk1, B0k1_halves, secondDer_B0k1halves_lamk1, B0k1_lamk1, secondDer_B0k1_lamk1)
+     etaMin = min(etak, etak1)
+     if( np.all(yk1 == zk) ):
+          return etaMin*perL_lamk1
+     else:
+          return etak*np.dot(B0k1_lamk1, yk1 - zk)/norm(yk1 - zk) + etaMin*perL_lamk1
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_recSt(shFrom, shTo, rec, x0From, B0From, x1From, B1From, x0To, B0To, x1To, B1To, etaInside, etaOutside):
+     '''
+     Partial of the objective function (generalized) with respect to a RECEIVER that shoots directly (with
+     a straight line) to a shooter
+     '''
+     shooterFrom = hermite_boundary(shFrom, x0From, B0From, x1From, B1From)
+     receiver = hermite_boundary(rec, x0To, B0To, x1To, B1To)
+     shooterTo = hermite_boundary(shTo, x0To, B0To, x1To, B1To)
+     B_atReceiver = gradientBoundary(rec, x0To, B0To, x1To, B1To)
+     if( rec == 0 and shTo == 0 and shFrom == 0):
+          return 0.0
+     elif( np.all(shooterTo == receiver) and np.any(receiver != shooterFrom) ):
+          return etaOutside*np.dot(B_atReceiver, receiver - shooterFrom)/norm( receiver - shooterFrom)
+     elif( np.all(receiver == shooterFrom)  ):
+          return etaInside*np.dot(- B_atReceiver, shooterTo - receiver)/norm(shooterTo - receiver)
+     else:
+          return etaOutside*np.dot(B_atReceiver, receiver - shooterFrom)/norm( receiver - shooterFrom) + etaInside*np.dot(- B_atReceiver, shooterTo - receiver)/norm(shooterTo - receiver)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_shSt(sh, recFrom, recTo, x0From, B0From, x1From, B1From, x0To, B0To, x1To, B1To, etaInside, etaOutside):
+     '''
+     Partial of the objective function (generalized) with respect to a SHOOTER that comes from a straight ray
+     from a receiver and shoots in a straight line to another receiver
+     '''
+     receiverFrom = hermite_boundary(recFrom, x0From, B0From, x1From, B1From)
+     shooter = hermite_boundary(sh, x0From, B0From, x1From, B1From)
+     receiverTo = hermite_boundary(recTo, x0To, B0To, x1To, B1To)
+     B_atShooter = gradientBoundary(sh, x0From, B0From, x1From, B1From)
+     if( sh == 0 and recFrom == 0 and recTo == 0 ):
+          return 0.0
+     elif( np.all(receiverTo == shooter) and np.any(shooter != receiverFrom) ):
+          return etaOutside*np.dot( B_atShooter, shooter - receiverFrom)/norm(shooter - receiverFrom)
+     elif( np.all(shooter == receiverFrom) ):
+          return etaInside*np.dot( -B_atShooter, receiverTo - shooter)/norm(receiverTo - shooter)
+     else:
+          return etaOutside*np.dot( B_atShooter, shooter - receiverFrom)/norm(shooter - receiverFrom) + etaInside*np.dot( -B_atShooter, receiverTo - shooter)/norm(receiverTo - shooter)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def partial_fObj_collapsedShooter(shFrom, sh, recTo, x0From, B0From, x1From, B1From, x0This, B0This, x1This, B1This, x0To, B0To, x1To, B1To, etaPrev, etaNext):
+     '''
+     Partial of the objective function (generalized) with respect to a "COLLAPSED SHOOTER" (one where both
+     the shooter and a receiver on an edge have collapsed to the same point)
+     '''
+     shooterFrom = hermite_boundary(shFrom, x0From, B0From, x1From, B1From)
+     collapsedShooter = hermite_boundary(sh, x0This, B0This, x1This, B1This)
+     B_collapsedShooter = gradientBoundary(sh, x0This, B0This, x1This, B1This)
+     receiverTo = hermite_boundary(recTo, x0To, B0To, x1To, B1To)
+     if( np.all(shooterFrom == collapsedShooter) and  np.all( receiverTo == collapsedShooter) ):
+          return 0.0
+     elif( np.all(shooterFrom == collapsedShooter) and np.any(receiverTo != collapsedShooter) ):
+          return etaNext*np.dot( -B_collapsedShooter, receiverTo - collapsedShooter)/norm( receiverTo - collapsedShooter)
+     elif( np.all( receiverTo == collapsedShooter) and np.any( shooterFrom != collapsedShooter) ):
+          return etaPrev*np.dot( B_collapsedShooter, collapsedShooter - shooterFrom)/norm(collapsedShooter - shooterFrom)
+     else:
+          return etaPrev*np.dot( B_collapsedShooter, collapsedShooter - shooterFrom)/norm(collapsedShooter - shooterFrom) + etaNext*np.dot( -B_collapsedShooter, receiverTo - collapsedShooter)/norm( receiverTo - collapsedShooter)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listxk, listB0k, listBk, listBkBk1,
+                     indCrTop, paramsCrTop, indStTop, paramsStTop):
+     '''
+     Generalized objective function for when the tops on the triangle fan are also parametric curves.
+     Same as optiPython.fObj_generalized
+     '''
+     currentCrTop = 0
+     currentStTop = 0
+     n = len(listxk) - 2
+     muk = params[0]
+     etak = listIndices[0]
+     Bk = listBk[0]
+     B0k = listB0k[0]
+     zk = hermite_boundary(muk, x0, B0k, x1, Bk)
+     sum = hermite_interpolationT(muk, x0, T0, grad0, x1, T1, grad1)
+     for j in range(1, n+1):
+          k = 2*j - 1  # Starts in k = 1, all the way to k = 2n - 1
+          nTop = j # Number of boundary on the top that we are considering
+          lamk = params[k]
+          muk = params[k+1]
+          B0k = listB0k[j]
+          xkM1 = listxk[j]
+          xk = listxk[j+1]
+          Bk = listBk[j]
+          BkBk1_0 = listBkBk1[k-1] # grad of hkhk1 at xk
+          BkBk1_1 = listBkBk1[k] # grad of hkhk1 at xk1
+          etakPrev = etak
+          etak = listIndices[j]
+          etaMin = min(etakPrev, etak)
+          # Compute the points
+          zkPrev = zk
+          zk = hermite_boundary(muk, x0, B0k, xk, Bk)
+          yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
+          if( nTop == indCrTop[currentCrTop] ):
+               # zkPrev shoots to ak, creeps to bk, shoots to yk and creeps to zk
+               etaRegionOutside = listIndices[n + j]
+               etaMinCr = min(etaRegionOutside, etakPrev)
+               rk = paramsCrTop[2*currentCrTop]
+               sk = paramsCrTop[2*currentCrTop + 1]
+               ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+               bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+               sum += etakPrev*norm( ak - zkPrev )
+               sum += etaMinCr*arclengthSimpson(rk, sk, xkM1, BkBk1_0, xk, BkBk1_1)
+               sum += etakPrev*norm( yk - bk )
+               sum += etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+               if (currentCrTop  < len(indCrTop) - 1):
+                    currentCrTop += 1
+          elif( nTop == indStTop[currentStTop]):
+               # zkPrev shoots to ak, goes straight to bk, shoots to yk and creeps to zk
+               etaRegionOutside = listIndices[n + j]
+               rk = paramsStTop[2*currentStTop]
+               sk = paramsStTop[2*currentStTop + 1]
+               ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+               bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+               sum += etakPrev*norm( ak - zkPrev )
+               sum += etaRegionOutside*norm( bk - ak )
+               sum += etakPrev*norm( yk - bk )
+               sum += etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+               if (currentStTop  < len(indStTop) - 1):
+                    currentStTop += 1
+          else:
+               sum += etakPrev*norm(yk - zkPrev) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+     return sum
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def fObj_regionTerm(j, params, x0, T0, grad0, x1, T1, grad1, listIndices, listxk, listB0k, listBk, listBkBk1,
+                    topType, rk, sk):
+     '''
+     Term of the generalized objective function that corresponds to the j-th region of the triangle fan
+     (j = 0 is the Hermite interpolation of T on h0h1). Same as optiPython.fObj_regionTerm
+     '''
+     if( j == 0 ):
+          return hermite_interpolationT(params[0], x0, T0, grad0, x1, T1, grad1)
+     n = len(listxk) - 2
+     k = 2*j - 1
+     mukM1 = params[k-1]
+     lamk = params[k]
+     muk = params[k+1]
+     if( j == 1 ):
+          zkPrev = hermite_boundary(mukM1, x0, listB0k[0], x1, listBk[0])
+     else:
+          zkPrev = hermite_boundary(mukM1, x0, listB0k[j-1], listxk[j], listBk[j-1])
+     B0k = listB0k[j]
+     xkM1 = listxk[j]
+     xk = listxk[j+1]
+     Bk = listBk[j]
+     BkBk1_0 = listBkBk1[k-1]
+     BkBk1_1 = listBkBk1[k]
+     etakPrev = listIndices[j-1]
+     etak = listIndices[j]
+     etaMin = min(etakPrev, etak)
+     yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
+     if( topType == 1 ):
+          etaRegionOutside = listIndices[n + j]
+          etaMinCr = min(etaRegionOutside, etakPrev)
+          ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+          bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+          return etakPrev*norm( ak - zkPrev ) + etaMinCr*arclengthSimpson(rk, sk, xkM1, BkBk1_0, xk, BkBk1_1) + etakPrev*norm( yk - bk ) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+     elif( topType == 2 ):
+          etaRegionOutside = listIndices[n + j]
+          ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+          bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+          return etakPrev*norm( ak - zkPrev ) + etaRegionOutside*norm( bk - ak ) + etakPrev*norm( yk - bk ) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+     else:
+          return etakPrev*norm(yk - zkPrev) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def getPathGradEikonal(params, listIndices, listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop):
+     '''
+     Compute the gradient of the eikonal, straight rights. Same as optiPython.getPathGradEikonal
+     (indCrTop[0] == -1 or indStTop[0] == -1 mean that there are no points of that type on the tops)
+     '''
+     tolGrads = norm(listxk[0] - listxk[1])*0.0001
+     nGrads = len(params)  #  Number of gradients we need to compute
+     if( indStTop[0] != -1 ):
+          nGrads += 2*len(indStTop)
+     if( indCrTop[0] != -1 ):
+          nGrads += 2*len(indCrTop)
+     grads = np.zeros((nGrads, 2), dtype=np.float64)
+     path = np.zeros((nGrads, 2), dtype=np.float64)
+     currentCrTop = 0
+     currentStTop = 0
+     n = len(listxk) - 2
+     x0 = listxk[0]
+     path[0, :] = hermite_boundary(params[0], x0, listB0k[0], listxk[1], listBk[0])
+     currGrad = 0 # last point of the path so far
+     for j in range(1, n+1):
+          # Region j: from zkPrev (on h0hk) to yk and zk (on h0hk1), maybe through ak and bk on the top
+          lamk = params[2*j - 1]
+          muk = params[2*j]
+          B0k = listB0k[j]
+          xk = listxk[j+1]
+          Bk = listBk[j]
+          etakPrev = listIndices[j-1]
+          etak = listIndices[j]
+          topType = 0
+          rk = 0.0
+          sk = 0.0
+          # Same matching of the points on the tops as in fObj_generalized
+          if( j == indCrTop[currentCrTop] ):
+               topType = 1
+               rk = paramsCrTop[2*currentCrTop]
+               sk = paramsCrTop[2*currentCrTop + 1]
+               if( currentCrTop < len(indCrTop) - 1 ):
+                    currentCrTop += 1
+          elif( j == indStTop[currentStTop] ):
+               topType = 2
+               rk = paramsStTop[2*currentStTop]
+               sk = paramsStTop[2*currentStTop + 1]
+               if( currentStTop < len(indStTop) - 1 ):
+                    currentStTop += 1
+          zkPrev = path[currGrad].copy()
+          if( topType > 0 ):
+               xkM1 = listxk[j]
+               BkBk1_0 = listBkBk1[2*j - 2]
+               BkBk1_1 = listBkBk1[2*j - 1]
+               etaRegionOutside = listIndices[n + j]
+               ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+               bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+               if( norm(ak - zkPrev) > tolGrads ):
+                    grads[currGrad, :] = ((ak - zkPrev)/norm(ak - zkPrev))*etakPrev # Ray from zkPrev to ak
+               path[currGrad + 1, :] = ak
+               path[currGrad + 2, :] = bk
+               if( abs(rk - sk) > 0.01 and topType == 1 ):
+                    Bsk = gradientBoundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+                    grads[currGrad + 1, :] = (Bsk/norm(Bsk))*min(etaRegionOutside, etakPrev) # Creeping ray from ak to bk
+               elif( abs(rk - sk) > 0.01 ):
+                    grads[currGrad + 1, :] = ((bk - ak)/norm(bk - ak))*etaRegionOutside # Ray from ak to bk
+               currGrad += 2
+               zkPrev = bk
+          yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
+          if( norm(yk - zkPrev) > tolGrads ):
+               grads[currGrad, :] = ((yk - zkPrev)/norm(yk - zkPrev))*etakPrev # Ray to yk
+          path[currGrad + 1, :] = yk
+          path[currGrad + 2, :] = hermite_boundary(muk, x0, B0k, xk, Bk)
+          if( abs(lamk - muk) > 0.01 ):
+               Bmuk = gradientBoundary(muk, x0, B0k, xk, Bk)
+               grads[currGrad + 1, :] = (Bmuk/norm(Bmuk))*min(etakPrev, etak) # Creeping ray from yk to zk
+          currGrad += 2
+     return path, grads
+
+
+######## Types of the information of a triangle fan (not used yet, for a jitclass version of triangleFan)
+
+triInf = [
+     ('nRegions', int32),
+     ('params', float64[:]),
+     ('x0', float64[:]),
+     ('T0', float64),
+     ('grad0', float64[:]),
+     ('x1', float64[:]),
+     ('T1', float64),
+     ('grad1', float64[:]),
+     ('xHat', float64[:]),
+     ('listIndices', float64[:] ),
+     ('listxk', float64[:, :] ),
+     ('listB0k', float64[:, :] ),
+     ('listBk', float64[:, :] ),
+     ('listBkBk1', float64[:, :] ),
+     ('listCurvingInwards', int32[:] ),
+     ('optionsTop', int32[:, :]),
+     ('optiParams', float64[:]),
+     ('optiIndCrTop', int32[:]),
+     ('optiParamsCrTop', float64[:]),
+     ('nIndCrTop', int32),
+     ('optiIndStTop', int32[:]),
+     ('optiParamsStTop', float64[:]),
+     ('nIndStTop', int32),
+     ('opti_fVal', float64),
+     ('path', float64[:, :]),
+     ('grads', float64[:, :]),
+     ('lastGrad', float64[:]),
+     ('plotBefore', int32),
+     ('plotAfter', int32),
+     ('plotOpti', int32),
+     ('maxIter', int32),
+     ('tol', float64),
+     ('plotSteps', boolean),
+     ('saveIterates', boolean)
+     ]
@@ -0,0 +1,167 @@
+# Plots for optiPython. Kept apart from the optimizer so that importing optiPython
+# (the marcher imports it for every fan worker) doesn't import matplotlib, colorcet
+# and intermediateTests. optiPython imports this module the first time it plots something.
+
+import matplotlib.pyplot as plt
+import numpy as np
+from numpy.linalg import norm
+import intermediateTests as itt
+import colorcet as cc
+import matplotlib.colors as clr
+import optiPython as oP
+
+colormap2 = "cet_linear_worb_100_25_c53_r"
+colormap2_r = "cet_linear_worb_100_25_c53"
+
+
+def plotFan(x0, listB0k, listxk, listBk, title, **kwargs):
+     '''
+     Plot a triangle fan (and the path given by the parameters in kwargs, see itt.plotFann) with a title
+     '''
+     itt.plotFann(x0, listB0k, listxk, listBk, **kwargs)
+     plt.title(title)
+
+
+def plotResults(x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listB0k, listxk,
+                listBk, params0, paramsOpt, listObjVals, listGradNorms, listChangefObj,
+                listChangeParams = None, trueSol = None, contours = True,
+                listBkBk1 = None, indCrTop = None, paramsCrTop0 = None, 
+                indStTop = None, paramsStTop0 = None, 
+                paramsCrTop = None, paramsStTop = None):
+     '''
+     Plots results from blockCoordinateGradient
+     '''
+     # First plot the original parameters
+     itt.plotFann(x0, listB0k, listxk, listBk, params = params0,
+                  listBkBk1 = listBkBk1, indCrTop = indCrTop,
+                  paramsCrTop = paramsCrTop0, indStTop = indStTop,
+                  paramsStTop = paramsStTop0)
+     plt.title("Initial parameters")
+     # Then plot the parameters found by this method
+     itt.plotFann(x0, listB0k, listxk, listBk, params = paramsOpt,
+                  listBkBk1 = listBkBk1, indCrTop = indCrTop,
+                  paramsCrTop = paramsCrTop, indStTop = indStTop,
+                  paramsStTop = paramsStTop)
+     plt.title("Optimal parameters found")
+     # Now plot the function value at each iteration
+     fig = plt.figure(figsize=(800/96, 800/96), dpi=96) 
+     plt.semilogy( range(0, len(listChangefObj)), listChangefObj, c = "#394664", linewidth = 0.8)
+     plt.xlabel("Iteration")
+     plt.ylabel("Change of function value")
+     plt.title("Change of function value at each iteration")
+     # Now plot the function value at each iteration
+     fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
+     plt.semilogy( range(0, len(listObjVals)), listObjVals, c = "#396064", linewidth = 0.8)
+     plt.xlabel("Iteration")
+     plt.ylabel("Function value")
+     plt.title("Function value at each iteration")
+     # Now plot the norm of the gradient at each iteration
+     fig = plt.figure(figsize=(800/96, 800/96), dpi=96) 
+     plt.semilogy( range(0, len(listGradNorms)), listGradNorms, c = "#4d3964", linewidth = 0.8)
+     plt.xlabel("Iteration")
+     plt.ylabel("Norm of (sub)gradient")
+     plt.title("Norm of (sub)gradient at each iteration")
+     # Plot the change in the parameters
+     fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
+     plt.semilogy( range(0, len(listChangeParams)), listChangeParams, c = "#394664", linewidth = 0.8)
+     plt.xlabel("Iteration")
+     plt.ylabel("Norm of change in parameters")
+     plt.title("Norm of change in parameters at each iteration")
+     # For pairs of parameters MU AND LAMBDA
+     nRegions = len(listxk) - 2
+     fObjMesh = np.empty((200,200))
+     for k in range(2*nRegions - 1):
+          # We plot level sets by changins sequential parameters (2 at a time)
+          param1, param2 = np.meshgrid( np.linspace(0,1,200), np.linspace(0,1,200) )
+          # Compute the solution, compute this level set
+          for i in range(200):
+               for j in range(200):
+                    p1 = param1[i,j]
+                    p2 = param2[i,j]
+                    paramsMesh = np.copy(paramsOpt)
+                    paramsMesh[k] = p1
+                    paramsMesh[k+1] = p2
+                    fObjMesh[i,j] = oP.fObj_generalized(paramsMesh, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                                     listxk, listB0k, listBk, listBkBk1,
+                                                     indCrTop = indCrTop, paramsCrTop = paramsCrTop,
+                                                     indStTop = indStTop, paramsStTop = paramsStTop)
+          # Plot it
+          fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
+          im = plt.imshow(fObjMesh, cmap = colormap2, extent = [0,1,0,1], origin = "lower")
+          plt.scatter(paramsOpt[k], paramsOpt[k+1], c = "white", marker = "*", label = "optimum found")
+          if(contours):
+               plt.contour(param1[0, :], param1[0, :], fObjMesh, colors = ["white"], extent = [0,1,0,1], origin = "lower", levels = 30, linewidths = 0.5)
+          plt.title("Level set of objective function")
+          plt.xlabel("Parameter " + str(k))
+          plt.ylabel("Parameter " + str(k+1))
+          plt.legend()
+          plt.colorbar(im)
+     # For pairs of parameters R AND S for a creeping ray update
+     if( indCrTop is not None):
+          fObjMesh = np.empty((200,200))
+          for kCrTop in range(len(indCrTop)):
+               k = 2*kCrTop
+               # We plot level sets by changins sequential parameters (2 at a time)
+               rr, ss = np.meshgrid( np.linspace(0,1,200), np.linspace(0,1,200) )
+               # Compute the solution, compute this level set
+               for i in range(200):
+                    for j in range(200):
+                         rk = rr[i,j]
+                         sk = ss[i,j]
+                         paramsMesh = np.copy(paramsCrTop)
+                         paramsMesh[k] = rk
+                         paramsMesh[k+1] = sk
+                         fObjMesh[i,j] = oP.fObj_generalized(paramsOpt, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                                          listxk, listB0k, listBk, listBkBk1,
+                                                          indCrTop = indCrTop, paramsCrTop = paramsMesh,
+                                                          indStTop = indStTop, paramsStTop = paramsStTop)
+               # Plot it
+               fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
+               im = plt.imshow(fObjMesh, cmap = colormap2, extent = [0,1,0,1], origin = "lower")
+               plt.scatter(paramsCrTop[k], paramsCrTop[k+1], c = "white", marker = "*", label = "optimum found")
+               if(contours):
+                    plt.contour(rr[0, :], rr[0, :], fObjMesh, colors = ["white"], extent = [0,1,0,1], origin = "lower", levels = 30, linewidths = 0.5)
+               plt.title("Level set of objective function, parameters for creeping rays on side edges changed, r" + str(kCrTop+1) + " s" + str(kCrTop+1))
+               plt.xlabel("r" + str(kCrTop+1))
+               plt.ylabel("s" + str(kCrTop+1))
+               plt.legend()
+               plt.colorbar(im)
+     # For pairs of parameters R AND S for a creeping ray update
+     if( indStTop is not None):
+          fObjMesh = np.empty((200,200))
+          for kStTop in range(len(indStTop)):
+               k = 2*kStTop
+               # We plot level sets by changins sequential parameters (2 at a time)
+               rr, ss = np.meshgrid( np.linspace(0,1,200), np.linspace(0,1,200) )
+               # Compute the solution, compute this level set
+               for i in range(200):
+                    for j in range(200):
+                         rk = rr[i,j]
+                         sk = ss[i,j]
+                         paramsMesh = np.copy(paramsStTop)
+                         paramsMesh[k] = rk
+                         paramsMesh[k+1] = sk
+                         fObjMesh[i,j] = oP.fObj_generalized(paramsOpt, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                                          listxk, listB0k, listBk, listBkBk1,
+                                                          indCrTop = indCrTop, paramsCrTop = paramsCrTop,
+                                                          indStTop = indStTop, paramsStTop = paramsMesh)
+               # Plot it
+               fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
+               im = plt.imshow(fObjMesh, cmap = colormap2, extent = [0,1,0,1], origin = "lower")
+               plt.scatter(paramsStTop[k], paramsStTop[k+1], c = "white", marker = "*", label = "optimum found")
+               if(contours):
+                    plt.contour(rr[0, :], ss[0, :], fObjMesh, colors = ["white"], extent = [0,1,0,1], origin = "lower", levels = 30, linewidths = 0.5)
+               plt.title("Level set of objective function, parameters for straight rays on side edges changed, r" + str(kStTop) + " s" + str(kStTop))
+               plt.xlabel("r" + str(k))
+               plt.ylabel("s" + str(k+1))
+               plt.legend()
+               plt.colorbar(im)
+     # If we know the true solution for this triangle fan, plot the decrease in the error
+     if trueSol is not None:
+          errRel = np.array(listObjVals)
+          errRel = abs(errRel-trueSol)/trueSol
+          fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
+          plt.semilogy( range(0, len(listObjVals)), errRel, c = "#00011f", linewidth = 0.8)
+          plt.xlabel("Iteration")
+          plt.ylabel("Relative error")
+          plt.title("Relative error at each iteration")
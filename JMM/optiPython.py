@@ -2,22 +2,33 @@
 # we test the projected coordinate gradient descent here
 # to make sure it works or it makes sense to try this approach
 
-import pdb # FOR DEBUGGING
-
-import matplotlib.pyplot as plt
 import numpy as np
 from numpy.linalg import norm
-from math import sqrt, pi, cos, sin
-import intermediateTests as itt
-from scipy.optimize import root_scalar # to project back blocks [mu_k, lambda_k+1]
-import colorcet as cc
-import matplotlib.colors as clr
+from math import sqrt, pi, cos, sin, isfinite
 import json
-from numba import njit, types, int32, float64, boolean
-from numba.experimental import jitclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import threading
+from time import perf_counter
+
+# The plots (matplotlib, colorcet, intermediateTests) are in optiPlots.py, which we
+# only import if we plot something (plotBefore, plotAfter, plotOpti or plotSteps)
+plotNames = ['plotResults', 'plotFan', 'plt', 'itt', 'cc', 'clr', 'colormap2', 'colormap2_r']
+
+def plotting():
+     '''
+     optiPlots, imported the first time we need it
+     '''
+     import optiPlots
+     return optiPlots
 
-colormap2 = "cet_linear_worb_100_25_c53_r"
-colormap2_r = "cet_linear_worb_100_25_c53"
+def __getattr__(name):
+     '''
+     optiPython.plotResults (and the rest of plotNames) as before the plots were moved to optiPlots
+     '''
+     if( name in plotNames ):
+          return getattr(plotting(), name)
+     raise AttributeError("module 'optiPython' has no attribute " + repr(name))
 
 
 #@njit
@@ -25,9 +36,9 @@ def arclengthSimpson(mu, lam, xFrom, Bfrom, xTo, Bto):
      '''
      arclength along a boundary from xLam to xMu
      '''
-     Bmu = itt.gradientBoundary(mu, xFrom, Bfrom, xTo, Bto)
-     Blam = itt.gradientBoundary(lam, xFrom, Bfrom, xTo, Bto)
-     B_mid = itt.gradientBoundary((mu + lam)/2, xFrom, Bfrom, xTo, Bto)
+     Bmu = gradientBoundary(mu, xFrom, Bfrom, xTo, Bto)
+     Blam = gradientBoundary(lam, xFrom, Bfrom, xTo, Bto)
+     B_mid = gradientBoundary((mu + lam)/2, xFrom, Bfrom, xTo, Bto)
      return (norm(Bmu) + 4*norm(B_mid) + norm(Blam))*(abs(mu - lam)/6)
 
 
@@ -125,6 +136,256 @@ def findRtan(r, xkM1, xk, BkM1Bk_0, BkM1Bk_1, pointFrom):
      N_tan = np.array([-BkM1Bk_tan[1], BkM1Bk_tan[0]])
      return np.dot(N_tan, a_tan - pointFrom)
 
+## Closed form versions of t1, t2, t3, t4 and findRtan. The boundaries are cubic Hermite
+## curves so all of these are polynomials in the parameter (degree 3 if the direction is fixed,
+## degree 4 if it is the tangent to the boundary), we find all their roots at once
+
+def hermiteCoefficients(xFrom, Bfrom, xTo, Bto):
+     '''
+     Coefficients (highest power first, as in np.polyval) of the Hermite interpolation of the boundary,
+     one column per coordinate
+     '''
+     return np.array([2*xFrom + Bfrom - 2*xTo + Bto, -3*xFrom - 2*Bfrom + 3*xTo - Bto, Bfrom, xFrom])
+
+def crossPolynomial(P, Q):
+     '''
+     Coefficients of P[0]*Q[1] - P[1]*Q[0] where P, Q are polynomials with coefficients
+     in columns
+     '''
+     return np.convolve(P[:, 0], Q[:, 1]) - np.convolve(P[:, 1], Q[:, 0])
+
+class hermiteEdge:
+     '''
+     Coefficients of the Hermite interpolation of a boundary edge and of its derivatives (highest
+     power first), evaluated with Horner's scheme. Also the coefficients of h'(r) x h(r), which is
+     the part of t2, t3 and findRtan that doesn't depend on the point
+     '''
+     def __init__(self, xFrom, Bfrom, xTo, Bto):
+          self.coefs = hermiteCoefficients(xFrom, Bfrom, xTo, Bto)
+          self.derCoefs = self.coefs[:-1]*np.array([[3], [2], [1]])
+          self.secondDerCoefs = self.derCoefs[:-1]*np.array([[2], [1]])
+          self.tangentCross = crossPolynomial(self.derCoefs, self.coefs)
+
+     def boundary(self, param):
+          '''
+          Same as hermite_boundary
+          '''
+          c = self.coefs
+          return ((c[0]*param + c[1])*param + c[2])*param + c[3]
+
+     def gradient(self, param):
+          '''
+          Same as gradientBoundary
+          '''
+          c = self.derCoefs
+          return (c[0]*param + c[1])*param + c[2]
+
+     def secondDer(self, param):
+          '''
+          Same as secondDer_Boundary
+          '''
+          c = self.secondDerCoefs
+          return c[0]*param + c[1]
+
+     def fixedDirectionPolynomial(self, point, direction):
+          '''
+          direction[0]*(h(r)[1] - point[1]) - direction[1]*(h(r)[0] - point[0])
+          '''
+          poly = direction[0]*self.coefs[:, 1] - direction[1]*self.coefs[:, 0]
+          poly[-1] -= direction[0]*point[1] - direction[1]*point[0]
+          return poly
+
+     def tangentDirectionPolynomial(self, point):
+          '''
+          h'(r)[0]*(h(r)[1] - point[1]) - h'(r)[1]*(h(r)[0] - point[0])
+          '''
+          poly = np.copy(self.tangentCross)
+          poly[-3:] -= self.derCoefs[:, 0]*point[1] - self.derCoefs[:, 1]*point[0]
+          return poly
+
+class hermiteTable:
+     '''
+     hermiteEdge of the boundary edges we've seen, by their end points and tangents. A triangle fan
+     adds all of its edges when it's set up (x0 -> xk with B0k, Bk and the top edges xk -> xk1 with
+     BkBk1) so that the projections don't rebuild the coefficients on every call
+     '''
+     def __init__(self, maxSize = 4096):
+          self.maxSize = maxSize
+          self.edges = {}
+
+     def edge(self, xFrom, Bfrom, xTo, Bto):
+          '''
+          hermiteEdge from xFrom to xTo (computed and saved if we haven't seen it)
+          '''
+          key = np.concatenate( (xFrom, Bfrom, xTo, Bto) ).tobytes()
+          edge = self.edges.get(key)
+          if( edge is None ):
+               if( len(self.edges) >= self.maxSize ):
+                    self.edges = {}
+               edge = hermiteEdge(xFrom, Bfrom, xTo, Bto)
+               self.edges[key] = edge
+          return edge
+
+     def addFan(self, x0, listxk, listB0k, listBk, listBkBk1):
+          '''
+          Precompute all the edges of a triangle fan
+          '''
+          n = len(listxk) - 2
+          for k in range(n + 1):
+               self.edge(x0, listB0k[k], listxk[k + 1], listBk[k])
+          for k in range(n):
+               self.edge(listxk[k + 1], listBkBk1[2*k], listxk[k + 2], listBkBk1[2*k + 1])
+
+hermiteEdges = hermiteTable()
+
+def fixedDirectionPolynomial(xFrom, Bfrom, xTo, Bto, point, direction):
+     '''
+     direction[0]*(h(r)[1] - point[1]) - direction[1]*(h(r)[0] - point[0]), the polynomial
+     version of t1 and (up to sign) t4
+     '''
+     return hermiteEdges.edge(xFrom, Bfrom, xTo, Bto).fixedDirectionPolynomial(point, direction)
+
+def tangentDirectionPolynomial(xFrom, Bfrom, xTo, Bto, point):
+     '''
+     h'(r)[0]*(h(r)[1] - point[1]) - h'(r)[1]*(h(r)[0] - point[0]), the polynomial version
+     of t2, findRtan and (up to sign) t3
+     '''
+     return hermiteEdges.edge(xFrom, Bfrom, xTo, Bto).tangentDirectionPolynomial(point)
+
+def polynomialRoots_batch(listPolys):
+     '''
+     Roots of all the polynomials in listPolys as eigenvalues of their companion matrices,
+     polynomials of the same degree are solved in a single call
+     '''
+     listRoots = [np.zeros(0, dtype=complex) for i in range(len(listPolys))]
+     byDegree = {}
+     for i, poly in enumerate(listPolys):
+          poly = np.asarray(poly, dtype=float)
+          scale = np.max(np.abs(poly)) if len(poly) > 0 else 0
+          if( not scale > 0 ):
+               # Zero polynomial or nan coefficients (degenerate edges), no roots
+               continue
+          # Trim the leading coefficients that are numerically zero
+          nz = np.flatnonzero( np.abs(poly) > 1e-12*scale )[0]
+          poly = poly[nz:]
+          if( len(poly) > 1 ):
+               byDegree.setdefault(len(poly) - 1, []).append( (i, poly/poly[0]) )
+     for deg, polys in byDegree.items():
+          companions = np.zeros((len(polys), deg, deg))
+          companions[:, 0, :] = -np.array([poly[1:] for i, poly in polys])
+          companions[:, np.arange(1, deg), np.arange(0, deg - 1)] = 1
+          roots = np.linalg.eigvals(companions)
+          for j, (i, poly) in enumerate(polys):
+               listRoots[i] = roots[j]
+     return listRoots
+
+def secantLimit(poly, start0 = 0.4, start1 = 0.5, maxIter = 50, tol = 1.48e-8):
+     '''
+     Where the secant method started at start0, start1 ends on the polynomial poly (same steps as
+     root_scalar(method = "secant"), which is what the projections used), nan if it doesn't converge
+     '''
+     coefficients = [float(c) for c in poly]
+     def polyval(x):
+          # Horner's scheme, as np.polyval (with floats, this is called a lot)
+          y = 0.0
+          for c in coefficients:
+               y = y*x + c
+          return y
+     p0, p1 = start0, start1
+     q0, q1 = polyval(p0), polyval(p1)
+     if( abs(q1) < abs(q0) ):
+          p0, p1, q0, q1 = p1, p0, q1, q0
+     for i in range(maxIter):
+          if( q1 == q0 or not isfinite(q1) ):
+               return np.nan
+          try:
+               if( abs(q1) > abs(q0) ):
+                    p = (-q0/q1*p1 + p0)/(1 - q0/q1)
+               else:
+                    p = (-q1/q0*p0 + p1)/(1 - q1/q0)
+          except ZeroDivisionError:
+               # numpy would give an infinite step, the next value isn't finite either
+               return np.nan
+          if( abs(p - p1) <= tol ):
+               return p
+          p0, q0 = p1, q1
+          p1 = p
+          q1 = polyval(p1)
+     return np.nan
+
+def secantLimit_batch(listPolys, start0 = 0.4, start1 = 0.5, maxIter = 50, tol = 1.48e-8):
+     '''
+     secantLimit for each polynomial of listPolys (nan if it doesn't converge), all the polynomials take
+     their steps at the same time (the shorter ones are padded with zeros)
+     '''
+     degree = max([len(poly) for poly in listPolys] + [1])
+     coefficients = np.zeros((len(listPolys), degree))
+     for i, poly in enumerate(listPolys):
+          coefficients[i, degree - len(poly):] = poly
+     def polyval(x, ind):
+          # Horner's scheme, as np.polyval
+          y = np.zeros(len(ind))
+          for c in coefficients[ind].T:
+               y = y*x + c
+          return y
+     p0, p1 = np.full(len(listPolys), start0), np.full(len(listPolys), start1)
+     with np.errstate(all = 'ignore'):
+          ind = np.arange(len(listPolys))
+          q0, q1 = polyval(p0, ind), polyval(p1, ind)
+          swap = np.abs(q1) < np.abs(q0)
+          p0, p1, q0, q1 = np.where(swap, p1, p0), np.where(swap, p0, p1), np.where(swap, q1, q0), np.where(swap, q0, q1)
+          limits = np.full(len(listPolys), np.nan)
+          for i in range(maxIter):
+               ind = ind[ (q1[ind] != q0[ind]) & np.isfinite(q1[ind]) ]
+               if( len(ind) == 0 ):
+                    break
+               ratio = np.where(np.abs(q1[ind]) > np.abs(q0[ind]), q0[ind]/q1[ind], q1[ind]/q0[ind])
+               p = np.where(np.abs(q1[ind]) > np.abs(q0[ind]), (-ratio*p1[ind] + p0[ind])/(1 - ratio),
+                            (-ratio*p0[ind] + p1[ind])/(1 - ratio))
+               converged = np.abs(p - p1[ind]) <= tol
+               limits[ind[converged]] = p[converged]
+               ind, p = ind[~converged], p[~converged]
+               p0[ind], q0[ind] = p1[ind], q1[ind]
+               p1[ind] = p
+               q1[ind] = polyval(p, ind)
+     return limits
+
+def selectRoot(poly, roots, current, limit, bracket = False, tolRoot = 1e-6):
+     '''
+     From the roots of the polynomial poly pick the real one that the secant method started at 0.4, 0.5
+     reaches (limit, from secantLimit, the companion matrix gives it to machine precision). If the secant
+     method doesn't reach a real root (the polynomial doesn't vanish near [0,1]) we keep current. With
+     bracket we pick a real root in [0,1] where poly changes sign instead (as root_scalar with bracket = [0,1])
+     '''
+     if( bracket ):
+          realRoots = roots.real[ (np.abs(roots.imag) <= tolRoot) & (roots.real >= 0) & (roots.real <= 1) ]
+          if( np.polyval(poly, 0)*np.polyval(poly, 1) > 0 or len(realRoots) == 0 ):
+               return current
+          return realRoots[np.argmin(np.abs(realRoots - 0.5))]
+     if( np.isnan(limit) ):
+          return current
+     if( len(roots) > 0 ):
+          closest = roots[np.argmin(np.abs(roots - limit))]
+          if( abs(closest - limit) <= tolRoot ):
+               return closest.real
+     return limit
+
+def projectionRoots(listPolys, currents, brackets = None, limits = None):
+     '''
+     Roots used in the projections for all the polynomials in listPolys, in one call. currents are the
+     values to keep if a polynomial doesn't have a real root there, brackets if the root has to be
+     in [0,1] (see selectRoot). limits (where the secant method ends) are computed one polynomial at a
+     time if they are not given, secantLimit_batch is faster for long lists
+     '''
+     if( brackets is None ):
+          brackets = [False]*len(listPolys)
+     listPolys = [np.asarray(poly, dtype=float) for poly in listPolys]
+     if( limits is None ):
+          limits = [secantLimit(poly) for poly in listPolys]
+     return [selectRoot(poly, roots, current, limit, bracket)
+             for poly, roots, current, limit, bracket in zip(listPolys, polynomialRoots_batch(listPolys), currents,
+                                                              limits, brackets)]
+
 
 ##########
 ## THESE ARE THE AUXILIARY FUNCTIONS FOR THE BLOCK COORDINATE PROJECTED GRADIENT DESCENT
@@ -179,9 +440,9 @@ def partial_fObj_recCr(shFrom, shTo, rec, x0From, B0From, x1From, B1From, x0To,
      receiver = hermite_boundary(rec, x0To, B0To, x1To, B1To)
      B_atShooterTo = gradientBoundary(shTo, x0To, B0To, x1To, B1To)
      B_atReceiver = gradientBoundary(rec, x0To, B0To, x1To, B1To)
-     secondDer_B_atReceiver = itt.secondDer_Boundary(rec, x0To, B0To, x1To, B1To)
+     secondDer_B_atReceiver = secondDer_Boundary(rec, x0To, B0To, x1To, B1To)
      B_halves = gradientBoundary( (shTo + rec)/2, x0To, B0To, x1To, B1To)
-     secondDer_Bhalves_atReceiver = itt.secondDer_Boundary( (shTo + rec)/2, x0To, B0To, x1To, B1To)
+     secondDer_Bhalves_atReceiver = secondDer_Boundary( (shTo + rec)/2, x0To, B0To, x1To, B1To)
      perL_receiver = partial_L_lamk(shTo, rec, B_atShooterTo, B_halves, secondDer_Bhalves_atReceiver, B_atReceiver, secondDer_B_atReceiver)
      etaMin = min(etaInside, etaOutside)
      if( np.all(receiver == shooterFrom) ):
@@ -198,9 +459,9 @@ def partial_fObj_shCr(sh, recFrom, recTo, x0From, B0From, x1From, B1From, x0To,
      shooter = hermite_boundary(sh, x0From, B0From, x1From, B1From)
      receiverTo = hermite_boundary(recTo, x0To, B0To, x1To, B1To)
      B_atShooter = gradientBoundary(sh, x0From, B0From, x1From, B1From)
-     secondDer_B_atShooter = itt.secondDer_Boundary(sh, x0From, B0From, x1From, B1From)
+     secondDer_B_atShooter = secondDer_Boundary(sh, x0From, B0From, x1From, B1From)
      B_halves = gradientBoundary( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
-     secondDer_Bhalves_atShooter = itt.secondDer_Boundary( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
+     secondDer_Bhalves_atShooter = secondDer_Boundary( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
      B_atReceiver = gradientBoundary(recFrom, x0From, B0From, x1From, B1From)
      parL_shooter = partial_L_muk(sh, recFrom, B_atShooter, secondDer_B_atShooter, B_halves, secondDer_Bhalves_atShooter, B_atReceiver)
      etaMin = min(etaInside, etaOutside)
@@ -218,9 +479,9 @@ def partial_fObj_recCr1(muk, muk1, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1, etak,
      zk = hermite_boundary(muk, x0, B0k, xk, Bk)
      yk1 = hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
      B0k1_muk1 = gradientBoundary(muk1, x0, B0k1, xk1, Bk1)
-     secondDer_B0k1_lamk1 = itt.secondDer_Boundary(lamk1, x0, B0k1, xk1, Bk1)
+     secondDer_B0k1_lamk1 = secondDer_Boundary(lamk1, x0, B0k1, xk1, Bk1)
      B0k1_halves = gradientBoundary( (muk1 + lamk1)/2, x0, B0k1, xk1, Bk1)
-     secondDer_B0k1halves_lamk1 = itt.secondDer_Boundary((muk1 + lamk1)/2, x0, B0k1, xk1, Bk1)
+     secondDer_B0k1halves_lamk1 = secondDer_Boundary((muk1 + lamk1)/2, x0, B0k1, xk1, Bk1)
      B0k1_lamk1 = gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
      perL_lamk1 = partial_L_lamk(muk1, lamk1, B0k1_muk1, B0k1_halves, secondDer_B0k1halves_lamk1, B0k1_lamk1, secondDer_B0k1_lamk1)
      etaMin = min(etak, etak1)
@@ -310,6 +571,10 @@ def project_lamk1Givenmuk(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
     if( np.dot( Nk1_lamk1, x0 - xk) < 0):
          Nk1_lamk1 = -Nk1_lamk1
     
+    if( dotTestMin < 0 or dotTestMax < 0 ):
+        # lambdaMin and lambdaMax (roots of t1 and t2) at the same time
+        lamk1Min, lamk1Max = projectionRoots([fixedDirectionPolynomial(x0, B0k1, xk1, Bk1, zk, B0k_muk),
+                                             tangentDirectionPolynomial(x0, B0k1, xk1, Bk1, zk)], [lamk1, lamk1])
     #print("       dotTestMin: ", dotTestMin, "  dotTestMax: ", dotTestMax)
     # Test if lamk < lamMin
     if( dotTestMin < 0):
@@ -319,10 +584,7 @@ def project_lamk1Givenmuk(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
         # print("  B0k: ", B0k, "  xk: ", xk, "  Bk: ", Bk)
         # print("  B0k1: ", B0k1, "  xk1: ", xk1, "  Bk1: ", Bk1)
         # Means that we need to find lambdaMin
-        tMin = lambda lam: t1(lam, x0, xk1, B0k1, Bk1, zk, B0k_muk)
-        # Find the root of tMin
-        rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-        lamk1 = rootMin.root
+        lamk1 = lamk1Min
         yk1 = hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
         B0k1_lamk1 = gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
         Nk1_lamk1 = np.array([-B0k1_lamk1[1], B0k1_lamk1[0]])
@@ -337,9 +599,7 @@ def project_lamk1Givenmuk(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
         # print("  B0k: ", B0k, "  xk: ", xk, "  Bk: ", Bk)
         # print("  B0k1: ", B0k1, "  xk1: ", xk1, "  Bk1: ", Bk1)
         # Means that we need to find lambdaMax
-        tMax = lambda lam: t2(lam, x0, xk1, B0k1, Bk1, zk)
-        rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-        lamk1 = rootMax.root
+        lamk1 = lamk1Max
         #print("       lambda > lambdaMax")
     lamk1 = project_box(lamk1) # Such that 0<=lamk1 <=1
     return lamk1
@@ -368,15 +628,17 @@ def project_mukGivenlamk1(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
      # Compute the tests
      dotTestMin =  np.dot(N0k1_lamk1, yk1 - zk)
      dotTestMax = np.dot(N0k_muk, yk1 - zk)
+     if( dotTestMin < 0 or dotTestMax < 0 ):
+          # mukMin and mukMax (roots of t4 and t3) at the same time
+          mukMin, mukMax = projectionRoots([fixedDirectionPolynomial(x0, B0k, xk, Bk, yk1, B0k1_lamk1),
+                                            tangentDirectionPolynomial(x0, B0k, xk, Bk, yk1)], [muk, muk])
      if(dotTestMin<0 ):
           # print("  failed dotTestMin project muk given lamk1")
           # print("  zk: ", zk, "  yk1: ", yk1)
           # print("  muk: ", muk, " lamk1: ", lamk1)
           # print("  B0k: ", B0k, "  xk: ", xk, "  Bk: ", Bk)
           # print("  B0k1: ", B0k1, "  xk1: ", xk1, "  Bk1: ", Bk1)
-          tMin = lambda mu: t4(mu, x0, xk, B0k, Bk, yk1, B0k1_lamk1)
-          rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-          muk = rootMin.root
+          muk = mukMin
           zk = hermite_boundary(muk, x0, B0k, xk, Bk)
           B0k_muk = gradientBoundary(muk, x0, B0k, xk, Bk)
           N0k_muk = np.array([-B0k_muk[1], B0k_muk[0]])
@@ -389,9 +651,7 @@ def project_mukGivenlamk1(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
           # print("  muk: ", muk, " lamk1: ", lamk1)
           # print("  B0k: ", B0k, "  xk: ", xk, "  Bk: ", Bk)
           # print("  B0k1: ", B0k1, "  xk1: ", xk1, "  Bk1: ", Bk1)
-          tMax = lambda mu: t3(mu, x0, xk, B0k, Bk, yk1)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          muk = rootMax.root
+          muk = mukMax
      muk = project_box(muk)
      return muk
 
@@ -624,150 +884,6 @@ def get_sk(muk, lamk):
 
 
 
-def plotResults(x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listB0k, listxk,
-                listBk, params0, paramsOpt, listObjVals, listGradNorms, listChangefObj,
-                listChangeParams = None, trueSol = None, contours = True,
-                listBkBk1 = None, indCrTop = None, paramsCrTop0 = None, 
-                indStTop = None, paramsStTop0 = None, 
-                paramsCrTop = None, paramsStTop = None):
-     '''
-     Plots results from blockCoordinateGradient
-     '''
-     # First plot the original parameters
-     itt.plotFann(x0, listB0k, listxk, listBk, params = params0,
-                  listBkBk1 = listBkBk1, indCrTop = indCrTop,
-                  paramsCrTop = paramsCrTop0, indStTop = indStTop,
-                  paramsStTop = paramsStTop0)
-     plt.title("Initial parameters")
-     # Then plot the parameters found by this method
-     itt.plotFann(x0, listB0k, listxk, listBk, params = paramsOpt,
-                  listBkBk1 = listBkBk1, indCrTop = indCrTop,
-                  paramsCrTop = paramsCrTop, indStTop = indStTop,
-                  paramsStTop = paramsStTop)
-     plt.title("Optimal parameters found")
-     # Now plot the function value at each iteration
-     fig = plt.figure(figsize=(800/96, 800/96), dpi=96) 
-     plt.semilogy( range(0, len(listChangefObj)), listChangefObj, c = "#394664", linewidth = 0.8)
-     plt.xlabel("Iteration")
-     plt.ylabel("Change of function value")
-     plt.title("Change of function value at each iteration")
-     # Now plot the function value at each iteration
-     fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
-     plt.semilogy( range(0, len(listObjVals)), listObjVals, c = "#396064", linewidth = 0.8)
-     plt.xlabel("Iteration")
-     plt.ylabel("Function value")
-     plt.title("Function value at each iteration")
-     # Now plot the norm of the gradient at each iteration
-     fig = plt.figure(figsize=(800/96, 800/96), dpi=96) 
-     plt.semilogy( range(0, len(listGradNorms)), listGradNorms, c = "#4d3964", linewidth = 0.8)
-     plt.xlabel("Iteration")
-     plt.ylabel("Norm of (sub)gradient")
-     plt.title("Norm of (sub)gradient at each iteration")
-     # Plot the change in the parameters
-     fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
-     plt.semilogy( range(0, len(listChangeParams)), listChangeParams, c = "#394664", linewidth = 0.8)
-     plt.xlabel("Iteration")
-     plt.ylabel("Norm of change in parameters")
-     plt.title("Norm of change in parameters at each iteration")
-     # For pairs of parameters MU AND LAMBDA
-     nRegions = len(listxk) - 2
-     fObjMesh = np.empty((200,200))
-     for k in range(2*nRegions - 1):
-          # We plot level sets by changins sequential parameters (2 at a time)
-          param1, param2 = np.meshgrid( np.linspace(0,1,200), np.linspace(0,1,200) )
-          # Compute the solution, compute this level set
-          for i in range(200):
-               for j in range(200):
-                    p1 = param1[i,j]
-                    p2 = param2[i,j]
-                    paramsMesh = np.copy(paramsOpt)
-                    paramsMesh[k] = p1
-                    paramsMesh[k+1] = p2
-                    fObjMesh[i,j] = fObj_generalized(paramsMesh, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
-                                                     listxk, listB0k, listBk, listBkBk1,
-                                                     indCrTop = indCrTop, paramsCrTop = paramsCrTop,
-                                                     indStTop = indStTop, paramsStTop = paramsStTop)
-          # Plot it
-          fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
-          im = plt.imshow(fObjMesh, cmap = colormap2, extent = [0,1,0,1], origin = "lower")
-          plt.scatter(paramsOpt[k], paramsOpt[k+1], c = "white", marker = "*", label = "optimum found")
-          if(contours):
-               plt.contour(param1[0, :], param1[0, :], fObjMesh, colors = ["white"], extent = [0,1,0,1], origin = "lower", levels = 30, linewidths = 0.5)
-          plt.title("Level set of objective function")
-          plt.xlabel("Parameter " + str(k))
-          plt.ylabel("Parameter " + str(k+1))
-          plt.legend()
-          plt.colorbar(im)
-     # For pairs of parameters R AND S for a creeping ray update
-     if( indCrTop is not None):
-          fObjMesh = np.empty((200,200))
-          for kCrTop in range(len(indCrTop)):
-               k = 2*kCrTop
-               # We plot level sets by changins sequential parameters (2 at a time)
-               rr, ss = np.meshgrid( np.linspace(0,1,200), np.linspace(0,1,200) )
-               # Compute the solution, compute this level set
-               for i in range(200):
-                    for j in range(200):
-                         rk = rr[i,j]
-                         sk = ss[i,j]
-                         paramsMesh = np.copy(paramsCrTop)
-                         paramsMesh[k] = rk
-                         paramsMesh[k+1] = sk
-                         fObjMesh[i,j] = fObj_generalized(paramsOpt, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
-                                                          listxk, listB0k, listBk, listBkBk1,
-                                                          indCrTop = indCrTop, paramsCrTop = paramsMesh,
-                                                          indStTop = indStTop, paramsStTop = paramsStTop)
-               # Plot it
-               fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
-               im = plt.imshow(fObjMesh, cmap = colormap2, extent = [0,1,0,1], origin = "lower")
-               plt.scatter(paramsCrTop[k], paramsCrTop[k+1], c = "white", marker = "*", label = "optimum found")
-               if(contours):
-                    plt.contour(rr[0, :], rr[0, :], fObjMesh, colors = ["white"], extent = [0,1,0,1], origin = "lower", levels = 30, linewidths = 0.5)
-               plt.title("Level set of objective function, parameters for creeping rays on side edges changed, r" + str(kCrTop+1) + " s" + str(kCrTop+1))
-               plt.xlabel("r" + str(kCrTop+1))
-               plt.ylabel("s" + str(kCrTop+1))
-               plt.legend()
-               plt.colorbar(im)
-     # For pairs of parameters R AND S for a creeping ray update
-     if( indStTop is not None):
-          fObjMesh = np.empty((200,200))
-          for kStTop in range(len(indStTop)):
-               k = 2*kStTop
-               # We plot level sets by changins sequential parameters (2 at a time)
-               rr, ss = np.meshgrid( np.linspace(0,1,200), np.linspace(0,1,200) )
-               # Compute the solution, compute this level set
-               for i in range(200):
-                    for j in range(200):
-                         rk = rr[i,j]
-                         sk = ss[i,j]
-                         paramsMesh = np.copy(paramsStTop)
-                         paramsMesh[k] = rk
-                         paramsMesh[k+1] = sk
-                         fObjMesh[i,j] = fObj_generalized(paramsOpt, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
-                                                          listxk, listB0k, listBk, listBkBk1,
-                                                          indCrTop = indCrTop, paramsCrTop = paramsCrTop,
-                                                          indStTop = indStTop, paramsStTop = paramsMesh)
-               # Plot it
-               fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
-               im = plt.imshow(fObjMesh, cmap = colormap2, extent = [0,1,0,1], origin = "lower")
-               plt.scatter(paramsStTop[k], paramsStTop[k+1], c = "white", marker = "*", label = "optimum found")
-               if(contours):
-                    plt.contour(rr[0, :], ss[0, :], fObjMesh, colors = ["white"], extent = [0,1,0,1], origin = "lower", levels = 30, linewidths = 0.5)
-               plt.title("Level set of objective function, parameters for straight rays on side edges changed, r" + str(kStTop) + " s" + str(kStTop))
-               plt.xlabel("r" + str(k))
-               plt.ylabel("s" + str(k+1))
-               plt.legend()
-               plt.colorbar(im)
-     # If we know the true solution for this triangle fan, plot the decrease in the error
-     if trueSol is not None:
-          errRel = np.array(listObjVals)
-          errRel = abs(errRel-trueSol)/trueSol
-          fig = plt.figure(figsize=(800/96, 800/96), dpi=96)
-          plt.semilogy( range(0, len(listObjVals)), errRel, c = "#00011f", linewidth = 0.8)
-          plt.xlabel("Iteration")
-          plt.ylabel("Relative error")
-          plt.title("Relative error at each iteration")
-
 ######################################################
 ######################################################
 ######################################################
@@ -853,12 +969,203 @@ def fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat, listIndices, li
                sum += etakPrev*norm( yk - bk ) # shoots from bk to yk
                sum += etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk) # creeps from yk to zk
                # Update the current index of the creeping updates
-               if (currentCrTop  < len(indCrTop) - 1):
-                    currentCrTop += 1
+               if (currentStTop  < len(indStTop) - 1):
+                    currentStTop += 1
           else:
                # This means that there are no points along this triangle top, we proceed as "usual"
                sum += etakPrev*norm(yk - zkPrev) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
      return sum
+
+
+#@njit
+def fObj_regionTerm(j, params, x0, T0, grad0, x1, T1, grad1, listIndices, listxk, listB0k, listBk, listBkBk1,
+                    topType, rk, sk):
+     '''
+     Term of the generalized objective function that corresponds to the j-th region of the triangle fan
+     (j = 0 is the Hermite interpolation of T on h0h1). topType is 0 if there are no points on the
+     j-th top, 1 if the path creeps along it from rk to sk, 2 if it goes straight through it from rk to sk.
+     Adding up all the terms gives fObj_generalized.
+     '''
+     if( j == 0 ):
+          return hermite_interpolationT(params[0], x0, T0, grad0, x1, T1, grad1)
+     n = len(listxk) - 2
+     k = 2*j - 1
+     mukM1 = params[k-1]
+     lamk = params[k]
+     muk = params[k+1]
+     if( j == 1 ):
+          zkPrev = hermite_boundary(mukM1, x0, listB0k[0], x1, listBk[0])
+     else:
+          zkPrev = hermite_boundary(mukM1, x0, listB0k[j-1], listxk[j], listBk[j-1])
+     B0k = listB0k[j]
+     xkM1 = listxk[j]
+     xk = listxk[j+1]
+     Bk = listBk[j]
+     BkBk1_0 = listBkBk1[k-1] # grad of hkhk1 at xk
+     BkBk1_1 = listBkBk1[k] # grad of hkhk1 at xk1
+     etakPrev = listIndices[j-1]
+     etak = listIndices[j]
+     etaMin = min(etakPrev, etak)
+     yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
+     if( topType == 1 ):
+          # zkPrev shoots to ak, creeps to bk, shoots to yk and creeps to zk
+          etaRegionOutside = listIndices[n + j]
+          etaMinCr = min(etaRegionOutside, etakPrev)
+          ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+          bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+          return etakPrev*norm( ak - zkPrev ) + etaMinCr*arclengthSimpson(rk, sk, xkM1, BkBk1_0, xk, BkBk1_1) + etakPrev*norm( yk - bk ) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+     elif( topType == 2 ):
+          # zkPrev shoots to ak, goes straight to bk, shoots to yk and creeps to zk
+          etaRegionOutside = listIndices[n + j]
+          ak = hermite_boundary(rk, xkM1, BkBk1_0, xk, BkBk1_1)
+          bk = hermite_boundary(sk, xkM1, BkBk1_0, xk, BkBk1_1)
+          return etakPrev*norm( ak - zkPrev ) + etaRegionOutside*norm( bk - ak ) + etakPrev*norm( yk - bk ) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+     else:
+          return etakPrev*norm(yk - zkPrev) + etaMin*arclengthSimpson(muk, lamk, x0, B0k, xk, Bk)
+
+
+def topsPerRegion(n, indCrTop, indStTop):
+     '''
+     For each region of the triangle fan which type of points are on its top (0 none, 1 Cr, 2 St)
+     and which pair of paramsCrTop/paramsStTop they use. Same matching as in fObj_generalized.
+     '''
+     topType = np.zeros((n+1), dtype=int)
+     topIndex = np.zeros((n+1), dtype=int)
+     currentCrTop = 0
+     currentStTop = 0
+     for j in range(1, n+1):
+          if( j == indCrTop[currentCrTop] ):
+               topType[j] = 1
+               topIndex[j] = currentCrTop
+               if (currentCrTop  < len(indCrTop) - 1):
+                    currentCrTop += 1
+          elif( j == indStTop[currentStTop] ):
+               topType[j] = 2
+               topIndex[j] = currentStTop
+               if (currentStTop  < len(indStTop) - 1):
+                    currentStTop += 1
+     return topType, topIndex
+
+
+def regionsOfParams(n, changedParams):
+     '''
+     Regions whose term (fObj_regionTerm) depends on the given entries of params
+     '''
+     regions = set()
+     for i in changedParams:
+          if( i < 0 or i > 2*n ):
+               continue
+          if( i == 0 ):
+               regions.update([0, 1])
+          elif( i % 2 == 1 ):
+               regions.add((i + 1)//2)
+          else:
+               regions.add(i//2)
+               if( i//2 < n ):
+                    regions.add(i//2 + 1)
+     return sorted(regions)
+
+def changedEntries(new, old):
+     '''
+     Indices where new is different from old (all of them if they don't have the same size)
+     '''
+     if( new is old ):
+          return []
+     new = np.asarray(new)
+     if( new.shape != old.shape ):
+          return range(len(new))
+     return np.flatnonzero(new != old)
+
+
+class fanObjective:
+     '''
+     Generalized objective function on a triangle fan split in one term per region (see
+     fObj_regionTerm). Used in the line searches: a trial step only moves one block
+     (mu_k/lam_k or r_k/s_k) so we only recompute the terms that depend on that block.
+     '''
+     def __init__(self, params, x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listxk, listB0k, listBk, listBkBk1,
+                  indCrTop = None, paramsCrTop = None, indStTop = None, paramsStTop = None):
+          self.x0 = x0
+          self.T0 = T0
+          self.grad0 = grad0
+          self.x1 = x1
+          self.T1 = T1
+          self.grad1 = grad1
+          self.listIndices = listIndices
+          self.listxk = listxk
+          self.listB0k = listB0k
+          self.listBk = listBk
+          self.listBkBk1 = listBkBk1
+          self.n = len(listxk) - 2
+          indCrTop, paramsCrTop, indStTop, paramsStTop = topsAsArrays(indCrTop, paramsCrTop, indStTop, paramsStTop)
+          # Copies, fTrial compares the trial parameters with these ones
+          self.params = np.array(params, dtype=float)
+          self.paramsCrTop = np.copy(paramsCrTop)
+          self.paramsStTop = np.copy(paramsStTop)
+          self.topType, self.topIndex = topsPerRegion(self.n, indCrTop, indStTop)
+          # Regions that use each pair of paramsCrTop/paramsStTop
+          self.regionCrTop = {self.topIndex[j]: j for j in range(1, self.n+1) if self.topType[j] == 1}
+          self.regionStTop = {self.topIndex[j]: j for j in range(1, self.n+1) if self.topType[j] == 2}
+          self.terms = np.array([self.term(j, self.params, paramsCrTop, paramsStTop) for j in range(self.n+1)])
+          self.fVal = 0
+          for j in range(self.n+1):
+               self.fVal += self.terms[j]
+
+     def term(self, j, params, paramsCrTop, paramsStTop):
+          '''
+          Term of the j-th region
+          '''
+          topType = self.topType[j]
+          rk = 0.0
+          sk = 0.0
+          if( topType == 1 ):
+               rk = paramsCrTop[2*self.topIndex[j]]
+               sk = paramsCrTop[2*self.topIndex[j] + 1]
+          elif( topType == 2 ):
+               rk = paramsStTop[2*self.topIndex[j]]
+               sk = paramsStTop[2*self.topIndex[j] + 1]
+          return fObj_regionTerm(j, params, self.x0, self.T0, self.grad0, self.x1, self.T1, self.grad1,
+                                 self.listIndices, self.listxk, self.listB0k, self.listBk, self.listBkBk1,
+                                 topType, rk, sk)
+
+     def regionsChanged(self, changedParams, changedCrTop, changedStTop):
+          '''
+          Regions whose term depends on the given entries of params, paramsCrTop, paramsStTop
+          '''
+          regions = set(regionsOfParams(self.n, changedParams))
+          for i in changedCrTop:
+               if( i//2 in self.regionCrTop ):
+                    regions.add(self.regionCrTop[i//2])
+          for i in changedStTop:
+               if( i//2 in self.regionStTop ):
+                    regions.add(self.regionStTop[i//2])
+          return sorted(regions)
+
+     def fTrial(self, params = None, paramsCrTop = None, paramsStTop = None):
+          '''
+          Objective function at params, paramsCrTop, paramsStTop (None means the ones used to
+          initialize this object). Only the terms of the regions whose parameters changed are
+          recomputed
+          '''
+          if( params is None ):
+               params = self.params
+          if( paramsCrTop is None ):
+               paramsCrTop = self.paramsCrTop
+          if( paramsStTop is None ):
+               paramsStTop = self.paramsStTop
+          changedParams = changedEntries(params, self.params)
+          changedCrTop = changedEntries(paramsCrTop, self.paramsCrTop)
+          changedStTop = changedEntries(paramsStTop, self.paramsStTop)
+          terms = np.copy(self.terms)
+          for j in self.regionsChanged(changedParams, changedCrTop, changedStTop):
+               terms[j] = self.term(j, params, paramsCrTop, paramsStTop)
+          # Add up the terms again instead of fVal + (new term - old term): the line searches
+          # compare values that are almost the same and the rounding of the difference can
+          # change which step they take
+          f = 0
+          for j in range(self.n+1):
+               f += terms[j]
+          return f
           
 ################################################################################################
 ################################################################################################
@@ -881,36 +1188,37 @@ def project_lamkGivenmuk1_noCr(mukM1, lamk, x0, B0kM1, xkM1, BkM1, B0k, xk, Bk,
      yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
      B0kM1_mukM1 = gradientBoundary(mukM1, x0, B0kM1, xkM1, BkM1)
      B0k_lamk = gradientBoundary(lamk, x0, B0k, xk, Bk)
-     # We need to find a_tan = hkM1hk(r_tan)
-     rPass = lambda r: findRtan(r, xkM1, xk, BkM1Bk_0, BkM1Bk_1, zkM1)
-     rootTan = root_scalar(rPass, method = "secant", x0 = 0.4, x1 = 0.5)
-     r_tan = rootTan.root
-     a_tan = hermite_boundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
-     BkM1Bk_tan = gradientBoundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
+     # We need to find a_tan = hkM1hk(r_tan), together with lamMin and lamMax from h0hkM1
+     r_tan, lamkMin, lamkMax = projectionRoots([tangentDirectionPolynomial(xkM1, BkM1Bk_0, xk, BkM1Bk_1, zkM1),
+                                               fixedDirectionPolynomial(x0, B0k, xk, Bk, zkM1, B0kM1_mukM1),
+                                               tangentDirectionPolynomial(x0, B0k, xk, Bk, zkM1)], [None, lamk, lamk])
+     # If there is no tangent from zkM1 to hkM1hk (r_tan is None) there is no max from hkM1hk
+     if( r_tan is not None ):
+          a_tan = hermite_boundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
+          BkM1Bk_tan = gradientBoundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
 
      # The normals - depends on the position of x0 and xk  with respect to xkM1
      NkM1_mukM1 = np.array([-B0kM1_mukM1[1], B0kM1_mukM1[0]])
      Nk_lamk = np.array([-B0k_lamk[1], B0k_lamk[0]])
-     N_tan = np.array([-BkM1Bk_tan[1], BkM1Bk_tan[0]])
      NkM1Nk_0 = np.array([-BkM1Bk_0[1], BkM1Bk_0[0]])
      if( np.dot(NkM1_mukM1, xk - x0) < 0):
           NkM1_mukM1 = -NkM1_mukM1
      if( np.dot(Nk_lamk, x0 - xkM1) < 0):
           Nk_lamk = -Nk_lamk
-     if( np.dot(NkM1Nk_0, x0 - xk) < 0):
-          N_tan = -N_tan
+     if( r_tan is not None ):
+          N_tan = np.array([-BkM1Bk_tan[1], BkM1Bk_tan[0]])
+          if( np.dot(NkM1Nk_0, x0 - xk) < 0):
+               N_tan = -N_tan
 
      # Tests
      dotTestMin_fromh0kM1 = np.dot( yk - zkM1, NkM1_mukM1 ) # should be positive
      dotTestMax_fromh0kM1 = np.dot( yk - zkM1, Nk_lamk ) # should be positive
-     dotTestMax_fromhkM1hk = np.dot( yk - a_tan, N_tan ) # should be positive
+     dotTestMax_fromhkM1hk = np.dot( yk - a_tan, N_tan ) if r_tan is not None else 0 # should be positive
 
      # Test if lamk < lamMin
      if( dotTestMin_fromh0kM1 < 0 ):
           #print(" dotTestMin_fromh0kM1 failed", yk, ",   ", zkM1)
-          tMin = lambda lam: t1(lam, x0, xk, B0k, Bk, zkM1, B0kM1_mukM1)
-          rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-          lamk = rootMin.root
+          lamk = lamkMin
           yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
           B0k_lamk = gradientBoundary(lamk, x0, B0k, xk, Bk)
           Nk_lamk = np.array([-B0k_lamk[1], B0k_lamk[0]])
@@ -919,24 +1227,18 @@ def project_lamkGivenmuk1_noCr(mukM1, lamk, x0, B0kM1, xkM1, BkM1, B0k, xk, Bk,
           dotTestMax_fromh0kM1 = np.dot( yk - zkM1, Nk_lamk )
      # Test if lamk > lamkMax (from h0hkM1)
      if( dotTestMax_fromh0kM1 < 0 ):
-          tMax = lambda lam: t2(lam, x0, xk, B0k, Bk, zkM1)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          lamk = rootMax.root
-          # Update this lambda to test for max from hkM1hk
-          rPass = lambda r: findRtan(r, xkM1, xk, BkM1Bk_0, BkM1Bk_1, zkM1)
-          rootTan = root_scalar(rPass, method = "secant", x0 = 0.4, x1 = 0.5)
-          r_tan = rootTan.root
-          a_tan = hermite_boundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
-          BkM1Bk_tan = gradientBoundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
-          N_tan = np.array([-BkM1Bk_tan[1], BkM1Bk_tan[0]])
-          if( np.dot(NkM1Nk_0, x0 - xk) < 0):
-               N_tan = -N_tan
-          dotTestMax_fromhkM1hk = np.dot( yk - a_tan, N_tan )
+          lamk = lamkMax
+          # Update this lambda to test for max from hkM1hk (r_tan only depends on zkM1)
+          if( r_tan is not None ):
+               a_tan = hermite_boundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
+               BkM1Bk_tan = gradientBoundary(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
+               N_tan = np.array([-BkM1Bk_tan[1], BkM1Bk_tan[0]])
+               if( np.dot(NkM1Nk_0, x0 - xk) < 0):
+                    N_tan = -N_tan
+               dotTestMax_fromhkM1hk = np.dot( yk - a_tan, N_tan )
      # Test if lamk > lamkMax (from hkM1hk)
      if( dotTestMax_fromhkM1hk < 0 ):
-          tMax = lambda lam: t1(lam, x0, xk, B0k, Bk, a_tan, BkM1Bk_tan)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          lamk = rootMax.root
+          lamk = projectionRoots([fixedDirectionPolynomial(x0, B0k, xk, Bk, a_tan, BkM1Bk_tan)], [lamk])[0]
      lamk = project_box(lamk)
      return lamk
 
@@ -955,36 +1257,38 @@ def project_mukGivenlamk1_noCr(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1, BkBk
      B0k1_lamk1 = gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
      zk = hermite_boundary(muk, x0, B0k, xk, Bk)
      B0k_muk = gradientBoundary(muk, x0, B0k, xk, Bk)
-     # We need to find a_tan = hkhk1(r_tan)
-     rPass = lambda r: findRtan(r, xk, xk1, BkBk1_0, BkBk1_1, yk1)
-     rootTan = root_scalar(rPass, method = "secant", x0 = 0.4, x1 = 0.5)
-     r_tan = rootTan.root
-     a_tan = hermite_boundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
-     BkBk1_tan = gradientBoundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
+     # We need to find a_tan = hkhk1(r_tan), together with mukMin and mukMax from h0hk
+     r_tan, mukMin, mukMax = projectionRoots([tangentDirectionPolynomial(xk, BkBk1_0, xk1, BkBk1_1, yk1),
+                                             fixedDirectionPolynomial(x0, B0k, xk, Bk, yk1, B0k1_lamk1),
+                                             tangentDirectionPolynomial(x0, B0k, xk, Bk, yk1)], [None, muk, muk],
+                                             [False, True, False])
+     # If there is no tangent from yk1 to hkhk1 (r_tan is None) there is no max from hkhk1
+     if( r_tan is not None ):
+          a_tan = hermite_boundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
+          BkBk1_tan = gradientBoundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
 
      # Compute the normals
      N0k1_lamk1 = np.array([-B0k1_lamk1[1], B0k1_lamk1[0]])
      N0k_muk = np.array([-B0k_muk[1], B0k_muk[0]])
-     N_tan = np.array([-BkBk1_tan[1], BkBk1_tan[0]])
      NkNk1_0 = np.array([-BkBk1_0[1], BkBk1_1[0]])
      # Check if this is the correct orientation - check the position of x0, xk, xk1
      if( np.dot( N0k1_lamk1, x0 - xk) < 0):
           N0k1_lamk1 = -N0k1_lamk1
      if( np.dot( N0k_muk, xk1 - x0) < 0):
           N0k_muk = -N0k_muk
-     if( np.dot(NkNk1_0, x0 - xk) < 0):
-          N_tan = -N_tan
+     if( r_tan is not None ):
+          N_tan = np.array([-BkBk1_tan[1], BkBk1_tan[0]])
+          if( np.dot(NkNk1_0, x0 - xk) < 0):
+               N_tan = -N_tan
 
      # Tests
      dotTestMin_fromh0hk =  np.dot(N0k1_lamk1, yk1 - zk) # Should be positive
      dotTestMax_fromh0hk = np.dot(N0k_muk, yk1 - zk) # Should be positive
-     dotTestMax_fromhkhk1 = np.dot(N_tan, zk - a_tan) # Should be positive
+     dotTestMax_fromhkhk1 = np.dot(N_tan, zk - a_tan) if r_tan is not None else 0 # Should be positive
      
      # Test if muk < mukMin
      if(dotTestMin_fromh0hk < 0 ):
-          tMin = lambda mu: t4(mu, x0, xk, B0k, Bk, yk1, B0k1_lamk1)
-          rootMin = root_scalar(tMin, bracket = [0,1])
-          muk = rootMin.root
+          muk = mukMin
           zk = hermite_boundary(muk, x0, B0k, xk, Bk)
           B0k_muk = gradientBoundary(muk, x0, B0k, xk, Bk)
           N0k_muk = np.array([-B0k_muk[1], B0k_muk[0]])
@@ -993,25 +1297,17 @@ def project_mukGivenlamk1_noCr(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1, BkBk
           dotTestMax = np.dot(N0k_muk, yk1 - zk)
      # Test if muk > mukMax (from h0hk)
      if(dotTestMax_fromh0hk < 0 ):
-          tMax = lambda mu: t3(mu, x0, xk, B0k, Bk, yk1)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          muk = rootMax.root
-          # Update this mu to test for max from hkhk1
-          rPass = lambda r: findRtan(r, xk, xk1, BkBk1_0, BkBk1_1, yk1)
-          rootTan = root_scalar(rPass, method = "secant", x0 = 0.4, x1 = 0.5)
-          r_tan = rootTan.root
-          a_tan = hermite_boundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
-          BkBk1_tan = gradientBoundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
-          N_tan = np.array([-BkBk1_tan[1], BkBk1_tan[0]])
-          if( np.dot(NkNk1_0, x0 - xk) < 0):
-               N_tan = -N_tan
-          dotTestMax_fromhkhk1 = np.dot(N_tan, zk - a_tan)
+          muk = mukMax
+          # Update this mu to test for max from hkhk1 (r_tan only depends on yk1)
+          if( r_tan is not None ):
+               a_tan = hermite_boundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
+               BkBk1_tan = gradientBoundary(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
+               N_tan = np.array([-BkBk1_tan[1], BkBk1_tan[0]])
+               if( np.dot(NkNk1_0, x0 - xk) < 0):
+                    N_tan = -N_tan
+               dotTestMax_fromhkhk1 = np.dot(N_tan, zk - a_tan)
      if(dotTestMax_fromhkhk1 < 0):
-          tMax = lambda mu: t4(mu, x0, xk, B0k, Bk, a_tan, BkBk1_tan)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          #print( tMax(muk) )
-          muk = rootMax.root
-          #print( tMax(muk))
+          muk = projectionRoots([fixedDirectionPolynomial(x0, B0k, xk, Bk, a_tan, BkBk1_tan)], [muk])[0]
      muk = project_box(muk)
      return muk
 
@@ -1040,12 +1336,14 @@ def project_rkGivenmuk(rk, muk, x0, B0k, xk, Bk, xk1, Bk1, BkBk1_0, BkBk1_1):
      # Compute the tests
      dotTestMin = np.dot( N0k_muk, ak - zk)
      dotTestMax = np.dot( NkNk1_rk, zk - ak)
+     if( dotTestMin < 0 or dotTestMax < 0 ):
+          # rMin and rMax (roots of t1 and t2) at the same time
+          rkMin, rkMax = projectionRoots([fixedDirectionPolynomial(xk, BkBk1_0, xk1, BkBk1_1, zk, B0k_muk),
+                                          tangentDirectionPolynomial(xk, BkBk1_0, xk1, BkBk1_1, zk)], [rk, rk])
 
      # Test if rk < rMin
      if( dotTestMin < 0):
-          tMin = lambda r: t1(r, xk, xk1, BkBk1_0, BkBk1_1, zk, B0k_muk)
-          rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-          rk = rootMin.root
+          rk = rkMin
           ak = hermite_boundary(rk, xk, BkBk1_0, xk1, BkBk1_1)
           BkBk1_rk = gradientBoundary(rk, xk, BkBk1_0, xk1, BkBk1_1)
           NkNk1_rk = np.array([-BkBk1_rk[1], BkBk1_rk[0]])
@@ -1053,9 +1351,7 @@ def project_rkGivenmuk(rk, muk, x0, B0k, xk, Bk, xk1, Bk1, BkBk1_0, BkBk1_1):
                NkNk1_rk = -NkNk1_rk
           dotTestMax = np.dot( NkNk1_rk, ak - zk)
      if( dotTestMax < 0):
-          tMax = lambda r: t2(r, xk, xk1, BkBk1_0, BkBk1_1, zk)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          rk = rootMax.root
+          rk = rkMax
      rk = project_box(rk)
      return rk
 
@@ -1084,12 +1380,14 @@ def project_skGivenlamk1(sk, lamk1, x0, B0k1, xk1, Bk1, xk, BkBk1_0, BkBk1_1):
      # Compute the tests
      dotTestMin = np.dot( Nk1_lamk1, yk1 - bk ) # Should be positive
      dotTestMax = np.dot( NkNk1_sk , yk1 - bk ) #Should be positive
+     if( dotTestMin < 0 or dotTestMax < 0 ):
+          # sMin and sMax (roots of t4 and t2) at the same time
+          skMin, skMax = projectionRoots([fixedDirectionPolynomial(xk, BkBk1_0, xk1, BkBk1_1, yk1, B0k1_lamk1),
+                                          tangentDirectionPolynomial(xk, BkBk1_0, xk1, BkBk1_1, yk1)], [sk, sk])
 
      # If  sk < sMin
      if( dotTestMin < 0):
-          tMin = lambda s: t4(s, xk, xk1, BkBk1_0, BkBk1_1, yk1, B0k1_lamk1)
-          rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-          sk = rootMin.root
+          sk = skMin
           bk = hermite_boundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
           BkBk1_sk = gradientBoundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
           NkNk1_sk = np.array([-BkBk1_sk[1], BkBk1_sk[0]])
@@ -1097,9 +1395,7 @@ def project_skGivenlamk1(sk, lamk1, x0, B0k1, xk1, Bk1, xk, BkBk1_0, BkBk1_1):
                NkNk1_sk = -NkNk1_sk
           dotTestMax = np.dot( NkNk1_sk , yk1 - bk )
      if( dotTestMax < 0):
-          tMax = lambda s: t2(s, xk, xk1, BkBk1_0, BkBk1_1, yk1)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          sk = rootMax.root
+          sk = skMax
      sk = project_box(sk)
      return sk
 
@@ -1128,16 +1424,16 @@ def project_mukGivenrk(muk, rk, x0, B0k, xk, Bk, BkBk1_0, xk1, BkBk1_1):
      # Compute the tests
      dotTestMin =  np.dot(N0k_muk, ak - zk)
      dotTestMax = np.dot(NkNk1_rk, zk - ak)
+     if( dotTestMin < 0 or dotTestMax < 0 ):
+          # mukMin and mukMax (roots of t2 and t1) at the same time
+          mukMin, mukMax = projectionRoots([tangentDirectionPolynomial(x0, B0k, xk, Bk, ak),
+                                            fixedDirectionPolynomial(x0, B0k, xk, Bk, ak, BkBk1_rk)], [muk, muk])
      if(dotTestMin<0 ):
-          tMin = lambda mu: t2(mu, x0, xk, B0k, Bk, ak)
-          rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-          muk = rootMin.root
+          muk = mukMin
           zk = hermite_boundary(muk, x0, B0k, xk, Bk)
           dotTestMax = np.dot(NkNk1_rk, zk - ak)
      if(dotTestMax < 0 ):
-          tMax = lambda mu: t1(mu, x0, xk, B0k, Bk, ak, BkBk1_rk)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          muk = rootMax.root
+          muk = mukMax
      muk = project_box(muk)
      return muk
 
@@ -1166,11 +1462,13 @@ def project_lamkGivenskM1(lamk, skM1, x0, B0k, xk, Bk, BkM1Bk_0, xkM1, BkM1Bk_1)
      # Compute the tests
      testMin = np.dot(N0k_lamk, yk - bkM1 )
      testMax = np.dot(NkM1Nk_skM1, yk - bkM1)
+     if( testMin < 0 or testMax < 0 ):
+          # lamkMin and lamkMax (roots of t2 and t1) at the same time
+          lamkMin, lamkMax = projectionRoots([tangentDirectionPolynomial(x0, B0k, xk, Bk, bkM1),
+                                              fixedDirectionPolynomial(x0, B0k, xk, Bk, bkM1, BkM1Bk_skM1)], [lamk, lamk])
      # Test if lamk<lamMin
      if(testMin < 0):
-          tMin = lambda lam: t2(lam, x0, xk, B0k, Bk, bkM1)
-          rootMin = root_scalar(tMin, method = "secant", x0 = 0.4, x1 = 0.5)
-          lamk = rootMin.root
+          lamk = lamkMin
           yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
           B0k_lamk = gradientBoundary(lamk, x0, B0k, xk, Bk)
           N0k_lamk = np.array([-B0k_lamk[1], B0k_lamk[0]])
@@ -1178,9 +1476,7 @@ def project_lamkGivenskM1(lamk, skM1, x0, B0k, xk, Bk, BkM1Bk_0, xkM1, BkM1Bk_1)
                N0k_lamk = -N0k_lamk
           testMax = np.dot(N0k_lamk, bkM1 - yk)
      if(testMax < 0):
-          tMax = lambda lam: t1(lam, x0, xk, B0k, Bk, bkM1, BkM1Bk_skM1)
-          rootMax = root_scalar(tMax, method = "secant", x0 = 0.4, x1 = 0.5)
-          lamk = rootMax.root
+          lamk = lamkMax
      lamk = project_box(lamk)
      return lamk
 
@@ -1200,6 +1496,9 @@ def projections_muk_lamk1(muk_candidate, lamk1_candidate, muk_free, lamk1_free,
      '''
      if( muk_candidate == muk_free and lamk1_candidate == lamk1_free):
           return muk_candidate, lamk1_free
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
      params_muk_projected = np.copy(params)
      params_muk_projected[k] = muk_candidate
      if( params[k-1] == params[k-2] ):
@@ -1207,9 +1506,7 @@ def projections_muk_lamk1(muk_candidate, lamk1_candidate, muk_free, lamk1_free,
      params_muk_projected[k+1] = lamk1_free
      if( params[k+1] == params[k] and k < len(params) - 1):
           params_muk_projected[k+2] = lamk1_free
-     f_muk_projected = fObj_generalized(params_muk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_muk_projected = fanObj.fTrial(params_muk_projected)
      params_lamk1_projected = np.copy(params)
      params_lamk1_projected[k] = muk_free
      if( params[k-1] == params[k-2] ):
@@ -1217,9 +1514,7 @@ def projections_muk_lamk1(muk_candidate, lamk1_candidate, muk_free, lamk1_free,
      params_lamk1_projected[k+1] = lamk1_candidate
      if( params[k+1] == params[k] and k < len(params) -1):
           params_lamk1_projected[k] = lamk1_candidate
-     f_lamk1_projected = fObj_generalized(params_lamk1_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                          listIndices, listxk, listB0k, listBk, listBkBk1,
-                                          indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_lamk1_projected = fanObj.fTrial(params_lamk1_projected)
      if( f_muk_projected < f_lamk1_projected):
           return muk_candidate, lamk1_free
      else:
@@ -1237,9 +1532,10 @@ def projections_muk_rkCr(muk_candidate, rk_candidate, muk_free, rk_free, k, kCrT
      '''
      if( muk_candidate == muk_free and rk_candidate == rk_free):
           return muk_candidate, rk_free
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      params_muk_projected = np.copy(params)
      params_muk_projected[k] = muk_candidate
      if( params[k-1] == params[k] and k > 0 ):
@@ -1248,9 +1544,7 @@ def projections_muk_rkCr(muk_candidate, rk_candidate, muk_free, rk_free, k, kCrT
      paramsCrTop_muk_projected[kCrTop] = rk_free
      if( paramsCrTop[kCrTop + 1] ==  paramsCrTop[kCrTop ] ):
           paramsCrTop_muk_projected[kCrTop + 1] = rk_free
-     f_muk_projected = fObj_generalized(params_muk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop_muk_projected, indStTop, paramsStTop)
+     f_muk_projected = fanObj.fTrial(params_muk_projected, paramsCrTop_muk_projected)
      params_rk_projected = np.copy(params)
      params_rk_projected[k] = muk_free
      if( params[k-1] == params[k] and k > 0):
@@ -1259,9 +1553,7 @@ def projections_muk_rkCr(muk_candidate, rk_candidate, muk_free, rk_free, k, kCrT
      paramsCrTop_rk_projected[kCrTop] = rk_candidate
      if( paramsCrTop[kCrTop + 1] == paramsCrTop[kCrTop]  ):
           paramsCrTop_rk_projected[kCrTop + 1] = rk_candidate
-     f_rk_projected = fObj_generalized(params_rk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop_rk_projected, indStTop, paramsStTop)
+     f_rk_projected = fanObj.fTrial(params_rk_projected, paramsCrTop_rk_projected)
      if( f_before < f_muk_projected and f_before < f_rk_projected):
           return params[k], paramsCrTop[kCrTop]
      elif( f_muk_projected < f_rk_projected ):
@@ -1281,9 +1573,10 @@ def projections_muk_rkSt(muk_candidate, rk_candidate, muk_free, rk_free, k, kStT
      '''
      if( muk_candidate == muk_free and rk_candidate == rk_free):
           return muk_candidate, rk_free
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      params_muk_projected = np.copy(params)
      params_muk_projected[k] = muk_candidate
      if( params[k-1] == params[k] and k > 0 ):
@@ -1292,9 +1585,7 @@ def projections_muk_rkSt(muk_candidate, rk_candidate, muk_free, rk_free, k, kStT
      paramsStTop_muk_projected[kStTop] = rk_free
      if( paramsStTop[kStTop + 1] == paramsStTop[kStTop] ):
           paramsStTop_muk_projected[kStTop + 1] = rk_free
-     f_muk_projected = fObj_generalized(params_muk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop, indStTop, paramsStTop_muk_projected)
+     f_muk_projected = fanObj.fTrial(params_muk_projected, paramsCrTop, paramsStTop_muk_projected)
      params_rk_projected = np.copy(params)
      params_rk_projected[k] = muk_free
      if( params[k-1] == params[k] and k > 0):
@@ -1303,9 +1594,7 @@ def projections_muk_rkSt(muk_candidate, rk_candidate, muk_free, rk_free, k, kStT
      paramsStTop_rk_projected[kStTop] = rk_candidate
      if( paramsStTop[kStTop + 1] == paramsStTop[kStTop] ):
           paramsStTop_rk_projected[kStTop + 1] = rk_candidate
-     f_rk_projected = fObj_generalized(params_rk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop, indStTop, paramsStTop_rk_projected)
+     f_rk_projected = fanObj.fTrial(params_rk_projected, paramsCrTop, paramsStTop_rk_projected)
      if( f_before < f_muk_projected and f_before < f_rk_projected):
           return params[k-1], paramsStTop[kStTop + 1]
      elif( f_muk_projected < f_rk_projected ):
@@ -1325,9 +1614,10 @@ def projections_skCr_lamk1(sk_candidate, lamk1_candidate, sk_free, lamk1_free, k
      '''
      if( sk_candidate == sk_free and lamk1_candidate == lamk1_free):
           return sk_candidate, lamk1_free
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                 listIndices, listxk, listB0k, listBk, listBkBk1,
-                                 indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      paramsCrTop_sk_projected = np.copy(paramsCrTop)
      paramsCrTop_sk_projected[kCrTop + 1] = sk_candidate
      if( paramsCrTop[kCrTop + 1] == paramsCrTop[kCrTop] ):
@@ -1338,9 +1628,7 @@ def projections_skCr_lamk1(sk_candidate, lamk1_candidate, sk_free, lamk1_free, k
      if( params[k] == params[k+1] and k < len(params) - 2):
           # If lamk1 == muk1 numerically
           params_sk_projected[k+1] = lamk1_free
-     f_sk_projected = fObj_generalized(params_sk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop_sk_projected, indStTop, paramsStTop)
+     f_sk_projected = fanObj.fTrial(params_sk_projected, paramsCrTop_sk_projected)
      paramsCrTop_lamk1_projected = np.copy(paramsCrTop)
      paramsCrTop_lamk1_projected[kCrTop + 1] = sk_free
      if( paramsCrTop[kCrTop] == paramsCrTop[kCrTop + 1] ):
@@ -1351,9 +1639,7 @@ def projections_skCr_lamk1(sk_candidate, lamk1_candidate, sk_free, lamk1_free, k
      if( params[k+1] == params[k]  and k < len(params) - 2):
           # Then lamk1 == muk1 numerically
           params_lamk1_projected[k+1] = lamk1_candidate
-     f_lamk1_projected = fObj_generalized(params_lamk1_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop_lamk1_projected, indStTop, paramsStTop)
+     f_lamk1_projected = fanObj.fTrial(params_lamk1_projected, paramsCrTop_lamk1_projected)
      if( f_before < f_sk_projected and f_before < f_lamk1_projected):
           return paramsCrTop[kCrTop + 1], params[k]
      elif( f_sk_projected < f_lamk1_projected):
@@ -1373,9 +1659,10 @@ def projections_skSt_lamk1(sk_candidate, lamk1_candidate, sk_free, lamk1_free, k
      '''
      if( sk_candidate == sk_free and lamk1_candidate == lamk1_free):
           return sk_candidate, lamk1_free
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                 listIndices, listxk, listB0k, listBk, listBkBk1,
-                                 indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      paramsStTop_sk_projected = np.copy(paramsStTop)
      paramsStTop_sk_projected[kStTop + 1] = sk_candidate
      if( paramsStTop[kStTop + 1] == paramsStTop[kStTop] ):
@@ -1386,9 +1673,7 @@ def projections_skSt_lamk1(sk_candidate, lamk1_candidate, sk_free, lamk1_free, k
      if( params[k] == params[k+1] and k < len(params) - 2):
           # If lamk1 == muk1 numerically
           params_sk_projected[k+1] = lamk1_free
-     f_sk_projected = fObj_generalized(params_sk_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop, indStTop, paramsStTop_sk_projected)
+     f_sk_projected = fanObj.fTrial(params_sk_projected, paramsCrTop, paramsStTop_sk_projected)
      paramsStTop_lamk1_projected = np.copy(params)
      paramsStTop_lamk1_projected[kStTop + 1] = sk_free
      if( paramsStTop[kStTop] == paramsStTop[kStTop + 1] ):
@@ -1399,9 +1684,7 @@ def projections_skSt_lamk1(sk_candidate, lamk1_candidate, sk_free, lamk1_free, k
      if( params[k+1] == params[k]  and k < len(params) - 2):
           # Then lamk1 == muk1 numerically
           params_lamk1_projected[k+1] = lamk1_candidate
-     f_lamk1_projected = fObj_generalized(params_lamk1_projected, x0, T0, grad0, x1, T1, grad1, xHat,
-                                          listIndices, listxk, listB0k, listBk, listBkBk1,
-                                          indCrTop, paramsCrTop, indStTop, paramsStTop_lamk1_projected)
+     f_lamk1_projected = fanObj.fTrial(params_lamk1_projected, paramsCrTop, paramsStTop_lamk1_projected)
      if( f_before < f_sk_projected and f_before < f_lamk1_projected):
           return paramsStTop[kStTop + 1], params[k]
      elif( f_sk_projected < f_lamk1_projected):
@@ -1428,32 +1711,27 @@ def backTr_coord(alpha0, k, d, params, x0, T0, grad0, x1, T1, grad1, xHat,
      Backtracking for just one coordinate (the k-th coordinate) in params (not for
      the points on the side of the triangle fan (tops)
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      params_test = np.copy(params)
      alpha = alpha0*1/(max(abs(d), 1))
      params_test[k] = params[k] - alpha*d
-     f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                               listIndices, listxk, listB0k, listBk, listBkBk1,
-                               indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_test = fanObj.fTrial(params_test)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( (f_test < f_before) and i < 8 ):
           alpha = alpha*1.3
           params_test[k] = params[k] - alpha*d
-          f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params_test)
           i += 1
      i = 0
      # If there is no decrease in the function, try decreasing alpha, the step size
      while( (f_before <= f_test) and i < 25 ):
           alpha = alpha*0.2
           params_test[k] = params[k] - alpha*d
-          f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params_test)
           i += 1
      if( f_before <= f_test ):
           return 0
@@ -1476,9 +1754,10 @@ def backTrClose_block0k(alpha0, k, dlamk, dmuk, dCollapsed,
                                     steepest descent projected onto the line lamk = muk
                                     steepest descent for the collapsed point (i.e. muk =∼ lamk)
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      d_middle = np.array([dlamk, dmuk])
      params_test = np.copy(params)
@@ -1489,30 +1768,18 @@ def backTrClose_block0k(alpha0, k, dlamk, dmuk, dCollapsed,
      params_collapsed = np.copy(params)
      params_collapsed[k:(k+2)] = params[k] - alpha*dCollapsed
      # Compare the function value
-     f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                               listIndices, listxk, listB0k, listBk, listBkBk1,
-                               indCrTop, paramsCrTop, indStTop, paramsStTop)
-     f_test_proj = fObj_generalized(params_test_proj, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-     f_test_collapsed = fObj_generalized(params_collapsed, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_test = fanObj.fTrial(params_test)
+     f_test_proj = fanObj.fTrial(params_test_proj)
+     f_test_collapsed = fanObj.fTrial(params_collapsed)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( ( (f_test < f_before) or (f_test_proj < f_before) or (f_test_collapsed < f_before) ) and i < 8 ):
           alpha = alpha*1.3 # increase the step size
           params_test[k:(k+2)] = params[k:(k+2)] - alpha*d_middle
           params_test_proj[k:(k+2)] = project_ontoLine(params_test[k:(k+2)])
           params_collapsed[k:(k+2)] = params[k] - alpha*dCollapsed
-          f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_test_proj = fObj_generalized(params_test_proj, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_test_collapsed = fObj_generalized(params_collapsed, x0, T0, grad0, x1, T1, grad1, xHat,
-                                              listIndices, listxk, listB0k, listBk, listBkBk1,
-                                              indCrTop, paramsCrTop, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params_test)
+          f_test_proj = fanObj.fTrial(params_test_proj)
+          f_test_collapsed = fanObj.fTrial(params_collapsed)
           i += 1
      i = 0
      # Then if there is no decrease try decreasing alpha, the step size
@@ -1522,15 +1789,9 @@ def backTrClose_block0k(alpha0, k, dlamk, dmuk, dCollapsed,
           params_test_proj[k:(k+2)] = project_ontoLine(params_test[k:(k+2)])
           params_collapsed[k:(k+2)] = params[k] - alpha*dCollapsed
           #breakpoint()
-          f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_test_proj = fObj_generalized(params_test_proj, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_test_collapsed = fObj_generalized(params_collapsed, x0, T0, grad0, x1, T1, grad1, xHat,
-                                              listIndices, listxk, listB0k, listBk, listBkBk1,
-                                              indCrTop, paramsCrTop, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params_test)
+          f_test_proj = fanObj.fTrial(params_test_proj)
+          f_test_collapsed = fanObj.fTrial(params_collapsed)
           i += 1
      # Now we should have a decrease or set alpha to 0
      if( f_before <= f_test and f_before <= f_test_proj and f_before <= f_test_collapsed):
@@ -1554,9 +1815,10 @@ def backTrClose_blockCrTop(alpha0, kCrTop, drk, dsk, dCollapsed,
                                     steepest descent projected onto the line rk = sk
                                     steepest descent for the collapsed point (i.e. rk =∼ sk)
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      d_middle = np.array([drk, dsk])
      #breakpoint()
@@ -1568,30 +1830,18 @@ def backTrClose_blockCrTop(alpha0, kCrTop, drk, dsk, dCollapsed,
      paramsCrTop_test_proj[kCrTop:(kCrTop + 2)] = project_ontoLine(paramsCrTop_test[kCrTop:(kCrTop + 2)])
      paramsCrTop_collapsed[kCrTop:(kCrTop + 2)] = paramsCrTop[kCrTop] - alpha*dCollapsed
      # Compare the function value
-     f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop_test, indStTop, paramsStTop)
-     f_test_proj = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop_test_proj, indStTop, paramsStTop)
-     f_test_collapsed = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop_collapsed, indStTop, paramsStTop)
+     f_test = fanObj.fTrial(params, paramsCrTop_test)
+     f_test_proj = fanObj.fTrial(params, paramsCrTop_test_proj)
+     f_test_collapsed = fanObj.fTrial(params, paramsCrTop_collapsed)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( ( (f_test < f_before) or (f_test_proj < f_before) or (f_test_collapsed < f_before ) ) and i < 8 ):
           alpha = alpha*1.3
           paramsCrTop_test[kCrTop:(kCrTop + 2)] = paramsCrTop[kCrTop:(kCrTop+2)] - alpha*d_middle
           paramsCrTop_test_proj[kCrTop:(kCrTop + 2)] = project_ontoLine(paramsCrTop_test[kCrTop:(kCrTop + 2)])
           paramsCrTop_collapsed[kCrTop:(kCrTop + 2)] = paramsCrTop[kCrTop] - alpha*dCollapsed
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop_test, indStTop, paramsStTop)
-          f_test_proj = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop_test_proj, indStTop, paramsStTop)
-          f_test_collapsed = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                              listIndices, listxk, listB0k, listBk, listBkBk1,
-                                              indCrTop, paramsCrTop_collapsed, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params, paramsCrTop_test)
+          f_test_proj = fanObj.fTrial(params, paramsCrTop_test_proj)
+          f_test_collapsed = fanObj.fTrial(params, paramsCrTop_collapsed)
           i += 1
      i = 0
      # If there is no decrease in the function value, try decreasing alpha, the step size
@@ -1600,15 +1850,9 @@ def backTrClose_blockCrTop(alpha0, kCrTop, drk, dsk, dCollapsed,
           paramsCrTop_test[kCrTop:(kCrTop + 2)] = paramsCrTop[kCrTop:(kCrTop+2)] - alpha*d_middle
           paramsCrTop_test_proj[kCrTop:(kCrTop + 2)] = project_ontoLine(paramsCrTop_test[kCrTop:(kCrTop + 2)])
           paramsCrTop_collapsed[kCrTop:(kCrTop + 2)] = paramsCrTop[kCrTop] - alpha*dCollapsed
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop_test, indStTop, paramsStTop)
-          f_test_proj = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop_test_proj, indStTop, paramsStTop)
-          f_test_collapsed = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                              listIndices, listxk, listB0k, listBk, listBkBk1,
-                                              indCrTop, paramsCrTop_collapsed, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params, paramsCrTop_test)
+          f_test_proj = fanObj.fTrial(params, paramsCrTop_test_proj)
+          f_test_collapsed = fanObj.fTrial(params, paramsCrTop_collapsed)
           i += 1
      # Now we should have a decrease or set alpha to 0
      if( f_before <= f_test and f_before <= f_test_proj and f_before <= f_test_collapsed):
@@ -1632,9 +1876,10 @@ def backTrClose_blockStTop(alpha0, kStTop, drk, dsk, dCollapsed,
                                     steepest descent projected onto the line rk = sk
                                     steepest descent for the collapsed point (i.e. rk =∼ sk)
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      d_middle = np.array([drk, dsk])
      paramsStTop_test = np.copy(paramsStTop)
@@ -1645,30 +1890,18 @@ def backTrClose_blockStTop(alpha0, kStTop, drk, dsk, dCollapsed,
      paramsStTop_test_proj[kStTop:(kStTop + 2)] = project_ontoLine(paramsStTop_test[kStTop:(kStTop + 2)])
      paramsStTop_collapsed[kStTop:(kStTop + 2)] = paramsStTop[kStTop] - alpha*dCollapsed
      # Compare the function value
-     f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                               listIndices, listxk, listB0k, listBk, listBkBk1,
-                               indCrTop, paramsCrTop, indStTop, paramsStTop_test)
-     f_test_proj = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop_test_proj)
-     f_test_collapsed = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                                        indCrTop, paramsCrTop, indStTop, paramsStTop_collapsed)
+     f_test = fanObj.fTrial(params, paramsCrTop, paramsStTop_test)
+     f_test_proj = fanObj.fTrial(params, paramsCrTop, paramsStTop_test_proj)
+     f_test_collapsed = fanObj.fTrial(params, paramsCrTop, paramsStTop_collapsed)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( ( (f_test < f_before) or (f_test_proj < f_before) or (f_test_collapsed < f_before )) and i < 8 ):
           alpha = alpha*1.3
           paramsStTop_test[kStTop:(kStTop + 2)] = paramsStTop[kStTop:(kStTop+2)] - alpha*d_middle
           paramsStTop_test_proj[kStTop:(kStTop + 2)] = project_ontoLine(paramsStTop_test[kStTop:(kStTop + 2)])
           paramsStTop_collapsed[kStTop:(kStTop + 2)] = paramsStTop[kStTop] - alpha*dCollapsed
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop_test)
-          f_test_proj = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop, indStTop, paramsStTop_test_proj)
-          f_test_collapsed = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                             listIndices, listxk, listB0k, listBk, listBkBk1,
-                                             indCrTop, paramsCrTop, indStTop, paramsStTop_collapsed)
+          f_test = fanObj.fTrial(params, paramsCrTop, paramsStTop_test)
+          f_test_proj = fanObj.fTrial(params, paramsCrTop, paramsStTop_test_proj)
+          f_test_collapsed = fanObj.fTrial(params, paramsCrTop, paramsStTop_collapsed)
           i += 1
      i = 0
      # If there is no decrease in the function value, try decreasing alpha, the step size
@@ -1677,15 +1910,9 @@ def backTrClose_blockStTop(alpha0, kStTop, drk, dsk, dCollapsed,
           paramsStTop_test[kStTop:(kStTop + 2)] = paramsStTop[kStTop:(kStTop+2)] - alpha*d_middle
           paramsStTop_test_proj[kStTop:(kStTop + 2)] = project_ontoLine(paramsStTop_test[kStTop:(kStTop + 2)])
           paramsStTop_collapsed[kStTop:(kStTop + 2)] = paramsStTop[kStTop] - alpha*dCollapsed
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop_test)
-          f_test_proj = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                         listIndices, listxk, listB0k, listBk, listBkBk1,
-                                         indCrTop, paramsCrTop, indStTop, paramsStTop_test_proj)
-          f_test_collapsed = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                             listIndices, listxk, listB0k, listBk, listBkBk1,
-                                             indCrTop, paramsCrTop, indStTop, paramsStTop_collapsed)
+          f_test = fanObj.fTrial(params, paramsCrTop, paramsStTop_test)
+          f_test_proj = fanObj.fTrial(params, paramsCrTop, paramsStTop_test_proj)
+          f_test_collapsed = fanObj.fTrial(params, paramsCrTop, paramsStTop_collapsed)
           i += 1
      # Now we should have a decrease or set alpha to 0
      if( f_before <= f_test and f_before <= f_test_proj and f_before <= f_test_collapsed):
@@ -1709,9 +1936,10 @@ def backTr_block0k(alpha0, k, dlamk, dmuk, params, x0, T0, grad0, x1, T1, grad1,
      of the triangle fan)
      it considers one direction: steepest descent
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      d_middle = np.array([dlamk, dmuk])
      params_test = np.copy(params)
@@ -1724,15 +1952,9 @@ def backTr_block0k(alpha0, k, dlamk, dmuk, params, x0, T0, grad0, x1, T1, grad1,
      params_lamk[k] = params[k] - alpha*dlamk
      params_muk[k+1] = params[k+1] - alpha*dmuk
      # Compare the function value
-     f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                               listIndices, listxk, listB0k, listBk, listBkBk1,
-                               indCrTop, paramsCrTop, indStTop, paramsStTop)
-     f_lamk = fObj_generalized(params_lamk, x0, T0, grad0, x1, T1, grad1, xHat,
-                               listIndices, listxk, listB0k, listBk, listBkBk1,
-                               indCrTop, paramsCrTop, indStTop, paramsStTop)
-     f_muk = fObj_generalized(params_muk, x0, T0, grad0, x1, T1, grad1, xHat,
-                              listIndices, listxk, listB0k, listBk, listBkBk1,
-                              indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_test = fanObj.fTrial(params_test)
+     f_lamk = fanObj.fTrial(params_lamk)
+     f_muk = fanObj.fTrial(params_muk)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( (f_test < f_before or f_lamk < f_before or f_muk < f_before) and i < 8 ):
           alpha = alpha*1.3 # increase the step size
@@ -1741,15 +1963,9 @@ def backTr_block0k(alpha0, k, dlamk, dmuk, params, x0, T0, grad0, x1, T1, grad1,
           params_test[k:(k+2)] = params[k:(k+2)] - alpha*d_middle
           params_lamk[k] = params[k] - alpha*dlamk
           params_muk[k+1] = params[k+1] - alpha*dmuk
-          f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_lamk = fObj_generalized(params_lamk, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_muk = fObj_generalized(params_muk, x0, T0, grad0, x1, T1, grad1, xHat,
-                                   listIndices, listxk, listB0k, listBk, listBkBk1,
-                                   indCrTop, paramsCrTop, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params_test)
+          f_lamk = fanObj.fTrial(params_lamk)
+          f_muk = fanObj.fTrial(params_muk)
           i += 1
      i = 0
      # Then if there is no decrease try decreasing alpha, the step size
@@ -1760,15 +1976,9 @@ def backTr_block0k(alpha0, k, dlamk, dmuk, params, x0, T0, grad0, x1, T1, grad1,
           params_test[k:(k+2)] = params[k:(k+2)] - alpha*d_middle
           params_lamk[k] = params[k] - alpha*dlamk
           params_muk[k+1] = params[k+1] - alpha*dmuk
-          f_test = fObj_generalized(params_test, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_lamk = fObj_generalized(params_lamk, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop)
-          f_muk = fObj_generalized(params_muk, x0, T0, grad0, x1, T1, grad1, xHat,
-                                   listIndices, listxk, listB0k, listBk, listBkBk1,
-                                   indCrTop, paramsCrTop, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params_test)
+          f_lamk = fanObj.fTrial(params_lamk)
+          f_muk = fanObj.fTrial(params_muk)
           i += 1
      # Now we should have a decrease or set alpha to 0
      if( f_lamk < f_before and f_lamk < f_test and f_lamk < f_muk):
@@ -1789,9 +1999,10 @@ def backTr_blockCrTop(alpha0, kCrTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
      on the sides of the triangle fan)
      it considers one direction: steepest descent
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      d_middle = np.array([drk, dsk])
      paramsCrTop_test = np.copy(paramsCrTop)
@@ -1804,15 +2015,9 @@ def backTr_blockCrTop(alpha0, kCrTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
      paramsCrTop_rk[kCrTop] = paramsCrTop[kCrTop] - alpha*drk
      paramsCrTop_sk[kCrTop + 1] = paramsCrTop[kCrTop + 1] - alpha*dsk
      # Compare the function value
-     f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop_test, indStTop, paramsStTop)
-     f_rk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                             listIndices, listxk, listB0k, listBk, listBkBk1,
-                             indCrTop, paramsCrTop_rk, indStTop, paramsStTop)
-     f_sk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                             listIndices, listxk, listB0k, listBk, listBkBk1,
-                             indCrTop, paramsCrTop_sk, indStTop, paramsStTop)
+     f_test = fanObj.fTrial(params, paramsCrTop_test)
+     f_rk = fanObj.fTrial(params, paramsCrTop_rk)
+     f_sk = fanObj.fTrial(params, paramsCrTop_sk)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( (f_test < f_before or f_rk < f_before or f_sk < f_before) and i < 8 ):
           alpha = alpha*1.3
@@ -1821,15 +2026,9 @@ def backTr_blockCrTop(alpha0, kCrTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
           paramsCrTop_test[kCrTop:(kCrTop + 2)] = paramsCrTop[kCrTop:(kCrTop+2)] - alpha*d_middle
           paramsCrTop_rk[kCrTop] = paramsCrTop[kCrTop] - alpha*drk
           paramsCrTop_sk[kCrTop + 1] = paramsCrTop[kCrTop + 1] - alpha*dsk
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop_test, indStTop, paramsStTop)
-          f_rk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop_rk, indStTop, paramsStTop)
-          f_sk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop_sk, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params, paramsCrTop_test)
+          f_rk = fanObj.fTrial(params, paramsCrTop_rk)
+          f_sk = fanObj.fTrial(params, paramsCrTop_sk)
           i += 1
      i = 0
      # If there is no decrease in the function value, try decreasing alpha, the step size
@@ -1841,15 +2040,9 @@ def backTr_blockCrTop(alpha0, kCrTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
           paramsCrTop_rk[kCrTop] = paramsCrTop[kCrTop] - alpha*drk
           paramsCrTop_sk[kCrTop + 1] = paramsCrTop[kCrTop + 1] - alpha*dsk
           #breakpoint()
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop_test, indStTop, paramsStTop)
-          f_rk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop_rk, indStTop, paramsStTop)
-          f_sk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop_sk, indStTop, paramsStTop)
+          f_test = fanObj.fTrial(params, paramsCrTop_test)
+          f_rk = fanObj.fTrial(params, paramsCrTop_rk)
+          f_sk = fanObj.fTrial(params, paramsCrTop_sk)
           i += 1
      # Now we should have a decrease or set alpha to 0
      if( f_before <= f_test and f_before <= f_rk and f_before <= f_sk):
@@ -1871,9 +2064,10 @@ def backTr_blockStTop(alpha0, kStTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
      on the sides of the triangle fan)
      it considers one direction: steepest descent
      '''
-     f_before = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                        listIndices, listxk, listB0k, listBk, listBkBk1,
-                        indCrTop, paramsCrTop, indStTop, paramsStTop)
+     fanObj = fanObjective(params, x0, T0, grad0, x1, T1, grad1, xHat,
+                           listIndices, listxk, listB0k, listBk, listBkBk1,
+                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+     f_before = fanObj.fVal
      i = 0
      d_middle = np.array([drk, dsk])
      paramsStTop_test = np.copy(paramsStTop)
@@ -1886,15 +2080,9 @@ def backTr_blockStTop(alpha0, kStTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
      paramsStTop_rk[kStTop] = paramsStTop[kStTop] - alpha*drk
      paramsStTop_sk[kStTop + 1] = paramsStTop[kStTop + 1] - alpha*dsk
      # Compare the function value
-     f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                               listIndices, listxk, listB0k, listBk, listBkBk1,
-                               indCrTop, paramsCrTop, indStTop, paramsStTop_test)
-     f_rk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                             listIndices, listxk, listB0k, listBk, listBkBk1,
-                             indCrTop, paramsCrTop, indStTop, paramsStTop_rk)
-     f_sk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                             listIndices, listxk, listB0k, listBk, listBkBk1,
-                             indCrTop, paramsCrTop, indStTop, paramsStTop_sk)
+     f_test = fanObj.fTrial(params, paramsCrTop, paramsStTop_test)
+     f_rk = fanObj.fTrial(params, paramsCrTop, paramsStTop_rk)
+     f_sk = fanObj.fTrial(params, paramsCrTop, paramsStTop_sk)
      # If there is a decrease in the function, try increasing alpha, the step size
      while( (f_test < f_before or f_rk < f_before or f_sk < f_before) and i < 8 ):
           alpha = alpha*1.3
@@ -1903,15 +2091,9 @@ def backTr_blockStTop(alpha0, kStTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
           paramsStTop_test[kStTop:(kStTop + 2)] = paramsStTop[kStTop:(kStTop+2)] - alpha*d_middle
           paramsStTop_rk[kStTop] = paramsStTop[kStTop] - alpha*drk
           paramsStTop_sk[kStTop + 1] = paramsStTop[kStTop + 1] - alpha*dsk
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop_test)
-          f_rk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop, indStTop, paramsStTop_rk)
-          f_sk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop, indStTop, paramsStTop_sk)
+          f_test = fanObj.fTrial(params, paramsCrTop, paramsStTop_test)
+          f_rk = fanObj.fTrial(params, paramsCrTop, paramsStTop_rk)
+          f_sk = fanObj.fTrial(params, paramsCrTop, paramsStTop_sk)
           i += 1
      i = 0
      # If there is no decrease in the function value, try decreasing alpha, the step size
@@ -1922,15 +2104,9 @@ def backTr_blockStTop(alpha0, kStTop, drk, dsk, params, x0, T0, grad0, x1, T1, g
           paramsStTop_test[kStTop:(kStTop + 2)] = paramsStTop[kStTop:(kStTop+2)] - alpha*d_middle
           paramsStTop_rk[kStTop] = paramsStTop[kStTop] - alpha*drk
           paramsStTop_sk[kStTop + 1] = paramsStTop[kStTop + 1] - alpha*dsk
-          f_test = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                    listIndices, listxk, listB0k, listBk, listBkBk1,
-                                    indCrTop, paramsCrTop, indStTop, paramsStTop_test)
-          f_rk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop, indStTop, paramsStTop_rk)
-          f_sk = fObj_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat,
-                                  listIndices, listxk, listB0k, listBk, listBkBk1,
-                                  indCrTop, paramsCrTop, indStTop, paramsStTop_sk)
+          f_test = fanObj.fTrial(params, paramsCrTop, paramsStTop_test)
+          f_rk = fanObj.fTrial(params, paramsCrTop, paramsStTop_rk)
+          f_sk = fanObj.fTrial(params, paramsCrTop, paramsStTop_sk)
           i += 1
      # Now we should have a decrease or set alpha to 0
      if( f_before <= f_test and f_before <= f_rk and f_before <= f_sk):
@@ -2722,13 +2898,143 @@ def forwardPassUpdate(params0, gammas, theta_gamma, x0, T0, grad0, x1, T1, grad1
      return params, paramsCrTop, paramsStTop, gradParams, gradCrTop, gradStTop
 
 
+###################################
+# Iterates of the optimizer (triangleFan.saveIterates)
+
+class iterateRecorder:
+     '''
+     Ring buffer with the last capacity iterates of one optimization: each row is
+     [params, paramsCrTop, paramsStTop] and fVals has the objective function there.
+     Everything is allocated here, recording an iterate just copies it into a row. When
+     the buffer is full the oldest iterates are overwritten (nRecorded counts all of them)
+     '''
+     def __init__(self, nParams, nCrTop = 0, nStTop = 0, capacity = 256):
+          self.nParams = nParams
+          self.nCrTop = nCrTop
+          self.nStTop = nStTop
+          self.capacity = capacity
+          self.iterates = np.empty((capacity, nParams + nCrTop + nStTop))
+          self.fVals = np.empty((capacity))
+          self.nRecorded = 0
+
+     def record(self, fVal, params, paramsCrTop = None, paramsStTop = None):
+          '''
+          Save an iterate (paramsCrTop and paramsStTop are ignored if this fan has no points there)
+          '''
+          i = self.nRecorded % self.capacity
+          row = self.iterates[i]
+          row[:self.nParams] = params[:self.nParams]
+          if( self.nCrTop > 0 ):
+               row[self.nParams:(self.nParams + self.nCrTop)] = paramsCrTop
+          if( self.nStTop > 0 ):
+               row[(self.nParams + self.nCrTop):] = paramsStTop
+          self.fVals[i] = fVal
+          self.nRecorded += 1
+
+     def nStored(self):
+          return min(self.nRecorded, self.capacity)
+
+     def ordered(self):
+          '''
+          Iterates and values of the objective function we still have, oldest first
+          '''
+          n = self.nStored()
+          start = self.nRecorded % self.capacity if self.nRecorded > self.capacity else 0
+          order = (start + np.arange(n)) % self.capacity
+          return self.iterates[order], self.fVals[order]
+
+     def toBytes(self):
+          '''
+          int64 nParams, nCrTop, nStTop, nStored, nRecorded then nStored rows of doubles
+          (the iterates, oldest first) and nStored doubles (the values of the objective function)
+          '''
+          iterates, fVals = self.ordered()
+          header = np.array([self.nParams, self.nCrTop, self.nStTop, self.nStored(), self.nRecorded], dtype=np.int64)
+          return header.tobytes() + iterates.tobytes() + fVals.tobytes()
+
+     @staticmethod
+     def fromBytes(buf, offset = 0):
+          '''
+          Read what toBytes wrote, returns the recorder and the offset after it
+          '''
+          nParams, nCrTop, nStTop, nStored, nRecorded = np.frombuffer(buf, dtype=np.int64, count = 5, offset = offset)
+          offset += 5*8
+          recorder = iterateRecorder(int(nParams), int(nCrTop), int(nStTop), capacity = max(int(nStored), 1))
+          width = nParams + nCrTop + nStTop
+          # Put them back where they were in a ring of capacity nStored
+          rows = (nRecorded - nStored + np.arange(nStored)) % recorder.capacity
+          recorder.iterates[rows] = np.frombuffer(buf, dtype=np.float64, count = nStored*width, offset = offset).reshape((nStored, width))
+          offset += 8*nStored*width
+          recorder.fVals[rows] = np.frombuffer(buf, dtype=np.float64, count = nStored, offset = offset)
+          offset += 8*nStored
+          recorder.nRecorded = int(nRecorded)
+          return recorder, offset
+
+def loadIterates(fileName):
+     '''
+     Iterates written by triangleFan.dumpIterates, list (one per fan) of lists of (option, iterateRecorder)
+     '''
+     with open(fileName, "rb") as f:
+          buf = f.read()
+     fans = []
+     offset = 0
+     while( offset < len(buf) ):
+          nRegions, nOptions = np.frombuffer(buf, dtype=np.int64, count = 2, offset = offset)
+          offset += 2*8
+          options = []
+          for i in range(nOptions):
+               option = np.frombuffer(buf, dtype=np.int64, count = nRegions, offset = offset)
+               offset += 8*nRegions
+               recorder, offset = iterateRecorder.fromBytes(buf, offset)
+               options.append( (option, recorder) )
+          fans.append(options)
+     return fans
+
+
+def kktResidual(params, paramsCrTop, paramsStTop, gradParams, gradCrTop, gradStTop, tolCollapse = 1e-6):
+     '''
+     Largest partial of the objective function (from the gradients of the forward pass) in the directions
+     where it is differentiable: the parameters strictly inside [0,1], without mun1 = 1, with the pairs lamk, muk
+     (and rk, sk) that are collapsed as a single variable (the sum of their partials). It's 0 at a KKT point.
+     Opening a collapsed pair or leaving a bound (the objective function has a kink there, e.g. the arc length
+     or a path through a vertex) is what backTrClose_* and the projections check, not this residual
+     '''
+     listx = [np.ravel(params)[:-1]]
+     listg = [np.ravel(gradParams)[:-1]]
+     nCrTop = 0
+     for x, g in [(paramsCrTop, gradCrTop), (paramsStTop, gradStTop)]:
+          x = np.ravel(x) # the forward pass returns columns
+          g = np.ravel(g)
+          if( len(x) > 0 and len(x) == len(g) ):
+               listx.append(x)
+               listg.append(g)
+     if( len(listx) > 1 and len(np.ravel(gradCrTop)) > 0 ):
+          nCrTop = len(listx[1])
+     x = np.concatenate(listx).astype(float)
+     g = np.concatenate(listg).astype(float)
+     M, z = collapsedPairs_qN(x, len(listx[0]), nCrTop, tolCollapse)
+     gz = M.T @ g
+     free = (z > tolCollapse) & (z < 1 - tolCollapse)
+     return float(np.max(np.abs(gz[free]), initial = 0.0))
+
+def tolKKT_fromMeshSize(h, factor = 1e-2):
+     '''
+     Target for kktResidual for a mesh of size h. Close to a minimum the error in the objective
+     function is about residual**2 so factor*h**2 keeps it far below the error of the discretization
+     '''
+     return factor*h**2
+
+
 #@njit
 def blockCoordinateGradient_generalized(params0, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
                                         listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop0,
                                         indStTop, paramsStTop0, listCurvingInwards, theta_gamma = 1,
-                                        tol = 1e-14, maxIter = 75, plotSteps = False):
+                                        tol = 1e-14, maxIter = 75, plotSteps = False, recorder = None,
+                                        tolKKT = None):
      '''
      Block coordiante subgradient descent (modified) for a generalized triangle fan.
+     If recorder (an iterateRecorder) is given the iterates are saved there. If tolKKT is given
+     it also stops once kktResidual (from the gradients of the forward pass) is below tolKKT.
      '''
      paramsk = np.copy(params0)
      n = len(listxk) - 2
@@ -2752,7 +3058,8 @@ def blockCoordinateGradient_generalized(params0, x0, T0, grad0, x1, T1, grad1, x
      iter = 0
      change_fVal = 1
      normChangeP = 1
-     while( change_fVal > tol and iter < maxIter and normChangeP > tol):
+     residual = np.inf
+     while( change_fVal > tol and iter < maxIter and normChangeP > tol and (tolKKT is None or residual > tolKKT) ):
           paramskM1, paramsCrTopkM1, paramsStTopkM1 = paramsk, paramsCrTopk, paramsStTopk
           # Forward pass
           paramsTest, paramsCrTopTest, paramsStTopTest, gradParamsTest, gradCrTopTest, gradStTopTest = forwardPassUpdate(paramsk, gammas,
@@ -2770,6 +3077,8 @@ def blockCoordinateGradient_generalized(params0, x0, T0, grad0, x1, T1, grad1, x
                                 indCrTop = indCrTop, paramsCrTop = paramsCrTopTest,
                                 indStTop = indStTop, paramsStTop = paramsStTopTest)
           listObjVals.append(fk)
+          if( recorder is not None ):
+               recorder.record(fk, paramsTest, paramsCrTopTest, paramsStTopTest)
           if( iter > 0):
                change_fVal = listObjVals[-2] - fk
                if( change_fVal > 0):
@@ -2778,269 +3087,1546 @@ def blockCoordinateGradient_generalized(params0, x0, T0, grad0, x1, T1, grad1, x
                     normChangeP = sqrt( norm( paramskM1 - paramsk)**2 + norm( paramsCrTopkM1 - paramsCrTopk)**2 + norm(paramsStTopkM1 - paramsStTopk)**2 )
                     listChangeParams.append(normChangeP)
                     listGradNorms.append(gradk)
+                    if( tolKKT is not None ):
+                         residual = kktResidual(paramsk, paramsCrTopk, paramsStTopk, gradParamsk, gradCrTopk, gradStTopk)
                listChangefObj.append(change_fVal)
           else:
                paramsk, paramsCrTopk, paramsStTopk, gradParamsk, gradCrTopk, gradStTopk = paramsTest, paramsCrTopTest, paramsStTopTest, gradParamsTest, gradCrTopTest, gradStTopTest
           if( plotSteps):
-               itt.plotFann(x0, listB0k, listxk, listBk, params = paramsk, listBkBk1 = listBkBk1, indStTop = indStTop, paramsStTop = paramsStTopk, indCrTop = indCrTop, paramsCrTop = paramsCrTopk)
-               plt.title("Triangle fan after " + str(iter) + " iterations")
+               plotting().plotFan(x0, listB0k, listxk, listBk, "Triangle fan after " + str(iter) + " iterations", params = paramsk, listBkBk1 = listBkBk1, indStTop = indStTop, paramsStTop = paramsStTopk, indCrTop = indCrTop, paramsCrTop = paramsCrTopk)
           iter += 1
      return paramsk, paramsCrTopk, paramsStTopk, gradParamsk, gradCrTopk, gradStTopk, listObjVals, listGradNorms, listChangefObj, listChangeParams
           
 
-#@njit
-def getPathGradEikonal(params, listIndices, listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop):
+###################################
+# Projected quasi Newton (BFGS) on all the parameters at the same time
+
+def splitParams_qN(x, nParams, nCrTop, fanObj):
      '''
-     Compute the gradient of the eikonal, straight rights
+     params (with mun1 = 1), paramsCrTop, paramsStTop from x = [params without mun1, paramsCrTop, paramsStTop]
+     '''
+     params = np.append(x[:nParams], [1])
+     paramsCrTop = x[nParams:(nParams + nCrTop)] if nCrTop > 0 else fanObj.paramsCrTop
+     paramsStTop = x[(nParams + nCrTop):] if len(x) > nParams + nCrTop else fanObj.paramsStTop
+     return params, paramsCrTop, paramsStTop
+
+def gradient_fanObjective(fanObj, z, M, nParams, nCrTop, h = 1e-7):
+     '''
+     Gradient with respect to z of the objective function at x = M z with central differences (each
+     coordinate only changes a few regions, see fanObjective). Also returns how different the one
+     sided differences are (big where the objective function has a kink, e.g. muk = lamk). On the
+     bounds of [0,1] we use one sided differences
+     '''
+     f = fanObj.fTrial(*splitParams_qN(M @ z, nParams, nCrTop, fanObj))
+     grad = np.zeros(len(z))
+     kink = 0.0
+     for i in range(len(z)):
+          zPlus = np.copy(z)
+          zPlus[i] += h
+          zMinus = np.copy(z)
+          zMinus[i] -= h
+          if( zMinus[i] < 0 ):
+               fPlus = fanObj.fTrial(*splitParams_qN(M @ zPlus, nParams, nCrTop, fanObj))
+               grad[i] = (fPlus - f)/h
+          elif( zPlus[i] > 1 ):
+               fMinus = fanObj.fTrial(*splitParams_qN(M @ zMinus, nParams, nCrTop, fanObj))
+               grad[i] = (f - fMinus)/h
+          else:
+               fPlus = fanObj.fTrial(*splitParams_qN(M @ zPlus, nParams, nCrTop, fanObj))
+               fMinus = fanObj.fTrial(*splitParams_qN(M @ zMinus, nParams, nCrTop, fanObj))
+               grad[i] = (fPlus - fMinus)/(2*h)
+               kink = max(kink, abs( (fPlus - f)/h - (f - fMinus)/h ))
+     return grad, kink
+
+def projectedBFGS(fanObj, z0, M, nParams, nCrTop, tol, maxIter, recorder = None):
+     '''
+     Projected BFGS on [0,1] for the objective function at x = M z. Returns z, if it converged,
+     the kink at z (see gradient_fanObjective) and the list of values of the objective function
+     '''
+     zk = np.clip(z0, 0, 1)
+     fk = fanObj.fTrial(*splitParams_qN(M @ zk, nParams, nCrTop, fanObj))
+     if( recorder is not None ):
+          recorder.record(fk, *splitParams_qN(M @ zk, nParams, nCrTop, fanObj))
+     gk, kink = gradient_fanObjective(fanObj, zk, M, nParams, nCrTop)
+     H = np.eye(len(zk))
+     listObjVals = [fk]
+     for iter in range(maxIter):
+          # Variables on the bounds with the gradient pointing outwards stay there
+          active = ((zk <= 0) & (gk > 0)) | ((zk >= 1) & (gk < 0))
+          free = ~active
+          projGrad = np.where(free, gk, 0)
+          if( norm(projGrad) < tol ):
+               return zk, True, kink, listObjVals
+          d = np.zeros(len(zk))
+          d[free] = -H[np.ix_(free, free)] @ gk[free]
+          if( np.dot(d, gk) >= 0 ):
+               # Not a descent direction, restart with steepest descent
+               H = np.eye(len(zk))
+               d = -projGrad
+          # Projected backtracking (Armijo)
+          alpha = 1
+          while( alpha > 1e-12 ):
+               zTest = np.clip(zk + alpha*d, 0, 1)
+               fTest = fanObj.fTrial(*splitParams_qN(M @ zTest, nParams, nCrTop, fanObj))
+               if( fTest <= fk + 1e-4*np.dot(gk, zTest - zk) ):
+                    break
+               alpha = alpha*0.5
+          if( alpha <= 1e-12 ):
+               # No decrease along the projected direction
+               return zk, norm(projGrad) < sqrt(tol), kink, listObjVals
+          gTest, kink = gradient_fanObjective(fanObj, zTest, M, nParams, nCrTop)
+          sk = zTest - zk
+          yk = gTest - gk
+          if( np.dot(sk, yk) > 1e-12 ):
+               rho = 1/np.dot(sk, yk)
+               V = np.eye(len(zk)) - rho*np.outer(sk, yk)
+               H = V @ H @ V.T + rho*np.outer(sk, sk)
+          change_fVal = fk - fTest
+          zk, fk, gk = zTest, fTest, gTest
+          listObjVals.append(fk)
+          if( recorder is not None ):
+               recorder.record(fk, *splitParams_qN(M @ zk, nParams, nCrTop, fanObj))
+          if( change_fVal < tol and norm(sk) < tol ):
+               return zk, True, kink, listObjVals
+     return zk, False, kink, listObjVals
+
+def collapsedPairs_qN(x, nParams, nCrTop, tolCollapse = 1e-6):
+     '''
+     Matrix M such that x = M z where the pairs lamk, muk and rk, sk that are (numerically) the same
+     in x are a single variable in z. Also returns z
+     '''
+     pairs = [(2*j - 1, 2*j) for j in range(1, nParams//2)] # lamk, muk (mun1 = 1 is not in x)
+     pairs += [(i, i + 1) for i in range(nParams, len(x) - 1, 2)] # rk, sk
+     collapsed = {i: j for i, j in pairs if abs(x[i] - x[j]) < tolCollapse}
+     columns = []
+     for i in range(len(x)):
+          if( i in collapsed ):
+               columns.append( [i, collapsed[i]] )
+          elif( i not in collapsed.values() ):
+               columns.append( [i] )
+     M = np.zeros((len(x), len(columns)))
+     for c, rows in enumerate(columns):
+          M[rows, c] = 1
+     z = np.array([x[rows[0]] for rows in columns])
+     return M, z
+
+def projectedQuasiNewton_generalized(params0, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                     listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop0,
+                                     indStTop, paramsStTop0, listCurvingInwards, theta_gamma = 1,
+                                     tol = 1e-10, maxIter = 30, maxIterPolish = 5, tolKink = 1e-3,
+                                     maxIterFallback = 75, recorder = None, tolKKT = None):
+     '''
+     Projected BFGS on [0,1] for all the parameters at the same time. If it ends on a kink because
+     some lamk = muk (or rk = sk) we run it again with those pairs as a single variable. Then a few
+     iterations of blockCoordinateGradient_generalized from there (it has the feasibility projections).
+     If the objective function is still not smooth at the point BFGS found (one sided differences differ
+     by more than tolKink) or BFGS didn't converge we fall back to blockCoordinateGradient_generalized
+     with maxIterFallback iterations. Same outputs as blockCoordinateGradient_generalized.
+     If recorder (an iterateRecorder) is given the iterates of all these stages are saved there.
+     tolKKT is for blockCoordinateGradient_generalized (see kktResidual).
      '''
-     tol = 1e-10
-     tolGrads = norm(listxk[0] - listxk[1])*0.0001
-     nGrads = len(params)  #  Number of gradients we need to compute
-     # Set indStTop if indCrTop is given
-     if(paramsStTop is not None and indStTop[0] != -1):
-          nGrads += 2*len(indStTop)
-     else:
-          indStTop = [-1]
-          paramsStTop = [0,0]
-     # Set indCrTop if indStTop is given
-     if(paramsCrTop is not None and indCrTop[0] != -1):
-          nGrads += 2*len(indCrTop)
-     else:
-          indCrTop = [-1]
-          paramsCrTop = [0,0]
-     grads = np.zeros((nGrads, 2), dtype=float) # Initialize
-     path = np.zeros((nGrads, 2), dtype=float) # Initialize
-     currentCrTop = 0
-     currentStTop = 0
      n = len(listxk) - 2
-     muk = params[0]
-     etak = listIndices[0]
-     Bk = listBk[0]
-     B0k = listB0k[0]
-     x0 = listxk[0]
-     xk = listxk[1]
-     zk = hermite_boundary(muk, x0, B0k, xk, Bk)
-     path[0, :] = zk
-     BkBk1_0 = listBkBk1[0]
-     BkBk1_1 = listBkBk1[1]
-     lam2 = params[1]
-     mu2 = params[2]
-     B0k = listB0k[1]
-     Bk = listBk[1]
-     xk1 = listxk[2]
-     etak1 = listIndices[1]
-     etaMin = min(etak, etak1)
-     yk1 = hermite_boundary(lam2, x0, B0k, xk1, Bk)
-     zk1 = hermite_boundary(mu2, x0, B0k, xk1, Bk)
-     Bmu2 = gradientBoundary(mu2, x0, B0k, xk, Bk)
-     # We need to know where it goes
-     nTop = 1
-     if( nTop == indCrTop[currentCrTop]  ):
-          # This means that there is creeping along this triangle top
-          # Hence from zkPrev the path goes to ak and creeps to bk
-          # which then shoots to yk and then creeps to zk
-          etaRegionOutside = listIndices[n+1]
-          etaMinCr = min(etaRegionOutside, etak)
-          xk1 = listxk[2]
-          rk = paramsCrTop[2*currentCrTop]
-          sk = paramsCrTop[2*currentCrTop + 1]
-          ak = hermite_boundary(rk, xk, BkBk1_0, xk1, BkBk1_1)
-          bk = hermite_boundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
-          Bsk = gradientBoundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
-          if( norm(ak - zk)>tolGrads ):
-               grads[0, :] = ((ak - zk)/norm(ak - zk))*etak # Ray from mu1 to r1
-          path[1, :] = ak
-          path[2, :] = bk
-          if( abs(rk - sk) > 0.01 ):
-               grads[1, :] = (Bsk/norm(Bsk))*etaMinCr # creeping ray from r1 to s1
-          if( norm(yk1 - bk)>tolGrads ):
-               grads[2, :] = ((yk1 - bk)/norm(yk1 - bk))*etak # Ray from s1 to lam2
-          path[3, :] = yk1
-          if( abs(lam2 - mu2) > 0.01 ):
-               grads[3, :] = (Bmu2/norm(Bmu2))*etaMin # Creeping ray from lam2 to mu2
-          currGrad = 4
-          if( currentCrTop < len(indCrTop) - 1):
-               currentCrTop += 1
-     elif( nTop == indStTop[currentStTop]  ):
-          etaRegionOutside = listIndices[n+1]
-          x2 = listxk[2]
-          rk = paramsStTop[2*currentStTop]
-          sk = paramsStTop[2*currentStTop + 1]
-          ak = hermite_boundary(rk, xk, BkBk1_0, xk1, BkBk1_1)
-          bk = hermite_boundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
-          if( norm(ak - zk) > tolGrads ):
-               grads[0, :] = ((ak - zk)/norm(ak - zk))*etak # Ray from mu1 to r1
-          path[1, :] = ak
-          path[2, :] = bk
-          if( abs(rk - sk) > 0.01 ):
-               grads[1, :] = ((bk - ak)/norm(bk - ak))*etaRegionOutside # Ray from r1 to s1
-          if( norm( yk1 - bk)>tolGrads ):
-               grads[2, :] = ((yk1 - bk)/norm(yk1 - bk))*etak # Ray from s1 to lam2
-          path[3, :] = yk1
-          if( abs(lam2 - mu2) > 0.01 ):
-               grads[3, :] = (Bmu2/norm(Bmu2))*etaMin # Creeping ray from lam2 to mu2
-          currGrad = 4
-          if( currentStTop < len(indStTop) - 1):
-               currentStTop += 1
+     params0 = np.copy(params0)
+     if( len(params0) < 2*n + 1):
+          params0 = np.append(params0, [1])
+     fanObj = fanObjective(params0, x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listxk, listB0k,
+                           listBk, listBkBk1, indCrTop, paramsCrTop0, indStTop, paramsStTop0)
+     nParams = 2*n # mun1 = 1 always
+     nCrTop = 0 if paramsCrTop0 is None else len(paramsCrTop0)
+     xk = np.concatenate( (params0[:nParams], [] if paramsCrTop0 is None else paramsCrTop0,
+                           [] if paramsStTop0 is None else paramsStTop0) ).astype(float)
+     M = np.eye(len(xk))
+     zk, converged, kink, listObjVals = projectedBFGS(fanObj, xk, M, nParams, nCrTop, tol, maxIter, recorder)
+     if( not converged or kink >= tolKink ):
+          # Try again with the collapsed points as a single variable (BFGS is slow next to a kink)
+          M, zk = collapsedPairs_qN(M @ zk, nParams, nCrTop)
+          zk, converged, kink, listObjValsCollapsed = projectedBFGS(fanObj, zk, M, nParams, nCrTop, tol, maxIter, recorder)
+          listObjVals += listObjValsCollapsed
+     params, paramsCrTop, paramsStTop = splitParams_qN(M @ zk, nParams, nCrTop, fanObj)
+     paramsCrTop = None if paramsCrTop0 is None else paramsCrTop
+     paramsStTop = None if paramsStTop0 is None else paramsStTop
+     if( converged and kink < tolKink ):
+          maxIterBCD = maxIterPolish
      else:
-          # Means that the next point is on h0hk1
-          if( norm(yk1 - zk) > tolGrads ):
-               grads[0, :] = ((yk1 - zk)/norm(yk1 - zk))*etak
-          if( abs(lam2 - mu2) > 0.01 ):
-               grads[1, :] = (Bmu2/norm(Bmu2))*etaMin
-          path[1, :] = yk1
-          currGrad = 2
-     # NOW WE CIRCLE AROUND THE TRIANGLE FAN
-     for j in range(1, n ):
-          # j goes from 1 to n
-          # Circle around all the regions
-          k = 2*j-1 # Starts in k = 1, all the wat to k = 2n -3
-          nTop = j+1
-          lamk = params[k]
-          muk = params[k+1]
-          B0k = listB0k[j]
-          xk = listxk[j+1]
-          Bk = listBk[j]
-          etak = listIndices[j]
-          yk = hermite_boundary(lamk, x0, B0k, xk, Bk)
-          zk = hermite_boundary(muk, x0, B0k, xk, Bk)
-          path[currGrad, :] = zk
-          # We need to know where the path goes next
-          if( nTop == indCrTop[currentCrTop]  ):
-               # This means that there is creeping along this triangle top
-               # Hence from zkPrev the path goes to ak and creeps to bk
-               # which then shoots to yk and then creeps to zk
-               lamk1 = params[k+2]
-               muk1 = params[k+3]
-               B0k1 = listB0k[j+1]
-               Bk1 = listBk[j+1]
-               yk1 = hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
-               Bmuk1 = gradientBoundary(muk1, x0, B0k1, xk1, Bk1)
-               etak1 = listIndices[j+1]
-               etaMin =  min(etak, etak1)
-               BkBk1_0 = listBkBk1[k]
-               BkBk1_0 = listBkBk1[k+1]
-               xk1 = listxk[j+2]
-               etaRegionOutside = listIndices[n+j+1]
-               etaMinCr = min(etaRegionOutside, etak)
-               rk = paramsCrTop[2*currentCrTop]
-               sk = paramsCrTop[2*currentCrTop + 1]
-               ak = hermite_boundary(rk, xk, BkBk1_0, xk1, BkBk1_1)
-               bk = hermite_boundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
-               Bsk = gradientBoundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
-               if( norm( ak - zk) > tolGrads ):
-                    grads[currGrad, :] = ((ak - zk)/norm(ak - zk))*etak
-               path[currGrad + 1, :] = ak
-               if( abs(rk - sk) > 0.01 ):
-                    grads[currGrad + 1, :] = (Bsk/norm(Bsk))*etaMinCr
-               path[currGrad + 2, :] = bk
-               if( norm( yk1 - bk)>tolGrads ):
-                    grads[currGrad + 2, :] = ((yk1 - bk)/norm(yk1 - bk))*etak
-               path[currGrad + 3, :] = yk1
-               if( abs(lamk1 - muk1) > 0.01 ):
-                    grads[currGrad + 3, :] = (Bmuk1/norm(Bmuk1))*etaMin
-               currGrad += 4
-               if( currentCrTop < len(indCrTop) - 1):
-                    currentCrTop += 1
-          elif( nTop == indStTop[currentStTop]  ):
-               lamk1 = params[k+2]
-               muk1 = params[k+3]
-               B0k1 = listB0k[j+1]
-               Bk1 = listBk[j+1]
-               yk1 = hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
-               Bmuk1 = gradientBoundary(muk1, x0, B0k1, xk1, Bk1)
-               etak1 = listIndices[j+1]
-               etaMin =  min(etak, etak1)
-               BkBk1_0 = listBkBk1[k]
-               BkBk1_0 = listBkBk1[k+1]
-               xk1 = listxk[j+2]
-               etaRegionOutside = listIndices[n+j+1]
-               rk = paramsCrTop[2*currentCrTop]
-               sk = paramsCrTop[2*currentCrTop + 1]
-               ak = hermite_boundary(rk, xk, BkBk1_0, xk1, BkBk1_1)
-               bk = hermite_boundary(sk, xk, BkBk1_0, xk1, BkBk1_1)
-               if( norm( ak - zk) > tolGrads ):
-                    grads[currGrad, :] = ((ak - zk)/norm(ak - zk))*etak
-               path[currGrad + 1, :] = ak
-               if( abs(rk - sk) > 0.01 ):
-                    grads[currGrad + 1, :] = ((bk - ak)/norm(bk - ak))*etaRegionOutside
-               path[currGrad + 2, :] = bk
-               if( norm( yk1 - bk) > tolGrads ):
-                    grads[currGrad + 2, :] = ((yk1 - bk)/norm(yk1 - bk))*etak
-               path[currGrad + 3, :] = yk1
-               if( abs(lamk1 - muk1) > 0.01 ):
-                    grads[currGrad + 3, :] = (Bmuk1/norm(Bmuk1))*etaMin
-               currGrad += 4
-               if( currentCrTop < len(indCrTop) - 1):
-                    currentCrTop += 1
-          elif( j < n ) :
-               # The next point is on h0hk1
-               lamk1 = params[k+2]
-               muk1 = params[k+3]
-               xk1 = listxk[j+2]
-               B0k1 = listB0k[j+1]
-               Bk1 = listBk[j+1]
-               yk1 = hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
-               zk1 = hermite_boundary(muk1, x0, B0k1, xk1, Bk1)
-               Bmuk1 = gradientBoundary(muk1, x0, B0k1, xk1, Bk1)
-               etak1 = listIndices[j+1]
-               etaMin =  min(etak, etak1)
-               BkBk1_0 = listBkBk1[k]
-               BkBk1_0 = listBkBk1[k+1]
-               xk1 = listxk[j+2]
-               path[currGrad + 1, :] = yk1
-               path[currGrad + 2, :] = zk1
-               if( norm( zk - yk1 ) > tolGrads ):
-                    grads[currGrad, :] = ((yk1 - zk)/norm(yk1 - zk))*etak
-               if( abs(lamk1 - muk1) > 0.01 ):
-                    grads[currGrad + 1, :] = (Bmuk1/norm(Bmuk1))*etaMin
-               currGrad += 2
+          # Non smooth (or BFGS got stuck), the block coordinate method handles the kinks
+          maxIterBCD = maxIterFallback
+     output = blockCoordinateGradient_generalized(params, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                                  listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop,
+                                                  indStTop, paramsStTop, listCurvingInwards, theta_gamma = theta_gamma,
+                                                  maxIter = maxIterBCD, recorder = recorder, tolKKT = tolKKT)
+     if( maxIterBCD == maxIterPolish and len(output[6]) >= maxIterPolish ):
+          # The polish didn't stop on its own, BFGS wasn't at the optimum after all
+          listObjVals += output[6]
+          output = blockCoordinateGradient_generalized(output[0], x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                                       listxk, listB0k, listBk, listBkBk1, indCrTop, output[1],
+                                                       indStTop, output[2], listCurvingInwards, theta_gamma = theta_gamma,
+                                                       maxIter = maxIterFallback, recorder = recorder, tolKKT = tolKKT)
+     return output[0:6] + (listObjVals + output[6],) + output[7:]
+
+
+###################################
+# Batch of triangle fans with the same number of regions (and the same type of points on the tops)
+# Arrays have a leading batch dimension B: x0[B,2], T0[B], listxk[B,n+2,2], params[B,2n+1], ...
+
+def norm_batch(v):
+     '''
+     Euclidean norm of each row of v[B,2]
+     '''
+     return np.sqrt(v[:, 0]**2 + v[:, 1]**2)
+
+def gradientBoundary_batch(param, xFrom, Bfrom, xTo, Bto):
+     '''
+     Tangent to the boundary (interpolated using Hermite), param[B]
+     '''
+     p = param[:, None]
+     return 3*(2*xFrom + Bfrom - 2*xTo + Bto)*p**2 + 2*(-3*xFrom - 2*Bfrom + 3*xTo - Bto)*p + Bfrom
+
+def hermite_boundary_batch(param, xFrom, Bfrom, xTo, Bto):
+     '''
+     Hermite interpolation of the boundary, param[B]
+     '''
+     p = param[:, None]
+     return (2*xFrom + Bfrom - 2*xTo + Bto)*p**3 + (-3*xFrom - 2*Bfrom + 3*xTo - Bto)*p**2 + Bfrom*p + xFrom
+
+def dot_batch(u, v):
+     '''
+     Dot product of each row of u[B,2] with the same row of v[B,2] (rounded as np.dot, the
+     signs of these products decide the projections)
+     '''
+     return np.matmul(u[:, None, :], v[:, :, None])[:, 0, 0]
+
+def normal_batch(v):
+     '''
+     Each row of v[B,2] rotated 90 degrees
+     '''
+     return np.stack((-v[:, 1], v[:, 0]), axis = 1)
+
+def orientNormal_batch(N, v):
+     '''
+     Flip the rows of N[B,2] that point away from v[B,2]
+     '''
+     return np.where((dot_batch(N, v) < 0)[:, None], -N, N)
+
+def hermite_interpolationT_batch(param, x0, T0, grad0, x1, T1, grad1):
+     '''
+     Hermite interpolation of the eikonal, param[B]
+     '''
+     p = param[:, None]
+     sumGrads = (p**3 - 2*p**2 + p)*grad0 + (p**3 - p**2)*grad1
+     return (2*param**3 - 3*param**2 + 1)*T0 + (-2*param**3 + 3*param**2)*T1 + dot_batch(x1 - x0, sumGrads)
+
+def der_hermite_interpolationT_batch(param, x0, T0, grad0, x1, T1, grad1):
+     '''
+     derivative with respect to param of the Hermite interpolation of the eikonal, param[B]
+     '''
+     p = param[:, None]
+     sumGrads = (3*p**2 - 4*p + 1)*grad0 + (3*p**2 - 2*p)*grad1
+     return (6*param**2 - 6*param)*T0 + (-6*param**2 + 6*param)*T1 + dot_batch(x1 - x0, sumGrads)
+
+def secondDer_Boundary_batch(param, xFrom, Bfrom, xTo, Bto):
+     '''
+     d2B/dparam2, param[B]
+     '''
+     p = param[:, None]
+     return 6*(2*xFrom + Bfrom - 2*xTo + Bto)*p + 2*(-3*xFrom - 2*Bfrom + 3*xTo - Bto)
+
+def arclengthSimpson_batch(mu, lam, xFrom, Bfrom, xTo, Bto):
+     '''
+     arclength along a boundary from xLam to xMu, mu[B] and lam[B]
+     '''
+     Bmu = gradientBoundary_batch(mu, xFrom, Bfrom, xTo, Bto)
+     Blam = gradientBoundary_batch(lam, xFrom, Bfrom, xTo, Bto)
+     B_mid = gradientBoundary_batch((mu + lam)/2, xFrom, Bfrom, xTo, Bto)
+     return (norm_batch(Bmu) + 4*norm_batch(B_mid) + norm_batch(Blam))*(np.abs(mu - lam)/6)
+
+def partial_L_muk_batch(muk, lamk, B0k_muk, secondDer_B0k_muk, B0k_halves, secondDer_B0khalves_muk, B0k_lamk):
+     '''
+     partial_L_muk, muk[B] and lamk[B]
+     '''
+     with np.errstate(all = 'ignore'):
+          normB0k_muk = norm_batch(B0k_muk)
+          normB0k_halves = norm_batch(B0k_halves)
+          sk = np.where(muk > lamk, 1, -1)
+          firstPart = sk/6*(normB0k_muk + 4*normB0k_halves + norm_batch(B0k_lamk) )
+          secondPart = (np.abs(muk - lamk)/6)*(dot_batch(secondDer_B0k_muk, B0k_muk)/normB0k_muk + 2*dot_batch(secondDer_B0khalves_muk, B0k_halves)/normB0k_halves)
+     return np.where(np.abs(muk - lamk) <= 1e-14, 0, firstPart + secondPart)
+
+def partial_L_lamk_batch(muk, lamk, B0k_muk, B0k_halves, secondDer_B0khalves_lamk, B0k_lamk, secondDer_B0k_lamk):
+     '''
+     partial_L_lamk, muk[B] and lamk[B]
+     '''
+     with np.errstate(all = 'ignore'):
+          normB0k_halves = norm_batch(B0k_halves)
+          normB0k_lamk = norm_batch(B0k_lamk)
+          sk = np.where(muk > lamk, 1, -1)
+          firstPart = -sk/6*(norm_batch(B0k_muk) + 4*normB0k_halves + normB0k_lamk )
+          secondPart = (np.abs(muk - lamk)/6)*(2*dot_batch(secondDer_B0khalves_lamk, B0k_halves)/normB0k_halves + dot_batch(secondDer_B0k_lamk, B0k_lamk)/normB0k_lamk )
+     return np.where(np.abs(muk - lamk) <= 1e-14, 0, firstPart + secondPart)
+
+def partial_fObj_mu1_batch(mu1, x0, T0, grad0, x1, T1, grad1, B01_mu, y2, z1):
+     '''
+     partial_fObj_mu1, mu1[B]
+     '''
+     der_hermite_inter = der_hermite_interpolationT_batch(mu1, x0, T0, grad0, x1, T1, grad1)
+     with np.errstate(all = 'ignore'):
+          ray = dot_batch(B01_mu, y2 - z1)/norm_batch(y2 - z1)
+     return np.where(norm_batch(y2 - z1) < 1e-8, der_hermite_inter, der_hermite_inter - ray)
+
+def partial_fObj_recCr_batch(shFrom, shTo, rec, x0From, B0From, x1From, B1From, x0To, B0To, x1To, B1To, etaInside, etaOutside):
+     '''
+     partial_fObj_recCr, shFrom[B], shTo[B] and rec[B]
+     '''
+     shooterFrom = hermite_boundary_batch(shFrom, x0From, B0From, x1From, B1From)
+     receiver = hermite_boundary_batch(rec, x0To, B0To, x1To, B1To)
+     B_atShooterTo = gradientBoundary_batch(shTo, x0To, B0To, x1To, B1To)
+     B_atReceiver = gradientBoundary_batch(rec, x0To, B0To, x1To, B1To)
+     secondDer_B_atReceiver = secondDer_Boundary_batch(rec, x0To, B0To, x1To, B1To)
+     B_halves = gradientBoundary_batch( (shTo + rec)/2, x0To, B0To, x1To, B1To)
+     secondDer_Bhalves_atReceiver = secondDer_Boundary_batch( (shTo + rec)/2, x0To, B0To, x1To, B1To)
+     perL_receiver = partial_L_lamk_batch(shTo, rec, B_atShooterTo, B_halves, secondDer_Bhalves_atReceiver, B_atReceiver, secondDer_B_atReceiver)
+     etaMin = np.minimum(etaInside, etaOutside)
+     with np.errstate(all = 'ignore'):
+          ray = etaInside*dot_batch(B_atReceiver, receiver - shooterFrom)/norm_batch(receiver - shooterFrom)
+     return np.where(np.all(receiver == shooterFrom, axis = 1), 0, ray) + etaMin*perL_receiver
+
+def partial_fObj_shCr_batch(sh, recFrom, recTo, x0From, B0From, x1From, B1From, x0To, B0To, x1To, B1To, etaInside, etaOutside):
+     '''
+     partial_fObj_shCr, sh[B], recFrom[B] and recTo[B]
+     '''
+     shooter = hermite_boundary_batch(sh, x0From, B0From, x1From, B1From)
+     receiverTo = hermite_boundary_batch(recTo, x0To, B0To, x1To, B1To)
+     B_atShooter = gradientBoundary_batch(sh, x0From, B0From, x1From, B1From)
+     secondDer_B_atShooter = secondDer_Boundary_batch(sh, x0From, B0From, x1From, B1From)
+     B_halves = gradientBoundary_batch( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
+     secondDer_Bhalves_atShooter = secondDer_Boundary_batch( (sh + recFrom)/2, x0From, B0From, x1From, B1From)
+     B_atReceiver = gradientBoundary_batch(recFrom, x0From, B0From, x1From, B1From)
+     parL_shooter = partial_L_muk_batch(sh, recFrom, B_atShooter, secondDer_B_atShooter, B_halves, secondDer_Bhalves_atShooter, B_atReceiver)
+     etaMin = np.minimum(etaInside, etaOutside)
+     with np.errstate(all = 'ignore'):
+          ray = etaInside*dot_batch(-B_atShooter, receiverTo - shooter)/norm_batch(receiverTo - shooter)
+     return np.where(np.all(receiverTo == shooter, axis = 1), 0, ray) + etaMin*parL_shooter
+
+def partial_fObj_collapsedShooter_batch(shFrom, sh, recTo, x0From, B0From, x1From, B1From, x0This, B0This, x1This, B1This, x0To, B0To, x1To, B1To, etaPrev, etaNext):
+     '''
+     partial_fObj_collapsedShooter, shFrom[B], sh[B] and recTo[B]
+     '''
+     shooterFrom = hermite_boundary_batch(shFrom, x0From, B0From, x1From, B1From)
+     collapsedShooter = hermite_boundary_batch(sh, x0This, B0This, x1This, B1This)
+     B_collapsedShooter = gradientBoundary_batch(sh, x0This, B0This, x1This, B1This)
+     receiverTo = hermite_boundary_batch(recTo, x0To, B0To, x1To, B1To)
+     with np.errstate(all = 'ignore'):
+          fromShooter = etaPrev*dot_batch( B_collapsedShooter, collapsedShooter - shooterFrom)/norm_batch(collapsedShooter - shooterFrom)
+          toReceiver = etaNext*dot_batch( -B_collapsedShooter, receiverTo - collapsedShooter)/norm_batch( receiverTo - collapsedShooter)
+     fromShooter = np.where(np.all(shooterFrom == collapsedShooter, axis = 1), 0, fromShooter)
+     toReceiver = np.where(np.all(receiverTo == collapsedShooter, axis = 1), 0, toReceiver)
+     return fromShooter + toReceiver
+
+class fanBatch:
+     '''
+     Stacked arrays of B triangle fans with the same number of regions, the same arguments as
+     blockCoordinateGradient_generalized with a leading batch dimension
+     '''
+     def __init__(self, x0, T0, grad0, x1, T1, grad1, listIndices, listxk, listB0k, listBk, listBkBk1, listCurvingInwards):
+          self.x0 = np.asarray(x0, dtype=float)
+          self.T0 = np.asarray(T0, dtype=float)
+          self.grad0 = np.asarray(grad0, dtype=float)
+          self.x1 = np.asarray(x1, dtype=float)
+          self.T1 = np.asarray(T1, dtype=float)
+          self.grad1 = np.asarray(grad1, dtype=float)
+          self.listIndices = np.asarray(listIndices, dtype=float)
+          self.listxk = np.asarray(listxk, dtype=float)
+          self.listB0k = np.asarray(listB0k, dtype=float)
+          self.listBk = np.asarray(listBk, dtype=float)
+          self.listBkBk1 = np.asarray(listBkBk1, dtype=float)
+          self.listCurvingInwards = np.asarray(listCurvingInwards)
+          self.n = self.listxk.shape[1] - 2
+
+     def rows(self, ind):
+          '''
+          The fans ind of this batch
+          '''
+          return fanBatch(self.x0[ind], self.T0[ind], self.grad0[ind], self.x1[ind], self.T1[ind], self.grad1[ind],
+                          self.listIndices[ind], self.listxk[ind], self.listB0k[ind], self.listBk[ind],
+                          self.listBkBk1[ind], self.listCurvingInwards[ind])
+
+     def regionTerm(self, j, params, ind = slice(None)):
+          '''
+          Term of the j-th region (fObj_regionTerm without points on the top) for the fans ind, params[len(ind),2n+1]
+          '''
+          if( j == 0 ):
+               return hermite_interpolationT_batch(params[:, 0], self.x0[ind], self.T0[ind], self.grad0[ind],
+                                                   self.x1[ind], self.T1[ind], self.grad1[ind])
+          k = 2*j - 1
+          x0 = self.x0[ind]
+          if( j == 1 ):
+               zkPrev = hermite_boundary_batch(params[:, k-1], x0, self.listB0k[ind, 0], self.x1[ind], self.listBk[ind, 0])
+          else:
+               zkPrev = hermite_boundary_batch(params[:, k-1], x0, self.listB0k[ind, j-1], self.listxk[ind, j], self.listBk[ind, j-1])
+          B0k = self.listB0k[ind, j]
+          xk = self.listxk[ind, j+1]
+          Bk = self.listBk[ind, j]
+          etakPrev = self.listIndices[ind, j-1]
+          etaMin = np.minimum(etakPrev, self.listIndices[ind, j])
+          yk = hermite_boundary_batch(params[:, k], x0, B0k, xk, Bk)
+          return etakPrev*norm_batch(yk - zkPrev) + etaMin*arclengthSimpson_batch(params[:, k+1], params[:, k], x0, B0k, xk, Bk)
+
+class fanObjective_batch:
+     '''
+     fanObjective for a batch of triangle fans without points on the tops. The trial steps move the
+     same block in all the fans, fTrial only recomputes the terms of the regions that depend on it.
+     '''
+     def __init__(self, params, fans):
+          self.fans = fans
+          self.params = np.array(params, dtype=float)
+          self.terms = np.stack([fans.regionTerm(j, self.params) for j in range(fans.n + 1)], axis = 1)
+          self.fVal = np.zeros(len(self.params))
+          for j in range(fans.n + 1):
+               self.fVal += self.terms[:, j]
+
+     def fTrial(self, params, ind = slice(None)):
+          '''
+          Objective function of the fans ind at params[len(ind),2n+1]
+          '''
+          changedParams = np.flatnonzero(np.any(params != self.params[ind], axis = 0))
+          terms = np.copy(self.terms[ind])
+          for j in regionsOfParams(self.fans.n, changedParams):
+               terms[:, j] = self.fans.regionTerm(j, params, ind)
+          f = np.zeros(len(params))
+          for j in range(self.fans.n + 1):
+               f += terms[:, j]
+          return f
+
+def close_to_identity_batch(lamk, muk):
+     '''
+     close_to_identity, lamk[B] and muk[B]
+     '''
+     middle = 0.5*lamk + 0.5*muk
+     return np.sqrt( (lamk - middle)**2 + (muk - middle)**2 )
+
+def projectionRoots_batch(polysPerFan, currents, brackets):
+     '''
+     Roots for the projections of a batch: polysPerFan(i) are the polynomials of the i-th fan, currents[B, m]
+     (nan for the tangents, where there might be no root) and brackets[m] as in projectionRoots. All the
+     polynomials are solved in one call. Returns roots[B, m], nan where there is no root
+     '''
+     B, m = currents.shape
+     listPolys = [poly for i in range(B) for poly in polysPerFan(i)]
+     roots = projectionRoots(listPolys, currents.flatten(), list(brackets)*B, limits = secantLimit_batch(listPolys))
+     return np.array(roots, dtype=float).reshape((B, m))
+
+def project_lamk1Givenmuk_batch(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
+     '''
+     project_lamk1Givenmuk, muk[B] and lamk1[B]. The roots are only computed for the fans where lamk1 is
+     not feasible (all of them in one projectionRoots call)
+     '''
+     lamk1 = np.clip(lamk1, 0, 1)
+     zk = hermite_boundary_batch(muk, x0, B0k, xk, Bk)
+     yk1 = hermite_boundary_batch(lamk1, x0, B0k1, xk1, Bk1)
+     B0k_muk = gradientBoundary_batch(muk, x0, B0k, xk, Bk)
+     B0k1_lamk1 = gradientBoundary_batch(lamk1, x0, B0k1, xk1, Bk1)
+     # The tests use the normals before they are oriented, as in project_lamk1Givenmuk
+     dotTestMin = dot_batch( yk1 - zk, normal_batch(B0k_muk) )
+     dotTestMax = dot_batch( yk1 - zk, normal_batch(B0k1_lamk1) )
+     lamk1Min = np.copy(lamk1)
+     lamk1Max = np.copy(lamk1)
+     ind = np.flatnonzero( (dotTestMin < 0) | (dotTestMax < 0) )
+     if( len(ind) > 0 ):
+          roots = projectionRoots_batch(lambda r: [fixedDirectionPolynomial(x0[ind[r]], B0k1[ind[r]], xk1[ind[r]], Bk1[ind[r]], zk[ind[r]], B0k_muk[ind[r]]),
+                                                   tangentDirectionPolynomial(x0[ind[r]], B0k1[ind[r]], xk1[ind[r]], Bk1[ind[r]], zk[ind[r]])],
+                                        np.stack((lamk1[ind], lamk1[ind]), axis = 1), [False, False])
+          lamk1Min[ind] = roots[:, 0]
+          lamk1Max[ind] = roots[:, 1]
+     # lamk1 < lambdaMin
+     ind = np.flatnonzero(dotTestMin < 0)
+     lamk1[ind] = lamk1Min[ind]
+     yk1 = hermite_boundary_batch(lamk1[ind], x0[ind], B0k1[ind], xk1[ind], Bk1[ind])
+     Nk1_lamk1 = orientNormal_batch(normal_batch(gradientBoundary_batch(lamk1[ind], x0[ind], B0k1[ind], xk1[ind], Bk1[ind])),
+                                    x0[ind] - xk[ind])
+     dotTestMax[ind] = dot_batch( yk1 - zk[ind], Nk1_lamk1 )
+     # lamk1 > lambdaMax
+     ind = np.flatnonzero(dotTestMax < 0)
+     lamk1[ind] = lamk1Max[ind]
+     return np.clip(lamk1, 0, 1)
+
+def project_mukGivenlamk1_batch(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
+     '''
+     project_mukGivenlamk1, muk[B] and lamk1[B]. The roots are only computed for the fans where muk is
+     not feasible (all of them in one projectionRoots call)
+     '''
+     muk = np.clip(muk, 0, 1)
+     yk1 = hermite_boundary_batch(lamk1, x0, B0k1, xk1, Bk1)
+     B0k1_lamk1 = gradientBoundary_batch(lamk1, x0, B0k1, xk1, Bk1)
+     zk = hermite_boundary_batch(muk, x0, B0k, xk, Bk)
+     N0k1_lamk1 = orientNormal_batch(normal_batch(B0k1_lamk1), x0 - xk)
+     N0k_muk = orientNormal_batch(normal_batch(gradientBoundary_batch(muk, x0, B0k, xk, Bk)), xk1 - x0)
+     dotTestMin = dot_batch(N0k1_lamk1, yk1 - zk)
+     dotTestMax = dot_batch(N0k_muk, yk1 - zk)
+     mukMin = np.copy(muk)
+     mukMax = np.copy(muk)
+     ind = np.flatnonzero( (dotTestMin < 0) | (dotTestMax < 0) )
+     if( len(ind) > 0 ):
+          roots = projectionRoots_batch(lambda r: [fixedDirectionPolynomial(x0[ind[r]], B0k[ind[r]], xk[ind[r]], Bk[ind[r]], yk1[ind[r]], B0k1_lamk1[ind[r]]),
+                                                   tangentDirectionPolynomial(x0[ind[r]], B0k[ind[r]], xk[ind[r]], Bk[ind[r]], yk1[ind[r]])],
+                                        np.stack((muk[ind], muk[ind]), axis = 1), [False, False])
+          mukMin[ind] = roots[:, 0]
+          mukMax[ind] = roots[:, 1]
+     # muk < mukMin
+     ind = np.flatnonzero(dotTestMin < 0)
+     muk[ind] = mukMin[ind]
+     zk = hermite_boundary_batch(muk[ind], x0[ind], B0k[ind], xk[ind], Bk[ind])
+     N0k_muk = orientNormal_batch(normal_batch(gradientBoundary_batch(muk[ind], x0[ind], B0k[ind], xk[ind], Bk[ind])),
+                                  xk1[ind] - x0[ind])
+     dotTestMax[ind] = dot_batch(N0k_muk, yk1[ind] - zk)
+     # muk > mukMax
+     ind = np.flatnonzero(dotTestMax < 0)
+     muk[ind] = mukMax[ind]
+     return np.clip(muk, 0, 1)
+
+def project_lamkGivenmuk1_noCr_batch(mukM1, lamk, x0, B0kM1, xkM1, BkM1, B0k, xk, Bk, BkM1Bk_0, BkM1Bk_1):
+     '''
+     project_lamkGivenmuk1_noCr, mukM1[B] and lamk[B]
+     '''
+     lamk = np.clip(lamk, 0, 1)
+     zkM1 = hermite_boundary_batch(mukM1, x0, B0kM1, xkM1, BkM1)
+     yk = hermite_boundary_batch(lamk, x0, B0k, xk, Bk)
+     B0kM1_mukM1 = gradientBoundary_batch(mukM1, x0, B0kM1, xkM1, BkM1)
+     B0k_lamk = gradientBoundary_batch(lamk, x0, B0k, xk, Bk)
+     # a_tan = hkM1hk(r_tan), together with lamMin and lamMax from h0hkM1
+     roots = projectionRoots_batch(lambda i: [tangentDirectionPolynomial(xkM1[i], BkM1Bk_0[i], xk[i], BkM1Bk_1[i], zkM1[i]),
+                                           fixedDirectionPolynomial(x0[i], B0k[i], xk[i], Bk[i], zkM1[i], B0kM1_mukM1[i]),
+                                           tangentDirectionPolynomial(x0[i], B0k[i], xk[i], Bk[i], zkM1[i])],
+                                np.stack((np.full(len(lamk), np.nan), lamk, lamk), axis = 1), [False, False, False])
+     r_tan, lamkMin, lamkMax = roots[:, 0], roots[:, 1], roots[:, 2]
+     hasTan = ~np.isnan(r_tan)
+     with np.errstate(all = 'ignore'):
+          a_tan = hermite_boundary_batch(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
+          BkM1Bk_tan = gradientBoundary_batch(r_tan, xkM1, BkM1Bk_0, xk, BkM1Bk_1)
+     # The normals - depends on the position of x0 and xk  with respect to xkM1
+     NkM1_mukM1 = orientNormal_batch(normal_batch(B0kM1_mukM1), xk - x0)
+     Nk_lamk = orientNormal_batch(normal_batch(B0k_lamk), x0 - xkM1)
+     N_tan = normal_batch(BkM1Bk_tan)
+     N_tan = np.where((dot_batch(normal_batch(BkM1Bk_0), x0 - xk) < 0)[:, None], -N_tan, N_tan)
+     # Tests
+     dotTestMin_fromh0kM1 = dot_batch( yk - zkM1, NkM1_mukM1 )
+     dotTestMax_fromh0kM1 = dot_batch( yk - zkM1, Nk_lamk )
+     dotTestMax_fromhkM1hk = np.where(hasTan, dot_batch( yk - a_tan, N_tan ), 0)
+     # lamk < lamMin
+     ind = np.flatnonzero(dotTestMin_fromh0kM1 < 0)
+     lamk[ind] = lamkMin[ind]
+     yk[ind] = hermite_boundary_batch(lamk[ind], x0[ind], B0k[ind], xk[ind], Bk[ind])
+     Nk_lamk = orientNormal_batch(normal_batch(gradientBoundary_batch(lamk[ind], x0[ind], B0k[ind], xk[ind], Bk[ind])), x0[ind] - xkM1[ind])
+     dotTestMax_fromh0kM1[ind] = dot_batch( yk[ind] - zkM1[ind], Nk_lamk )
+     # lamk > lamkMax (from h0hkM1), test again for the max from hkM1hk
+     ind = np.flatnonzero(dotTestMax_fromh0kM1 < 0)
+     lamk[ind] = lamkMax[ind]
+     ind = ind[hasTan[ind]]
+     dotTestMax_fromhkM1hk[ind] = dot_batch( yk[ind] - a_tan[ind], N_tan[ind] )
+     # lamk > lamkMax (from hkM1hk)
+     ind = np.flatnonzero(dotTestMax_fromhkM1hk < 0)
+     if( len(ind) > 0 ):
+          listPolys = [fixedDirectionPolynomial(x0[i], B0k[i], xk[i], Bk[i], a_tan[i], BkM1Bk_tan[i]) for i in ind]
+          lamk[ind] = projectionRoots(listPolys, lamk[ind], limits = secantLimit_batch(listPolys))
+     return np.clip(lamk, 0, 1)
+
+def project_mukGivenlamk1_noCr_batch(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1, BkBk1_0, BkBk1_1):
+     '''
+     project_mukGivenlamk1_noCr, muk[B] and lamk1[B]
+     '''
+     muk = np.clip(muk, 0, 1)
+     yk1 = hermite_boundary_batch(lamk1, x0, B0k1, xk1, Bk1)
+     B0k1_lamk1 = gradientBoundary_batch(lamk1, x0, B0k1, xk1, Bk1)
+     zk = hermite_boundary_batch(muk, x0, B0k, xk, Bk)
+     B0k_muk = gradientBoundary_batch(muk, x0, B0k, xk, Bk)
+     # a_tan = hkhk1(r_tan), together with mukMin and mukMax from h0hk
+     roots = projectionRoots_batch(lambda i: [tangentDirectionPolynomial(xk[i], BkBk1_0[i], xk1[i], BkBk1_1[i], yk1[i]),
+                                           fixedDirectionPolynomial(x0[i], B0k[i], xk[i], Bk[i], yk1[i], B0k1_lamk1[i]),
+                                           tangentDirectionPolynomial(x0[i], B0k[i], xk[i], Bk[i], yk1[i])],
+                                np.stack((np.full(len(muk), np.nan), muk, muk), axis = 1), [False, True, False])
+     r_tan, mukMin, mukMax = roots[:, 0], roots[:, 1], roots[:, 2]
+     hasTan = ~np.isnan(r_tan)
+     with np.errstate(all = 'ignore'):
+          a_tan = hermite_boundary_batch(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
+          BkBk1_tan = gradientBoundary_batch(r_tan, xk, BkBk1_0, xk1, BkBk1_1)
+     # The normals (NkNk1_0 as in project_mukGivenlamk1_noCr)
+     N0k1_lamk1 = orientNormal_batch(normal_batch(B0k1_lamk1), x0 - xk)
+     N0k_muk = orientNormal_batch(normal_batch(B0k_muk), xk1 - x0)
+     NkNk1_0 = np.stack((-BkBk1_0[:, 1], BkBk1_1[:, 0]), axis = 1)
+     N_tan = normal_batch(BkBk1_tan)
+     N_tan = np.where((dot_batch(NkNk1_0, x0 - xk) < 0)[:, None], -N_tan, N_tan)
+     # Tests
+     dotTestMin_fromh0hk = dot_batch(N0k1_lamk1, yk1 - zk)
+     dotTestMax_fromh0hk = dot_batch(N0k_muk, yk1 - zk)
+     dotTestMax_fromhkhk1 = np.where(hasTan, dot_batch(N_tan, zk - a_tan), 0)
+     # muk < mukMin (the test for the max from h0hk is not updated, as in project_mukGivenlamk1_noCr)
+     ind = np.flatnonzero(dotTestMin_fromh0hk < 0)
+     muk[ind] = mukMin[ind]
+     zk[ind] = hermite_boundary_batch(muk[ind], x0[ind], B0k[ind], xk[ind], Bk[ind])
+     # muk > mukMax (from h0hk), test again for the max from hkhk1
+     ind = np.flatnonzero(dotTestMax_fromh0hk < 0)
+     muk[ind] = mukMax[ind]
+     ind = ind[hasTan[ind]]
+     dotTestMax_fromhkhk1[ind] = dot_batch(N_tan[ind], zk[ind] - a_tan[ind])
+     # muk > mukMax (from hkhk1)
+     ind = np.flatnonzero(dotTestMax_fromhkhk1 < 0)
+     if( len(ind) > 0 ):
+          listPolys = [fixedDirectionPolynomial(x0[i], B0k[i], xk[i], Bk[i], a_tan[i], BkBk1_tan[i]) for i in ind]
+          muk[ind] = projectionRoots(listPolys, muk[ind], limits = secantLimit_batch(listPolys))
+     return np.clip(muk, 0, 1)
+
+def projectPair_batch(mukForMuk, mukForLamk1, lamk1, noCr, x0, B0k, xk, Bk, B0k1, xk1, Bk1, BkBk1_0, BkBk1_1):
+     '''
+     muk projected given lamk1 and lamk1 projected given muk (mukForMuk and mukForLamk1, they are not always
+     the same) for a batch. Where noCr (the side edge curves inwards and the step went towards it) the
+     projections are the _noCr ones.
+     '''
+     muk_projected = np.empty(len(lamk1))
+     lamk1_projected = np.empty(len(lamk1))
+     for ind, projectMuk, projectLamk1 in ((np.flatnonzero(~noCr), project_mukGivenlamk1_batch, project_lamk1Givenmuk_batch),
+                                           (np.flatnonzero(noCr), project_mukGivenlamk1_noCr_batch, project_lamkGivenmuk1_noCr_batch)):
+          if( len(ind) == 0 ):
+               continue
+          edges = (x0[ind], B0k[ind], xk[ind], Bk[ind], B0k1[ind], xk1[ind], Bk1[ind])
+          tops = (BkBk1_0[ind], BkBk1_1[ind]) if projectMuk is project_mukGivenlamk1_noCr_batch else ()
+          muk_projected[ind] = projectMuk(mukForMuk[ind], lamk1[ind], *edges, *tops)
+          lamk1_projected[ind] = projectLamk1(mukForLamk1[ind], lamk1[ind], *edges, *tops)
+     return muk_projected, lamk1_projected
+
+def projections_muk_lamk1_batch(muk_candidate, lamk1_candidate, muk_free, lamk1_free, k, params, fans):
+     '''
+     projections_muk_lamk1 for a batch, params[B,2n+1]
+     '''
+     muk = np.copy(muk_candidate)
+     lamk1 = np.copy(lamk1_free)
+     ind = np.flatnonzero( (muk_candidate != muk_free) | (lamk1_candidate != lamk1_free) )
+     if( len(ind) == 0 ):
+          return muk, lamk1
+     params = params[ind]
+     fanObj = fanObjective_batch(params, fans.rows(ind))
+     # Same entries as in projections_muk_lamk1 (also the ones that move with muk or lamk1 if they were equal)
+     sameBefore = params[:, k-1] == params[:, k-2]
+     sameAfter = params[:, k+1] == params[:, k]
+     params_muk_projected = np.copy(params)
+     params_muk_projected[:, k] = muk_candidate[ind]
+     params_muk_projected[sameBefore, k-1] = muk_candidate[ind][sameBefore]
+     params_muk_projected[:, k+1] = lamk1_free[ind]
+     params_lamk1_projected = np.copy(params)
+     params_lamk1_projected[:, k] = muk_free[ind]
+     params_lamk1_projected[sameBefore, k-1] = muk_free[ind][sameBefore]
+     params_lamk1_projected[:, k+1] = lamk1_candidate[ind]
+     if( k < params.shape[1] - 1 ):
+          params_muk_projected[sameAfter, k+2] = lamk1_free[ind][sameAfter]
+          params_lamk1_projected[sameAfter, k] = lamk1_candidate[ind][sameAfter]
+     f_muk_projected = fanObj.fTrial(params_muk_projected)
+     f_lamk1_projected = fanObj.fTrial(params_lamk1_projected)
+     lamk1Better = ind[~(f_muk_projected < f_lamk1_projected)]
+     muk[lamk1Better] = muk_free[lamk1Better]
+     lamk1[lamk1Better] = lamk1_candidate[lamk1Better]
+     return muk, lamk1
+
+def backTr_coord_batch(alpha0, k, d, params, fans):
+     '''
+     backTr_coord for a batch, d[B]. Each fan changes its step size until its own line search ends
+     '''
+     fanObj = fanObjective_batch(params, fans)
+     f_before = fanObj.fVal
+     alpha = alpha0/np.maximum(np.abs(d), 1)
+     params_test = np.copy(params)
+     params_test[:, k] = params[:, k] - alpha*d
+     f_test = fanObj.fTrial(params_test)
+     # If there is a decrease in the function, try increasing alpha, the step size
+     ind = np.flatnonzero(f_test < f_before)
+     for i in range(8):
+          if( len(ind) == 0 ):
+               break
+          alpha[ind] = alpha[ind]*1.3
+          params_test[ind, k] = params[ind, k] - alpha[ind]*d[ind]
+          f_test[ind] = fanObj.fTrial(params_test[ind], ind)
+          ind = ind[f_test[ind] < f_before[ind]]
+     # If there is no decrease in the function, try decreasing alpha, the step size
+     ind = np.flatnonzero(f_before <= f_test)
+     for i in range(25):
+          if( len(ind) == 0 ):
+               break
+          alpha[ind] = alpha[ind]*0.2
+          params_test[ind, k] = params[ind, k] - alpha[ind]*d[ind]
+          f_test[ind] = fanObj.fTrial(params_test[ind], ind)
+          ind = ind[f_before[ind] <= f_test[ind]]
+     return np.where(f_before <= f_test, 0, alpha)
+
+def backTr_block0k_batch(alpha0, k, dlamk, dmuk, params, fans):
+     '''
+     backTr_block0k for a batch (without points on the tops), dlamk[B] and dmuk[B]
+     '''
+     fanObj = fanObjective_batch(params, fans)
+     f_before = fanObj.fVal
+     alpha = alpha0/np.maximum(np.sqrt(dlamk**2 + dmuk**2), 1)
+     params_test = np.copy(params)
+     params_lamk = np.copy(params)
+     params_muk = np.copy(params)
+     def trialSteps(ind):
+          params_test[ind, k] = params[ind, k] - alpha[ind]*dlamk[ind]
+          params_test[ind, k+1] = params[ind, k+1] - alpha[ind]*dmuk[ind]
+          params_lamk[ind, k] = params_test[ind, k]
+          params_muk[ind, k+1] = params_test[ind, k+1]
+          return fanObj.fTrial(params_test[ind], ind), fanObj.fTrial(params_lamk[ind], ind), fanObj.fTrial(params_muk[ind], ind)
+     ind = np.arange(len(params))
+     f_test, f_lamk, f_muk = trialSteps(ind)
+     # If there is a decrease in the function, try increasing alpha, the step size
+     ind = np.flatnonzero( (f_test < f_before) | (f_lamk < f_before) | (f_muk < f_before) )
+     for i in range(8):
+          if( len(ind) == 0 ):
+               break
+          alpha[ind] = alpha[ind]*1.3
+          f_test[ind], f_lamk[ind], f_muk[ind] = trialSteps(ind)
+          ind = ind[ (f_test[ind] < f_before[ind]) | (f_lamk[ind] < f_before[ind]) | (f_muk[ind] < f_before[ind]) ]
+     # Then if there is no decrease try decreasing alpha, the step size
+     ind = np.flatnonzero( (f_before < f_test) & (f_before < f_lamk) & (f_before < f_muk) )
+     for i in range(25):
+          if( len(ind) == 0 ):
+               break
+          alpha[ind] = alpha[ind]*0.2
+          f_test[ind], f_lamk[ind], f_muk[ind] = trialSteps(ind)
+          ind = ind[ (f_before[ind] < f_test[ind]) & (f_before[ind] < f_lamk[ind]) & (f_before[ind] < f_muk[ind]) ]
+     # Now we should have a decrease or keep the block
+     choices = [ (f_lamk < f_before) & (f_lamk < f_test) & (f_lamk < f_muk),
+                 (f_muk < f_before) & (f_muk < f_test),
+                 f_before <= f_test ]
+     lamk = np.select(choices, [params_lamk[:, k], params_muk[:, k], params[:, k]], params_test[:, k])
+     muk = np.select(choices, [params_lamk[:, k+1], params_muk[:, k+1], params[:, k+1]], params_test[:, k+1])
+     return lamk, muk
+
+def backTrClose_block0k_batch(alpha0, k, dlamk, dmuk, dCollapsed, params, fans):
+     '''
+     backTrClose_block0k for a batch (without points on the tops), dlamk[B], dmuk[B] and dCollapsed[B]
+     '''
+     fanObj = fanObjective_batch(params, fans)
+     f_before = fanObj.fVal
+     alpha = alpha0/np.maximum(np.sqrt(dlamk**2 + dmuk**2), 1)
+     params_test = np.copy(params)
+     params_test_proj = np.copy(params)
+     params_collapsed = np.copy(params)
+     def trialSteps(ind):
+          params_test[ind, k] = params[ind, k] - alpha[ind]*dlamk[ind]
+          params_test[ind, k+1] = params[ind, k+1] - alpha[ind]*dmuk[ind]
+          params_test_proj[ind, k] = 0.5*params_test[ind, k] + 0.5*params_test[ind, k+1]
+          params_test_proj[ind, k+1] = params_test_proj[ind, k]
+          params_collapsed[ind, k] = params[ind, k] - alpha[ind]*dCollapsed[ind]
+          params_collapsed[ind, k+1] = params_collapsed[ind, k]
+          return fanObj.fTrial(params_test[ind], ind), fanObj.fTrial(params_test_proj[ind], ind), fanObj.fTrial(params_collapsed[ind], ind)
+     ind = np.arange(len(params))
+     f_test, f_test_proj, f_test_collapsed = trialSteps(ind)
+     # If there is a decrease in the function, try increasing alpha, the step size
+     ind = np.flatnonzero( (f_test < f_before) | (f_test_proj < f_before) | (f_test_collapsed < f_before) )
+     for i in range(8):
+          if( len(ind) == 0 ):
+               break
+          alpha[ind] = alpha[ind]*1.3
+          f_test[ind], f_test_proj[ind], f_test_collapsed[ind] = trialSteps(ind)
+          ind = ind[ (f_test[ind] < f_before[ind]) | (f_test_proj[ind] < f_before[ind]) | (f_test_collapsed[ind] < f_before[ind]) ]
+     # Then if there is no decrease try decreasing alpha, the step size
+     ind = np.flatnonzero( (f_before < f_test) & (f_before < f_test_proj) & (f_before < f_test_collapsed) )
+     for i in range(25):
+          if( len(ind) == 0 ):
+               break
+          alpha[ind] = alpha[ind]*0.2
+          f_test[ind], f_test_proj[ind], f_test_collapsed[ind] = trialSteps(ind)
+          ind = ind[ (f_before[ind] < f_test[ind]) & (f_before[ind] < f_test_proj[ind]) & (f_before[ind] < f_test_collapsed[ind]) ]
+     # Now we should have a decrease or keep the block
+     choices = [ (f_before <= f_test) & (f_before <= f_test_proj) & (f_before <= f_test_collapsed),
+                 (f_test < f_test_proj) & (f_test < f_test_collapsed),
+                 f_test_proj < f_test_collapsed ]
+     lamk = np.select(choices, [params[:, k], params_test[:, k], params_test_proj[:, k]], params_collapsed[:, k])
+     muk = np.select(choices, [params[:, k+1], params_test[:, k+1], params_test_proj[:, k+1]], params_collapsed[:, k+1])
+     return lamk, muk
+
+def updateFromh0kM1_batch(j, params, gammas, theta_gamma, fans, gradParams):
+     '''
+     udapteFromh0kM1 for a batch of triangle fans without points on the tops, gammas[B,n+1]
+     and gradParams[B,2n+1] are updated here
+     '''
+     n = fans.n
+     k = 2*j - 1
+     x0 = fans.x0
+     mukM1 = np.copy(params[:, k-1])
+     lamk = np.copy(params[:, k])
+     muk = np.copy(params[:, k+1])
+     B0kM1 = fans.listB0k[:, j-1]
+     BkM1Bk_0 = fans.listBkBk1[:, k-1]
+     BkM1Bk_1 = fans.listBkBk1[:, k]
+     B0k = fans.listB0k[:, j]
+     xkM1 = fans.listxk[:, j]
+     xk = fans.listxk[:, j+1]
+     BkM1 = fans.listBk[:, j-1]
+     Bk = fans.listBk[:, j]
+     etakPrev = fans.listIndices[:, j-1]
+     etak = fans.listIndices[:, j]
+     dlamk = partial_fObj_recCr_batch(mukM1, muk, lamk, x0, B0kM1, xkM1, BkM1, x0, B0k, xk, Bk, etakPrev, etak)
+     gradParams[:, k] = dlamk
+     if( j < n ):
+          # The next receiver is on h0k1
+          xk1 = fans.listxk[:, j+2]
+          B0k1 = fans.listB0k[:, j+1]
+          Bk1 = fans.listBk[:, j+1]
+          etak1 = fans.listIndices[:, j+1]
+          lamk1 = np.copy(params[:, k+2])
+          dmuk = partial_fObj_shCr_batch(muk, lamk, lamk1, x0, B0k, xk, Bk, x0, B0k1, xk1, Bk1, etak, etak1)
+          gradParams[:, k+1] = dmuk
+          # Close updates for the fans where [lamk, muk] is close to lamk = muk, far updates for the others
+          close = close_to_identity_batch(lamk, muk) <= gammas[:, j-1]
+          ind = np.flatnonzero(close)
+          if( len(ind) > 0 ):
+               dmuk_collapsed = partial_fObj_collapsedShooter_batch(mukM1[ind], muk[ind], lamk1[ind], x0[ind], BkM1[ind], xkM1[ind], BkM1[ind],
+                                                                    x0[ind], B0k[ind], xk[ind], Bk[ind],
+                                                                    x0[ind], B0k1[ind], xk1[ind], Bk1[ind], etakPrev[ind], etak[ind])
+               lamk[ind], muk[ind] = backTrClose_block0k_batch(1, k, dlamk[ind], dmuk[ind], dmuk_collapsed, params[ind], fans.rows(ind))
+               gammas[ind, j-1] = gammas[ind, j-1]*theta_gamma
+          ind = np.flatnonzero(~close)
+          if( len(ind) > 0 ):
+               lamk[ind], muk[ind] = backTr_block0k_batch(1, k, dlamk[ind], dmuk[ind], params[ind], fans.rows(ind))
+          # Project back lamk using mukM1 (and hkM1k if the step went towards it)
+          mukM1_projected, lamk_projected = projectPair_batch(mukM1, mukM1, lamk, ~(dlamk > 0) & (fans.listCurvingInwards[:, j-1] == 1),
+                                                              x0, B0kM1, xkM1, BkM1, B0k, xk, Bk, BkM1Bk_0, BkM1Bk_1)
+          lamk_free = np.clip(lamk, 0, 1)
+          mukM1, lamk = projections_muk_lamk1_batch(mukM1_projected, lamk_projected, mukM1, lamk_free, k-1, params, fans)
+          # Project back muk using lamk1 (and hkk1 if the step went towards it)
+          muk_projected, lamk1_projected = projectPair_batch(muk, muk, lamk1, ~(dmuk > 0) & (fans.listCurvingInwards[:, j] == 1),
+                                                             x0, B0k, xk, Bk, B0k1, xk1, Bk1, fans.listBkBk1[:, k+1], fans.listBkBk1[:, k+2])
+          muk_free = np.clip(muk, 0, 1)
+          muk, lamk1 = projections_muk_lamk1_batch(muk_projected, lamk1_projected, muk_free, lamk1, k+1, params, fans)
+          params[:, k] = lamk
+          params[:, k+1] = muk
+          params[:, k+2] = lamk1
+     else:
+          # j = n, we are on lamn1
+          alpha = backTr_coord_batch(1, k, dlamk, params, fans)
+          lamk = lamk - alpha*dlamk
+          lamk_free = np.clip(lamk, 0, 1)
+          mukM1_projected, lamk_projected = projectPair_batch(mukM1, mukM1, lamk, ~(dlamk > 0) & (fans.listCurvingInwards[:, j-1] == 1),
+                                                              x0, B0kM1, xkM1, BkM1, B0k, xk, Bk, BkM1Bk_0, BkM1Bk_1)
+          mukM1, lamk = projections_muk_lamk1_batch(mukM1_projected, lamk_projected, mukM1, lamk_free, k-1, params, fans)
+          params[:, k-1] = mukM1
+          params[:, k] = lamk
+     return params, gradParams
+
+def forwardPassUpdate_batch(params0, gammas, theta_gamma, fans):
+     '''
+     forwardPassUpdate for a batch of triangle fans without points on the tops. Every block is updated
+     for all the fans at the same time: the directions, the line searches (each fan with its own
+     step size and number of steps) and the projections are computed with arrays over the batch.
+     gammas[B,n+1] is updated here. Returns params[B,2n+1] and gradParams[B,2n+1]
+     '''
+     params = np.copy(params0)
+     gradParams = np.zeros(params.shape) # gradParams[:, -1] = 0 because mun1 = 1 always
+     x0 = fans.x0
+     # First parameter to update: mu1
+     mu1 = np.copy(params[:, 0])
+     lam2 = np.copy(params[:, 1])
+     B0k = fans.listB0k[:, 0]
+     xk = fans.listxk[:, 1]
+     Bk = fans.listBk[:, 0]
+     B0k1 = fans.listB0k[:, 1]
+     xk1 = fans.listxk[:, 2]
+     Bk1 = fans.listBk[:, 1]
+     B0k_muk = gradientBoundary_batch(mu1, x0, B0k, xk, Bk)
+     yk1 = hermite_boundary_batch(lam2, x0, B0k1, xk1, Bk1)
+     zk = hermite_boundary_batch(mu1, x0, B0k, xk, Bk)
+     dmuk = partial_fObj_mu1_batch(mu1, x0, fans.T0, fans.grad0, fans.x1, fans.T1, fans.grad1, B0k_muk, yk1, zk)
+     alpha = backTr_coord_batch(2, 0, dmuk, params, fans)
+     mu1 = mu1 - alpha*dmuk
+     mu1_free = np.clip(mu1, 0, 1)
+     mu1_projected, lam2_projected = projectPair_batch(mu1, mu1_free, lam2, fans.listCurvingInwards[:, 0] == 1,
+                                                       x0, B0k, xk, Bk, B0k1, xk1, Bk1, fans.listBkBk1[:, 0], fans.listBkBk1[:, 1])
+     mu1, lam2 = projections_muk_lamk1_batch(mu1_projected, lam2_projected, mu1_free, lam2, 0, params, fans)
+     params[:, 0] = mu1
+     params[:, 1] = lam2
+     # As in forwardPassUpdate: at the new mu1 but with the boundary at the old one
+     gradParams[:, 0] = partial_fObj_mu1_batch(mu1, x0, fans.T0, fans.grad0, fans.x1, fans.T1, fans.grad1, B0k_muk, yk1, zk)
+     # Now the blocks of size 2
+     for j in range(1, fans.n + 1):
+          params, gradParams = updateFromh0kM1_batch(j, params, gammas, theta_gamma, fans, gradParams)
+     # Test for the last one, lamn1 = 1 if that is better
+     ind = np.flatnonzero(params[:, -2] > 0.4)
+     if( len(ind) > 0 ):
+          fanObj = fanObjective_batch(params[ind], fans.rows(ind))
+          params_test = np.copy(params[ind])
+          params_test[:, -2] = 1.0
+          params[ind[fanObj.fVal > fanObj.fTrial(params_test)], -2] = 1.0
+     return params, gradParams
+
+def blockCoordinateGradient_batch(params0, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                                  listxk, listB0k, listBk, listBkBk1, listCurvingInwards,
+                                  theta_gamma = 1, tol = 1e-14, maxIter = 75):
+     '''
+     blockCoordinateGradient_generalized for B triangle fans with the same number of regions and without
+     points on the tops (the type of path that every fan tries). All the arrays have a leading batch
+     dimension: x0[B,2], T0[B], listIndices[B,2n+1], listxk[B,n+2,2], listCurvingInwards[B,n], params0[B,2n+1]...
+     Each iteration is a forward pass for all the fans that haven't converged (forwardPassUpdate_batch),
+     each fan stops with the same criteria as blockCoordinateGradient_generalized.
+     Returns params[B,2n+1], gradParams[B,2n+1], fVals[B], nIter[B]
+     '''
+     fans = fanBatch(x0, T0, grad0, x1, T1, grad1, listIndices, listxk, listB0k, listBk, listBkBk1, listCurvingInwards)
+     B = fans.listxk.shape[0]
+     n = fans.n
+     paramsk = np.array(params0, dtype=float).reshape((B, -1))
+     # Add artificial mun1 if necessary
+     if( paramsk.shape[1] < 2*n + 1):
+          paramsk = np.hstack((paramsk, np.ones((B, 1))))
+     gradParamsk = np.zeros(paramsk.shape)
+     gammas = 0.1*np.ones((B, n + 1))
+     fLast = np.zeros((B)) # last value of the objective function that was tested
+     nIter = np.zeros((B), dtype=int)
+     active = np.ones((B), dtype=bool)
+     iter = 0
+     while( np.any(active) and iter < maxIter ):
+          ind = np.flatnonzero(active)
+          fansActive = fans.rows(ind)
+          gammasActive = gammas[ind]
+          paramsTest, gradParamsTest = forwardPassUpdate_batch(paramsk[ind], gammasActive, theta_gamma, fansActive)
+          gammas[ind] = gammasActive
+          fk = fanObjective_batch(paramsTest, fansActive).fVal
+          change_fVal = fLast[ind] - fk
+          accept = (change_fVal > 0) | (iter == 0)
+          normChangeP = np.sqrt( np.sum((paramsk[ind] - paramsTest)**2, axis = 1) )
+          paramsk[ind[accept]] = paramsTest[accept]
+          gradParamsk[ind[accept]] = gradParamsTest[accept]
+          fLast[ind] = fk # blockCoordinateGradient_generalized compares with the last tested value
+          nIter[ind] += 1
+          # Same stopping criteria as blockCoordinateGradient_generalized (only after the first iteration)
+          if( iter > 0 ):
+               converged = ~(change_fVal > tol) | (accept & ~(normChangeP > tol))
+               active[ind[converged]] = False
+          iter += 1
+     fVals = fanObjective_batch(paramsk, fans).fVal
+     return paramsk, gradParamsk, fVals, nIter
+
+
+pathLayouts = {}
+
+def pathLayout(n, topType, topIndex, nCrTop):
+     '''
+     Index arrays that getPathGradEikonal_batch needs for a type of path (cached). The points of the path
+     are z1 and then, for each region, [ak, bk,] yk1, zk1. For each point: the edge it's on (start and end
+     in listxk, tangents in concat(listB0k, listBk, listBkBk1)) and its parameter in
+     concat(params, paramsCrTop, paramsStTop). For each segment: 0 if it's a ray (it shoots), 1 if it
+     creeps (tangent at its end point), 2 if it goes straight along a top, and its two indices of refraction.
+     '''
+     key = (n, tuple(topType), tuple(topIndex), nCrTop)
+     if( key in pathLayouts ):
+          return pathLayouts[key]
+     xFrom, xTo, BFrom, BTo, param = [0], [1], [0], [n+1], [0]
+     kind, eta1, eta2 = [], [], []
+     for j in range(1, n+1):
+          if( topType[j] > 0 ):
+               first = 2*n + 1 + 2*topIndex[j] + (0 if topType[j] == 1 else nCrTop)
+               xFrom += [j, j]
+               xTo += [j+1, j+1]
+               BFrom += [2*n + 2*j, 2*n + 2*j]
+               BTo += [2*n + 2*j + 1, 2*n + 2*j + 1]
+               param += [first, first + 1]
+               kind += [0, 1 if topType[j] == 1 else 2, 0]
+               eta1 += [j-1, n+j, j-1]
+               eta2 += [j-1, j-1 if topType[j] == 1 else n+j, j-1]
+          else:
+               kind += [0]
+               eta1 += [j-1]
+               eta2 += [j-1]
+          # yk1 and zk1 on h0hk1
+          xFrom += [0, 0]
+          xTo += [j+1, j+1]
+          BFrom += [j, j]
+          BTo += [n+1+j, n+1+j]
+          param += [2*j-1, 2*j]
+          kind += [1]
+          eta1 += [j-1]
+          eta2 += [j]
+     layout = tuple(np.array(ind, dtype=int) for ind in (xFrom, xTo, BFrom, BTo, param, kind, eta1, eta2))
+     pathLayouts[key] = layout
+     return layout
+
+def getPathGradEikonal_batch(params, listIndices, listxk, listB0k, listBk, listBkBk1,
+                             topType, topIndex, paramsCrTop, paramsStTop):
+     '''
+     Path and gradients of the eikonal (straight rays) for a batch of triangle fans with the same
+     number of regions and the same points on the tops (topType, topIndex as in topsPerRegion).
+     All the points and tangents are evaluated at once (same edges as fObj_regionTerm), grads[:, i] is
+     the gradient along the segment from path[:, i] to path[:, i+1] (the last one is 0).
+     Returns path[B,m,2] and grads[B,m,2].
+     '''
+     params, listIndices, listxk = np.asarray(params, dtype=float), np.asarray(listIndices, dtype=float), np.asarray(listxk, dtype=float)
+     paramsCrTop, paramsStTop = np.asarray(paramsCrTop, dtype=float), np.asarray(paramsStTop, dtype=float)
+     n = listxk.shape[1] - 2
+     xFrom, xTo, BFrom, BTo, param, kind, eta1, eta2 = pathLayout(n, topType, topIndex, paramsCrTop.shape[1])
+     tangents = np.concatenate((listB0k, listBk, listBkBk1), axis = 1)
+     x0, x1 = listxk[:, xFrom], listxk[:, xTo]
+     B0, B1 = tangents[:, BFrom], tangents[:, BTo]
+     p = np.concatenate((params, paramsCrTop, paramsStTop), axis = 1)[:, param]
+     # Hermite interpolation of the boundary and its tangent, Horner's scheme
+     d = x0 - x1
+     c3 = 2*d + B0 + B1
+     c2 = -3*d - 2*B0 - B1
+     t = p[:, :, None]
+     path = ((c3*t + c2)*t + B0)*t + x0
+     tangent = (3*c3*t + 2*c2)*t + B0
+     # Segments: rays and straight lines along the tops use the difference of their points,
+     # creeping segments the tangent at their end point
+     direction = np.where((kind == 1)[None, :, None], tangent[:, 1:], path[:, 1:] - path[:, :-1])
+     length = np.sqrt(np.sum(direction**2, axis = 2))
+     tolGrads = norm_batch(listxk[:, 0] - listxk[:, 1])*0.0001
+     nonzero = np.where(kind == 0, length > tolGrads[:, None], np.abs(p[:, 1:] - p[:, :-1]) > 0.01)
+     eta = np.minimum(listIndices[:, eta1], listIndices[:, eta2])
+     grads = np.zeros(path.shape)
+     grads[:, :-1] = direction*(np.where(nonzero, eta, 0)/np.where(nonzero, length, 1))[:, :, None]
      return path, grads
+
+def lastNonzeroGrad(grads):
+     '''
+     Last nonzero row of grads[..., m, 2] (the gradient of the eikonal at xHat), 0 if all of them are 0
+     '''
+     grads = np.asarray(grads)
+     nonzero = np.any(grads != 0, axis = -1)
+     last = grads.shape[-2] - 1 - np.argmax(nonzero[..., ::-1], axis = -1)
+     return np.take_along_axis(grads, last[..., None, None], axis = -2)[..., 0, :]
+
+
+#@njit
+def getPathGradEikonal(params, listIndices, listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop):
+     '''
+     Compute the gradient of the eikonal, straight rights. The points on the tops are matched to
+     the regions as in fObj_generalized (topsPerRegion), path and grads have
+     len(params) + 2*len(indCrTop) + 2*len(indStTop) rows (see getPathGradEikonal_batch)
+     '''
+     n = len(listxk) - 2
+     indCrTop, paramsCrTop, indStTop, paramsStTop = topsAsArrays(indCrTop, paramsCrTop, indStTop, paramsStTop)
+     nGrads = len(params) + 2*len(indCrTop)*(indCrTop[0] != -1) + 2*len(indStTop)*(indStTop[0] != -1)
+     topType, topIndex = topsPerRegion(n, indCrTop, indStTop)
+     path, grads = getPathGradEikonal_batch(np.asarray(params, dtype=float)[None, :], np.asarray(listIndices)[None, :],
+                                            np.asarray(listxk)[None, :], np.asarray(listB0k)[None, :],
+                                            np.asarray(listBk)[None, :], np.asarray(listBkBk1)[None, :],
+                                            topType, topIndex, paramsCrTop[None, :], paramsStTop[None, :])
+     # points on the tops that don't match any region (see topsPerRegion) are left as 0
+     pathOut, gradsOut = np.zeros((nGrads, 2)), np.zeros((nGrads, 2))
+     pathOut[:path.shape[1]] = path[0]
+     gradsOut[:grads.shape[1]] = grads[0]
+     return pathOut, gradsOut
      
 
 
-######## Define function and class such that we can put everything in order
-# and know which cases to solve for
-
-
-triInf = [
-     ('nRegions', int32),
-     ('params', float64[:]),
-     ('x0', float64[:]),
-     ('T0', float64),
-     ('grad0', float64[:]),
-     ('x1', float64[:]),
-     ('T1', float64),
-     ('grad1', float64[:]),
-     ('xHat', float64[:]),
-     ('listIndices', float64[:] ),
-     ('listxk', float64[:, :] ),
-     ('listB0k', float64[:, :] ),
-     ('listBk', float64[:, :] ),
-     ('listBkBk1', float64[:, :] ),
-     ('listCurvingInwards', int32[:] ),
-     ('optionsTop', int32[:, :]),
-     ('optiParams', float64[:]),
-     ('optiIndCrTop', int32[:]),
-     ('optiParamsCrTop', float64[:]),
-     ('nIndCrTop', int32),
-     ('optiIndStTop', int32[:]),
-     ('optiParamsStTop', float64[:]),
-     ('nIndStTop', int32),
-     ('opti_fVal', float64),
-     ('path', float64[:, :]),
-     ('grads', float64[:, :]),
-     ('lastGrad', float64[:]),
-     ('plotBefore', int32),
-     ('plotAfter', int32),
-     ('plotOpti', int32),
-     ('maxIter', int32),
-     ('tol', float64),
-     ('plotSteps', boolean),
-     ('saveIterates', boolean)
-     ]
+######## Compiled kernels
+
+# The functions that are evaluated the most have a nopython compiled version in
+# optiKernels.py. The pure Python versions above are kept in reference (and are
+# used again with useCompiledKernels(False)) to check the results of the kernels.
+kernelNames = ['hermite_interpolationT', 'der_hermite_interpolationT', 'secondDer_Boundary',
+               'gradientBoundary', 'hermite_boundary', 'arclengthSimpson', 'get_sk',
+               'partial_L_muk', 'partial_L_lamk', 'partial_fObj_mu1', 'partial_fObj_recCr',
+               'partial_fObj_shCr', 'partial_fObj_recCr1', 'partial_fObj_recSt',
+               'partial_fObj_shSt', 'partial_fObj_collapsedShooter',
+               'fObj_generalized', 'fObj_regionTerm', 'getPathGradEikonal']
+reference = {name: globals()[name] for name in kernelNames}
+
+def topsAsArrays(indCrTop, paramsCrTop, indStTop, paramsStTop):
+     '''
+     Indices and parameters of the points on the tops as the compiled kernels need them
+     ([-1] and [0, 0] if there are no points of that type)
+     '''
+     if(paramsCrTop is None or indCrTop is None):
+          indCrTop = np.array([-1], dtype=np.int64)
+          paramsCrTop = np.zeros((2), dtype=np.float64)
+     else:
+          indCrTop = np.asarray(indCrTop, dtype=np.int64)
+          paramsCrTop = np.asarray(paramsCrTop, dtype=np.float64)
+     if(paramsStTop is None or indStTop is None):
+          indStTop = np.array([-1], dtype=np.int64)
+          paramsStTop = np.zeros((2), dtype=np.float64)
+     else:
+          indStTop = np.asarray(indStTop, dtype=np.int64)
+          paramsStTop = np.asarray(paramsStTop, dtype=np.float64)
+     return indCrTop, paramsCrTop, indStTop, paramsStTop
+
+def fObj_generalized_compiled(params, x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listxk, listB0k, listBk, listBkBk1,
+                              indCrTop = None, paramsCrTop = None, indStTop = None, paramsStTop = None):
+     '''
+     fObj_generalized using optiKernels
+     '''
+     indCrTop, paramsCrTop, indStTop, paramsStTop = topsAsArrays(indCrTop, paramsCrTop, indStTop, paramsStTop)
+     return optiKernels.fObj_generalized(np.asarray(params, dtype=np.float64), x0, float(T0), grad0,
+                                         x1, float(T1), grad1, xHat, listIndices, listxk,
+                                         listB0k, listBk, listBkBk1,
+                                         indCrTop, paramsCrTop, indStTop, paramsStTop)
+
+def getPathGradEikonal_compiled(params, listIndices, listxk, listB0k, listBk, listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop):
+     '''
+     getPathGradEikonal using optiKernels
+     '''
+     indCrTop, paramsCrTop, indStTop, paramsStTop = topsAsArrays(indCrTop, paramsCrTop, indStTop, paramsStTop)
+     return optiKernels.getPathGradEikonal(np.asarray(params, dtype=np.float64), listIndices, listxk,
+                                           listB0k, listBk, listBkBk1,
+                                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+
+def useCompiledKernels(useKernels = True):
+     '''
+     Use the compiled kernels (True) or the pure Python reference (False) in this module
+     '''
+     if( useKernels and optiKernels is None ):
+          raise ImportError("numba is needed for the compiled kernels (optiKernels.py)")
+     for name in kernelNames:
+          if( not useKernels ):
+               globals()[name] = reference[name]
+          elif( name == 'fObj_generalized' ):
+               globals()[name] = fObj_generalized_compiled
+          elif( name == 'getPathGradEikonal' ):
+               globals()[name] = getPathGradEikonal_compiled
+          else:
+               globals()[name] = getattr(optiKernels, name)
+
+try:
+     import optiKernels
+except ImportError:
+     optiKernels = None # without numba we use the pure Python versions
+if( optiKernels is not None ):
+     useCompiledKernels(True)
+
 
 
+def fanRequestSize(nRegions):
+     '''
+     Number of doubles in a binary fan request (without the nRegions header),
+     the fan (12*nRegions + 21) plus its key (nRegions + 3)
+     '''
+     return 13*nRegions + 24
+
+
+###################################
+# Lower bounds for the objective function on a type of path (row of optionsTop)
+# Used to skip the types of paths that can't be better than the best one found so far.
+
+def maxDerHermiteInterpolationT(x0, T0, grad0, x1, T1, grad1):
+     '''
+     Maximum of |der_hermite_interpolationT| for param in [0,1] (it's a quadratic, check the end
+     points and the vertex)
+     '''
+     c = der_hermite_interpolationT(0.0, x0, T0, grad0, x1, T1, grad1)
+     dPlus = der_hermite_interpolationT(1.0, x0, T0, grad0, x1, T1, grad1)
+     dMinus = der_hermite_interpolationT(-1.0, x0, T0, grad0, x1, T1, grad1)
+     a = (dPlus + dMinus)/2 - c
+     b = (dPlus - dMinus)/2
+     candidates = [0.0, 1.0]
+     if( a != 0 and 0 < -b/(2*a) < 1 ):
+          candidates.append(-b/(2*a))
+     return max(abs(der_hermite_interpolationT(t, x0, T0, grad0, x1, T1, grad1)) for t in candidates)
+
+def hermiteSamples(xFrom, Bfrom, xTo, Bto, nSamples = 129):
+     '''
+     Equispaced samples of a boundary (interpolated using Hermite) and how far any point on
+     that boundary can be from its closest sample
+     '''
+     t = np.linspace(0, 1, nSamples)[:, None]
+     a = 2*xFrom + Bfrom - 2*xTo + Bto
+     b = -3*xFrom - 2*Bfrom + 3*xTo - Bto
+     samples = a*t**3 + b*t**2 + Bfrom*t + xFrom
+     # |dB/dparam| <= 3|a| + 2|b| + |Bfrom| and the closest sample is at most half a step away
+     maxSpeed = 3*norm(a) + 2*norm(b) + norm(Bfrom)
+     return samples, maxSpeed/(2*(nSamples - 1))
+
+def lowerBound_pathType(option, x0, T0, grad0, x1, T1, grad1, listIndices, listxk, listB0k, listBk, listBkBk1,
+                        nSamples = 129):
+     '''
+     Lower bound for the objective function for all the paths of the type given by option (row of optionsTop).
+     The path starts on h0h1 (where we pay the Hermite interpolation of T), goes through a point on each top
+     edge k with option[k] != 0 (in order) and ends at xHat. All the arcs are at least as long as their chords
+     and all the indices of refraction are at least min(listIndices) so we bound the objective function with a
+     shortest chain through the samples of each boundary, minus how much the objective function can change
+     between a point on a boundary and its closest sample.
+     '''
+     xHat = listxk[-1]
+     etaMin = min(listIndices)
+     start, errStart = hermiteSamples(x0, listB0k[0], x1, listBk[0], nSamples)
+     t = np.linspace(0, 1, nSamples)
+     # Cost to get to each sample of the current boundary in the chain
+     cost = np.array([hermite_interpolationT(ti, x0, T0, grad0, x1, T1, grad1) for ti in t])
+     points = start
+     # T is Lipschitz in the parameter of h0h1 and the chords are 1-Lipschitz in their end points
+     err = maxDerHermiteInterpolationT(x0, T0, grad0, x1, T1, grad1)/(2*(nSamples - 1)) + etaMin*errStart
+     for k in np.flatnonzero(option):
+          top, errTop = hermiteSamples(listxk[k+1], listBkBk1[2*k], listxk[k+2], listBkBk1[2*k + 1], nSamples)
+          cost = np.min(cost[:, None] + etaMin*np.linalg.norm(points[:, None, :] - top[None, :, :], axis = 2), axis = 0)
+          points = top
+          err += 2*etaMin*errTop # both chords that touch this top
+     return np.min(cost + etaMin*np.linalg.norm(points - xHat, axis = 1)) - err
+
+
+###################################
+# Dynamic programming over the regions to choose the type of path
+# The objective function is a sum of one term per region (fObj_regionTerm) and two consecutive
+# regions only share mu_{k-1}. On a grid for the parameters we keep the best cost to get to each
+# value of mu_k on h0k, the type of path on each top edge comes from the argmins (Viterbi).
+
+def minPlus(A, B):
+     '''
+     (min, +) matrix product, C[i,j] = min_k A[i,k] + B[k,j]. Also returns the argmin
+     '''
+     sums = A[:, :, None] + B[None, :, :]
+     return np.min(sums, axis = 1), np.argmin(sums, axis = 1)
+
+def pairwiseNorms(P, Q):
+     '''
+     D[i,j] = |P[i] - Q[j]| for points P[m,2], Q[l,2]
+     '''
+     return np.linalg.norm(P[:, None, :] - Q[None, :, :], axis = 2)
+
+def pairwiseArclength(t, xFrom, Bfrom, xTo, Bto):
+     '''
+     L[i,j] = arclengthSimpson(t[i], t[j], ...) for all the pairs of parameters in t
+     '''
+     G = len(t)
+     mu = np.repeat(t, G)
+     lam = np.tile(t, G)
+     return arclengthSimpson_batch(mu, lam, xFrom, Bfrom, xTo, Bto).reshape((G, G))
+
+def feasibleChords(x0, zPrev, tangentsPrev, xkM1, y, tangents, xk):
+     '''
+     F[i,j] True if the segment from zPrev[i] on h0kM1 to y[j] on h0k is inside the region, the same
+     tests as in project_mukGivenlamk1 (the segment is on the right side of the tangents at both ends)
+     '''
+     chords = y[None, :, :] - zPrev[:, None, :]
+     Nprev = orientNormal_batch(normal_batch(tangentsPrev), np.tile(xk - x0, (len(zPrev), 1)))
+     N = orientNormal_batch(normal_batch(tangents), np.tile(x0 - xkM1, (len(y), 1)))
+     return (np.einsum('ijk,ik->ij', chords, Nprev) >= 0) & (np.einsum('ijk,jk->ij', chords, N) >= 0)
+
+def pathTypeSearch_dp(x0, T0, grad0, x1, T1, grad1, listIndices, listxk, listB0k, listBk, listBkBk1,
+                      allowedTypes, nGrid = 33):
+     '''
+     Type of path (0 no points, 1 Cr, 2 St on each top edge, same format as a row of optionsTop) that
+     minimizes the objective function with all the parameters on a grid of nGrid points in [0,1].
+     allowedTypes[k] are the types we consider on the k-th top edge. The cost is linear in the number
+     of regions (each region is a few (min, +) products of nGrid x nGrid matrices).
+     Returns the type of path and the minimum on the grid.
+     '''
+     n = len(listxk) - 2
+     t = np.linspace(0, 1, nGrid)
+     # Best cost to get to h01 at each value of mu1
+     V = np.array([hermite_interpolationT(ti, x0, T0, grad0, x1, T1, grad1) for ti in t])
+     zPrev = hermite_boundary_batch(t, x0, listB0k[0], x1, listBk[0])
+     tangentsPrev = gradientBoundary_batch(t, x0, listB0k[0], x1, listBk[0])
+     argTypes = np.zeros((n + 1, nGrid), dtype=int)
+     argPrev = np.zeros((n + 1, nGrid), dtype=int)
+     for j in range(1, n + 1):
+          k = 2*j - 1
+          xkM1 = listxk[j]
+          xk = listxk[j+1]
+          B0k = listB0k[j]
+          Bk = listBk[j]
+          BkBk1_0 = listBkBk1[k-1]
+          BkBk1_1 = listBkBk1[k]
+          etakPrev = listIndices[j-1]
+          etaMin = min(etakPrev, listIndices[j])
+          etaRegionOutside = listIndices[n + j]
+          y = hermite_boundary_batch(t, x0, B0k, xk, Bk) # y(lamk)
+          tangents = gradientBoundary_batch(t, x0, B0k, xk, Bk)
+          creep = etaMin*pairwiseArclength(t, x0, B0k, xk, Bk).T # creep[lamk, muk]
+          bestRegion = None
+          for topType in allowedTypes[j-1]:
+               # Q[mukM1, lamk] = min cost from zkPrev to yk
+               if( topType == 0 ):
+                    # the straight segments that leave the region are not feasible
+                    Q = np.where(feasibleChords(x0, zPrev, tangentsPrev, xkM1, y, tangents, xk),
+                                 etakPrev*pairwiseNorms(zPrev, y), np.inf)
+               else:
+                    a = hermite_boundary_batch(t, xkM1, BkBk1_0, xk, BkBk1_1) # points on the top edge
+                    if( topType == 1 ):
+                         middle = min(etaRegionOutside, etakPrev)*pairwiseArclength(t, xkM1, BkBk1_0, xk, BkBk1_1)
+                    else:
+                         middle = etaRegionOutside*pairwiseNorms(a, a)
+                    toTop, _ = minPlus(etakPrev*pairwiseNorms(zPrev, a), middle)
+                    Q, _ = minPlus(toTop, etakPrev*pairwiseNorms(a, y))
+               C, _ = minPlus(Q, creep) # C[mukM1, muk]
+               costs, prev = minPlus(V[None, :], C)
+               costs, prev = costs[0], prev[0]
+               if( bestRegion is None ):
+                    bestRegion, argPrev[j], argTypes[j] = costs, prev, topType
+               else:
+                    better = costs < bestRegion # strict, ties keep the simpler type
+                    bestRegion = np.where(better, costs, bestRegion)
+                    argPrev[j] = np.where(better, prev, argPrev[j])
+                    argTypes[j] = np.where(better, topType, argTypes[j])
+          V = bestRegion
+          zPrev = y
+          tangentsPrev = tangents
+     # mu_{n+1} = 1 always, backtrack from there
+     option = np.zeros((n))
+     i = nGrid - 1
+     for j in range(n, 0, -1):
+          option[j-1] = argTypes[j, i]
+          i = argPrev[j, i]
+     return option, V[nGrid - 1]
+
+
+def fanKeyFromArray(key):
+     '''
+     Key of a triangle fan for warmStartCache from the doubles index0, index1, indexHat, listFaces
+     '''
+     return tuple(int(i) for i in key)
+
+def padParams(params, nRegions):
+     '''
+     Params of a triangle fan with one region less as params for nRegions (the new region gets
+     the usual initial values, mun1 = 1)
+     '''
+     paramsPadded = np.ones((2*nRegions + 1))
+     paramsPadded[0:(2*nRegions):2] = 0.4
+     paramsPadded[1:(2*nRegions):2] = 0.6
+     nCopy = min(len(params) - 1, 2*nRegions)
+     paramsPadded[:nCopy] = params[:nCopy]
+     return paramsPadded
+
+def seedTops(indTop, paramsTop, warmIndTop, warmParamsTop):
+     '''
+     Initial parameters for the points on the tops indTop, take the ones from the warm
+     start if it had points of the same type on the same top edge
+     '''
+     if( indTop is None or warmIndTop is None ):
+          return paramsTop
+     warmIndTop = list(warmIndTop)
+     paramsTop = np.copy(paramsTop)
+     for i, j in enumerate(indTop):
+          if( j in warmIndTop ):
+               iWarm = warmIndTop.index(j)
+               paramsTop[2*i:(2*i + 2)] = warmParamsTop[2*iWarm:(2*iWarm + 2)]
+     return paramsTop
+
+class warmStartCache:
+     '''
+     LRU cache with the optimum of the triangle fans we've already optimized, the key is
+     (index0, index1, indexHat, listFaces...). A fan is seeded with the optimum of the same fan
+     (e.g. when T0 or T1 changed) or, if it's not there, with the optimum of the fan with the
+     same x0, x1 and one triangle less (the fan grew by one triangle).
+     '''
+     def __init__(self, maxSize = 4096):
+          self.maxSize = maxSize
+          self.entries = OrderedDict()
+          self.lastKeyWithFaces = {} # (index0, index1, listFaces...) -> last key with these faces
+          self.nHits = 0
+          self.nGrowHits = 0
+          self.nMisses = 0
+
+     def seed(self, key, nRegions):
+          '''
+          Warm start for the fan with this key and nRegions (None if there is nothing useful)
+          dictionary with params, option, indCrTop, paramsCrTop, indStTop, paramsStTop
+          '''
+          entry = self.entries.get(key)
+          if( entry is not None ):
+               self.entries.move_to_end(key)
+               self.nHits += 1
+               return entry
+          prevKey = self.lastKeyWithFaces.get( key[0:2] + key[3:-1] )
+          prevEntry = None if prevKey is None else self.entries.get(prevKey)
+          if( prevEntry is None or len(prevEntry['option']) != nRegions - 1 ):
+               self.nMisses += 1
+               return None
+          self.nGrowHits += 1
+          entry = dict(prevEntry)
+          entry['params'] = padParams(prevEntry['params'], nRegions)
+          entry['option'] = np.append(prevEntry['option'], 0)
+          return entry
+
+     def put(self, key, params, option, indCrTop, paramsCrTop, indStTop, paramsStTop):
+          '''
+          Save the optimum of the fan with this key
+          '''
+          self.entries[key] = dict(params = np.copy(params), option = np.copy(option),
+                                   indCrTop = indCrTop, paramsCrTop = paramsCrTop,
+                                   indStTop = indStTop, paramsStTop = paramsStTop)
+          self.entries.move_to_end(key)
+          self.lastKeyWithFaces[ key[0:2] + key[3:] ] = key
+          while( len(self.entries) > self.maxSize ):
+               oldKey, _ = self.entries.popitem(last = False)
+               facesKey = oldKey[0:2] + oldKey[3:]
+               if( self.lastKeyWithFaces.get(facesKey) == oldKey ):
+                    del self.lastKeyWithFaces[facesKey]
+
+embeddedWarmStartCache = None # see useEmbeddedWarmStart
+
+def useEmbeddedWarmStart(useCache = True):
+     '''
+     Warm start the fans optimized from the embedded interpreter (outputFromBuffers) with a
+     warmStartCache that lives as long as the interpreter (True) or start them from the usual
+     initial values (False, the default). A warm start can end in a different local optimum
+     than the cold one
+     '''
+     global embeddedWarmStartCache
+     if( not useCache ):
+          embeddedWarmStartCache = None
+     elif( embeddedWarmStartCache is None ):
+          embeddedWarmStartCache = warmStartCache()
+
+
+###################################
+# Metrics of the optimizer (opt in, see triangleFan.metrics). With useMetrics(True) the
+# backtracking and the projections in metricsNames count their calls in the optionMetrics
+# of the option that is being solved in this thread (if any)
+
+metricsNames = ['backTr_coord', 'backTrClose_block0k', 'backTrClose_blockCrTop', 'backTrClose_blockStTop',
+                'backTr_block0k', 'backTr_blockCrTop', 'backTr_blockStTop',
+                'project_lamk1Givenmuk', 'project_mukGivenlamk1', 'project_lamkGivenmuk1_noCr',
+                'project_mukGivenlamk1_noCr', 'project_rkGivenmuk', 'project_skGivenlamk1',
+                'project_mukGivenrk', 'project_lamkGivenskM1']
+uncounted = {} # the plain functions while useMetrics is on
+activeMetrics = threading.local() # activeMetrics.current is the optionMetrics of this thread
+
+def pathTypeName(option):
+     '''
+     Type of path as a string, one character per top edge: . no points, C creeping, S shooting
+     '''
+     if( option is None ):
+          return "?"
+     return "".join(".CS"[int(t)] for t in option)
+
+class optionMetrics:
+     '''
+     What the optimizer did for one option in optionsTop (or, added up, for many): iterations,
+     calls to the backtracking of each block, evaluations of the objective function inside
+     them (backtracking steps), calls to each projection and wall time
+     '''
+     def __init__(self):
+          self.nOptions = 1
+          self.nIterations = 0
+          self.backtrackingCalls = {}
+          self.backtrackingSteps = {}
+          self.projectionCalls = {}
+          self.time = 0.0
+          self.context = None # function in metricsNames we are in
+
+     def add(self, other):
+          '''
+          Add the counts of other to these ones
+          '''
+          self.nOptions += other.nOptions
+          self.nIterations += other.nIterations
+          for mine, theirs in [(self.backtrackingCalls, other.backtrackingCalls),
+                               (self.backtrackingSteps, other.backtrackingSteps),
+                               (self.projectionCalls, other.projectionCalls)]:
+               for name, count in theirs.items():
+                    mine[name] = mine.get(name, 0) + count
+          self.time += other.time
+
+     def __getstate__(self):
+          state = self.__dict__.copy()
+          state['context'] = None
+          return state
+
+def countCalls(name, function):
+     '''
+     function, but it adds its calls to the metrics of the option solved in this thread
+     '''
+     calls = 'backtrackingCalls' if name.startswith('backTr') else 'projectionCalls'
+     def counted(*args, **kwargs):
+          metrics = getattr(activeMetrics, 'current', None)
+          if( metrics is None ):
+               return function(*args, **kwargs)
+          count = getattr(metrics, calls)
+          count[name] = count.get(name, 0) + 1
+          context = metrics.context
+          metrics.context = name
+          try:
+               return function(*args, **kwargs)
+          finally:
+               metrics.context = context
+     return counted
+
+fTrialUncounted = fanObjective.fTrial
+
+def fTrialCounted(self, params = None, paramsCrTop = None, paramsStTop = None):
+     '''
+     fanObjective.fTrial, counts the evaluations inside the backtracking (backtracking steps)
+     '''
+     metrics = getattr(activeMetrics, 'current', None)
+     if( metrics is not None and metrics.context is not None and metrics.context.startswith('backTr') ):
+          metrics.backtrackingSteps[metrics.context] = metrics.backtrackingSteps.get(metrics.context, 0) + 1
+     return fTrialUncounted(self, params, paramsCrTop, paramsStTop)
+
+def useMetrics(useCounters = True):
+     '''
+     Count the calls to the backtracking and the projections (True) or use the plain functions (False)
+     '''
+     if( useCounters == (len(uncounted) > 0) ):
+          return
+     if( useCounters ):
+          for name in metricsNames:
+               uncounted[name] = globals()[name]
+               globals()[name] = countCalls(name, uncounted[name])
+          fanObjective.fTrial = fTrialCounted
+     else:
+          for name, function in uncounted.items():
+               globals()[name] = function
+          uncounted.clear()
+          fanObjective.fTrial = fTrialUncounted
+
+class marchMetrics:
+     '''
+     Metrics of the optimizer added up over all the fans of a march, by (nRegions, type of path)
+     so that we can see which fans take the time. Set triangleFan.metrics to the same
+     marchMetrics for all the fans.
+     '''
+     def __init__(self):
+          self.nFans = 0
+          self.nOptionsPruned = 0
+          self.byShape = {} # (nRegions, pathTypeName) -> optionMetrics
+
+     def addFan(self, nRegions, options, listMetrics, nOptionsPruned = 0):
+          '''
+          Add the metrics of the options solved for a fan (options[i] was solved with listMetrics[i])
+          '''
+          self.nFans += 1
+          self.nOptionsPruned += nOptionsPruned
+          for option, metrics in zip(options, listMetrics):
+               key = (nRegions, pathTypeName(option))
+               if( key in self.byShape ):
+                    self.byShape[key].add(metrics)
+               else:
+                    self.byShape[key] = metrics
+
+     def total(self):
+          '''
+          optionMetrics with everything added up
+          '''
+          total = optionMetrics()
+          total.nOptions = 0
+          for metrics in self.byShape.values():
+               total.add(metrics)
+          return total
+
+     def report(self, maxRows = 20):
+          '''
+          Table with the shapes that took the most time
+          '''
+          total = self.total()
+          lines = ["fans: {}  options solved: {}  pruned: {}  time: {:.3f} s".format(self.nFans, total.nOptions,
+                                                                                  self.nOptionsPruned, total.time)]
+          lines.append("{:>8} {:>12} {:>8} {:>10} {:>10} {:>10} {:>12} {:>10}".format("nRegions", "path type", "options",
+                                                                                   "time [s]", "iter/opt", "backTr/opt",
+                                                                                   "steps/backTr", "proj/opt"))
+          rows = sorted(self.byShape.items(), key = lambda item: -item[1].time)
+          for (nRegions, pathType), metrics in rows[:maxRows]:
+               nBackTr = sum(metrics.backtrackingCalls.values())
+               lines.append("{:>8} {:>12} {:>8} {:>10.3f} {:>10.1f} {:>10.1f} {:>12.2f} {:>10.1f}".format(
+                    nRegions, pathType, metrics.nOptions, metrics.time, metrics.nIterations/metrics.nOptions,
+                    nBackTr/metrics.nOptions, sum(metrics.backtrackingSteps.values())/max(nBackTr, 1),
+                    sum(metrics.projectionCalls.values())/metrics.nOptions))
+          if( len(total.backtrackingCalls) > 0 ):
+               lines.append("backtracking (calls, steps): " + ", ".join("{} {} {}".format(name, count, total.backtrackingSteps.get(name, 0))
+                                                                       for name, count in sorted(total.backtrackingCalls.items())))
+          if( len(total.projectionCalls) > 0 ):
+               lines.append("projections: " + ", ".join("{} {}".format(name, count) for name, count in sorted(total.projectionCalls.items())))
+          return "\n".join(lines)
+
+
+def optimizeOptionTop(triFan, k):
+     '''
+     Solve the k-th option of a triangle fan (module level so that it can be sent to a process pool)
+     '''
+     return triFan.optimizeOption(k)
+
 
 class triangleFan:
      '''
@@ -3082,8 +4668,26 @@ class triangleFan:
         :param bool plotOpti: if plot optimal triangle fan of all possible path types
         :param int maxIter: max number of iterations the optimzer should perform
         :param double tol: tolerance for the optimizer
+        :param double tolKKT: target for the KKT residual of the optimizer (None to stop only with tol and maxIter)
+        :param double optiResidual: KKT residual at the optimal path (sent to C with THat)
         :param bool plotSteps: if each step in the optimization should be plotted or not
-        :param bool saveIterates: if the iterates should be saved or not
+        :param bool saveIterates: if the iterates should be saved or not (see iterateRecorder and dumpIterates)
+        :param int iterateCapacity: max number of iterates saved per option, the oldest ones are overwritten
+        :param dict iterates: iterateRecorder of each option solved in the last optimization (if saveIterates)
+        :param executor: how to solve the options in optionsTop, None (one after another), "threads", "processes" or a concurrent.futures.Executor
+        :param int nWorkers: number of workers if executor is "threads" or "processes"
+        :param bool pruneOptions: if the options in optionsTop that can't be better than the best one found so far are skipped
+        :param int nOptionsPruned: number of options skipped in the last optimization
+        :param int nIterations: iterations of the optimizer in the last optimization (all the options solved)
+        :param ndarray optiOption: row of optionsTop of the optimal path (type of path)
+        :param marchMetrics metrics: if set, the metrics of the optimizer (iterations, backtracking, projections, time) are added here
+        :param dict optionMetrics: optionMetrics of each option solved in the last optimization (if metrics is set)
+        :param str pathTypeSearch: "exhaustive" to solve all the options in optionsTop, "dp" to solve the one chosen by dynamic programming
+        :param int nGridDP: number of grid points for each parameter in the dynamic programming
+        :param str solver: "bcd" for block coordinate subgradient descent, "newton" for projected BFGS (falls back to "bcd" on non smooth problems)
+        :param warmStartCache cache: cache with previous optimums to warm start the optimizer
+        :param tuple cacheKey: key of this fan in the cache
+        :param dict warmStart: initial guess for the optimizer taken from the cache
         '''
         self.nRegions = 0
         self.params = []     # Always length 2*nRegions + 1
@@ -3117,32 +4721,97 @@ class triangleFan:
         self.plotOpti = True # If plot the triangle fan, optimal path of all possible path types
         self.maxIter = 75
         self.tol = 1e-14
+        self.tolKKT = None # also stop once kktResidual is below this (e.g. tolKKT_fromMeshSize(h)), None: only tol and maxIter
+        self.optiResidual = np.nan # kktResidual at the optimal path
         self.plotSteps = False
         self.saveIterates = False
+        self.iterateCapacity = 256 # iterates saved per option (the last ones) if saveIterates
+        self.iterates = None # {k: iterateRecorder} of the options solved in the last call to optimize if saveIterates
         self.params_dict = None # dictionary for reading with json
+        self.executor = None # None (sequential), "threads", "processes" or a concurrent.futures.Executor to solve the options in optionsTop
+        self.nWorkers = None # max_workers if the executor is created here
+        self.pruneOptions = True # skip the options in optionsTop whose lower bound is above the best value found so far
+        self.nOptionsPruned = 0 # number of options skipped in the last call to optimize
+        self.nIterations = 0
+        self.optiOption = None
+        self.metrics = None # marchMetrics where we add the metrics of the optimizer (opt in, see useMetrics)
+        self.optionMetrics = None # {k: optionMetrics} of the options solved in the last call to optimize
+        self.pathTypeSearch = "exhaustive" # "exhaustive" (all of optionsTop) or "dp" (pathTypeSearch_dp chooses the type of path)
+        self.nGridDP = 33 # grid for the parameters in pathTypeSearch_dp
+        self.solver = "bcd" # "bcd" (blockCoordinateGradient_generalized) or "newton" (projectedQuasiNewton_generalized)
+        self.cache = None # warmStartCache to seed the optimizer (and save the optimum)
+        self.cacheKey = None # (index0, index1, indexHat, listFaces...) of this fan
+        self.warmStart = None # initial guess from the cache, see warmStartCache.seed
 
      def initFromJSON(self, jsonString):
           '''
           Set the parameters of this class from a json type of string
           '''
-          tol = 1e-12
           params_dict = json.loads(jsonString) # Loading this json type of string
           self.params_dict = params_dict
-          self.x0 =  np.array(params_dict["x0"], dtype=float)
-          self.T0 = params_dict["T0"]
-          self.grad0 = np.array( params_dict["grad0"], dtype=float )
-          self.x1 = np.array( params_dict["x1"], dtype=float)
-          self.T1 = params_dict["T1"]
-          self.grad1 = np.array( params_dict["grad1"], dtype=float)
-          self.xHat = np.array( params_dict["xHat"] , dtype=float)
-          self.listIndices = np.array(params_dict["listIndices"], dtype=float)
-          self.listxk = np.array(params_dict["listxk"], dtype=float)
-          self.listB0k = np.array(params_dict["listB0k"], dtype=float)
-          self.listBk = np.array(params_dict["listBk"], dtype=float)
-          self.listBkBk1 = np.array(params_dict["listBkBk1"], dtype=float)
           self.plotBefore = bool(params_dict["plotBefore"])
           self.plotAfter = bool(params_dict["plotAfter"])
           self.plotOpti = bool(params_dict["plotOpti"])
+          if( params_dict.get("tolKKT", 0) > 0 ):
+               self.tolKKT = float(params_dict["tolKKT"])
+          self.initFromArrays(np.array(params_dict["x0"], dtype=float), params_dict["T0"],
+                              np.array(params_dict["grad0"], dtype=float),
+                              np.array(params_dict["x1"], dtype=float), params_dict["T1"],
+                              np.array(params_dict["grad1"], dtype=float),
+                              np.array(params_dict["xHat"], dtype=float),
+                              np.array(params_dict["listIndices"], dtype=float),
+                              np.array(params_dict["listxk"], dtype=float),
+                              np.array(params_dict["listB0k"], dtype=float),
+                              np.array(params_dict["listBk"], dtype=float),
+                              np.array(params_dict["listBkBk1"], dtype=float))
+
+     def initFromBinary(self, buf):
+          '''
+          Set the parameters of this class from the binary request written by writeBinaryFan
+          in eik_grid.c. buf has the 13*nRegions + 24 doubles that come after the nRegions header:
+          x0, T0, grad0, x1, T1, grad1, xHat, listIndices, listxk, listB0k, listBk, listBkBk1
+          and the key of the fan (index0, index1, indexHat, listFaces)
+          The arrays are read only views of buf (no copies, no parsing).
+          '''
+          data = np.frombuffer(buf, dtype=np.float64)
+          n = (len(data) - 24)//13
+          assert( len(data) == fanRequestSize(n) )
+          self.cacheKey = fanKeyFromArray(data[(12*n + 21):])
+          self.plotBefore = False
+          self.plotAfter = False
+          self.plotOpti = False
+          start = 12
+          listIndices = data[start:(start + 2*n + 1)]
+          start += 2*n + 1
+          listxk = data[start:(start + 2*(n + 2))].reshape((n + 2, 2))
+          start += 2*(n + 2)
+          listB0k = data[start:(start + 2*(n + 1))].reshape((n + 1, 2))
+          start += 2*(n + 1)
+          listBk = data[start:(start + 2*(n + 1))].reshape((n + 1, 2))
+          start += 2*(n + 1)
+          listBkBk1 = data[start:(start + 4*n)].reshape((2*n, 2))
+          self.initFromArrays(data[0:2], data[2], data[3:5], data[5:7], data[7], data[8:10],
+                              data[10:12], listIndices, listxk, listB0k, listBk, listBkBk1)
+
+     def initFromArrays(self, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                        listxk, listB0k, listBk, listBkBk1):
+          '''
+          Set the parameters of this class from arrays, the tangents are copied
+          because we need to change them (orientation and tangents of straight edges)
+          '''
+          tol = 1e-12
+          self.x0 = x0
+          self.T0 = float(T0)
+          self.grad0 = grad0
+          self.x1 = x1
+          self.T1 = float(T1)
+          self.grad1 = grad1
+          self.xHat = xHat
+          self.listIndices = listIndices
+          self.listxk = listxk
+          self.listB0k = np.array(listB0k, dtype=float)
+          self.listBk = np.array(listBk, dtype=float)
+          self.listBkBk1 = np.array(listBkBk1, dtype=float)
           self.nRegions = len(self.listxk) - 2
           self.params = np.ones((2*self.nRegions + 1))
           # First we need to change the B0k, Bk, BkBk1 if they are zero (i.e. they are NOT on the boundary)
@@ -3239,84 +4908,229 @@ class triangleFan:
                     optionsTop[:, k] = 0
                     optionsTop[:, k] = 0
           self.optionsTop = np.unique(optionsTop, axis = 0)
+          # Coefficients of the Hermite interpolation of all the edges of this fan
+          hermiteEdges.addFan(self.x0, self.listxk, self.listB0k, self.listBk, self.listBkBk1)
           
+     def __getstate__(self):
+          '''
+          The executor stays here when this fan is sent to a process pool
+          '''
+          state = self.__dict__.copy()
+          state['executor'] = None
+          if( state['metrics'] is not None ):
+               state['metrics'] = marchMetrics() # the metrics come back with the result of each option
+          return state
+
+     def optimizeOption(self, k):
+          '''
+          Solve the optimization problem for the k-th option in optionsTop (type of path),
+          returns fk, params, indCrTop, paramsCrTop, indStTop, paramsStTop, nIter, residual, recorder, metrics
+          (the iterateRecorder of this option if self.saveIterates, the optionMetrics if
+          self.metrics is set, None if not)
+          '''
+          if( self.metrics is None ):
+               return self.solveOption(k) + (None,)
+          useMetrics(True)
+          metrics = optionMetrics()
+          activeMetrics.current = metrics
+          start = perf_counter()
+          try:
+               result = self.solveOption(k)
+          finally:
+               activeMetrics.current = None
+          metrics.time = perf_counter() - start
+          metrics.nIterations = result[6]
+          return result + (metrics,)
+
+     def solveOption(self, k):
+          '''
+          optimizeOption without the metrics
+          '''
+          thisOption = self.optionsTop[k] # Current option we are considering
+          indCrTop = np.where(thisOption == 1)[0]
+          if(len(indCrTop) == 0):
+               indCrTop = None
+               paramsCrTop = None
+          else:
+               indCrTop = indCrTop + 1
+               paramsCrTop = 0.7*np.ones((2*len(indCrTop)))
+               paramsCrTop[::2] = 0.3
+          indStTop = np.where(thisOption == 2)[0]
+          if(len(indStTop) == 0):
+               indStTop = None
+               paramsStTop = None
+          else:
+               indStTop = indStTop + 1
+               paramsStTop = 0.7*np.ones((2*len(indStTop)))
+               paramsStTop[::2] = 0.3
+          recorder = None
+          if( self.saveIterates ):
+               recorder = iterateRecorder(len(self.params), 0 if indCrTop is None else len(paramsCrTop),
+                                          0 if indStTop is None else len(paramsStTop), self.iterateCapacity)
+          params0 = self.params
+          if( self.warmStart is not None ):
+               # Start from the previous optimum of this fan
+               params0 = self.warmStart['params']
+               paramsCrTop = seedTops(indCrTop, paramsCrTop, self.warmStart['indCrTop'], self.warmStart['paramsCrTop'])
+               paramsStTop = seedTops(indStTop, paramsStTop, self.warmStart['indStTop'], self.warmStart['paramsStTop'])
+          # We have everything that we need, now we solve the current optimization problem
+          if( self.plotBefore ):
+               f_before = fObj_generalized(params0, self.x0, self.T0, self.grad0,
+                                           self.x1, self.T1, self.grad1, self.xHat,
+                                           self.listIndices, self.listxk, self.listB0k,
+                                           self.listBk, self.listBkBk1,
+                                           indCrTop, paramsCrTop, indStTop, paramsStTop)
+               plotting().plotFan(self.x0, self.listB0k, self.listxk, self.listBk,
+                                  "Initial parameters in triangle fan, $g^*_{C,D}$ =" + " {fk:6.3f}".format(fk=f_before),
+                                  params = params0, indCrTop = indCrTop,
+                                  paramsCrTop = paramsCrTop, indStTop = indStTop,
+                                  paramsStTop = paramsStTop, listBkBk1 = self.listBkBk1)
+          if( self.solver == "newton" ):
+               paramsk, paramsCrTopk, paramsStTopk, gradParamsk, gradCrTopk, gradStTopk, listObjVals,_, _, _ = projectedQuasiNewton_generalized(params0, self.x0, self.T0, self.grad0, self.x1, self.T1, self.grad1, self.xHat, self.listIndices, self.listxk, self.listB0k, self.listBk, self.listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop, self.listCurvingInwards, maxIterFallback = self.maxIter, recorder = recorder, tolKKT = self.tolKKT)
+          else:
+               paramsk, paramsCrTopk, paramsStTopk, gradParamsk, gradCrTopk, gradStTopk, listObjVals,_, _, _ = blockCoordinateGradient_generalized(params0, self.x0, self.T0, self.grad0, self.x1, self.T1, self.grad1, self.xHat, self.listIndices, self.listxk, self.listB0k, self.listBk, self.listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop, self.listCurvingInwards, plotSteps = False, maxIter = self.maxIter, recorder = recorder, tolKKT = self.tolKKT)
+          fk = fObj_generalized(paramsk, self.x0, self.T0, self.grad0,
+                                self.x1, self.T1, self.grad1, self.xHat,
+                                self.listIndices, self.listxk, self.listB0k,
+                                self.listBk, self.listBkBk1,
+                                indCrTop, paramsCrTopk,
+                                indStTop, paramsStTopk)
+          if( self.plotAfter ):
+               plotting().plotFan(self.x0, self.listB0k, self.listxk, self.listBk,
+                                  "Optimal parameters in triangle fan for this type of path, $g^*_{C,D}$ =" + " {fk:6.3f}".format(fk=fk),
+                                  params = paramsk, indCrTop = indCrTop,
+                                  paramsCrTop = paramsCrTopk, indStTop = indStTop,
+                                  paramsStTop = paramsStTopk, listBkBk1 = self.listBkBk1)
+          residual = kktResidual(paramsk, paramsCrTopk, paramsStTopk, gradParamsk, gradCrTopk, gradStTopk)
+          return fk, paramsk, indCrTop, paramsCrTopk, indStTop, paramsStTopk, len(listObjVals), residual, recorder
+
+     def pathTypesDP(self):
+          '''
+          Options to solve if pathTypeSearch is "dp": the type of path from pathTypeSearch_dp and
+          the one with no points on the tops (so that we never do worse than the usual path).
+          The types considered on each top edge are the ones that appear in optionsTop, if the
+          combination chosen is not one of the rows of optionsTop we solve all of them
+          '''
+          n = self.nRegions
+          allowedTypes = [np.unique(self.optionsTop[:, k]).astype(int) for k in range(n)]
+          option, _ = pathTypeSearch_dp(self.x0, self.T0, self.grad0, self.x1, self.T1, self.grad1,
+                                        self.listIndices, self.listxk, self.listB0k, self.listBk,
+                                        self.listBkBk1, allowedTypes, self.nGridDP)
+          if( not np.any(np.all(self.optionsTop == option, axis = 1)) ):
+               return self.optionsTop
+          return np.unique(np.array([np.zeros((n)), option]), axis = 0)
+
+     def lowerBoundOption(self, k):
+          '''
+          Lower bound for the objective function for the k-th option in optionsTop
+          '''
+          return lowerBound_pathType(self.optionsTop[k], self.x0, self.T0, self.grad0, self.x1, self.T1, self.grad1,
+                                     self.listIndices, self.listxk, self.listB0k, self.listBk, self.listBkBk1)
+
+     def dumpIterates(self, fOut):
+          '''
+          Append the iterates of the last optimization to the binary file fOut: int64 nRegions, nOptions
+          and for each option its row of optionsTop (int64) and iterateRecorder.toBytes (see loadIterates)
+          '''
+          iterates = {} if self.iterates is None else self.iterates
+          fOut.write(np.array([self.nRegions, len(iterates)], dtype=np.int64).tobytes())
+          for k in sorted(iterates):
+               fOut.write(np.asarray(self.optionsTop[k], dtype=np.int64).tobytes())
+               fOut.write(iterates[k].toBytes())
+
+     def optimizeOptions(self):
+          '''
+          Solve the optimization problems for the options in optionsTop, concurrently if
+          self.executor is set. If self.pruneOptions the options are solved in the order of their
+          lower bounds (most promising first) and the ones whose lower bound is above the best
+          value found so far are skipped. Returns a list of (k, result of optimizeOption)
+          '''
+          nOptions = len(self.optionsTop)
+          order = list(range(nOptions))
+          bounds = None
+          if( self.pruneOptions and nOptions > 1 ):
+               bounds = [self.lowerBoundOption(k) for k in range(nOptions)]
+               order = sorted(order, key = lambda k: bounds[k]) # stable, ties stay in optionsTop order
+          if( self.warmStart is not None ):
+               # The type of path of the previous optimum goes first
+               warm = [k for k in order if np.array_equal(self.optionsTop[k], self.warmStart['option'])]
+               order = warm + [k for k in order if k not in warm]
+          self.nOptionsPruned = 0
+          results = []
+          fBest = self.opti_fVal
+          def isPruned(k):
+               if( bounds is not None and bounds[k] > fBest ):
+                    self.nOptionsPruned += 1
+                    return True
+               return False
+          if( self.executor is None or nOptions < 2 or self.plotBefore or self.plotAfter ):
+               # matplotlib is not thread safe, plotting is always sequential
+               for k in order:
+                    if( isPruned(k) ):
+                         continue
+                    results.append( (k, self.optimizeOption(k)) )
+                    fBest = min(fBest, results[-1][1][0])
+               return results
+          if( bounds is not None ):
+               # Solve the most promising option first, it's the one that prunes the rest
+               results.append( (order[0], self.optimizeOption(order[0])) )
+               fBest = min(fBest, results[-1][1][0])
+               order = [k for k in order[1:] if not isPruned(k)]
+          if( len(order) == 0 ):
+               return results
+          if( isinstance(self.executor, str) ):
+               if( self.executor == "threads" ):
+                    pool = ThreadPoolExecutor(max_workers = self.nWorkers)
+               elif( self.executor == "processes" ):
+                    pool = ProcessPoolExecutor(max_workers = self.nWorkers)
+               else:
+                    raise ValueError("executor should be None, 'threads', 'processes' or a concurrent.futures.Executor")
+               with pool:
+                    return results + list(zip(order, pool.map(optimizeOptionTop, [self]*len(order), order)))
+          # An executor that the caller keeps alive between fans
+          return results + list(zip(order, self.executor.map(optimizeOptionTop, [self]*len(order), order)))
+
      def optimize(self):
           # After loading all of the information from the json type of string we can do different types
-          # of optimization
-          for k in range(len(self.optionsTop)):
-               # We  have this amount of optimization problems to solve
-               thisOption = self.optionsTop[k] # Current option we are considering
-               indCrTop = np.where(thisOption == 1)[0]
-               if(len(indCrTop) == 0):
-                    indCrTop = None
-                    paramsCrTop = None
-               else:
-                    indCrTop = indCrTop + 1
-                    paramsCrTop = 0.7*np.ones((2*len(indCrTop)))
-                    paramsCrTop[::2] = 0.3
-               indStTop = np.where(thisOption == 2)[0]
-               if(len(indStTop) == 0):
-                    indStTop = None
-                    paramsStTop = None
-               else:
-                    indStTop = indStTop + 1
-                    paramsStTop = 0.7*np.ones((2*len(indStTop)))
-                    paramsStTop[::2] = 0.3
-                    thisOption = self.optionsTop[k] # Current option we are considering
-               indCrTop = np.where(thisOption == 1)[0]
-               if(len(indCrTop) == 0):
-                    indCrTop = None
-                    paramsCrTop = None
-               else:
-                    indCrTop = indCrTop + 1
-                    paramsCrTop = 0.7*np.ones((2*len(indCrTop)))
-                    paramsCrTop[::2] = 0.3
-               indStTop = np.where(thisOption == 2)[0]
-               if(len(indStTop) == 0):
-                    indStTop = None
-                    paramsStTop = None
-               else:
-                    indStTop = indStTop + 1
-                    paramsStTop = 0.7*np.ones((2*len(indStTop)))
-                    paramsStTop[::2] = 0.3
-               # We have everything that we need, now we solve the current optimization problem
-               if( self.plotBefore ):
-                    f_before = fObj_generalized(self.params, self.x0, self.T0, self.grad0,
-                                                self.x1, self.T1, self.grad1, self.xHat,
-                                                self.listIndices, self.listxk, self.listB0k,
-                                                self.listBk, self.listBkBk1,
-                                                indCrTop, paramsCrTop, indStTop, paramsStTop)
-                    itt.plotFann(self.x0, self.listB0k, self.listxk, self.listBk,
-                                 params = self.params, indCrTop = indCrTop,
-                                 paramsCrTop = paramsCrTop, indStTop = indStTop,
-                                 paramsStTop = paramsStTop, listBkBk1 = self.listBkBk1)
-                    plt.title("Initial parameters in triangle fan, $g^*_{C,D}$ =" + " {fk:6.3f}".format(fk=f_before))
-               paramsk, paramsCrTopk, paramsStTopk, _, _, _, listObjVals,_, _, _ = blockCoordinateGradient_generalized(self.params, self.x0, self.T0, self.grad0, self.x1, self.T1, self.grad1, self.xHat, self.listIndices, self.listxk, self.listB0k, self.listBk, self.listBkBk1, indCrTop, paramsCrTop, indStTop, paramsStTop, self.listCurvingInwards, plotSteps = False, maxIter = self.maxIter)
-               fk = fObj_generalized(paramsk, self.x0, self.T0, self.grad0,
-                                                      self.x1, self.T1, self.grad1, self.xHat,
-                                                      self.listIndices, self.listxk, self.listB0k,
-                                                      self.listBk, self.listBkBk1,
-                                                      indCrTop, paramsCrTopk,
-                                                      indStTop, paramsStTopk)
-               if( self.plotAfter ):
-                    itt.plotFann(self.x0, self.listB0k, self.listxk, self.listBk,
-                                 params = paramsk, indCrTop = indCrTop,
-                                 paramsCrTop = paramsCrTopk, indStTop = indStTop,
-                                 paramsStTop = paramsStTopk, listBkBk1 = self.listBkBk1)
-                    plt.title("Optimal parameters in triangle fan for this type of path, $g^*_{C,D}$ =" + " {fk:6.3f}".format(fk=fk))
-               if(fk < self.opti_fVal):
+          # of optimization. In case of a tie the first option in optionsTop wins (no matter the order
+          # in which they were solved)
+          if( self.pathTypeSearch == "dp" ):
+               self.optionsTop = self.pathTypesDP()
+          if( self.cache is not None and self.cacheKey is not None ):
+               self.warmStart = self.cache.seed(self.cacheKey, self.nRegions)
+          kBest = len(self.optionsTop)
+          self.nIterations = 0
+          self.optionMetrics = None if self.metrics is None else {}
+          self.iterates = {} if self.saveIterates else None
+          for k, (fk, paramsk, indCrTop, paramsCrTopk, indStTop, paramsStTopk, nIter, residual, recorder, metricsk) in self.optimizeOptions():
+               self.nIterations += nIter
+               if( recorder is not None ):
+                    self.iterates[k] = recorder
+               if( metricsk is not None ):
+                    self.optionMetrics[k] = metricsk
+               if(fk < self.opti_fVal or (fk == self.opti_fVal and k < kBest)):
+                    kBest = k
                     # We've found a better path and type of path
                     self.optiParams = paramsk
                     self.optiIndCrTop = indCrTop
                     self.optiParamsCrTop = paramsCrTopk
                     self.optiIndStTop = indStTop
                     self.optiParamsStTop = paramsStTopk
+                    self.optiResidual = residual
                     self.opti_fVal = fObj_generalized(self.optiParams, self.x0, self.T0, self.grad0,
                                                       self.x1, self.T1, self.grad1, self.xHat,
                                                       self.listIndices, self.listxk, self.listB0k,
                                                       self.listBk, self.listBkBk1,
                                                       self.optiIndCrTop, self.optiParamsCrTop,
                                                       self.optiIndStTop, self.optiParamsStTop)
+          self.optiOption = self.optionsTop[kBest] if kBest < len(self.optionsTop) else None
+          if( self.metrics is not None ):
+               solved = sorted(self.optionMetrics)
+               self.metrics.addFan(self.nRegions, [self.optionsTop[k] for k in solved],
+                                   [self.optionMetrics[k] for k in solved], self.nOptionsPruned)
+          if( self.cache is not None and self.cacheKey is not None and kBest < len(self.optionsTop) ):
+               self.cache.put(self.cacheKey, self.optiParams, self.optionsTop[kBest], self.optiIndCrTop,
+                              self.optiParamsCrTop, self.optiIndStTop, self.optiParamsStTop)
           # Save nIndCrTop and nIndStTop
           if( self.optiIndCrTop is None or self.optiIndCrTop[0] == -1):
                self.nIndCrTop = 0
@@ -3336,18 +5150,13 @@ class triangleFan:
                                                      self.listBk, self.listBkBk1,
                                                      self.optiIndCrTop, self.optiParamsCrTop,
                                                      self.optiIndStTop, self.optiParamsStTop)
-          gradLast = self.grads[-1]
-          k = len(self.grads) - 1
-          while( norm(gradLast) == 0 and k > -1):
-               gradLast = self.grads[k]
-               k = k -1
-          self.lastGrad = gradLast
+          self.lastGrad = lastNonzeroGrad(self.grads)
           if( self.plotOpti):
-               itt.plotFann(self.x0, self.listB0k, self.listxk, self.listBk,
-                            params = self.optiParams, indCrTop = self.optiIndCrTop,
-                            paramsCrTop = self.optiParamsCrTop, indStTop = self.optiIndStTop,
-                            paramsStTop = self.optiParamsStTop, listBkBk1 = self.listBkBk1)
-               plt.title("Optimal path in triangle fan, $g^*_{C,D}$ =" + " {fk:6.3f}".format(fk=self.opti_fVal) )
+               plotting().plotFan(self.x0, self.listB0k, self.listxk, self.listBk,
+                                  "Optimal path in triangle fan, $g^*_{C,D}$ =" + " {fk:6.3f}".format(fk=self.opti_fVal),
+                                  params = self.optiParams, indCrTop = self.optiIndCrTop,
+                                  paramsCrTop = self.optiParamsCrTop, indStTop = self.optiIndStTop,
+                                  paramsStTop = self.optiParamsStTop, listBkBk1 = self.listBkBk1)
           return self.opti_fVal
 
      def outputReadableJSON(self, triInfo):
@@ -3407,6 +5216,8 @@ class triangleFan:
                     stringOut += ','
           # Add gradHat
           stringOut += '], "gradHat": [' + '{fk:6.12f}'.format(fk=self.lastGrad[0]) + ',' + '{fk:6.12f}'.format(fk=self.lastGrad[1]) + ']'
+          # Add the KKT residual
+          stringOut += ', "residual": ' + '{fk:.6e}'.format(fk=self.residualOut())
           stringOut += '}'
           return stringOut
 
@@ -3467,9 +5278,68 @@ class triangleFan:
                     stringOut += ','
           # Add gradHat
           stringOut += '], "gradHat": [' + '{fk:6.12f}'.format(fk=self.lastGrad[0]) + ',' + '{fk:6.12f}'.format(fk=self.lastGrad[1]) + ']'
+          # Add the KKT residual
+          stringOut += ', "residual": ' + '{fk:.6e}'.format(fk=self.residualOut())
           stringOut += '}'
           dict_out = json.loads(stringOut)
           self.params_dict.update(dict_out)
           return self.params_dict
+
+     def outputBinary(self, buf):
+          '''
+          Optimization given the binary request buf (see initFromBinary), outputs the
+          binary response read by readBinaryFanOutput in eik_grid.c (all doubles):
+          THat, gradHat, nIndCrTop, nIndStTop, params, indCrTop, paramsCrTop,
+          indStTop, paramsStTop, grads, path, residual
+          '''
+          self.initFromBinary(buf)
+          self.optimize()
+          return self.binaryOutput()
+
+     def outputFromBuffers(self, x0, T0, grad0, x1, T1, grad1, xHat, listIndices,
+                           listxk, listB0k, listBk, listBkBk1, key = None):
+          '''
+          Optimization given buffers (memoryviews of the triangleFanS memory when
+          called from the embedded interpreter in python_embedded.c), outputs the
+          same binary response as outputBinary. If key (index0, index1, indexHat, listFaces)
+          is given and useEmbeddedWarmStart is on the optimizer is warm started from embeddedWarmStartCache
+          '''
+          if( key is not None and embeddedWarmStartCache is not None ):
+               self.cacheKey = fanKeyFromArray(np.frombuffer(key))
+               if( self.cache is None ):
+                    self.cache = embeddedWarmStartCache
+          self.plotBefore = False
+          self.plotAfter = False
+          self.plotOpti = False
+          self.initFromArrays(np.frombuffer(x0), T0, np.frombuffer(grad0),
+                              np.frombuffer(x1), T1, np.frombuffer(grad1),
+                              np.frombuffer(xHat), np.frombuffer(listIndices),
+                              np.frombuffer(listxk).reshape((-1, 2)),
+                              np.frombuffer(listB0k).reshape((-1, 2)),
+                              np.frombuffer(listBk).reshape((-1, 2)),
+                              np.frombuffer(listBkBk1).reshape((-1, 2)))
+          self.optimize()
+          return self.binaryOutput()
+
+     def binaryOutput(self):
+          '''
+          Binary response after optimizing (see outputBinary)
+          '''
+          nGrads = len(self.optiParams) + 2*self.nIndCrTop + 2*self.nIndStTop
+          out = np.concatenate( ([self.opti_fVal], self.lastGrad, [self.nIndCrTop, self.nIndStTop],
+                                 self.optiParams,
+                                 np.asarray(self.optiIndCrTop, dtype=float)[:self.nIndCrTop],
+                                 np.asarray(self.optiParamsCrTop, dtype=float)[:2*self.nIndCrTop],
+                                 np.asarray(self.optiIndStTop, dtype=float)[:self.nIndStTop],
+                                 np.asarray(self.optiParamsStTop, dtype=float)[:2*self.nIndStTop],
+                                 self.grads[:nGrads].flatten(), self.path[:nGrads].flatten(),
+                                 [self.residualOut()]) )
+          return out.astype(np.float64).tobytes()
+
+     def residualOut(self):
+          '''
+          KKT residual at the optimal path for C, -1 if we don't have it
+          '''
+          return float(self.optiResidual) if np.isfinite(self.optiResidual) else -1.0
         
 
@@ -4,8 +4,12 @@ Here is the implementation of the prioriry queue for the 2D FMM. Explanaition
 
    - eik_queue: Eikonal values considered, binary tree in an array, this is the thing to heapify
    - index_queue : index (grid coordinates) if the Eikonal values considered in the queue
+   - queue_pos : position in the binary tree of each index (-1 if it's not in the queue)
    - size : current non empty entries of the binary tree
 
+With queue_pos we don't have to look for an index in the tree, insert, update, deleteRoot and
+delete_findIndex only sift the node that changed up or down, so they are O(log n).
+
 */
 
 #include "priority_queue.h"
@@ -17,8 +21,10 @@ Here is the implementation of the prioriry queue for the 2D FMM. Explanaition
 struct Priority_queue {
   double *queue_vals; // if we need more we'll add more
   int *queue_index; // same here
+  int *queue_pos; // position of each index in queue_vals and queue_index, -1 if not in the queue
   int size; // current occupied size occupied
   int maxSize; // max sized of queue_vals and queue_index currently allowed
+  int posSize; // size of queue_pos (one more than the largest index we've seen)
 };
 
 void priority_queue_alloc(p_queue **Priority_queue ) {
@@ -27,6 +33,9 @@ void priority_queue_alloc(p_queue **Priority_queue ) {
 }
 
 void priority_queue_dealloc(p_queue **Priority_queue ) {
+  free((*Priority_queue)->queue_vals);
+  free((*Priority_queue)->queue_index);
+  free((*Priority_queue)->queue_pos);
   free(*Priority_queue);
   *Priority_queue = NULL;
 }
@@ -36,6 +45,8 @@ void priority_queue_init( p_queue *Priority_queue  )
   Priority_queue->maxSize = 2;
   Priority_queue->queue_vals = malloc( Priority_queue->maxSize*sizeof(double)  );
   Priority_queue->queue_index = malloc( Priority_queue->maxSize*sizeof(int) );
+  Priority_queue->posSize = 0;
+  Priority_queue->queue_pos = NULL;
   Priority_queue->size = 0;
   assert( Priority_queue != NULL  ); // the queue should not be null if initialized
 }
@@ -48,6 +59,24 @@ void grow_queue( p_queue *Priority_queue )
   Priority_queue->queue_index = realloc( Priority_queue->queue_index, Priority_queue->maxSize*sizeof(int) );
 }
 
+static void grow_pos( p_queue *Priority_queue, int index )
+{
+  // make sure that queue_pos has an entry for index, new entries are not in the queue
+  if( index < Priority_queue->posSize ){
+    return;
+  }
+  int newSize = Priority_queue->posSize > 0 ? Priority_queue->posSize : 2;
+  while( newSize <= index ){
+    newSize *= 2;
+  }
+  Priority_queue->queue_pos = realloc( Priority_queue->queue_pos, newSize*sizeof(int) );
+  assert( Priority_queue->queue_pos != NULL );
+  for( int i = Priority_queue->posSize; i < newSize; i++ ){
+    Priority_queue->queue_pos[i] = -1;
+  }
+  Priority_queue->posSize = newSize;
+}
+
 
 void swap_double(double *a, double *b)
 {
@@ -63,6 +92,51 @@ void swap_int(int *a, int *b)
   *a = temp;
 }
 
+static void swap_nodes(p_queue *Priority_queue, int i, int j)
+{
+  // swap two nodes of the tree and keep track of where their indices are
+  swap_double(&Priority_queue->queue_vals[i], &Priority_queue->queue_vals[j]); // swap in the eik_queue
+  swap_int(&Priority_queue->queue_index[i], &Priority_queue->queue_index[j]); // swap in the index_queue
+  Priority_queue->queue_pos[Priority_queue->queue_index[i]] = i;
+  Priority_queue->queue_pos[Priority_queue->queue_index[j]] = j;
+}
+
+static void sift_up(p_queue *Priority_queue, int i)
+{
+  // move the node at i up while it's smaller than its parent
+  int parent;
+  while( i > 0 ){
+    parent = (i - 1)/2;
+    if( Priority_queue->queue_vals[i] >= Priority_queue->queue_vals[parent] ){
+      break;
+    }
+    swap_nodes(Priority_queue, i, parent);
+    i = parent;
+  }
+}
+
+static void delete_atPosition(p_queue *Priority_queue, int i)
+{
+  // move the last node to i and sift it to where it belongs
+  int last = Priority_queue->size - 1;
+  assert( i >= 0 && i <= last );
+  Priority_queue->queue_pos[Priority_queue->queue_index[i]] = -1;
+  if( i != last ){
+    Priority_queue->queue_vals[i] = Priority_queue->queue_vals[last];
+    Priority_queue->queue_index[i] = Priority_queue->queue_index[last];
+    Priority_queue->queue_pos[Priority_queue->queue_index[i]] = i;
+  }
+  Priority_queue->size -= 1; // make it "forget", after size-1 everything is ignored
+  if( i < Priority_queue->size ){
+    if( i > 0 && Priority_queue->queue_vals[i] < Priority_queue->queue_vals[(i - 1)/2] ){
+      sift_up(Priority_queue, i);
+    }
+    else{
+      heapify(Priority_queue, i);
+    }
+  }
+}
+
 void heapify(p_queue *Priority_queue, int i)
 {
   if (Priority_queue->size == 1)
@@ -82,8 +156,7 @@ void heapify(p_queue *Priority_queue, int i)
       smallest = r;
     if (smallest != i)
     {
-      swap_double(&Priority_queue->queue_vals[i], &Priority_queue->queue_vals[smallest]); // swap in the eik_queue
-      swap_int(&Priority_queue->queue_index[i], &Priority_queue->queue_index[smallest]); // swap in the index_queue
+      swap_nodes(Priority_queue, i, smallest); // swap in the eik_queue and in the index_queue
       heapify(Priority_queue, smallest); // recurrencia
     }
   }
@@ -91,35 +164,25 @@ void heapify(p_queue *Priority_queue, int i)
 
 void insert(p_queue *Priority_queue, double newNum, int newIndex)
 {
-  int i;
-  if (Priority_queue->size == 0) // First time we insert an element in the tree
-  {
-    Priority_queue->size = 1;
-    Priority_queue->queue_vals[0] = newNum;
-    Priority_queue->queue_index[0] = newIndex;
-  }
-  else // if there were elements in the tree before inserting
-  {
-    Priority_queue->size += 1;
-    if ( Priority_queue->size >= Priority_queue->maxSize  ) {
-      grow_queue( Priority_queue );
-    }
-    Priority_queue->queue_vals[Priority_queue->size -1 ] = newNum;
-    Priority_queue->queue_index[Priority_queue->size -1 ] = newIndex;
-    for (i = Priority_queue->size / 2 ; i >= 0; i--)
-    {
-      heapify(Priority_queue, i);
-    }
-  }
+  // add the new node at the end of the tree and sift it up
+  insert_end(Priority_queue, newNum, newIndex);
+  sift_up(Priority_queue, Priority_queue->size - 1);
 }
 
 
 
 void insert_end(p_queue *Priority_queue, double newNum, int newIndex)
 {
+    assert( newIndex >= 0 );
+    grow_pos(Priority_queue, newIndex);
+    assert( Priority_queue->queue_pos[newIndex] == -1 ); // each index can be in the queue just once
     Priority_queue->size += 1;
+    if ( Priority_queue->size >= Priority_queue->maxSize  ) {
+      grow_queue( Priority_queue );
+    }
     Priority_queue->queue_vals[Priority_queue->size -1 ] = newNum;
     Priority_queue->queue_index[Priority_queue->size -1] = newIndex;
+    Priority_queue->queue_pos[newIndex] = Priority_queue->size - 1;
 }
 
 
@@ -132,33 +195,16 @@ void delete_findValue(p_queue *Priority_queue, double num)
     if (num == Priority_queue->queue_vals[i] ) // find the value
       break;
   }
-
-  swap_double(&Priority_queue->queue_vals[i], &Priority_queue->queue_vals[Priority_queue->size - 1]); 
-  swap_int(&Priority_queue->queue_index[i], &Priority_queue->queue_index[Priority_queue->size - 1]); 
-
-  Priority_queue->size -= 1; // make it "forget", after size-1 everything is ignored
-  for (i = Priority_queue->size / 2 ; i >= 0; i--)
-  {
-    heapify(Priority_queue, i);
+  if( i < Priority_queue->size ){
+    delete_atPosition(Priority_queue, i);
   }
 }
 
 void delete_findIndex(p_queue *Priority_queue, int ind)
 {
-  int i;
-  for (i = 0; i < Priority_queue->size; i++)
-  {
-    if (ind == Priority_queue->queue_index[i])
-      break;
-  }
-
-  swap_double(&Priority_queue->queue_vals[i], &Priority_queue->queue_vals[Priority_queue->size - 1]); 
-  swap_int(&Priority_queue->queue_index[i], &Priority_queue->queue_index[Priority_queue->size - 1]); 
-
-  Priority_queue->size -= 1; // make it "forget", after size-1 everything is ignored
-  for (i = Priority_queue->size / 2 ; i >= 0; i--)
-  {
-    heapify(Priority_queue, i);
+  // we know where ind is
+  if( ind >= 0 && ind < Priority_queue->posSize && Priority_queue->queue_pos[ind] != -1 ){
+    delete_atPosition(Priority_queue, Priority_queue->queue_pos[ind]);
   }
 }
 
@@ -172,15 +218,8 @@ double valueRoot(p_queue *Priority_queue){
 
 void deleteRoot(p_queue *Priority_queue)
 {
-  int i;
   // we dont need to look for the index, we know its on the 0th position
-  swap_double(&Priority_queue->queue_vals[0], &Priority_queue->queue_vals[Priority_queue->size - 1]); 
-  swap_int(&Priority_queue->queue_index[0], &Priority_queue->queue_index[Priority_queue->size - 1]); 
-  Priority_queue->size -= 1; 
-  for (i = Priority_queue->size / 2; i >= 0; i--)
-  {
-    heapify(Priority_queue, i);
-  }
+  delete_atPosition(Priority_queue, 0);
 }
 
 
@@ -200,30 +239,16 @@ void printeik_queue(p_queue *Priority_queue)
 
 void update(p_queue *Priority_queue, double new_valConsidered, int index)
 {
-    int i, j;
-    // printf("Before updating the queue looks like this: \n");
-    // printeik_queue(Priority_queue);
-    // printf("\n");
+    int i;
     // First find the current value associated with index
-    for (i = 0; i < Priority_queue->size; i++)
-    {
-        if (index == Priority_queue->queue_index[i])
-        break;
-    }
+    assert( index >= 0 && index < Priority_queue->posSize && Priority_queue->queue_pos[index] != -1 );
+    i = Priority_queue->queue_pos[index];
     // Then, if the new value considered is smaller than the current value
     if ( Priority_queue->queue_vals[i] > new_valConsidered  )
     {
-        // printf("New value updated in %d to the queue: %fl\n", index, new_valConsidered);
+        // the value decreased, the node can only go up
         Priority_queue->queue_vals[i] = new_valConsidered;
-        for (j = Priority_queue->size / 2 ; j >= 0; j--)
-        {
-            heapify(Priority_queue, j);
-        }
-        // printf("The queue so far looks like this: \n");
-        // printeik_queue(Priority_queue);
-    }
-    else{
-      // printf("\nWe were trying to update at %d the value of %fl but the current value in the queue is better.\n", index, new_valConsidered);
+        sift_up(Priority_queue, i);
     }
 }
 
@@ -231,13 +256,8 @@ void update(p_queue *Priority_queue, double new_valConsidered, int index)
 
  double get_valueAtIndex(p_queue *Priority_queue, int index)
 {
-    int i;
-    for (i = 0; i < Priority_queue->size; i ++)
-    {
-        if (index == Priority_queue->queue_index[i])
-        break;
-    }
-    return Priority_queue->queue_vals[i];
+    assert( index >= 0 && index < Priority_queue->posSize && Priority_queue->queue_pos[index] != -1 );
+    return Priority_queue->queue_vals[Priority_queue->queue_pos[index]];
 }
 
 int getSize(p_queue *Priority_queue)
@@ -0,0 +1,111 @@
+/* EMBEDDED PYTHON OPTIMIZER
+
+Calls optiPython.triangleFan from an interpreter that lives inside the marcher.
+The arrays of the triangle fan are passed as memoryviews of the triangleFanS
+memory (read with np.frombuffer, no copies) and the answer is the same binary
+response the worker sends (triangleFan.binaryOutput).
+
+*/
+
+#ifdef JMM_EMBED_PYTHON
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h> // must go before the standard headers
+
+#include "python_embedded.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+
+static PyObject *triangleFanClass = NULL; // optiPython.triangleFan
+
+void embeddedPython_init() {
+  // start the interpreter and import optiPython, only once per process
+  if( triangleFanClass != NULL ){
+    return;
+  }
+  Py_Initialize();
+  // optiPython.py is in the working directory, same as for stepWithPython.py
+  PyRun_SimpleString("import sys\nsys.path.insert(0, '.')");
+  PyObject *module = PyImport_ImportModule("optiPython");
+  if( module == NULL ){
+    PyErr_Print();
+    exit(EXIT_FAILURE);
+  }
+  triangleFanClass = PyObject_GetAttrString(module, "triangleFan");
+  Py_DECREF(module);
+  if( triangleFanClass == NULL ){
+    PyErr_Print();
+    exit(EXIT_FAILURE);
+  }
+}
+
+void embeddedPython_finalize() {
+  // we keep the interpreter alive until the process ends, numpy
+  // can't be imported again after Py_FinalizeEx (e.g. for a second march)
+  fflush(stdout);
+  PyRun_SimpleString("import sys\nsys.stdout.flush()");
+}
+
+static PyObject *viewOf(double *data, size_t nDoubles) {
+  // read only memoryview of nDoubles doubles starting at data
+  return PyMemoryView_FromMemory((char *)data, (Py_ssize_t)(nDoubles*sizeof(double)), PyBUF_READ);
+}
+
+void optimizeTriangleFan_wEmbedded(fanUpdateS *fanUpdate) {
+  static int updateNumber = 0;
+  triangleFanS *triFan = fanUpdate->triFan;
+  size_t nRegions = triFan->nRegions;
+  PyObject *triFanPy, *output;
+  char *buf;
+  Py_ssize_t nBytes;
+  double *outputDb, *key;
+  printf("\nDoing update %d with the embedded interpreter\n\n", updateNumber);
+  output = NULL;
+  key = malloc((nRegions + 3)*sizeof(double));
+  fanKey(triFan, key);
+  triFanPy = PyObject_CallFunction(triangleFanClass, "n", (Py_ssize_t)nRegions);
+  if( triFanPy != NULL && fanUpdate->tolKKT > 0 ){
+    PyObject *tolKKT = PyFloat_FromDouble(fanUpdate->tolKKT);
+    PyObject_SetAttrString(triFanPy, "tolKKT", tolKKT);
+    Py_DECREF(tolKKT);
+  }
+  if( triFanPy != NULL ){
+    // the views are stolen by the call (N)
+    output = PyObject_CallMethod(triFanPy, "outputFromBuffers", "NdNNdNNNNNNNN",
+				 viewOf(triFan->x0, 2), fanUpdate->T0, viewOf(fanUpdate->grad0, 2),
+				 viewOf(triFan->x1, 2), fanUpdate->T1, viewOf(fanUpdate->grad1, 2),
+				 viewOf(triFan->xHat, 2),
+				 viewOf(triFan->listIndices, 2*nRegions + 1),
+				 viewOf(&triFan->listxk[0][0], 2*(nRegions + 2)),
+				 viewOf(&triFan->listB0k[0][0], 2*(nRegions + 1)),
+				 viewOf(&triFan->listBk[0][0], 2*(nRegions + 1)),
+				 viewOf(&triFan->listBkBk1[0][0], 4*nRegions),
+				 viewOf(key, nRegions + 3));
+    Py_DECREF(triFanPy);
+  }
+  free(key);
+  if( output == NULL || PyBytes_AsStringAndSize(output, &buf, &nBytes) != 0 ){
+    // don't kill the march because of one fan, a nan update is never accepted
+    PyErr_Print();
+    fanUpdate->THat = NAN;
+    fanUpdate->gradHat[0] = NAN;
+    fanUpdate->gradHat[1] = NAN;
+    fanUpdate->nIndCrTop = 0;
+    fanUpdate->nIndStTop = 0;
+    fanUpdate->residual = -1;
+  }
+  else{
+    outputDb = malloc(nBytes); // the bytes object might not be aligned for doubles
+    memcpy(outputDb, buf, nBytes);
+    fanUpdate_fromBinaryOutput(fanUpdate, outputDb, (size_t)nBytes/sizeof(double));
+    free(outputDb);
+  }
+  Py_XDECREF(output);
+  printf("THat and gradHat: %1.20f   %1.20f   %1.20f\n", fanUpdate->THat, fanUpdate->gradHat[0], fanUpdate->gradHat[1]);
+  updateNumber ++;
+}
+
+#endif
@@ -0,0 +1,18 @@
+#pragma once
+
+#include "eik_grid.h"
+
+// Python optimizer running in an interpreter embedded in the marcher, no
+// subprocess, no temporary files and no parsing of stdout per update.
+// Compile with -DJMM_EMBED_PYTHON and the flags given by python3-config
+// (see build.sh) and set eik_g->pythonOpti = PYTHON_EMBEDDED
+
+#ifdef JMM_EMBED_PYTHON
+
+void embeddedPython_init();
+
+void embeddedPython_finalize();
+
+void optimizeTriangleFan_wEmbedded(fanUpdateS *fanUpdate);
+
+#endif
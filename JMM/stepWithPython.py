@@ -1,7 +1,6 @@
 import optiPython as oP
 import json
 import sys
-import matplotlib.pyplot as plt
 from pathlib import Path
 
 # # JSON string
@@ -37,6 +36,7 @@ with open(Path(sys.argv[1])) as f:
 #     json.dump(dict_out, f)
 
 # if(dict_out["plotAfter"] == 1):
+#     import matplotlib.pyplot as plt
 #     plt.show()
 
 
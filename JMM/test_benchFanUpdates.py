@@ -0,0 +1,58 @@
+################ THE REPLAY BENCHMARK (benchFanUpdates.py) AGAINST OPTIMIZING THE SAME FANS
+################ DIRECTLY
+# replay reads the fans the way the marcher dumps them (updateN.json) and goes through
+# triangleFan.outputJSON, THat has to be the optimum of the fan (outputJSON rounds it to 12
+# digits). The baseline comparison has to find nothing against its own records and flag the
+# fans we move.
+
+import json
+import os
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+import benchFanUpdates as bench
+
+
+def writeCorpus(path, fans, numbers):
+     '''
+     Writes the fans as path/updateN.json (without plots), the JSON the marcher dumps
+     '''
+     for fan, n in zip(fans, numbers):
+          triInfo = {name: np.asarray(value).tolist() for name, value in fan.items()}
+          triInfo.update(plotBefore = 0, plotAfter = 0, plotOpti = 0)
+          with open(os.path.join(path, "update{}.json".format(n)), "w") as f:
+               f.write(json.dumps(triInfo))
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_replayAgainstDirect(rng, tmp_path):
+     # one region: its only top has no points on it in every type of path
+     numbers = [1, 3, 2, 11, 10, 20]
+     fans = [randomFanArrays(1, rng, curved = bool(i%2)) for i in range(len(numbers))]
+     writeCorpus(tmp_path, fans, numbers)
+     (tmp_path / "notes.json").write_text("{}")
+     files = bench.corpusFiles([str(tmp_path)])
+     assert [os.path.basename(fName) for fName in files] == ["update{}.json".format(n) for n in sorted(numbers)]
+     records = bench.replay(files, [])
+     fanOf = dict(zip(numbers, fans))
+     for rec in records:
+          assert "error" not in rec
+          triFan = fanFromArrays(fanOf[int(os.path.basename(rec["file"])[6:-5])])
+          triFan.optimize()
+          assert_allclose(rec["THat"], triFan.opti_fVal, rtol = 1e-11)
+          assert rec["nIterations"] == triFan.nIterations
+     baseline = {os.path.basename(rec["file"]): {"THat": rec["THat"], "gradHat": rec["gradHat"]}
+                 for rec in records}
+     regressions, maxErrT, maxAngle = bench.compareBaseline(records, baseline, 1e-8)
+     assert regressions == [] and maxErrT == 0 and maxAngle == 0
+     # move THat of one fan and rotate gradHat of another
+     baseline["update2.json"]["THat"] *= 1 + 1e-6
+     g = baseline["update10.json"]["gradHat"]
+     baseline["update10.json"]["gradHat"] = [g[0] - 1e-6*g[1], g[1] + 1e-6*g[0]]
+     regressions, maxErrT, maxAngle = bench.compareBaseline(records, baseline, 1e-8)
+     assert sorted(os.path.basename(fName) for fName, errT, angle in regressions) == ["update10.json", "update2.json"]
+     assert_allclose(maxErrT, 1e-6, rtol = 1e-3)
+     assert_allclose(maxAngle, 1e-6, rtol = 1e-3)
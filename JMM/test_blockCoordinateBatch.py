@@ -0,0 +1,47 @@
+################ THE BATCHED BLOCK COORDINATE METHOD (blockCoordinateGradient_batch) AGAINST
+################ blockCoordinateGradient_generalized ON EACH FAN
+# The batch runs the forward passes of all the fans at the same time (without points on the
+# tops). Each fan has to end where it ends on its own. The batch doesn't round exactly as the
+# kernels, where the objective is flat the last bits can make one of them stop an iteration
+# earlier, then the parameters can be different but the objective is the same.
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+import optiPython as oP
+
+fanNames = ('x0', 'T0', 'grad0', 'x1', 'T1', 'grad1', 'xHat', 'listIndices', 'listxk', 'listB0k',
+            'listBk', 'listBkBk1')
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("nRegions", [1, 2, 3])
+def test_batchAgainstEachFan(rng, nRegions):
+     fans = [fanFromArrays(randomFanArrays(nRegions, rng, curved = bool(i%2))) for i in range(12)]
+     stacked = [np.array([getattr(triFan, name) for triFan in fans]) for name in fanNames]
+     params, gradParams, fVals, nIter = oP.blockCoordinateGradient_batch(
+          np.array([triFan.params for triFan in fans]), *stacked,
+          np.array([triFan.listCurvingInwards for triFan in fans]))
+     nSame = 0
+     for b, triFan in enumerate(fans):
+          args = [getattr(triFan, name) for name in fanNames]
+          out = oP.blockCoordinateGradient_generalized(triFan.params, *args, None, None, None, None,
+                                                       triFan.listCurvingInwards)
+          assert_allclose(fVals[b], oP.fObj_generalized(out[0], *args), rtol = 1e-8)
+          assert fVals[b] == oP.fObj_generalized(params[b], *args)
+          if( nIter[b] == len(out[6]) ):
+               # same iterations, the same point and the same gradients up to rounding
+               assert_allclose(params[b], out[0], rtol = 0, atol = 1e-10)
+               assert_allclose(gradParams[b], np.ravel(out[3]), rtol = 1e-5, atol = 1e-8)
+               nSame += 1
+     assert nSame >= 10
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_secantLimitBatch(rng):
+     # Same limits as the secant method one polynomial at a time (nan if it doesn't converge)
+     listPolys = [rng.normal(size = rng.integers(1, 6)) for i in range(200)]
+     limits = oP.secantLimit_batch(listPolys)
+     assert_allclose(limits, [oP.secantLimit(poly) for poly in listPolys], rtol = 0, atol = 0)
@@ -0,0 +1,93 @@
+################ THE INCREMENTAL OBJECTIVE (fanObjective) AGAINST THE FULL fObj_generalized
+# A trial step in the line searches only moves one block of parameters, fanObjective.fTrial
+# only recomputes the terms of the regions that depend on it. The result has to be the
+# objective recomputed from scratch.
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays
+from test_optiKernels import randomTops
+import optiPython as oP
+
+
+def fanArgs(fan):
+     return (fan['x0'], fan['T0'], fan['grad0'], fan['x1'], fan['T1'], fan['grad1'], fan['xHat'],
+             fan['listIndices'], fan['listxk'], fan['listB0k'], fan['listBk'], fan['listBkBk1'])
+
+def manyStTops(rng, nRegions):
+     '''
+     Every top with St points (and some with Cr points in between), the case where the
+     counters of the tops are easy to mix up
+     '''
+     indCrTop = np.arange(2, nRegions + 1, 3)
+     indStTop = np.array([j for j in range(1, nRegions + 1) if j not in indCrTop])
+     if( len(indCrTop) == 0 ):
+          return None, None, indStTop, rng.uniform(0, 1, 2*len(indStTop))
+     return indCrTop, rng.uniform(0, 1, 2*len(indCrTop)), indStTop, rng.uniform(0, 1, 2*len(indStTop))
+
+def trialSteps(nRegions, tops):
+     '''
+     Trial steps like the ones in the line searches: one lamk/muk block, one top, or everything
+     '''
+     nParams = 2*nRegions + 1
+     for k in range(nRegions + 1):
+          block = [2*k - 1, 2*k] if k > 0 else [0]
+          yield block, [], []
+     for t in (1, 3):
+          if( tops[t] is not None ):
+               for i in range(len(tops[t])//2):
+                    yield [], [2*i, 2*i + 1] if t == 1 else [], [2*i, 2*i + 1] if t == 3 else []
+     yield list(range(nParams)), list(range(len(tops[1]) if tops[1] is not None else 0)), \
+          list(range(len(tops[3]) if tops[3] is not None else 0))
+
+@pytest.mark.parametrize("topsKind", ["random", "manySt"])
+def test_fTrialAgainstFullObjective(rng, topsKind):
+     nChecked = 0
+     for i in range(30):
+          nRegions = int(rng.integers(1, 6))
+          fan = randomFanArrays(nRegions, rng, curved = bool(i%2))
+          params = rng.uniform(0, 1, 2*nRegions + 1)
+          tops = randomTops(rng, nRegions) if topsKind == "random" else manyStTops(rng, nRegions)
+          fanObj = oP.fanObjective(params, *fanArgs(fan), *tops)
+          assert_allclose(fanObj.fVal, oP.fObj_generalized(params, *fanArgs(fan), *tops), rtol = 1e-12)
+          for changedParams, changedCrTop, changedStTop in trialSteps(nRegions, tops):
+               paramsTrial = np.copy(params)
+               paramsTrial[changedParams] = rng.uniform(0, 1, len(changedParams))
+               topsTrial = list(tops)
+               for t, changed in ((1, changedCrTop), (3, changedStTop)):
+                    if( tops[t] is not None ):
+                         topsTrial[t] = np.copy(tops[t])
+                         topsTrial[t][changed] = rng.uniform(0, 1, len(changed))
+               expected = oP.fObj_generalized(paramsTrial, *fanArgs(fan), *topsTrial)
+               got = fanObj.fTrial(paramsTrial, topsTrial[1], topsTrial[3])
+               assert_allclose(got, expected, rtol = 1e-12, atol = 1e-12)
+               # the same value (to the last bit) as starting from the trial point, so the
+               # comparisons in the line searches don't depend on where fanObj was built
+               assert got == oP.fanObjective(paramsTrial, *fanArgs(fan), *topsTrial).fVal
+               nChecked += 1
+          # fTrial doesn't change the point the object was initialized with, changing the
+          # array it was initialized with doesn't change it either
+          f = fanObj.fVal
+          params[:] = rng.uniform(0, 1, len(params))
+          assert fanObj.fTrial() == f
+          assert_allclose(fanObj.fTrial(params), oP.fObj_generalized(params, *fanArgs(fan), *tops), rtol = 1e-12)
+     assert nChecked > 100
+
+
+def test_everyStTopIsUsed(rng):
+     # Each region with St points uses its own pair of paramsStTop, also after other St tops
+     for i in range(10):
+          nRegions = int(rng.integers(2, 6))
+          fan = randomFanArrays(nRegions, rng)
+          params = rng.uniform(0, 1, 2*nRegions + 1)
+          tops = manyStTops(rng, nRegions)
+          topType, topIndex = oP.topsPerRegion(nRegions, *oP.topsAsArrays(*tops)[::2])
+          assert list(np.flatnonzero(topType == 2)) == list(tops[2])
+          assert list(topIndex[tops[2]]) == list(range(len(tops[2])))
+          f = oP.fObj_generalized(params, *fanArgs(fan), *tops)
+          for k in range(len(tops[2])):
+               paramsStTop = np.copy(tops[3])
+               paramsStTop[2*k:2*k + 2] = rng.uniform(0, 1, 2)
+               assert oP.fObj_generalized(params, *fanArgs(fan), tops[0], tops[1], tops[2], paramsStTop) != f
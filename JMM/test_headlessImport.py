@@ -0,0 +1,41 @@
+################ optiPython WITHOUT THE PLOTS (optiPlots.py IS ONLY IMPORTED TO PLOT SOMETHING)
+# Importing optiPython and optimizing a fan without plots must not import matplotlib (this is what
+# the worker and the embedded interpreter do). Each check runs in a new interpreter, pytest or
+# other tests could have imported matplotlib already.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def runPython(code):
+     '''
+     Run code in a new interpreter in this directory, returns its stdout
+     '''
+     result = subprocess.run([sys.executable, "-c", code], cwd = here, capture_output = True, text = True)
+     assert result.returncode == 0, result.stderr
+     return result.stdout
+
+
+def test_noMatplotlibWithoutPlots():
+     out = runPython(
+          "import sys\n"
+          "import numpy as np\n"
+          "from conftest import randomFanArrays, fanFromArrays\n"
+          "triFan = fanFromArrays(randomFanArrays(2, np.random.default_rng(7)))\n"
+          "triFan.optimize()\n"
+          "print(np.isfinite(triFan.opti_fVal), 'matplotlib' in sys.modules, 'optiPlots' in sys.modules)\n")
+     assert out.split() == ["True", "False", "False"]
+
+def test_plotsStillThere():
+     # The names that moved to optiPlots.py are still attributes of optiPython
+     pytest.importorskip("matplotlib")
+     pytest.importorskip("colorcet")
+     out = runPython(
+          "import sys\n"
+          "import optiPython as oP\n"
+          "print('matplotlib' in sys.modules, callable(oP.plotFan), 'matplotlib' in sys.modules)\n")
+     assert out.split() == ["False", "True", "True"]
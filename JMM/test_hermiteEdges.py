@@ -0,0 +1,62 @@
+################ THE PRECOMPUTED HERMITE COEFFICIENTS OF THE EDGES (hermiteEdge, hermiteTable)
+################ AGAINST THE FUNCTIONS THAT BUILD THEM ON EVERY CALL
+# The coefficients are the same numbers, only the order of the operations changes (Horner's
+# scheme), so the values agree up to a few ulps.
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays
+import optiPython as oP
+
+
+def fanEdges(fan):
+     '''
+     (xFrom, Bfrom, xTo, Bto) of all the edges of a fan: x0 -> xk and the tops xk -> xk1
+     '''
+     n = len(fan['listxk']) - 2
+     edges = [(fan['x0'], fan['listB0k'][k], fan['listxk'][k + 1], fan['listBk'][k]) for k in range(n + 1)]
+     edges += [(fan['listxk'][k + 1], fan['listBkBk1'][2*k], fan['listxk'][k + 2], fan['listBkBk1'][2*k + 1])
+               for k in range(n)]
+     return edges
+
+
+@pytest.mark.parametrize("compiled", [True, False])
+def test_edgeAgainstDirect(rng, compiled):
+     if( compiled and oP.optiKernels is None ):
+          pytest.skip("numba is not installed")
+     oP.useCompiledKernels(compiled)
+     try:
+          for i in range(20):
+               fan = randomFanArrays(int(rng.integers(1, 5)), rng, curved = bool(i%2))
+               for xFrom, Bfrom, xTo, Bto in fanEdges(fan):
+                    edge = oP.hermiteEdges.edge(xFrom, Bfrom, xTo, Bto)
+                    point = rng.normal(size = 2)
+                    direction = rng.normal(size = 2)
+                    for r in rng.uniform(-0.1, 1.1, 5):
+                         assert_allclose(edge.boundary(r), oP.hermite_boundary(r, xFrom, Bfrom, xTo, Bto), rtol = 1e-13, atol = 1e-14)
+                         assert_allclose(edge.gradient(r), oP.gradientBoundary(r, xFrom, Bfrom, xTo, Bto), rtol = 1e-13, atol = 1e-14)
+                         assert_allclose(edge.secondDer(r), oP.secondDer_Boundary(r, xFrom, Bfrom, xTo, Bto), rtol = 1e-13, atol = 1e-14)
+                         # the polynomials of the projections are t1 and t2
+                         assert_allclose(np.polyval(edge.fixedDirectionPolynomial(point, direction), r),
+                                         oP.t1(r, xFrom, xTo, Bfrom, Bto, point, direction), rtol = 1e-12, atol = 1e-13)
+                         assert_allclose(np.polyval(edge.tangentDirectionPolynomial(point), r),
+                                         oP.t2(r, xFrom, xTo, Bfrom, Bto, point), rtol = 1e-12, atol = 1e-13)
+     finally:
+          oP.useCompiledKernels(oP.optiKernels is not None)
+
+def test_hermiteTable(rng):
+     # The same edge object for the same edge, a new one if anything changes, and the table
+     # doesn't grow past maxSize
+     table = oP.hermiteTable(maxSize = 8)
+     fan = randomFanArrays(3, rng)
+     edges = fanEdges(fan)
+     table.addFan(fan['x0'], fan['listxk'], fan['listB0k'], fan['listBk'], fan['listBkBk1'])
+     assert len(table.edges) == len(edges)
+     for xFrom, Bfrom, xTo, Bto in edges:
+          assert table.edge(np.copy(xFrom), np.copy(Bfrom), np.copy(xTo), np.copy(Bto)) is table.edge(xFrom, Bfrom, xTo, Bto)
+          assert table.edge(xFrom, Bfrom + 1e-12, xTo, Bto) is not table.edge(xFrom, Bfrom, xTo, Bto)
+     for i in range(20):
+          table.edge(*rng.normal(size = (4, 2)))
+          assert len(table.edges) <= 8
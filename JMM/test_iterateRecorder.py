@@ -0,0 +1,74 @@
+################ THE ITERATES OF THE OPTIMIZER (iterateRecorder, triangleFan.saveIterates)
+################ AGAINST OPTIMIZING WITHOUT SAVING THEM
+# Saving the iterates can't change the optimum. The ring buffer keeps the last capacity
+# iterates of the ones a recorder that never fills up sees, and dumpIterates / loadIterates
+# give back the same iterates.
+
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from conftest import fanFromArrays
+import optiPython as oP
+from test_optionExecutor import fansWithOptions
+
+
+def test_ringBuffer(rng):
+     history = [(rng.normal(), rng.normal(size = 9)) for i in range(11)]
+     for capacity in [1, 4, 11, 20]:
+          recorder = oP.iterateRecorder(5, 2, 2, capacity)
+          for i, (fVal, row) in enumerate(history):
+               recorder.record(fVal, row[:5], row[5:7], row[7:])
+               n = min(i + 1, capacity)
+               iterates, fVals = recorder.ordered()
+               assert recorder.nRecorded == i + 1 and recorder.nStored() == n
+               assert_array_equal(iterates, np.array([row for fVal, row in history[i + 1 - n:i + 1]]))
+               assert_array_equal(fVals, [fVal for fVal, row in history[i + 1 - n:i + 1]])
+               # after some other bytes, as in the files of dumpIterates
+               buf = b"12345678" + recorder.toBytes()
+               loaded, offset = oP.iterateRecorder.fromBytes(buf, 8)
+               assert offset == len(buf)
+               assert loaded.nRecorded == recorder.nRecorded
+               assert_array_equal(loaded.ordered()[0], iterates)
+               assert_array_equal(loaded.ordered()[1], fVals)
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_iteratesOfFans(rng, tmp_path):
+     fileName = tmp_path / "iterates.bin"
+     fans = []
+     with open(fileName, "wb") as fOut:
+          for fan, optionsTop in fansWithOptions(rng, 5):
+               expected = fanFromArrays(fan)
+               expected.optionsTop = optionsTop
+               expected.optimize()
+               assert expected.iterates is None
+               everything = fanFromArrays(fan, saveIterates = True, iterateCapacity = 1000)
+               everything.optionsTop = optionsTop
+               everything.optimize()
+               last = fanFromArrays(fan, saveIterates = True, iterateCapacity = 3)
+               last.optionsTop = optionsTop
+               last.optimize()
+               for triFan in [everything, last]:
+                    assert triFan.opti_fVal == expected.opti_fVal
+                    assert_array_equal(triFan.optiParams, expected.optiParams)
+                    assert_array_equal(triFan.optiOption, expected.optiOption)
+               assert sorted(last.iterates) == sorted(everything.iterates)
+               for k, recorder in everything.iterates.items():
+                    # one iterate per iteration of the block coordinate method
+                    assert recorder.nRecorded == expected.solveOption(k)[6]
+                    assert recorder.nStored() == recorder.nRecorded
+                    n = last.iterates[k].nStored()
+                    assert n == min(3, recorder.nRecorded)
+                    assert_array_equal(last.iterates[k].ordered()[0], recorder.ordered()[0][-n:])
+                    assert_array_equal(last.iterates[k].ordered()[1], recorder.ordered()[1][-n:])
+               last.dumpIterates(fOut)
+               fans.append(last)
+     loaded = oP.loadIterates(fileName)
+     assert len(loaded) == len(fans)
+     for options, triFan in zip(loaded, fans):
+          assert len(options) == len(triFan.iterates)
+          for (option, recorder), k in zip(options, sorted(triFan.iterates)):
+               assert_array_equal(option, triFan.optionsTop[k])
+               assert recorder.nRecorded == triFan.iterates[k].nRecorded
+               assert_array_equal(recorder.ordered()[0], triFan.iterates[k].ordered()[0])
+               assert_array_equal(recorder.ordered()[1], triFan.iterates[k].ordered()[1])
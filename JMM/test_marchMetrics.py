@@ -0,0 +1,54 @@
+################ THE METRICS OF THE OPTIMIZER (triangleFan.metrics, useMetrics) AGAINST
+################ OPTIMIZING WITHOUT THEM
+# The counters only wrap the backtracking and the projections, the optimum has to be the same
+# to the last bit. The counts have to add up: one optionMetrics per option solved (not pruned)
+# with its iterations, and the marchMetrics of the march adds them all.
+
+from numpy.testing import assert_array_equal
+import pytest
+
+from conftest import fanFromArrays
+import optiPython as oP
+from test_optionExecutor import fansWithOptions
+
+
+def solveWithMetrics(fan, optionsTop, metrics, executor = None):
+     triFan = fanFromArrays(fan, metrics = metrics, executor = executor, nWorkers = 2)
+     triFan.optionsTop = optionsTop
+     triFan.optimize()
+     return triFan
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("executor", [None, "threads"])
+def test_metricsAgainstPlain(rng, executor):
+     metrics = oP.marchMetrics()
+     nSolved = 0
+     nIterations = 0
+     try:
+          for fan, optionsTop in fansWithOptions(rng, 6):
+               oP.useMetrics(False)
+               expected = solveWithMetrics(fan, optionsTop, None)
+               assert expected.optionMetrics is None
+               triFan = solveWithMetrics(fan, optionsTop, metrics, executor)
+               assert triFan.opti_fVal == expected.opti_fVal
+               assert_array_equal(triFan.optiParams, expected.optiParams)
+               assert_array_equal(triFan.optiOption, expected.optiOption)
+               assert len(triFan.optionMetrics) == len(optionsTop) - triFan.nOptionsPruned
+               for k, metricsk in triFan.optionMetrics.items():
+                    fk, params, indCrTop, paramsCrTop, indStTop, paramsStTop, nIter = expected.solveOption(k)[:7]
+                    assert metricsk.nOptions == 1
+                    assert metricsk.nIterations == nIter
+                    assert metricsk.time > 0
+                    assert sum(metricsk.projectionCalls.values()) > 0
+                    assert all(name in oP.metricsNames for name in metricsk.projectionCalls)
+                    assert all(name in metricsk.backtrackingCalls for name in metricsk.backtrackingSteps)
+                    nIterations += nIter
+               nSolved += len(triFan.optionMetrics)
+     finally:
+          oP.useMetrics(False)
+     total = metrics.total()
+     assert metrics.nFans == 6
+     assert total.nOptions == nSolved
+     assert total.nIterations == nIterations
+     assert len(metrics.report().splitlines()) > 2
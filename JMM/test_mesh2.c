@@ -3,12 +3,377 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <math.h>
+#include <assert.h>
 
 
+static void gridMesh(mesh2S *mesh2, size_t n) {
+    // n x n grid on [0, n-1]^2, each square split in two faces by its diagonal. Three indices of
+    // refraction: 1.0, 1.45 on a disk in the middle and 1.8 on the right (so there are points
+    // where three regions meet and interfaces that reach the boundary of the mesh).
+    // The tangents at the end points of edge e are (e, 0.25) and (-e, 0.75)
+    size_t nPoints = n*n, nFaces = 2*(n-1)*(n-1), nEdges = 0;
+    size_t i, j, k, f, e, p, u, v;
+    double (*points)[2] = malloc(nPoints*sizeof(double[2]));
+    size_t (*faces)[3] = malloc(nFaces*sizeof(size_t[3]));
+    size_t (*edges)[2] = malloc(3*nFaces*sizeof(size_t[2]));
+    size_t (*edgesInFace)[3] = malloc(nFaces*sizeof(size_t[3]));
+    neighborsRS *incidentFaces = malloc(nPoints*sizeof(neighborsRS));
+    double *eta = malloc(nFaces*sizeof(double));
+    double centroid[2], r;
+    boundaryCurve *h_i;
+
+    for( i = 0; i<n; i++ ){
+        for( j = 0; j<n; j++ ){
+            points[i*n + j][0] = (double)j;
+            points[i*n + j][1] = (double)i;
+        }
+    }
+    f = 0;
+    for( i = 0; i<n-1; i++ ){
+        for( j = 0; j<n-1; j++ ){
+            p = i*n + j;
+            faces[f][0] = p; faces[f][1] = p + 1; faces[f][2] = p + n + 1;
+            faces[f + 1][0] = p; faces[f + 1][1] = p + n; faces[f + 1][2] = p + n + 1;
+            f += 2;
+        }
+    }
+    // edges (SORTED) in the order in which we find them on the faces
+    for( f = 0; f<nFaces; f++ ){
+        for( k = 0; k<3; k++ ){
+            u = faces[f][k];
+            v = faces[f][(k+1)%3];
+            if( u > v ){
+                p = u; u = v; v = p;
+            }
+            for( e = 0; e<nEdges; e++ ){
+                if( edges[e][0] == u && edges[e][1] == v ){
+                    break;
+                }
+            }
+            if( e == nEdges ){
+                edges[nEdges][0] = u;
+                edges[nEdges][1] = v;
+                nEdges ++;
+            }
+            edgesInFace[f][k] = e;
+        }
+    }
+    for( p = 0; p<nPoints; p++ ){
+        incidentFaces[p].len = 0;
+        incidentFaces[p].neis_i = malloc(6*sizeof(int));
+    }
+    for( f = 0; f<nFaces; f++ ){
+        for( k = 0; k<3; k++ ){
+            p = faces[f][k];
+            incidentFaces[p].neis_i[incidentFaces[p].len] = (int)f;
+            incidentFaces[p].len ++;
+        }
+        centroid[0] = (points[faces[f][0]][0] + points[faces[f][1]][0] + points[faces[f][2]][0])/3;
+        centroid[1] = (points[faces[f][0]][1] + points[faces[f][1]][1] + points[faces[f][2]][1])/3;
+        r = sqrt( (centroid[0] - 0.4*n)*(centroid[0] - 0.4*n) + (centroid[1] - 0.5*n)*(centroid[1] - 0.5*n) );
+        eta[f] = 1.0;
+        if( r < 0.25*n ){
+            eta[f] = 1.45;
+        }
+        if( centroid[0] > 0.6*n ){
+            eta[f] = 1.8;
+        }
+    }
+    h_i = malloc(nEdges*sizeof(boundaryCurve));
+    for( e = 0; e<nEdges; e++ ){
+        h_i[e].i_Edge = e;
+        h_i[e].B[0][0] = (double)e;
+        h_i[e].B[0][1] = 0.25;
+        h_i[e].B[1][0] = -(double)e;
+        h_i[e].B[1][1] = 0.75;
+    }
+    mesh2_init(mesh2, points, nPoints, faces, nFaces, edges, edgesInFace, nEdges,
+               NULL, incidentFaces, eta, h_i);
+}
+
+static void twoTrianglesFromEdge_scan(mesh2S *mesh2, size_t index0, size_t index1,
+                                      int possibleTriangles[2], size_t possibleThirdVertices[2]) {
+    // twoTrianglesFromEdge going through the incident faces of index0
+    size_t j = 0, *face;
+    int f;
+    possibleTriangles[0] = -1;
+    possibleTriangles[1] = -1;
+    for( int i = 0; i<mesh2->incidentFaces[index0].len; i++ ){
+        f = mesh2->incidentFaces[index0].neis_i[i];
+        face = mesh2->faces[f];
+        for( int a = 0; a<3; a++ ){
+            for( int b = 0; b<3; b++ ){
+                if( a != b && face[a] == index0 && face[b] == index1 ){
+                    possibleTriangles[j] = f;
+                    possibleThirdVertices[j] = face[3 - a - b];
+                    j ++;
+                }
+            }
+        }
+    }
+}
+
+static int faceBetween3Points_scan(mesh2S *mesh2, size_t index0, size_t index1, size_t index2) {
+    // faceBetween3Points going through the incident faces of index0
+    size_t *face;
+    int f;
+    for( int i = 0; i<mesh2->incidentFaces[index0].len; i++ ){
+        f = mesh2->incidentFaces[index0].neis_i[i];
+        face = mesh2->faces[f];
+        if( (face[0] == index1 || face[1] == index1 || face[2] == index1) &&
+            (face[0] == index2 || face[1] == index2 || face[2] == index2) ){
+            return f;
+        }
+    }
+    return -1;
+}
+
+static int edgeBetweenPoints_scan(mesh2S *mesh2, size_t index0, size_t index1) {
+    // edgeBetweenPoints going through the edges of the incident faces of index0
+    size_t e;
+    int f;
+    for( int i = 0; i<mesh2->incidentFaces[index0].len; i++ ){
+        f = mesh2->incidentFaces[index0].neis_i[i];
+        for( int k = 0; k<3; k++ ){
+            e = mesh2->edgesInFace[f][k];
+            if( (mesh2->edges[e][0] == index0 && mesh2->edges[e][1] == index1) ||
+                (mesh2->edges[e][0] == index1 && mesh2->edges[e][1] == index0) ){
+                return (int)e;
+            }
+        }
+    }
+    return -1;
+}
+
+static void checkEdgeFaces(mesh2S *mesh2) {
+    // the edge index (mesh2_initEdgeFaces) gives the same as the scans on every edge and face
+    int possibleTriangles[2], scanTriangles[2];
+    size_t possibleThirdVertices[2], scanThirdVertices[2];
+    size_t e, f, index0, index1, *face;
+    long nChecks = 0;
+    for( e = 0; e<mesh2->nEdges; e++ ){
+        for( int s = 0; s<2; s++ ){
+            index0 = mesh2->edges[e][s];
+            index1 = mesh2->edges[e][1 - s];
+            assert( edgeBetweenPoints(mesh2, index0, index1) == (int)e );
+            twoTrianglesFromEdge(mesh2, index0, index1, possibleTriangles, possibleThirdVertices);
+            twoTrianglesFromEdge_scan(mesh2, index0, index1, scanTriangles, scanThirdVertices);
+            for( int j = 0; j<2; j++ ){
+                assert( possibleTriangles[j] == scanTriangles[j] );
+                if( scanTriangles[j] != -1 ){
+                    assert( possibleThirdVertices[j] == scanThirdVertices[j] );
+                }
+            }
+            nChecks ++;
+        }
+        // the two opposite vertices might not form an edge
+        if( mesh2->facesInEdge[e][1] != -1 ){
+            index0 = mesh2->oppositeInEdge[e][0];
+            index1 = mesh2->oppositeInEdge[e][1];
+            assert( edgeBetweenPoints(mesh2, index0, index1) == edgeBetweenPoints_scan(mesh2, index0, index1) );
+            nChecks ++;
+        }
+    }
+    for( f = 0; f<mesh2->nFaces; f++ ){
+        face = mesh2->faces[f];
+        for( int a = 0; a<3; a++ ){
+            for( int b = 0; b<3; b++ ){
+                if( a == b ){
+                    continue;
+                }
+                for( int c = 0; c<3; c++ ){
+                    assert( faceBetween3Points(mesh2, face[a], face[b], face[c]) ==
+                            faceBetween3Points_scan(mesh2, face[a], face[b], face[c]) );
+                    nChecks ++;
+                }
+            }
+        }
+    }
+    printf("Edge index agrees with the scans (%ld checks on %zu edges)\n", nChecks, mesh2->nEdges);
+}
+
+
+static int otherTriangle_scan(mesh2S *mesh2, size_t index0, size_t index1, int thisTriangle, size_t *indexOther) {
+    // the face across the edge index0 index1 from thisTriangle (-1 on the boundary), from the scan
+    int scanTriangles[2];
+    size_t scanThirdVertices[2];
+    twoTrianglesFromEdge_scan(mesh2, index0, index1, scanTriangles, scanThirdVertices);
+    if( scanTriangles[0] == thisTriangle ){
+        *indexOther = scanThirdVertices[1];
+        return scanTriangles[1];
+    }
+    assert( scanTriangles[1] == thisTriangle );
+    *indexOther = scanThirdVertices[0];
+    return scanTriangles[0];
+}
+
+static void checkCorners(mesh2S *mesh2) {
+    // the corner table (mesh2_initCorners): triangleAcrossPoint on every corner and going around
+    // every point with nextTriangleAround gives the same faces as the scans. Going around a point
+    // has to visit each of its incident faces once, on the boundary the walk stops on both sides
+    size_t f, p, *face, indexOpposite, indexNext, indexScan, indexk1, firstVertices[2];
+    int thisTriangle, nextTriangle, scanTriangle, nStops, nVisited, *visited;
+    long nBoundary = 0, nSteps = 0;
+    for( f = 0; f<mesh2->nFaces; f++ ){
+        face = mesh2->faces[f];
+        for( int k = 0; k<3; k++ ){
+            scanTriangle = otherTriangle_scan(mesh2, face[(k+1)%3], face[(k+2)%3], (int)f, &indexScan);
+            assert( triangleAcrossPoint(mesh2, f, face[k], &indexOpposite) == scanTriangle );
+            if( scanTriangle != -1 ){
+                assert( indexOpposite == indexScan );
+            }
+        }
+    }
+    visited = calloc(mesh2->nFaces, sizeof(int));
+    for( p = 0; p<mesh2->nPoints; p++ ){
+        if( mesh2->incidentFaces[p].len == 0 ){
+            continue;
+        }
+        thisTriangle = mesh2->incidentFaces[p].neis_i[0];
+        face = mesh2->faces[thisTriangle];
+        firstVertices[0] = face[0] == p ? face[1] : face[0];
+        firstVertices[1] = face[2] == p ? face[1] : face[2];
+        visited[thisTriangle] = 1;
+        nVisited = 1;
+        nStops = 0;
+        // go around one way and, if we get to the boundary, the other way
+        for( int side = 0; side<2 && nStops == side; side++ ){
+            thisTriangle = mesh2->incidentFaces[p].neis_i[0];
+            indexk1 = firstVertices[side];
+            while( 1 ){
+                nextTriangle = nextTriangleAround(mesh2, p, (size_t)thisTriangle, indexk1, &indexNext);
+                scanTriangle = otherTriangle_scan(mesh2, p, indexk1, thisTriangle, &indexScan);
+                assert( nextTriangle == scanTriangle );
+                nSteps ++;
+                if( nextTriangle == -1 ){
+                    nStops ++;
+                    break;
+                }
+                assert( indexNext == indexScan );
+                if( nextTriangle == mesh2->incidentFaces[p].neis_i[0] ){
+                    break; // full circle
+                }
+                assert( !visited[nextTriangle] );
+                visited[nextTriangle] = 1;
+                nVisited ++;
+                thisTriangle = nextTriangle;
+                indexk1 = indexNext;
+            }
+        }
+        assert( nStops == 0 || nStops == 2 );
+        nBoundary += nStops/2;
+        // all the incident faces, just once
+        assert( nVisited == mesh2->incidentFaces[p].len );
+        for( int i = 0; i<mesh2->incidentFaces[p].len; i++ ){
+            assert( visited[mesh2->incidentFaces[p].neis_i[i]] );
+            visited[mesh2->incidentFaces[p].neis_i[i]] = 0;
+        }
+    }
+    free(visited);
+    printf("Corner table agrees with the scans (%ld steps around %zu points, %ld on the boundary)\n",
+           nSteps, mesh2->nPoints, nBoundary);
+}
+
+static size_t pointOnBoundary_scan(mesh2S *mesh2, size_t indexPoint) {
+    // pointOnBoundary comparing the etas of the incident faces
+    int neiTri = mesh2->incidentFaces[indexPoint].neis_i[0];
+    double indexInit = mesh2->eta[neiTri];
+    for( int i = 1; i < mesh2->incidentFaces[indexPoint].len; i ++){
+        neiTri = mesh2->incidentFaces[indexPoint].neis_i[i];
+        if( mesh2->eta[neiTri] != indexInit ){
+            return 1;
+        }
+    }
+    return 0;
+}
+
+static int getTangentChangeReg_scan(mesh2S *mesh2, size_t indexPoint, size_t firstTriangle, double tanChange[2]) {
+    // getTangentChangeReg going around indexPoint with the scans. It used to read eta[-1] if it got to
+    // the boundary of the mesh before the region changed, here it stops there with 0 (like the table).
+    // Returns 1 if it stopped on the boundary
+    size_t pointsTriangleInit[2], currentVertex, prevVertex, edgeConsidered;
+    int currentTriangle, k = 0;
+    for( int i = 0; i<3; i ++){
+        if( mesh2->faces[firstTriangle][i] != indexPoint ) {
+            pointsTriangleInit[k] = mesh2->faces[firstTriangle][i];
+            k ++;
+        }
+    }
+    tanChange[0] = 0;
+    tanChange[1] = 0;
+    currentTriangle = (int)firstTriangle;
+    currentVertex = pointsTriangleInit[0];
+    while( currentVertex != pointsTriangleInit[1] ){
+        prevVertex = currentVertex;
+        currentTriangle = otherTriangle_scan(mesh2, indexPoint, prevVertex, currentTriangle, &currentVertex);
+        if( currentTriangle == -1 ){
+            return 1;
+        }
+        if( mesh2->eta[currentTriangle] != mesh2->eta[firstTriangle] ){
+            // the edge indexPoint prevVertex, B0 if it starts at indexPoint, B1 if it ends there
+            for( k = 0; k < 3; k++){
+                edgeConsidered = mesh2->edgesInFace[currentTriangle][k];
+                if( mesh2->edges[edgeConsidered][0] == indexPoint && mesh2->edges[edgeConsidered][1] == prevVertex ){
+                    tanChange[0] = mesh2->h_i[edgeConsidered].B[0][0];
+                    tanChange[1] = mesh2->h_i[edgeConsidered].B[0][1];
+                    return 0;
+                }
+                if( mesh2->edges[edgeConsidered][1] == indexPoint && mesh2->edges[edgeConsidered][0] == prevVertex ){
+                    tanChange[0] = mesh2->h_i[edgeConsidered].B[1][0];
+                    tanChange[1] = mesh2->h_i[edgeConsidered].B[1][1];
+                    return 0;
+                }
+            }
+            assert( 0 ); // the edge has to be on currentTriangle
+        }
+    }
+    return 0;
+}
+
+static void checkInterfaces(mesh2S *mesh2) {
+    // pointOnInterface and tanChangeCorner (mesh2_initInterfaces) against pointOnBoundary and
+    // getTangentChangeReg computed by going through the faces around each point
+    size_t f, p;
+    double tanScan[2], tanTable[2];
+    long nInterface = 0, nTangents = 0, nStops = 0;
+    int firstCorner = 1;
+    for( p = 0; p<mesh2->nPoints; p++ ){
+        assert( pointOnBoundary(mesh2, p) == pointOnBoundary_scan(mesh2, p) );
+        nInterface += pointOnBoundary(mesh2, p);
+    }
+    for( f = 0; f<mesh2->nFaces; f++ ){
+        for( int k = 0; k<3; k++ ){
+            p = mesh2->faces[f][k];
+            if( !pointOnBoundary(mesh2, p) ){
+                assert( mesh2->tanChangeCorner[3*f + k][0] == 0 && mesh2->tanChangeCorner[3*f + k][1] == 0 );
+                continue;
+            }
+            nStops += getTangentChangeReg_scan(mesh2, p, f, tanScan);
+            assert( mesh2->tanChangeCorner[3*f + k][0] == tanScan[0] );
+            assert( mesh2->tanChangeCorner[3*f + k][1] == tanScan[1] );
+            if( firstCorner ){
+                // getTangentChangeReg reads the table
+                getTangentChangeReg(mesh2, p, f, tanTable);
+                assert( tanTable[0] == tanScan[0] && tanTable[1] == tanScan[1] );
+                firstCorner = 0;
+            }
+            nTangents ++;
+        }
+    }
+    printf("Interface tables agree with the scans (%ld points on an interface, %ld tangents, %ld stop on the boundary)\n",
+           nInterface, nTangents, nStops);
+}
+
 int main(){
 
     mesh2S *mesh2;
     mesh2_alloc(&mesh2);
+
+    // first the tables in mesh2 against the scans they replaced, on a grid
+    gridMesh(mesh2, 30);
+    checkEdgeFaces(mesh2);
+    checkCorners(mesh2);
+    checkInterfaces(mesh2);
     const char *pathPoints, *pathFaces, *pathEdges, *pathEdgesInFace, *pathNeighbors;
     const char *pathIncidentFaces, *pathIndices, *pathBoundary;
     
@@ -26,6 +391,10 @@ int main(){
     mesh2_init_from_meshpy(mesh2, pathPoints, pathFaces, pathEdges, pathEdgesInFace,
 			   pathNeighbors, pathIncidentFaces, pathIndices, pathBoundary);
 
+    checkEdgeFaces(mesh2);
+    checkCorners(mesh2);
+    checkInterfaces(mesh2);
+
     printf("GENERAL INFO \n\n");
     printGeneralInfoMesh(mesh2);
 
@@ -0,0 +1,128 @@
+################ THE COMPILED KERNELS (optiKernels.py) AGAINST THEIR PURE PYTHON REFERENCE IN optiPython
+# On random inputs and on degenerate ones (zero length edges, coincident points) where the
+# reference divides by a zero norm and gives nan/inf.
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays
+
+optiKernels = pytest.importorskip("optiKernels")
+import optiPython as oP
+
+
+def randomEdge(rng):
+     return rng.normal(size = 2), rng.normal(size = 2), rng.normal(size = 2), rng.normal(size = 2)
+
+def zeroEdge(point):
+     # Zero length edge, its tangents are zero too
+     return np.copy(point), np.zeros(2), np.copy(point), np.zeros(2)
+
+def kernelArgs(name, rng, degenerate):
+     '''
+     Arguments for the kernel name, degenerate = 0 random, 1 zero length edges, 2 coincident points
+     (the edges are the same and so are the parameters, like a path through a corner of the fan)
+     '''
+     p = rng.normal(size = 2)
+     edge = randomEdge(rng) if degenerate != 1 else zeroEdge(p)
+     edgeTo = randomEdge(rng) if degenerate == 0 else edge
+     edgeThis = randomEdge(rng) if degenerate == 0 else edge
+     params = rng.uniform(0, 1, 3)
+     if( degenerate == 2 ):
+          params[:] = params[0] # the points on the same edge are the same
+     eta1, eta2 = rng.choice([1.0, 1.45, 1.8], 2)
+     x0, x1, grad0, grad1, v = (rng.normal(size = 2) for i in range(5))
+     if( degenerate > 0 ):
+          x1 = np.copy(x0)
+     T0, T1 = rng.uniform(0, 2, 2)
+     if( name in ('hermite_interpolationT', 'der_hermite_interpolationT') ):
+          return (params[0], x0, T0, grad0, x1, T1, grad1)
+     if( name in ('secondDer_Boundary', 'gradientBoundary', 'hermite_boundary') ):
+          return (params[0],) + edge
+     if( name == 'arclengthSimpson' ):
+          return (params[0], params[1]) + edge
+     if( name == 'get_sk' ):
+          return (params[0], params[1])
+     if( name in ('partial_L_muk', 'partial_L_lamk') ):
+          # the tangents are zero on a zero length edge
+          vectors = [np.zeros(2) if degenerate == 1 else rng.normal(size = 2) for i in range(5)]
+          return (params[0], params[1] + (0.5 if degenerate == 1 else 0)) + tuple(vectors)
+     if( name == 'partial_fObj_mu1' ):
+          y2 = np.copy(v) if degenerate > 0 else rng.normal(size = 2)
+          return (params[0], x0, T0, grad0, x1, T1, grad1, rng.normal(size = 2), y2, v)
+     if( name in ('partial_fObj_recCr', 'partial_fObj_shCr', 'partial_fObj_recSt', 'partial_fObj_shSt') ):
+          return tuple(params) + edge + edgeTo + (eta1, eta2)
+     if( name == 'partial_fObj_recCr1' ):
+          return tuple(params) + (edge[0], edge[1], edge[2], edge[3], edgeTo[1], edgeTo[2], edgeTo[3], eta1, eta2)
+     if( name == 'partial_fObj_collapsedShooter' ):
+          return tuple(params) + edge + edgeThis + edgeTo + (eta1, eta2)
+     raise KeyError(name)
+
+pointKernels = ['hermite_interpolationT', 'der_hermite_interpolationT', 'secondDer_Boundary',
+                'gradientBoundary', 'hermite_boundary', 'arclengthSimpson', 'get_sk', 'partial_L_muk',
+                'partial_L_lamk', 'partial_fObj_mu1', 'partial_fObj_recCr', 'partial_fObj_shCr',
+                'partial_fObj_recCr1', 'partial_fObj_recSt', 'partial_fObj_shSt',
+                'partial_fObj_collapsedShooter']
+
+
+@pytest.mark.parametrize("degenerate", [0, 1, 2])
+@pytest.mark.parametrize("name", pointKernels)
+def test_kernelAgainstReference(referenceKernels, rng, name, degenerate):
+     oP = referenceKernels
+     for i in range(50):
+          args = kernelArgs(name, rng, degenerate)
+          with np.errstate(all = 'ignore'):
+               expected = oP.reference[name](*args)
+               got = getattr(optiKernels, name)(*args)
+          assert_allclose(got, expected, rtol = 1e-12, atol = 1e-12, equal_nan = True)
+
+
+def randomTops(rng, nRegions):
+     '''
+     Random points on the tops: each top has no points, Cr points or St points
+     '''
+     topTypes = rng.integers(0, 3, nRegions)
+     indCrTop = [j + 1 for j in range(nRegions) if topTypes[j] == 1]
+     indStTop = [j + 1 for j in range(nRegions) if topTypes[j] == 2]
+     paramsCrTop = rng.uniform(0, 1, 2*len(indCrTop)) if indCrTop else None
+     paramsStTop = rng.uniform(0, 1, 2*len(indStTop)) if indStTop else None
+     return (np.array(indCrTop) if indCrTop else None, paramsCrTop,
+             np.array(indStTop) if indStTop else None, paramsStTop)
+
+@pytest.mark.parametrize("collapsed", [False, True])
+def test_fanKernelsAgainstReference(referenceKernels, rng, collapsed):
+     oP = referenceKernels
+     for i in range(40):
+          nRegions = int(rng.integers(1, 5))
+          fan = randomFanArrays(nRegions, rng, curved = bool(i%2))
+          params = rng.uniform(0, 1, 2*nRegions + 1)
+          tops = randomTops(rng, nRegions)
+          if( collapsed ):
+               # every point of the path at x0 (all the rays have zero length)
+               params[:] = 0
+               tops = tuple(None if t is None else np.zeros_like(t) if k%2 else t for k, t in enumerate(tops))
+          fanArgs = (fan['x0'], fan['T0'], fan['grad0'], fan['x1'], fan['T1'], fan['grad1'], fan['xHat'],
+                     fan['listIndices'], fan['listxk'], fan['listB0k'], fan['listBk'], fan['listBkBk1'])
+          with np.errstate(all = 'ignore'):
+               expected = oP.reference['fObj_generalized'](params, *fanArgs, *tops)
+               got = oP.fObj_generalized_compiled(params, *fanArgs, *tops)
+          assert_allclose(got, expected, rtol = 1e-12, atol = 1e-12, equal_nan = True)
+          topType, topIndex = oP.topsPerRegion(nRegions, *oP.topsAsArrays(*tops)[::2])
+          paramsTops = {1: tops[1], 2: tops[3]}
+          for j in range(nRegions + 1):
+               rk = sk = 0.0
+               if( topType[j] > 0 ):
+                    rk, sk = paramsTops[topType[j]][2*topIndex[j]:2*topIndex[j] + 2]
+               termArgs = (j, params) + fanArgs[:6] + fanArgs[7:] + (int(topType[j]), float(rk), float(sk))
+               with np.errstate(all = 'ignore'):
+                    expected = oP.reference['fObj_regionTerm'](*termArgs)
+                    got = optiKernels.fObj_regionTerm(*termArgs)
+               assert_allclose(got, expected, rtol = 1e-12, atol = 1e-12, equal_nan = True)
+          pathArgs = (params, fan['listIndices'], fan['listxk'], fan['listB0k'], fan['listBk'], fan['listBkBk1']) + tops
+          with np.errstate(all = 'ignore'):
+               expectedPath, expectedGrads = oP.reference['getPathGradEikonal'](*pathArgs)
+               gotPath, gotGrads = oP.getPathGradEikonal_compiled(*pathArgs)
+          assert_allclose(gotPath, expectedPath, rtol = 1e-12, atol = 1e-12)
+          assert_allclose(gotGrads, expectedGrads, rtol = 1e-12, atol = 1e-12, equal_nan = True)
+
@@ -0,0 +1,53 @@
+################ THE TYPES OF PATH SOLVED CONCURRENTLY (triangleFan.executor) AGAINST SOLVING
+################ THEM ONE AFTER ANOTHER
+# Each option in optionsTop is an independent problem, the pool only changes where it's solved.
+# The optimum (and the option that wins a tie) has to be the same to the last bit.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.testing import assert_array_equal
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+
+
+def fansWithOptions(rng, nFans):
+     '''
+     Random fans with at least three types of path (points on at most one top, as in
+     test_pathGradient.py)
+     '''
+     fans = []
+     while( len(fans) < nFans ):
+          nRegions = int(rng.integers(1, 4))
+          fan = randomFanArrays(nRegions, rng)
+          fan['listIndices'][nRegions + 1:] = 1.0
+          optionsTop = fanFromArrays(fan).optionsTop
+          optionsTop = optionsTop[np.count_nonzero(optionsTop, axis = 1) <= 1]
+          if( len(optionsTop) >= 3 ):
+               fans.append((fan, optionsTop))
+     return fans
+
+def solve(fan, optionsTop, executor, nWorkers = None):
+     triFan = fanFromArrays(fan, executor = executor, nWorkers = nWorkers, pruneOptions = False)
+     triFan.optionsTop = optionsTop
+     triFan.optimize()
+     return triFan
+
+def assertSameOptimum(triFan, expected):
+     assert triFan.opti_fVal == expected.opti_fVal
+     assert_array_equal(triFan.optiParams, expected.optiParams)
+     assert_array_equal(triFan.optiOption, expected.optiOption)
+     assert triFan.nIterations == expected.nIterations
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_executorAgainstSequential(rng):
+     fans = fansWithOptions(rng, 6)
+     with ThreadPoolExecutor(max_workers = 3) as pool:
+          for i, (fan, optionsTop) in enumerate(fans):
+               expected = solve(fan, optionsTop, None)
+               assertSameOptimum(solve(fan, optionsTop, "threads", 2), expected)
+               assertSameOptimum(solve(fan, optionsTop, pool), expected)
+               if( i < 2 ):
+                    assertSameOptimum(solve(fan, optionsTop, "processes", 2), expected)
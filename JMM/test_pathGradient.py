@@ -0,0 +1,94 @@
+################ THE GRADIENT OF THE EIKONAL AT xHat (gradHat, from getPathGradEikonal) AGAINST
+################ FINITE DIFFERENCES OF THat WHEN WE MOVE xHat
+# The last side h0hn is a segment. If the optimal path gets to xHat going straight (lam_n = 1,
+# the points on the last top, if any, both at the same end of it) THat only depends on xHat
+# through that last segment and dTHat/dxHat = gradHat. If it creeps along h0hn we can only move
+# xHat along h0hn and dTHat/dh = <gradHat, direction of h0hn>. The type of path is fixed, the
+# moved fans are solved for the same one.
+
+import numpy as np
+from numpy.linalg import norm
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+
+
+def moveHat(fan, xHat):
+     '''
+     Same fan with xHat moved, the last side is still the segment x0 xHat
+     '''
+     fan = dict(fan)
+     fan['xHat'] = np.copy(xHat)
+     for name in ('listxk', 'listB0k', 'listBk'):
+          fan[name] = np.copy(fan[name])
+     fan['listxk'][-1] = xHat
+     fan['listB0k'][-1] = xHat - fan['x0']
+     fan['listBk'][-1] = xHat - fan['x0']
+     return fan
+
+def solveFan(fan, option):
+     '''
+     Optimal path on the fan for one type of path (row of optionsTop)
+     '''
+     triFan = fanFromArrays(fan)
+     triFan.optionsTop = np.array([option])
+     triFan.optimize()
+     return triFan
+
+def pathTypes(fan):
+     '''
+     Types of path of triangleFan with points on at most one top (the forward pass can't go
+     from a point on a top straight to a point on the next top)
+     '''
+     optionsTop = fanFromArrays(fan).optionsTop
+     return optionsTop[np.count_nonzero(optionsTop, axis = 1) <= 1]
+
+def lastTop(triFan):
+     '''
+     Parameters of the points on the last top, None if there are none
+     '''
+     n = triFan.nRegions
+     for indTop, paramsTop in ((triFan.optiIndCrTop, triFan.optiParamsCrTop),
+                               (triFan.optiIndStTop, triFan.optiParamsStTop)):
+          indTop = list(indTop)
+          if( n in indTop ):
+               k = indTop.index(n)
+               return paramsTop[2*k:2*k + 2]
+     return None
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_gradHatAgainstFiniteDifferences(rng):
+     h = 1e-3
+     nChecked = 0
+     nTops = 0
+     for i in range(30):
+          nRegions = 1 + i%3
+          fan = randomFanArrays(nRegions, rng)
+          # faster outside the fan, so that the paths go along the tops
+          fan['listIndices'][nRegions + 1:] = 1.0
+          fan = moveHat(fan, fan['xHat'])
+          direction = (fan['xHat'] - fan['x0'])/norm(fan['xHat'] - fan['x0'])
+          for option in pathTypes(fan):
+               triFan = solveFan(fan, option)
+               if( not triFan.optiResidual < 1e-8 ):
+                    continue
+               lamn = triFan.optiParams[2*nRegions - 1]
+               paramsTop = lastTop(triFan)
+               if( lamn == 1 and (paramsTop is None or (paramsTop[0] == paramsTop[1] and paramsTop[0] in (0, 1))) ):
+                    directions = [np.array([1.0, 0.0]), np.array([0.0, 1.0])]
+               elif( paramsTop is None ):
+                    directions = [direction]
+               else:
+                    continue
+               for e in directions:
+                    plus = solveFan(moveHat(fan, fan['xHat'] + h*e), option)
+                    minus = solveFan(moveHat(fan, fan['xHat'] - h*e), option)
+                    if( not (plus.optiResidual < 1e-8 and minus.optiResidual < 1e-8) ):
+                         continue
+                    dTHat = (plus.opti_fVal - minus.opti_fVal)/(2*h)
+                    assert abs(dTHat - np.dot(triFan.lastGrad, e)) < 1e-3
+                    nChecked += 1
+                    nTops += np.any(option > 0)
+     assert nChecked > 20
+     assert nTops > 10
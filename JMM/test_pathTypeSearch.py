@@ -0,0 +1,41 @@
+################ THE TYPE OF PATH CHOSEN BY DYNAMIC PROGRAMMING (pathTypeSearch = "dp") AGAINST
+################ SOLVING ALL THE TYPES OF PATH (pathTypeSearch = "exhaustive")
+# pathTypeSearch_dp picks the type of path with the lowest objective on a grid for the parameters
+# and the optimizer only solves that one (and the one without points on the tops). The grid is not
+# a bound: the optimizer doesn't always reach the minimum of a type of path and the chords to the
+# tops are not checked for feasibility. So on a few fans the exhaustive search finds a better
+# optimum, we check that this is rare and that the difference is small.
+
+import numpy as np
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_dpAgainstExhaustive(rng):
+     nFans = 0
+     nSame = 0
+     while( nFans < 30 ):
+          nRegions = int(rng.integers(1, 5))
+          fan = randomFanArrays(nRegions, rng)
+          # faster outside the fan, so that the paths go along the tops
+          fan['listIndices'][nRegions + 1:] = 1.0
+          exhaustive = fanFromArrays(fan)
+          # points on at most one top (the forward pass can't go from a point on a top straight
+          # to a point on the next top)
+          optionsTop = exhaustive.optionsTop[np.count_nonzero(exhaustive.optionsTop, axis = 1) <= 1]
+          if( len(optionsTop) < 3 ):
+               continue
+          exhaustive.optionsTop = optionsTop
+          exhaustive.optimize()
+          dp = fanFromArrays(fan)
+          dp.optionsTop = optionsTop
+          dp.pathTypeSearch = "dp"
+          dp.optimize()
+          # the dp solves some of the types of path that the exhaustive search solves
+          assert dp.opti_fVal >= exhaustive.opti_fVal
+          assert dp.opti_fVal <= 1.1*exhaustive.opti_fVal
+          nSame += dp.opti_fVal <= exhaustive.opti_fVal*(1 + 1e-10)
+          nFans += 1
+     assert nSame >= 24
@@ -0,0 +1,114 @@
+/* TEST PRIORITY QUEUE
+
+Random inserts, updates, deleteRoot and delete_findIndex on the indexed heap, checked against
+a plain array of the values of the indices in the queue (the "scan"). After each operation:
+
+   - the root is the smallest value in the scan
+   - get_valueAtIndex finds the value of every index in the queue (so queue_pos is right)
+   - getSize is the number of indices in the scan
+
+At the end the queue is emptied and the roots have to come out in order.
+
+./test_priority_queue [nIndices] [nOperations] [seed]
+
+*/
+
+#include "priority_queue.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <assert.h>
+
+
+static void checkAgainstScan(p_queue *p_queueImp, double *vals, int *inQueue, int nIndices, int nInQueue)
+{
+  // compare the queue with the scan
+  double minVal = 0;
+  int i, foundMin = 0;
+  assert( getSize(p_queueImp) == nInQueue );
+  for( i = 0; i < nIndices; i++ ){
+    if( inQueue[i] ){
+      assert( get_valueAtIndex(p_queueImp, i) == vals[i] );
+      if( !foundMin || vals[i] < minVal ){
+        minVal = vals[i];
+        foundMin = 1;
+      }
+    }
+  }
+  if( nInQueue > 0 ){
+    assert( valueRoot(p_queueImp) == minVal );
+    assert( inQueue[indexRoot(p_queueImp)] && vals[indexRoot(p_queueImp)] == minVal );
+  }
+}
+
+int main(int argc, char **argv){
+  int nIndices = argc > 1 ? atoi(argv[1]) : 500;
+  long nOperations = argc > 2 ? atol(argv[2]) : 100000;
+  unsigned int seed = argc > 3 ? (unsigned int)atoi(argv[3]) : 1;
+  double *vals, newVal, lastVal;
+  int *inQueue, nInQueue, op, i, root;
+  long k;
+  p_queue *p_queueImp;
+
+  vals = malloc(nIndices*sizeof(double));
+  inQueue = calloc(nIndices, sizeof(int));
+  priority_queue_alloc(&p_queueImp);
+  priority_queue_init(p_queueImp);
+  srand(seed);
+  nInQueue = 0;
+
+  for( k = 0; k < nOperations; k++ ){
+    op = rand()%5;
+    i = rand()%nIndices;
+    if( op <= 1 && !inQueue[i] ){
+      // insert, sometimes with a value that is already in the queue
+      vals[i] = (rand()%4 == 0) ? (double)(rand()%10) : rand()/(double)RAND_MAX;
+      insert(p_queueImp, vals[i], i);
+      inQueue[i] = 1;
+      nInQueue++;
+    }
+    else if( op == 2 && inQueue[i] ){
+      // update only keeps the new value if it's smaller
+      newVal = (rand()%2 == 0) ? vals[i]*(rand()/(double)RAND_MAX) : vals[i] + 1.0;
+      update(p_queueImp, newVal, i);
+      if( newVal < vals[i] ){
+        vals[i] = newVal;
+      }
+    }
+    else if( op == 3 && nInQueue > 0 ){
+      root = indexRoot(p_queueImp);
+      deleteRoot(p_queueImp);
+      inQueue[root] = 0;
+      nInQueue--;
+    }
+    else if( op == 4 ){
+      // indices not in the queue are ignored
+      delete_findIndex(p_queueImp, i);
+      if( inQueue[i] ){
+        inQueue[i] = 0;
+        nInQueue--;
+      }
+    }
+    checkAgainstScan(p_queueImp, vals, inQueue, nIndices, nInQueue);
+  }
+
+  // empty the queue, the values have to come out in order
+  lastVal = -1;
+  while( getSize(p_queueImp) > 0 ){
+    assert( valueRoot(p_queueImp) >= lastVal );
+    lastVal = valueRoot(p_queueImp);
+    root = indexRoot(p_queueImp);
+    assert( inQueue[root] && vals[root] == lastVal );
+    inQueue[root] = 0;
+    nInQueue--;
+    deleteRoot(p_queueImp);
+  }
+  assert( nInQueue == 0 );
+
+  printf("Priority queue agrees with the scan after %ld operations on %d indices\n", nOperations, nIndices);
+
+  priority_queue_dealloc(&p_queueImp);
+  free(vals);
+  free(inQueue);
+  return 0;
+}
@@ -0,0 +1,116 @@
+################ THE PROJECTIONS WITH THE ROOTS OF THE POLYNOMIALS (projectionRoots) AGAINST THE
+################ PROJECTIONS WITH root_scalar (SECANT STARTED AT 0.4, 0.5) THAT THEY REPLACED
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays
+import optiPython as oP
+
+root_scalar = pytest.importorskip("scipy.optimize").root_scalar
+
+
+def secantRoot(f):
+     '''
+     Root found with the secant method, None if it didn't converge to a root (on a polynomial
+     that doesn't vanish it can stop very far away where the rounding errors cancel it)
+     '''
+     root = root_scalar(f, method = "secant", x0 = 0.4, x1 = 0.5)
+     if( not root.converged or abs(f(root.root)) > 1e-9 or abs(root.root) > 100 ):
+          return None
+     return root.root
+
+def project_lamk1Givenmuk_secant(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
+     '''
+     project_lamk1Givenmuk with root_scalar, None if the secant method doesn't converge
+     '''
+     lamk1 = oP.project_box(lamk1)
+     zk = oP.hermite_boundary(muk, x0, B0k, xk, Bk)
+     yk1 = oP.hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
+     B0k_muk = oP.gradientBoundary(muk, x0, B0k, xk, Bk)
+     B0k1_lamk1 = oP.gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
+     Nk_muk = np.array([-B0k_muk[1], B0k_muk[0]])
+     Nk1_lamk1 = np.array([-B0k1_lamk1[1], B0k1_lamk1[0]])
+     dotTestMin = np.dot( yk1 - zk, Nk_muk )
+     dotTestMax = np.dot( yk1 - zk, Nk1_lamk1 )
+     if( dotTestMin < 0 ):
+          lamk1 = secantRoot(lambda lam: oP.t1(lam, x0, xk1, B0k1, Bk1, zk, B0k_muk))
+          if( lamk1 is None ):
+               return None
+          yk1 = oP.hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
+          B0k1_lamk1 = oP.gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
+          Nk1_lamk1 = np.array([-B0k1_lamk1[1], B0k1_lamk1[0]])
+          if( np.dot( Nk1_lamk1, x0 - xk) < 0):
+               Nk1_lamk1 = -Nk1_lamk1
+          dotTestMax = np.dot( yk1 - zk, Nk1_lamk1 )
+     if( dotTestMax < 0 ):
+          lamk1 = secantRoot(lambda lam: oP.t2(lam, x0, xk1, B0k1, Bk1, zk))
+          if( lamk1 is None ):
+               return None
+     return oP.project_box(lamk1)
+
+def project_mukGivenlamk1_secant(muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1):
+     '''
+     project_mukGivenlamk1 with root_scalar, None if the secant method doesn't converge
+     '''
+     muk = oP.project_box(muk)
+     yk1 = oP.hermite_boundary(lamk1, x0, B0k1, xk1, Bk1)
+     B0k1_lamk1 = oP.gradientBoundary(lamk1, x0, B0k1, xk1, Bk1)
+     zk = oP.hermite_boundary(muk, x0, B0k, xk, Bk)
+     B0k_muk = oP.gradientBoundary(muk, x0, B0k, xk, Bk)
+     N0k1_lamk1 = np.array([-B0k1_lamk1[1], B0k1_lamk1[0]])
+     N0k_muk = np.array([-B0k_muk[1], B0k_muk[0]])
+     if( np.dot( N0k_muk, xk1 - x0) < 0):
+          N0k_muk = -N0k_muk
+     if( np.dot( N0k1_lamk1, x0 - xk) < 0):
+          N0k1_lamk1 = -N0k1_lamk1
+     dotTestMin =  np.dot(N0k1_lamk1, yk1 - zk)
+     dotTestMax = np.dot(N0k_muk, yk1 - zk)
+     if( dotTestMin < 0 ):
+          muk = secantRoot(lambda mu: oP.t4(mu, x0, xk, B0k, Bk, yk1, B0k1_lamk1))
+          if( muk is None ):
+               return None
+          zk = oP.hermite_boundary(muk, x0, B0k, xk, Bk)
+          B0k_muk = oP.gradientBoundary(muk, x0, B0k, xk, Bk)
+          N0k_muk = np.array([-B0k_muk[1], B0k_muk[0]])
+          if( np.dot( N0k_muk, xk1 - x0) < 0):
+               N0k_muk = -N0k_muk
+          dotTestMax = np.dot(N0k_muk, yk1 - zk)
+     if( dotTestMax < 0 ):
+          muk = secantRoot(lambda mu: oP.t3(mu, x0, xk, B0k, Bk, yk1))
+          if( muk is None ):
+               return None
+     return oP.project_box(muk)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("curved", [True, False])
+def test_projectionsAgainstSecant(rng, curved):
+     nProjected = 0
+     for i in range(400):
+          fan = randomFanArrays(1, rng, curved = curved)
+          x0, xk, xk1 = fan['listxk']
+          B0k, B0k1 = fan['listB0k']
+          Bk, Bk1 = fan['listBk']
+          muk, lamk1 = rng.uniform(-0.2, 1.2, 2)
+          args = (muk, lamk1, x0, B0k, xk, Bk, B0k1, xk1, Bk1)
+          expected = project_lamk1Givenmuk_secant(*args)
+          if( expected is not None ):
+               assert_allclose(oP.project_lamk1Givenmuk(*args), expected, atol = 1e-7)
+               nProjected += expected != oP.project_box(lamk1)
+          expected = project_mukGivenlamk1_secant(*args)
+          if( expected is not None ):
+               assert_allclose(oP.project_mukGivenlamk1(*args), expected, atol = 1e-7)
+               nProjected += expected != oP.project_box(muk)
+     # Most of the time the parameters are feasible, but not always
+     assert nProjected > 20
+
+
+def test_polynomialRootsDegenerate():
+     # No roots for the zero polynomial, constants and nan coefficients (from degenerate edges)
+     listRoots = oP.polynomialRoots_batch([[0.0, 0.0, 0.0], [2.0], [np.nan, 1.0, 2.0], [1e-20, 1.0, -0.5],
+                                           [1.0, -3.0, 2.0]])
+     assert [len(roots) for roots in listRoots] == [0, 0, 0, 1, 2]
+     assert_allclose(listRoots[3], [0.5])
+     assert_allclose(np.sort(listRoots[4].real), [1.0, 2.0])
@@ -0,0 +1,30 @@
+################ PRUNING THE TYPES OF PATH WITH THEIR LOWER BOUNDS (triangleFan.pruneOptions)
+################ AGAINST SOLVING ALL OF THEM
+# lowerBoundOption has to be below the objective function of any path of that type (so below
+# what the optimizer finds for it), then skipping the options whose bound is above the best value
+# found so far can't change the optimum.
+
+from numpy.testing import assert_array_equal
+import pytest
+
+from conftest import fanFromArrays
+from test_optionExecutor import fansWithOptions
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_pruningAgainstAllOptions(rng):
+     nPruned = 0
+     for fan, optionsTop in fansWithOptions(rng, 12):
+          everything = fanFromArrays(fan, pruneOptions = False)
+          everything.optionsTop = optionsTop
+          everything.optimize()
+          pruned = fanFromArrays(fan, pruneOptions = True)
+          pruned.optionsTop = optionsTop
+          pruned.optimize()
+          assert pruned.opti_fVal == everything.opti_fVal
+          assert_array_equal(pruned.optiParams, everything.optiParams)
+          assert_array_equal(pruned.optiOption, everything.optiOption)
+          nPruned += pruned.nOptionsPruned
+          for k in range(len(optionsTop)):
+               assert pruned.lowerBoundOption(k) <= everything.optimizeOption(k)[0]
+     assert nPruned > 0
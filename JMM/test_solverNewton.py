@@ -0,0 +1,30 @@
+################ THE PROJECTED QUASI NEWTON SOLVER (solver = "newton") AGAINST THE BLOCK
+################ COORDINATE METHOD (solver = "bcd")
+# Both solve the same problem with the same feasibility projections. Where the block coordinate
+# method converges (its KKT residual is zero) both have to find the same optimum. Where it
+# doesn't (it stops on a kink) they can stop at different points, but not far apart.
+
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_newtonAgainstBCD(rng):
+     nConverged = 0
+     for i in range(30):
+          nRegions = 1 + i%3
+          fan = randomFanArrays(nRegions, rng, curved = bool(i%2))
+          bcd = fanFromArrays(fan, solver = "bcd")
+          newton = fanFromArrays(fan, solver = "newton")
+          # the type of path without points on the tops
+          bcd.optionsTop = bcd.optionsTop[:1]
+          newton.optionsTop = bcd.optionsTop
+          bcd.optimize()
+          newton.optimize()
+          assert newton.opti_fVal <= bcd.opti_fVal*(1 + 1e-4)
+          if( bcd.optiResidual < 1e-8 ):
+               assert_allclose(newton.opti_fVal, bcd.opti_fVal, rtol = 1e-8)
+               nConverged += 1
+     assert nConverged > 20
@@ -0,0 +1,51 @@
+################ STOPPING WITH THE KKT RESIDUAL (kktResidual, triangleFan.tolKKT) AGAINST
+################ STOPPING ONLY WITH tol AND maxIter
+# kktResidual only looks at the directions where the objective function is differentiable. With
+# tolKKT the block coordinate method stops once the residual is below it, that can only save
+# iterations and (close to a minimum the error is about residual**2) the optimum barely moves.
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from conftest import randomFanArrays, fanFromArrays
+import optiPython as oP
+
+
+def test_kktResidual():
+     noTop = np.array([])
+     # mu1, lam2, mu2, lam3 and mun1 = 1 (never in the residual)
+     params = np.array([0.5, 0.3, 0.6, 0.4, 1.0])
+     assert_allclose(oP.kktResidual(params, noTop, noTop, np.array([0.1, -0.2, 0.05, 0.3, 7.0]), noTop, noTop), 0.3)
+     # on the bounds the partials don't count
+     params = np.array([0.0, 0.3, 0.6, 1.0, 1.0])
+     assert_allclose(oP.kktResidual(params, noTop, noTop, np.array([5.0, -0.2, 0.05, 9.0, 7.0]), noTop, noTop), 0.2)
+     # lam2 = mu2 is a single variable, the sum of their partials
+     params = np.array([0.5, 0.4, 0.4, 0.7, 1.0])
+     gradParams = np.array([0.01, 0.3, -0.25, 0.02, 1.0])
+     assert_allclose(oP.kktResidual(params, noTop, noTop, gradParams, noTop, noTop), 0.05)
+     # and so are rk = sk on the tops
+     assert_allclose(oP.kktResidual(params, np.array([0.3, 0.3]), noTop, gradParams, np.array([0.1, 0.2]), noTop), 0.3)
+     assert_allclose(oP.kktResidual(params, noTop, np.array([0.2, 0.9]), gradParams, noTop, np.array([0.1, -0.6])), 0.6)
+     assert_allclose(oP.tolKKT_fromMeshSize(0.1), 1e-4)
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("tolKKT", [1e-3, 1e-6])
+def test_tolKKTAgainstPlain(rng, tolKKT):
+     nSaved = 0
+     for i in range(30):
+          fan = randomFanArrays(1 + i%3, rng, curved = bool(i%2))
+          plain = fanFromArrays(fan)
+          # the type of path without points on the tops
+          plain.optionsTop = plain.optionsTop[:1]
+          plain.optimize()
+          early = fanFromArrays(fan, tolKKT = tolKKT)
+          early.optionsTop = plain.optionsTop
+          early.optimize()
+          assert early.nIterations <= plain.nIterations
+          if( early.nIterations < plain.nIterations ):
+               # it stopped because of the residual
+               assert early.optiResidual <= tolKKT
+               nSaved += 1
+          assert_allclose(early.opti_fVal, plain.opti_fVal, rtol = 1e-6)
+     assert nSaved > 10